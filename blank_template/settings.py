@@ -215,6 +215,8 @@ CRISPY_TEMPLATE_PACK = "bootstrap4"
 
 CRON_CLASSES = [
     'accounts.cron.ProcessRecurringExpensesCronJob',
+    'accounts.cron.ReceivablesAgingCronJob',
+    'accounts.cron.SupplierScorecardCronJob',
 ]
 
 MIDDLEWARE = [
@@ -223,6 +225,7 @@ MIDDLEWARE = [
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'accounts.middleware.MissingMediaCloudinaryRedirectMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'accounts.middleware.TenantScopeCacheMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -353,6 +356,8 @@ AUTHENTICATION_BACKENDS = [
 
 CRON_CLASSES = [
     "accounts.cron.ProcessRecurringExpensesCronJob",
+    "accounts.cron.ReceivablesAgingCronJob",
+    "accounts.cron.SupplierScorecardCronJob",
     # ... other cron jobs ...
 ]
 # Internationalization
@@ -419,6 +424,80 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_REDIRECT_URL = 'accounts:home'
 LOGIN_URL = 'accounts:login'
 
+# Tenant scoping lookups (business owner, team, connected group, stock owner)
+# are memoized per request and in the default cache. With the default
+# per-process LocMemCache, invalidations only reach the current worker, so the
+# timeout bounds how long other workers can serve a stale scope.
+TENANT_SCOPE_CACHE_ENABLED = _env_truthy(os.getenv('TENANT_SCOPE_CACHE_ENABLED'), True)
+try:
+    TENANT_SCOPE_CACHE_TIMEOUT = int(os.getenv('TENANT_SCOPE_CACHE_TIMEOUT', '300'))
+except (TypeError, ValueError):
+    TENANT_SCOPE_CACHE_TIMEOUT = 300
+
+# Invoice payment links are built after commit through an outbox
+# (accounts.payment_links) instead of inline in GroupedInvoice.save(). Run
+# ``manage.py process_payment_links --loop`` to retry failures; set the provider
+# to accounts.payment_links.FakePaymentLinkProvider to work offline.
+PAYMENT_LINK_OUTBOX_ENABLED = _env_truthy(os.getenv('PAYMENT_LINK_OUTBOX_ENABLED'), True)
+PAYMENT_LINK_OUTBOX_THREAD_DISPATCH = _env_truthy(os.getenv('PAYMENT_LINK_OUTBOX_THREAD_DISPATCH'), True)
+PAYMENT_LINK_PROVIDER_CLASS = os.getenv(
+    'PAYMENT_LINK_PROVIDER_CLASS',
+    'accounts.payment_links.LivePaymentLinkProvider',
+)
+
+# Rendered PDFs are cached by content hash (accounts.pdf_cache) in a local,
+# size-bounded LRU directory, and saved documents are pre-rendered after commit
+# (accounts.pdf_prerender). PDF_CACHE_STORE_CLASS swaps in another store.
+INVOICE_PDF_CACHE_ENABLED = _env_truthy(os.getenv('INVOICE_PDF_CACHE_ENABLED'), True)
+PDF_CACHE_DIR = os.getenv('PDF_CACHE_DIR') or None
+try:
+    PDF_CACHE_MAX_BYTES = int(os.getenv('PDF_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+except (TypeError, ValueError):
+    PDF_CACHE_MAX_BYTES = 256 * 1024 * 1024
+PDF_CACHE_STORE_CLASS = os.getenv('PDF_CACHE_STORE_CLASS', 'accounts.pdf_cache.FileSystemPdfStore')
+PDF_PRERENDER_ENABLED = _env_truthy(os.getenv('PDF_PRERENDER_ENABLED'), True)
+
+# WeasyPrint renders in a bounded pool of warm worker processes
+# (accounts.pdf_renderer) that keep stylesheets, fonts and logos loaded.
+# Set the pool size to 0 to render in-process.
+PDF_RENDER_POOL_ENABLED = _env_truthy(os.getenv('PDF_RENDER_POOL_ENABLED'), True)
+try:
+    PDF_RENDER_POOL_SIZE = int(os.getenv('PDF_RENDER_POOL_SIZE', '2'))
+except (TypeError, ValueError):
+    PDF_RENDER_POOL_SIZE = 2
+PDF_RENDER_POOL_START_METHOD = os.getenv('PDF_RENDER_POOL_START_METHOD', 'spawn')
+PDF_RENDER_TIMEOUT = 120
+PDF_RENDER_ASSET_TTL = 300
+
+# List views cache their row counts per tenant and filter (accounts.pagination);
+# counts are invalidated on writes, the timeout bounds staleness across workers.
+LIST_COUNT_CACHE_TIMEOUT = 300
+
+# Invoice/estimate/work order list searches go through the full-text index
+# (accounts.search_index); turn off to fall back to icontains filters.
+SEARCH_INDEX_ENABLED = _env_truthy(os.getenv('SEARCH_INDEX_ENABLED'), True)
+
+# Daily receivables aging snapshots (accounts.aging) older than this are pruned.
+try:
+    AGING_SNAPSHOT_RETENTION_DAYS = int(os.getenv('AGING_SNAPSHOT_RETENTION_DAYS', '730'))
+except (TypeError, ValueError):
+    AGING_SNAPSHOT_RETENTION_DAYS = 730
+
+# Nightly supplier scorecard snapshots (accounts.supplier_scorecards) older than this are pruned.
+try:
+    SUPPLIER_SCORECARD_RETENTION_DAYS = int(os.getenv('SUPPLIER_SCORECARD_RETENTION_DAYS', '730'))
+except (TypeError, ValueError):
+    SUPPLIER_SCORECARD_RETENTION_DAYS = 730
+
+# Bulk work order invoicing jobs (accounts.invoice_conversion) run in a
+# background thread after commit; turn off to leave them to
+# `manage.py process_invoice_conversions`.
+INVOICE_CONVERSION_THREAD_DISPATCH = _env_truthy(os.getenv('INVOICE_CONVERSION_THREAD_DISPATCH'), True)
+
+# Product workbook imports (accounts.product_import) run in a background thread
+# after commit; turn off to leave them to `manage.py process_product_imports`.
+PRODUCT_IMPORT_THREAD_DISPATCH = _env_truthy(os.getenv('PRODUCT_IMPORT_THREAD_DISPATCH'), True)
+
 # Path to your Google Vision API key JSON file (for local development, this is optional)
 # GOOGLE_APPLICATION_CREDENTIALS = os.path.join(BASE_DIR, 'vision-api-project-432902-3a3b7b7952d3.json')
 
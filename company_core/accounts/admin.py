@@ -7,7 +7,7 @@ from django.template.response import TemplateResponse
 from django.utils.html import format_html
 from .models import (
     Mechanic, WorkOrder, WorkOrderRecord, Customer, ExpenseRecord, IncomeRecord, InvoiceDetail, IncomeRecord2, GroupedInvoice,
-    Profile, PendingInvoice, PaidInvoice, MechExpense, MechExpenseItem, Payment, Category,
+    Profile, PendingInvoice, PaidInvoice, PaymentLinkRequest, InvoiceNumberSequence, MechExpense, MechExpenseItem, Payment, Category,
     Supplier, SupplierCredit, SupplierCreditItem, CustomerCredit, CustomerCreditItem, SupplierCheque, SupplierChequeLine, BusinessBankAccount,
     Product, InventoryTransaction, Driver, GroupedEstimate, EstimateRecord, WorkOrderAssignment, Vehicle, JobHistory,
     VehicleMaintenanceTask, FleetVehicle, MaintenanceRecord, QuickBooksSettings, ActivityLog, Service, CloverConnection,
@@ -596,6 +596,19 @@ class InvoiceDetailAdmin(CustomAdmin):
     # get_queryset handled by CustomAdmin
 
 
+class PaymentLinkRequestAdmin(admin.ModelAdmin):
+    list_display = ('invoice', 'status', 'total_amount', 'attempts', 'next_attempt_at', 'updated_at')
+    list_filter = ('status',)
+    search_fields = ('invoice__invoice_number', 'invoice__user__username')
+    readonly_fields = ('invoice', 'version', 'claimed_at', 'created_at', 'updated_at')
+
+
+class InvoiceNumberSequenceAdmin(admin.ModelAdmin):
+    list_display = ('user', 'next_value', 'updated_at')
+    search_fields = ('user__username',)
+    readonly_fields = ('updated_at',)
+
+
 class PendingInvoiceAdmin(CustomAdmin):
     # Linked via GroupedInvoice
     # list_display includes fields derived from GroupedInvoice
@@ -1053,6 +1066,8 @@ admin.site.register(InvoiceDetail, InvoiceDetailAdmin)
 admin.site.register(IncomeRecord2, IncomeRecord2Admin)
 admin.site.register(GroupedInvoice, GroupedInvoiceAdmin)
 admin.site.register(PendingInvoice, PendingInvoiceAdmin)
+admin.site.register(PaymentLinkRequest, PaymentLinkRequestAdmin)
+admin.site.register(InvoiceNumberSequence, InvoiceNumberSequenceAdmin)
 admin.site.register(PaidInvoice, PaidInvoiceAdmin)
 admin.site.register(MechExpense, MechExpenseAdmin)
 admin.site.register(MechExpenseItem, MechExpenseItemAdmin)
@@ -0,0 +1,274 @@
+"""Daily receivables aging snapshots per customer.
+
+:func:`compute` ages one business's open invoices into per-customer buckets in
+a single grouped query over the stored ``amount_due`` column. An invoice is
+overdue once its due date (invoice date plus the business's payment term)
+has passed, the same rule as ``GroupedInvoice.due_date``; undated invoices
+count as current. Buckets are by days past due:
+
+``current`` (not due yet), ``overdue_1_30``, ``overdue_31_60``,
+``overdue_61_90`` and ``overdue_90_plus``.
+
+The results are stored as :class:`~accounts.models.ReceivablesAgingSnapshot`
+rows, one per customer and day. A row with ``customer=None`` is always
+written. It holds invoices without a customer and marks the day as computed.
+
+* ``ReceivablesAgingCronJob`` (``manage.py snapshot_receivables_aging``)
+  writes every business's snapshot nightly and prunes rows older than
+  ``AGING_SNAPSHOT_RETENTION_DAYS``.
+* Invoice, payment and credit changes re-age the affected customer after
+  commit (:func:`schedule`), but only once today's snapshot exists.
+* Readers call :func:`current_rows` and friends. These build today's snapshot
+  on first use, so the numbers never lag the date.
+
+Earlier days stay in the table, which is what :func:`trend` charts.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, Min, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import commit_hooks
+from .models import TERM_CHOICES, GroupedInvoice, Profile, ReceivablesAgingSnapshot
+
+
+logger = logging.getLogger(__name__)
+
+BUCKET_FIELDS = ("current", "overdue_1_30", "overdue_31_60", "overdue_61_90", "overdue_90_plus")
+OVERDUE_FIELDS = BUCKET_FIELDS[1:]
+AMOUNT_FIELDS = BUCKET_FIELDS + ("total_due", "overdue_total")
+DEFAULT_RETENTION_DAYS = 730
+_ZERO = Decimal("0.00")
+
+
+def _term_days(user_id) -> int:
+    term = Profile.objects.filter(user_id=user_id).values_list("term", flat=True).first()
+    return TERM_CHOICES.get(term, 30)
+
+
+def _sum(condition=None):
+    return Coalesce(
+        Sum("amount_due", filter=condition),
+        Value(_ZERO),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+
+
+def compute(user_id, as_of=None, *, customer_ids=None, term_days=None) -> dict:
+    """
+    Return ``{customer_id: {field: value}}`` for ``user_id``'s open invoices,
+    aged as of ``as_of`` (today by default). ``customer_ids`` limits the
+    customers (``None`` in it selects invoices without a customer).
+    """
+    as_of = as_of or timezone.localdate()
+    term_days = _term_days(user_id) if term_days is None else term_days
+    # Invoices dated before ``due_cutoff`` are past due on ``as_of``.
+    due_cutoff = as_of - timedelta(days=term_days)
+    cutoff_30 = due_cutoff - timedelta(days=30)
+    cutoff_60 = due_cutoff - timedelta(days=60)
+    cutoff_90 = due_cutoff - timedelta(days=90)
+
+    invoices = GroupedInvoice.objects.filter(user_id=user_id, amount_due__gt=_ZERO)
+    if customer_ids is not None:
+        customer_ids = set(customer_ids)
+        scope = Q(customer_id__in=[pk for pk in customer_ids if pk])
+        if None in customer_ids:
+            scope |= Q(customer__isnull=True)
+        invoices = invoices.filter(scope)
+
+    overdue = Q(date__lt=due_cutoff)
+    rows = (
+        invoices.order_by()
+        .values("customer_id")
+        .annotate(
+            current=_sum(Q(date__isnull=True) | Q(date__gte=due_cutoff)),
+            overdue_1_30=_sum(Q(date__lt=due_cutoff, date__gte=cutoff_30)),
+            overdue_31_60=_sum(Q(date__lt=cutoff_30, date__gte=cutoff_60)),
+            overdue_61_90=_sum(Q(date__lt=cutoff_60, date__gte=cutoff_90)),
+            overdue_90_plus=_sum(Q(date__lt=cutoff_90)),
+            total_due=_sum(),
+            invoice_count=Count("pk"),
+            overdue_invoice_count=Count("pk", filter=overdue),
+            oldest_due_invoice_date=Min("date", filter=overdue),
+        )
+    )
+    results = {}
+    for row in rows:
+        customer_id = row.pop("customer_id")
+        row["overdue_total"] = sum((row[field] for field in OVERDUE_FIELDS), _ZERO)
+        results[customer_id] = row
+    return results
+
+
+def refresh(user_id, as_of=None, *, customer_ids=None) -> int:
+    """
+    Write ``user_id``'s snapshot rows for ``as_of`` (today by default), for
+    every customer or only ``customer_ids``. Returns the number of rows
+    written.
+    """
+    as_of = as_of or timezone.localdate()
+    results = compute(user_id, as_of, customer_ids=customer_ids)
+    existing = ReceivablesAgingSnapshot.objects.filter(user_id=user_id, as_of=as_of)
+    if customer_ids is None:
+        # The customer-less row doubles as the "this day is computed" marker.
+        results.setdefault(None, {field: _ZERO for field in AMOUNT_FIELDS})
+    else:
+        customer_ids = set(customer_ids)
+        scope = Q(customer_id__in=[pk for pk in customer_ids if pk])
+        if None in customer_ids:
+            scope |= Q(customer__isnull=True)
+            results.setdefault(None, {field: _ZERO for field in AMOUNT_FIELDS})
+        existing = existing.filter(scope)
+
+    snapshots = [
+        ReceivablesAgingSnapshot(user_id=user_id, customer_id=customer_id, as_of=as_of, **values)
+        for customer_id, values in results.items()
+    ]
+    try:
+        with transaction.atomic():
+            existing.delete()
+            ReceivablesAgingSnapshot.objects.bulk_create(snapshots)
+    except IntegrityError:
+        # Another request wrote the same snapshot first; theirs is as fresh.
+        logger.debug("Aging snapshot for user %s on %s written concurrently", user_id, as_of)
+        return 0
+    return len(snapshots)
+
+
+def ensure_current(user_ids, as_of=None) -> None:
+    """Build today's snapshot for any of ``user_ids`` that does not have one yet."""
+    as_of = as_of or timezone.localdate()
+    user_ids = {user_id for user_id in user_ids if user_id}
+    done = set(
+        ReceivablesAgingSnapshot.objects.filter(user_id__in=user_ids, as_of=as_of, customer__isnull=True)
+        .values_list("user_id", flat=True)
+    )
+    for user_id in sorted(user_ids - done):
+        refresh(user_id, as_of)
+
+
+def current_rows(user_ids, as_of=None):
+    """Today's snapshot rows for ``user_ids``, building them first if needed."""
+    as_of = as_of or timezone.localdate()
+    user_ids = list(user_ids)
+    ensure_current(user_ids, as_of)
+    return ReceivablesAgingSnapshot.objects.filter(user_id__in=user_ids, as_of=as_of)
+
+
+def _bucket_sums(fields=AMOUNT_FIELDS):
+    # Aliased: annotations may not reuse the model's field names.
+    return {
+        f"sum_{field}": Coalesce(Sum(field), Value(_ZERO), output_field=DecimalField(max_digits=14, decimal_places=2))
+        for field in fields
+    }
+
+
+def _unalias(row):
+    return {key[4:] if key.startswith("sum_") else key: value for key, value in row.items()}
+
+
+def customer_totals(user_ids, as_of=None) -> dict:
+    """
+    ``{customer_id: {field: value}}`` for today, summed across ``user_ids``
+    (connected businesses share customers). Customer-less rows are left out.
+    """
+    rows = (
+        current_rows(user_ids, as_of)
+        .filter(customer__isnull=False)
+        .order_by()
+        .values("customer_id")
+        .annotate(
+            **_bucket_sums(),
+            sum_invoice_count=Sum("invoice_count"),
+            sum_overdue_invoice_count=Sum("overdue_invoice_count"),
+        )
+    )
+    return {row.pop("customer_id"): _unalias(row) for row in rows}
+
+
+def business_summary(user_ids, as_of=None) -> dict:
+    """Today's bucket totals across every customer of ``user_ids``."""
+    return _unalias(current_rows(user_ids, as_of).aggregate(**_bucket_sums()))
+
+
+def trend(user_ids, days=90, as_of=None) -> list:
+    """Daily bucket totals for the last ``days`` days that have a snapshot, oldest first."""
+    as_of = as_of or timezone.localdate()
+    rows = (
+        ReceivablesAgingSnapshot.objects.filter(
+            user_id__in=list(user_ids),
+            as_of__gt=as_of - timedelta(days=days),
+            as_of__lte=as_of,
+        )
+        .order_by()
+        .values("as_of")
+        .annotate(**_bucket_sums())
+        .order_by("as_of")
+    )
+    return [_unalias(row) for row in rows]
+
+
+def snapshot_all(as_of=None) -> dict:
+    """Write every business's snapshot for ``as_of`` and prune expired rows."""
+    as_of = as_of or timezone.localdate()
+    user_ids = set(GroupedInvoice.objects.order_by().values_list("user_id", flat=True).distinct())
+    # Businesses whose last balance was just paid still get a (zero) row for the trend.
+    user_ids.update(
+        ReceivablesAgingSnapshot.objects.filter(as_of=as_of - timedelta(days=1))
+        .order_by()
+        .values_list("user_id", flat=True)
+        .distinct()
+    )
+    rows = sum(refresh(user_id, as_of) for user_id in sorted(user_ids))
+    retention = getattr(settings, "AGING_SNAPSHOT_RETENTION_DAYS", DEFAULT_RETENTION_DAYS)
+    pruned, _ = ReceivablesAgingSnapshot.objects.filter(as_of__lt=as_of - timedelta(days=retention)).delete()
+    return {"businesses": len(user_ids), "rows": rows, "pruned": pruned}
+
+
+# ---------- Incremental updates --------------------------------------------
+
+def _refresh_if_current(user_id, customer_ids):
+    today = timezone.localdate()
+    if ReceivablesAgingSnapshot.objects.filter(user_id=user_id, as_of=today, customer__isnull=True).exists():
+        refresh(user_id, today, customer_ids=customer_ids)
+
+
+def schedule(user_id, customer_id) -> None:
+    """Re-age one customer of ``user_id`` after commit, if today's snapshot exists."""
+    if user_id:
+        commit_hooks.on_commit_once(
+            ("receivables_aging", user_id, customer_id),
+            lambda: _refresh_if_current(user_id, {customer_id}),
+        )
+
+
+def schedule_for_invoices(invoice_ids) -> None:
+    """Re-age the customers of ``invoice_ids`` (e.g. after a payment) after commit."""
+    for invoice_id in invoice_ids:
+        if invoice_id:
+            commit_hooks.on_commit_once(
+                ("receivables_aging_invoice", invoice_id),
+                lambda invoice_id=invoice_id: _refresh_invoice_customer(invoice_id),
+            )
+
+
+def _refresh_invoice_customer(invoice_id):
+    row = GroupedInvoice.objects.filter(pk=invoice_id).values_list("user_id", "customer_id").first()
+    if row is not None:
+        _refresh_if_current(row[0], {row[1]})
+
+
+def schedule_business(user_id) -> None:
+    """Re-age every customer of ``user_id`` after commit (e.g. the payment term changed)."""
+    if user_id:
+        commit_hooks.on_commit_once(
+            ("receivables_aging", user_id),
+            lambda: _refresh_if_current(user_id, None),
+        )
@@ -0,0 +1,112 @@
+"""Coalesced ``transaction.on_commit`` callbacks.
+
+Receivers that react to every row save (invoice lines, invoice headers) often
+only need to run their follow-up work once per object after the transaction
+commits. :func:`on_commit_once` keeps a per-connection registry keyed by the
+caller so repeated registrations inside one transaction collapse into a single
+callback; the most recently registered callable for a key wins.
+:class:`BackgroundQueue` is the usual target of those callbacks: it hands the
+committed work to a daemon thread so the request does not wait on it.
+
+The registry is tied to the callback Django holds in ``run_on_commit``. When a
+rollback discards that callback, the next registration starts a fresh batch.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+
+from django.db import DEFAULT_DB_ALIAS, connection as default_connection, transaction
+
+
+logger = logging.getLogger(__name__)
+
+_REGISTRY_ATTR = "_accounts_commit_once_batch"
+
+
+class _CommitBatch:
+    def __init__(self, connection):
+        self.connection = connection
+        self.callbacks = {}
+
+    def add(self, key, func):
+        self.callbacks[key] = func
+
+    def is_pending(self):
+        return any(entry[1] is self for entry in self.connection.run_on_commit)
+
+    def __call__(self):
+        if getattr(self.connection, _REGISTRY_ATTR, None) is self:
+            setattr(self.connection, _REGISTRY_ATTR, None)
+        callbacks, self.callbacks = self.callbacks, {}
+        for key, func in callbacks.items():
+            try:
+                func()
+            except Exception:
+                logger.exception("On-commit callback %r failed", key)
+
+
+def on_commit_once(key, func, using=None):
+    """
+    Run ``func`` after the current transaction commits, at most once per ``key``.
+
+    Outside an atomic block ``func`` runs immediately, like ``on_commit``.
+    """
+    connection = transaction.get_connection(using or DEFAULT_DB_ALIAS)
+    batch = getattr(connection, _REGISTRY_ATTR, None)
+    if batch is not None and connection.in_atomic_block and batch.is_pending():
+        batch.add(key, func)
+        return
+
+    batch = _CommitBatch(connection)
+    batch.add(key, func)
+    setattr(connection, _REGISTRY_ATTR, batch)
+    transaction.on_commit(batch, using=using)
+
+
+def pending_keys(using=None):
+    """Return the keys queued for the current transaction (for tests and debugging)."""
+    connection = transaction.get_connection(using or DEFAULT_DB_ALIAS)
+    batch = getattr(connection, _REGISTRY_ATTR, None)
+    if batch is None or not batch.is_pending():
+        return []
+    return list(batch.callbacks)
+
+
+class BackgroundQueue:
+    """
+    De-duplicating work queue drained by at most one daemon thread.
+
+    ``add`` starts a thread named ``name`` when none is running; it passes each
+    queued item to ``handler`` until the queue is empty, logs handler failures
+    without stopping, and closes its database connection on the way out.
+    """
+
+    def __init__(self, name, handler):
+        self.name = name
+        self.handler = handler
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._thread = None
+
+    def add(self, item):
+        with self._lock:
+            self._pending.add(item)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._drain, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _drain(self):
+        try:
+            while True:
+                with self._lock:
+                    if not self._pending:
+                        self._thread = None
+                        return
+                    item = self._pending.pop()
+                try:
+                    self.handler(item)
+                except Exception:
+                    logger.exception("Background task %s failed for %r", self.name, item)
+        finally:
+            default_connection.close()
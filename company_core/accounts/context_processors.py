@@ -1,19 +1,23 @@
 from decimal import Decimal, ROUND_HALF_UP
 
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
 from django.db.models import Sum
+from django.utils.functional import SimpleLazyObject, cached_property
 
 from django.conf import settings
 from django.templatetags.static import static
 
+from . import tenant_scope
 from .models import Category, Product, ProductBrand, Profile, StorefrontCartItem
 from .utils import (
     get_default_store_owner,
     get_product_user_ids,
-    get_storefront_owner,
     get_storefront_profiles,
     resolve_storefront_root_user,
     resolve_storefront_category_flags,
+    select_storefront_owner,
 )
 
 _FONT_FAMILY_STACKS = {
@@ -275,33 +279,30 @@ def branding_defaults(request):
 def cart_summary(request):
     """Expose cart item count for storefront navigation."""
 
-    customer_account = None
-    user = getattr(request, "user", None)
-    if user and getattr(user, "is_authenticated", False):
-        try:
-            customer_account = user.customer_portal
-        except ObjectDoesNotExist:
-            customer_account = None
+    def _count_cart_items():
+        customer_account = None
+        user = getattr(request, "user", None)
+        if user and getattr(user, "is_authenticated", False):
+            try:
+                customer_account = user.customer_portal
+            except ObjectDoesNotExist:
+                customer_account = None
 
-    if not customer_account:
-        return {
-            "cart_item_count": 0,
-        }
+        if not customer_account:
+            return 0
 
-    store_owner = get_storefront_owner(request)
-    if not store_owner:
-        return {
-            "cart_item_count": 0,
-        }
+        store_owner = _get_storefront_state(request).selected_owner
+        if not store_owner:
+            return 0
 
-    item_count = StorefrontCartItem.objects.filter(
-        customer=customer_account,
-        store_owner=store_owner,
-    ).aggregate(total=Sum("quantity"))["total"]
-    item_count = int(item_count or 0)
+        item_count = StorefrontCartItem.objects.filter(
+            customer=customer_account,
+            store_owner=store_owner,
+        ).aggregate(total=Sum("quantity"))["total"]
+        return max(int(item_count or 0), 0)
 
     return {
-        "cart_item_count": max(item_count, 0),
+        "cart_item_count": SimpleLazyObject(_count_cart_items),
     }
 
 
@@ -321,115 +322,187 @@ def customer_portal_context(request):
     }
 
 
-def storefront_location_context(request):
-    """Expose storefront location options and the current selection."""
+class _StorefrontRequestState:
+    """Storefront owner and location data resolved at most once per request."""
+
+    def __init__(self, request):
+        self.request = request
+        self.nav = None
+
+    @cached_property
+    def root_user(self):
+        return resolve_storefront_root_user(self.request)
+
+    @cached_property
+    def profiles(self):
+        return list(get_storefront_profiles(self.root_user)) if self.root_user else []
+
+    @cached_property
+    def selected_owner(self):
+        return select_storefront_owner(self.request, self.root_user, self.profiles)
+
+    @cached_property
+    def selected_profile(self):
+        selected_owner = self.selected_owner
+        if self.profiles and selected_owner:
+            for profile in self.profiles:
+                if profile.user_id == selected_owner.id:
+                    return profile
+        return self.profiles[0] if self.profiles else None
+
+    @cached_property
+    def default_owner(self):
+        return get_default_store_owner()
+
 
-    root_user = resolve_storefront_root_user(request)
-    profiles = list(get_storefront_profiles(root_user)) if root_user else []
-    selected_owner = get_storefront_owner(request, fallback_owner=root_user)
-    selected_profile = None
+def _get_storefront_state(request):
+    state = getattr(request, "_storefront_state", None)
+    if state is None:
+        state = _StorefrontRequestState(request)
+        request._storefront_state = state
+    return state
 
-    if profiles and selected_owner:
-        for profile in profiles:
-            if profile.user_id == selected_owner.id:
-                selected_profile = profile
-                break
 
-    if not selected_profile and profiles:
-        selected_profile = profiles[0]
+def storefront_location_context(request):
+    """Expose storefront location options and the current selection.
+
+    Values are lazy so back-office pages that never render the storefront
+    navigation do not pay for the lookups.
+    """
 
+    state = _get_storefront_state(request)
     return {
-        "storefront_locations": profiles,
-        "storefront_selected_profile": selected_profile,
-        "storefront_selected_owner": selected_owner,
-        "storefront_has_multiple_locations": len(profiles) > 1,
+        "storefront_locations": SimpleLazyObject(lambda: state.profiles),
+        "storefront_selected_profile": SimpleLazyObject(lambda: state.selected_profile),
+        "storefront_selected_owner": SimpleLazyObject(lambda: state.selected_owner),
+        "storefront_has_multiple_locations": SimpleLazyObject(lambda: len(state.profiles) > 1),
     }
 
 
-def storefront_nav_context(request):
-    """Expose storefront category/brand navigation data for public menus."""
+STOREFRONT_NAV_GENERATION_KEY = "accounts:storefront_nav:generation"
+STOREFRONT_NAV_CACHE_TIMEOUT = 60 * 15
 
-    default_owner = get_default_store_owner()
-    store_owner = get_storefront_owner(request) or default_owner
-    if not store_owner:
-        return {
-            "nav_categories": [],
-            "nav_brand_logos": [],
-        }
-
-    def build_categories(owner):
-        if not owner:
-            return []
-        product_user_ids = get_product_user_ids(owner)
-        category_flags = resolve_storefront_category_flags(request, owner)
-        show_empty_categories = category_flags["show_empty_categories"]
-        available_products = None
-
-        categories_qs = Category.objects.filter(is_active=True, parent__isnull=True)
-        if show_empty_categories:
-            if product_user_ids:
-                categories_qs = categories_qs.filter(user__in=product_user_ids)
-            else:
-                categories_qs = categories_qs.filter(user=owner)
+
+def invalidate_storefront_nav_cache():
+    """Discard cached storefront navigation for every store owner."""
+
+    tenant_scope.rotate_generation(STOREFRONT_NAV_GENERATION_KEY)
+    transaction.on_commit(
+        lambda: tenant_scope.rotate_generation(STOREFRONT_NAV_GENERATION_KEY)
+    )
+
+
+def _build_nav_categories(owner, product_user_ids, show_empty_categories):
+    available_products = None
+
+    categories_qs = Category.objects.filter(is_active=True, parent__isnull=True)
+    if show_empty_categories:
+        if product_user_ids:
+            categories_qs = categories_qs.filter(user__in=product_user_ids)
         else:
+            categories_qs = categories_qs.filter(user=owner)
+    else:
+        available_products = Product.objects.filter(is_published_to_store=True)
+        if product_user_ids:
+            available_products = available_products.filter(user__in=product_user_ids)
+        else:
+            available_products = available_products.filter(user=owner)
+        categories_qs = categories_qs.filter(products__in=available_products)
+
+    categories = list(
+        categories_qs.select_related("group", "parent")
+        .distinct()
+        .order_by("sort_order", "name")
+    )
+    if categories:
+        return categories
+
+    fallback_qs = Category.objects.filter(is_active=True)
+    if show_empty_categories:
+        if product_user_ids:
+            fallback_qs = fallback_qs.filter(user__in=product_user_ids)
+        else:
+            fallback_qs = fallback_qs.filter(user=owner)
+    else:
+        if available_products is None:
             available_products = Product.objects.filter(is_published_to_store=True)
             if product_user_ids:
                 available_products = available_products.filter(user__in=product_user_ids)
             else:
                 available_products = available_products.filter(user=owner)
-            categories_qs = categories_qs.filter(products__in=available_products)
+        fallback_qs = fallback_qs.filter(products__in=available_products)
 
-        categories = list(
-            categories_qs.select_related("group", "parent")
-            .distinct()
-            .order_by("sort_order", "name")
-        )
-        if categories:
-            return categories
+    return list(
+        fallback_qs.select_related("group", "parent")
+        .distinct()
+        .order_by("sort_order", "name")
+    )
 
-        fallback_qs = Category.objects.filter(is_active=True)
-        if show_empty_categories:
-            if product_user_ids:
-                fallback_qs = fallback_qs.filter(user__in=product_user_ids)
-            else:
-                fallback_qs = fallback_qs.filter(user=owner)
-        else:
-            if available_products is None:
-                available_products = Product.objects.filter(is_published_to_store=True)
-                if product_user_ids:
-                    available_products = available_products.filter(user__in=product_user_ids)
-                else:
-                    available_products = available_products.filter(user=owner)
-            fallback_qs = fallback_qs.filter(products__in=available_products)
-
-        return list(
-            fallback_qs.select_related("group", "parent")
-            .distinct()
-            .order_by("sort_order", "name")
-        )
 
-    def build_brand_logos(owner):
-        if not owner:
-            return []
-        product_user_ids = get_product_user_ids(owner)
-        brand_qs = ProductBrand.objects.filter(is_active=True)
-        if product_user_ids:
-            brand_qs = brand_qs.filter(user__in=product_user_ids)
-        else:
-            brand_qs = brand_qs.filter(user=owner)
-        return list(brand_qs.order_by("sort_order", "name"))
+def _build_nav_brand_logos(owner, product_user_ids):
+    brand_qs = ProductBrand.objects.filter(is_active=True)
+    if product_user_ids:
+        brand_qs = brand_qs.filter(user__in=product_user_ids)
+    else:
+        brand_qs = brand_qs.filter(user=owner)
+    return list(brand_qs.order_by("sort_order", "name"))
+
+
+def get_storefront_nav(owner):
+    """Return ``(categories, brand_logos)`` for a store owner, cached per owner.
+
+    The cache is versioned by the storefront nav generation (rotated when
+    categories, brands or published products change) and by the tenant scope
+    generation so shared product lists follow connected-group changes.
+    """
+
+    if not owner:
+        return [], []
+
+    show_empty_categories = resolve_storefront_category_flags(None, owner)["show_empty_categories"]
+    cache_key = "accounts:storefront_nav:{}:{}:{}:{}".format(
+        tenant_scope.get_generation(STOREFRONT_NAV_GENERATION_KEY),
+        tenant_scope.get_generation(),
+        owner.pk,
+        int(show_empty_categories),
+    )
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    product_user_ids = get_product_user_ids(owner)
+    nav = (
+        _build_nav_categories(owner, product_user_ids, show_empty_categories),
+        _build_nav_brand_logos(owner, product_user_ids),
+    )
+    cache.set(cache_key, nav, STOREFRONT_NAV_CACHE_TIMEOUT)
+    return nav
+
+
+def storefront_nav_context(request):
+    """Expose storefront category/brand navigation data for public menus."""
+
+    state = _get_storefront_state(request)
+
+    def _resolve_nav():
+        if state.nav is not None:
+            return state.nav
+
+        default_owner = state.default_owner
+        store_owner = state.selected_owner or default_owner
+        categories, brand_logos = get_storefront_nav(store_owner)
 
-    categories = build_categories(store_owner)
-    brand_logos = build_brand_logos(store_owner)
+        fallback_owner = default_owner
+        if store_owner and fallback_owner and fallback_owner != store_owner:
+            if not categories or not brand_logos:
+                fallback_categories, fallback_brand_logos = get_storefront_nav(fallback_owner)
+                categories = categories or fallback_categories
+                brand_logos = brand_logos or fallback_brand_logos
 
-    fallback_owner = default_owner
-    if fallback_owner and fallback_owner != store_owner:
-        if not categories:
-            categories = build_categories(fallback_owner)
-        if not brand_logos:
-            brand_logos = build_brand_logos(fallback_owner)
+        state.nav = (categories, brand_logos)
+        return state.nav
 
     return {
-        "nav_categories": categories,
-        "nav_brand_logos": brand_logos,
+        "nav_categories": SimpleLazyObject(lambda: _resolve_nav()[0]),
+        "nav_brand_logos": SimpleLazyObject(lambda: _resolve_nav()[1]),
     }
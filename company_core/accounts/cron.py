@@ -1,5 +1,6 @@
 from django_cron import CronJobBase, Schedule
 from django.utils import timezone
+from . import aging, supplier_scorecards
 from .models import MechExpense, MechExpenseItem
 from .utils import calculate_next_occurrence  # Assume calculate_next_occurrence is moved to utils.py
 import logging
@@ -47,3 +48,31 @@ class ProcessRecurringExpensesCronJob(CronJobBase):
 
             except Exception as e:
                 logger.error(f"Error processing expense {expense.pk}: {e}")
+
+
+class ReceivablesAgingCronJob(CronJobBase):
+    RUN_EVERY_MINS = 60 * 24  # Every 24 hours
+
+    schedule = Schedule(run_every_mins=RUN_EVERY_MINS)
+    code = 'accounts.receivables_aging_cron_job'  # Unique code
+
+    def do(self):
+        result = aging.snapshot_all()
+        logger.info(
+            "Wrote %s receivables aging row(s) for %s business(es); pruned %s.",
+            result["rows"], result["businesses"], result["pruned"],
+        )
+
+
+class SupplierScorecardCronJob(CronJobBase):
+    RUN_EVERY_MINS = 60 * 24  # Every 24 hours
+
+    schedule = Schedule(run_every_mins=RUN_EVERY_MINS)
+    code = 'accounts.supplier_scorecard_cron_job'  # Unique code
+
+    def do(self):
+        result = supplier_scorecards.snapshot_all()
+        logger.info(
+            "Wrote %s supplier scorecard row(s) for %s business(es); pruned %s.",
+            result["rows"], result["businesses"], result["pruned"],
+        )
@@ -4,14 +4,13 @@ import os
 from decimal import Decimal
 
 from django.conf import settings
-from django.db.models import Sum
-from django.db.models.functions import Coalesce
 from django.http import JsonResponse
 from django.middleware.csrf import get_token
 from django.utils import timezone
 from django.views.decorators.http import require_POST
 from openai import OpenAI
 
+from . import receivables_journal
 from .decorators import customer_login_required
 from .models import Payment, VehicleMaintenanceTask, WorkOrder
 
@@ -99,15 +98,7 @@ def _summarize_customer_context(customer_account):
         .prefetch_related("payments")
         .order_by("-date", "-id")
     )
-    invoice_totals = invoices_qs.aggregate(
-        total_invoiced=Coalesce(Sum("total_amount"), Decimal("0.00"))
-    )
-    payment_totals = Payment.objects.filter(invoice__customer=customer_account).aggregate(
-        total_paid=Coalesce(Sum("amount"), Decimal("0.00"))
-    )
-    outstanding_balance = (invoice_totals.get("total_invoiced") or Decimal("0.00")) - (
-        payment_totals.get("total_paid") or Decimal("0.00")
-    )
+    outstanding_balance = receivables_journal.balance(customer_account.pk)
 
     overdue_count = 0
     overdue_total = Decimal("0.00")
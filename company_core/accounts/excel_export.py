@@ -0,0 +1,188 @@
+"""Stream Excel template exports with a write-only workbook.
+
+The template downloads used to build a full in-memory openpyxl workbook, then
+walk every cell again to style it and size the columns, so memory grew with the
+catalog. :func:`write_template` writes rows with ``Workbook(write_only=True)``
+as they come from ``queryset.iterator()`` and styles each cell on the way out
+(the look of :func:`accounts.excel_formatting.apply_template_styling`). Column
+widths come from the caller or the header, and the data-validation dropdowns
+read from a hidden "Options" sheet as before. :func:`template_response` writes
+to a temporary file and streams it back with ``FileResponse``.
+
+``manage.py benchmark_template_export`` measures time and peak memory for a
+synthetic catalog.
+"""
+from __future__ import annotations
+
+import tempfile
+from copy import copy
+from itertools import zip_longest
+from typing import Iterable, Mapping, Optional, Sequence, Union
+
+from django.http import FileResponse
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.datavalidation import DataValidation
+from openpyxl.worksheet.dimensions import SheetFormatProperties
+
+from .excel_formatting import (
+    ALT_ROW_FILL,
+    BORDER,
+    DATA_ALIGNMENT,
+    HEADER_ALIGNMENT,
+    HEADER_FILL,
+    HEADER_FONT,
+    INSTRUCTION_ALIGNMENT,
+    INSTRUCTION_FILL,
+    INSTRUCTION_FONT,
+)
+
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+ITERATOR_CHUNK_SIZE = 2000
+
+_DATA_ROW_HEIGHT = 22
+_HEADER_ROW_HEIGHT = 26
+_INSTRUCTION_ROW_HEIGHT = 48
+_MAX_COLUMN_WIDTH = 60
+_LAST_ROW = 1048576
+
+
+def batched(queryset, size=ITERATOR_CHUNK_SIZE):
+    """Yield lists of up to ``size`` rows from ``queryset.iterator()``."""
+    batch = []
+    for row in queryset.iterator(chunk_size=size):
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def unique_names(values) -> list:
+    """Non-blank ``values`` stripped, in order, without duplicates (dropdown options)."""
+    return list(dict.fromkeys(value.strip() for value in values if value and value.strip()))
+
+
+def _styled(worksheet, *, fill=None, font=None, alignment, border=BORDER):
+    cell = WriteOnlyCell(worksheet)
+    if fill is not None:
+        cell.fill = fill
+    if font is not None:
+        cell.font = font
+    cell.alignment = alignment
+    cell.border = border
+    return cell
+
+
+def _cells(worksheet, values, template):
+    cells = []
+    for value in values:
+        cell = WriteOnlyCell(worksheet, value)
+        # Copying the style ids is much cheaper than assigning each style.
+        cell._style = copy(template._style)
+        cells.append(cell)
+    return cells
+
+
+def _line_count(values):
+    lines = 1
+    for value in values:
+        if isinstance(value, str) and ("\n" in value or "\r" in value):
+            normalized = value.replace("\r\n", "\n").replace("\r", "\n")
+            lines = max(lines, len(normalized.split("\n")))
+    return lines
+
+
+def write_template(
+    output,
+    *,
+    title: str,
+    headers: Sequence[str],
+    rows: Iterable[Sequence],
+    instruction: Optional[str] = None,
+    column_widths: Optional[Mapping[Union[str, int], float]] = None,
+    dropdowns: Iterable[tuple] = (),
+    minimum_width: float = 12.0,
+) -> int:
+    """
+    Write a styled template workbook to ``output`` (a path or binary file).
+
+    ``rows`` is consumed once, one row at a time. ``dropdowns`` holds
+    ``(option_header, values, target_headers)``: the values go in a column of
+    the hidden "Options" sheet and every target column gets a list validation.
+    Columns missing from ``column_widths`` are sized from their header.
+    Returns the number of data rows written.
+    """
+    headers = list(headers)
+    column_widths = column_widths or {}
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(title=title)
+
+    for index, header in enumerate(headers, start=1):
+        width = column_widths.get(header)
+        if width is None:
+            width = column_widths.get(index)
+        if width is None:
+            width = max(minimum_width, min(len(str(header)) + 4, _MAX_COLUMN_WIDTH))
+        worksheet.column_dimensions[get_column_letter(index)].width = float(width)
+    # Every data row is this tall unless it has line breaks.
+    worksheet.sheet_format = SheetFormatProperties(defaultRowHeight=_DATA_ROW_HEIGHT, customHeight=True)
+
+    header_row_index = 2 if instruction else 1
+    # Views, widths and the sheet format are written with the first row.
+    worksheet.freeze_panes = f"A{header_row_index + 1}"
+    if instruction:
+        worksheet.merged_cells.add(f"A1:{get_column_letter(len(headers))}1")
+        worksheet.row_dimensions[1].height = _INSTRUCTION_ROW_HEIGHT
+        instruction_style = _styled(
+            worksheet, fill=INSTRUCTION_FILL, font=INSTRUCTION_FONT, alignment=INSTRUCTION_ALIGNMENT
+        )
+        worksheet.append(_cells(worksheet, [instruction] + [""] * (len(headers) - 1), instruction_style))
+    worksheet.row_dimensions[header_row_index].height = _HEADER_ROW_HEIGHT
+    header_style = _styled(worksheet, fill=HEADER_FILL, font=HEADER_FONT, alignment=HEADER_ALIGNMENT)
+    worksheet.append(_cells(worksheet, headers, header_style))
+
+    data_style = _styled(worksheet, alignment=DATA_ALIGNMENT)
+    alt_style = _styled(worksheet, fill=ALT_ROW_FILL, alignment=DATA_ALIGNMENT)
+    row_index = header_row_index
+    for values in rows:
+        row_index += 1
+        lines = _line_count(values)
+        if lines > 1:
+            worksheet.row_dimensions[row_index].height = _DATA_ROW_HEIGHT * lines
+        use_alt_fill = (row_index - header_row_index) % 2 == 1
+        worksheet.append(_cells(worksheet, values, alt_style if use_alt_fill else data_style))
+
+    dropdowns = list(dropdowns)
+    if dropdowns:
+        options_sheet = workbook.create_sheet(title="Options")
+        options_sheet.sheet_state = "hidden"
+        options_sheet.append([option_header for option_header, _, _ in dropdowns])
+        for option_row in zip_longest(*[values for _, values, _ in dropdowns]):
+            options_sheet.append(list(option_row))
+        for column_index, (_, values, target_headers) in enumerate(dropdowns, start=1):
+            column_letter = get_column_letter(column_index)
+            formula = f"=Options!${column_letter}$2:${column_letter}${max(2, len(values) + 1)}"
+            for target_header in target_headers:
+                target_letter = get_column_letter(headers.index(target_header) + 1)
+                validation = DataValidation(type="list", formula1=formula, allow_blank=True)
+                validation.add(f"{target_letter}2:{target_letter}{_LAST_ROW}")
+                worksheet.data_validations.append(validation)
+
+    workbook.save(output)
+    return row_index - header_row_index
+
+
+def template_response(filename: str, **kwargs) -> FileResponse:
+    """Stream a :func:`write_template` workbook as the download ``filename``."""
+    output = tempfile.TemporaryFile()
+    try:
+        write_template(output, **kwargs)
+        output.seek(0)
+    except Exception:
+        output.close()
+        raise
+    return FileResponse(output, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
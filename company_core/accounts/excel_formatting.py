@@ -9,15 +9,16 @@ from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
 from openpyxl.utils import get_column_letter
 from openpyxl.worksheet.worksheet import Worksheet
 
-_HEADER_FILL = PatternFill(start_color="1F4E78", end_color="1F4E78", fill_type="solid")
-_HEADER_FONT = Font(color="FFFFFF", bold=True)
-_HEADER_ALIGNMENT = Alignment(horizontal="center", vertical="center", wrap_text=True)
-_INSTRUCTION_FILL = PatternFill(start_color="FFF4CE", end_color="FFF4CE", fill_type="solid")
-_INSTRUCTION_FONT = Font(color="3F3F3F", bold=False)
-_INSTRUCTION_ALIGNMENT = Alignment(horizontal="left", vertical="center", wrap_text=True)
-_ALT_ROW_FILL = PatternFill(start_color="F3F6FC", end_color="F3F6FC", fill_type="solid")
-_DATA_ALIGNMENT = Alignment(horizontal="left", vertical="top", wrap_text=True)
-_BORDER = Border(
+# Shared with the write-only exports in excel_export.
+HEADER_FILL = PatternFill(start_color="1F4E78", end_color="1F4E78", fill_type="solid")
+HEADER_FONT = Font(color="FFFFFF", bold=True)
+HEADER_ALIGNMENT = Alignment(horizontal="center", vertical="center", wrap_text=True)
+INSTRUCTION_FILL = PatternFill(start_color="FFF4CE", end_color="FFF4CE", fill_type="solid")
+INSTRUCTION_FONT = Font(color="3F3F3F", bold=False)
+INSTRUCTION_ALIGNMENT = Alignment(horizontal="left", vertical="center", wrap_text=True)
+ALT_ROW_FILL = PatternFill(start_color="F3F6FC", end_color="F3F6FC", fill_type="solid")
+DATA_ALIGNMENT = Alignment(horizontal="left", vertical="top", wrap_text=True)
+BORDER = Border(
     left=Side(style="thin", color="D9D9D9"),
     right=Side(style="thin", color="D9D9D9"),
     top=Side(style="thin", color="D9D9D9"),
@@ -59,10 +60,10 @@ def _style_instruction_row(worksheet: Worksheet, row_index: int) -> None:
     for cell in cells:
         if isinstance(cell, MergedCell):
             continue
-        cell.fill = _INSTRUCTION_FILL
-        cell.font = _INSTRUCTION_FONT
-        cell.alignment = _INSTRUCTION_ALIGNMENT
-        cell.border = _BORDER
+        cell.fill = INSTRUCTION_FILL
+        cell.font = INSTRUCTION_FONT
+        cell.alignment = INSTRUCTION_ALIGNMENT
+        cell.border = BORDER
 
 
 def _style_header_row(worksheet: Worksheet, row_index: int) -> None:
@@ -71,10 +72,10 @@ def _style_header_row(worksheet: Worksheet, row_index: int) -> None:
     for cell in cells:
         if isinstance(cell, MergedCell):
             continue
-        cell.fill = _HEADER_FILL
-        cell.font = _HEADER_FONT
-        cell.alignment = _HEADER_ALIGNMENT
-        cell.border = _BORDER
+        cell.fill = HEADER_FILL
+        cell.font = HEADER_FONT
+        cell.alignment = HEADER_ALIGNMENT
+        cell.border = BORDER
 
 
 def _style_data_rows(worksheet: Worksheet, header_row_index: int) -> None:
@@ -94,10 +95,10 @@ def _style_data_rows(worksheet: Worksheet, header_row_index: int) -> None:
                 line_count = max(1, len(normalized_text.split("\n")))
                 if line_count > max_line_count:
                     max_line_count = line_count
-            cell.alignment = _DATA_ALIGNMENT
-            cell.border = _BORDER
+            cell.alignment = DATA_ALIGNMENT
+            cell.border = BORDER
             if use_alt_fill:
-                cell.fill = _ALT_ROW_FILL
+                cell.fill = ALT_ROW_FILL
         base_height = 22
         worksheet.row_dimensions[row_index].height = base_height * max_line_count
 
@@ -5,6 +5,7 @@ from typing import Optional
 
 from django.conf import settings
 from django.core import signing
+from django.db.models import Q
 from django.http import HttpRequest
 from django.urls import reverse
 
@@ -15,6 +16,13 @@ logger = logging.getLogger(__name__)
 EMAIL_OPEN_SALT = "invoice-email-open"
 EMAIL_OPEN_MAX_AGE_SECONDS = 365 * 24 * 60 * 60
 
+# Invoice columns holding the latest timestamp for each event type.
+ACTIVITY_TIMESTAMP_FIELDS = {
+    InvoiceActivity.EVENT_EMAIL_SENT: "last_email_sent_at",
+    InvoiceActivity.EVENT_EMAIL_OPENED: "last_email_opened_at",
+    InvoiceActivity.EVENT_VIEWED: "last_portal_viewed_at",
+}
+
 
 def log_invoice_activity(
     invoice: GroupedInvoice,
@@ -34,15 +42,29 @@ def log_invoice_activity(
         actor_user = None
 
     try:
-        InvoiceActivity.objects.create(
+        activity = InvoiceActivity.objects.create(
             invoice=invoice,
             event_type=event_type,
             actor=actor_user,
         )
+        _touch_activity_timestamp(invoice, event_type, activity.created_at)
     except Exception:
         logger.exception("Failed to log invoice activity for invoice %s", invoice.pk)
 
 
+def _touch_activity_timestamp(invoice: GroupedInvoice, event_type: str, timestamp) -> None:
+    field = ACTIVITY_TIMESTAMP_FIELDS.get(event_type)
+    if field is None:
+        return
+    # Only move forward, so a late write never hides a newer event.
+    GroupedInvoice.objects.filter(pk=invoice.pk).filter(
+        Q(**{f"{field}__isnull": True}) | Q(**{f"{field}__lt": timestamp})
+    ).update(**{field: timestamp})
+    current = getattr(invoice, field, None)
+    if current is None or current < timestamp:
+        setattr(invoice, field, timestamp)
+
+
 def build_email_open_tracking_url(
     invoice: GroupedInvoice,
     *,
@@ -0,0 +1,204 @@
+"""Turn estimates and completed work orders into invoices.
+
+Creating each line with ``IncomeRecord2.objects.create`` re-runs fee sync,
+inventory postings, the invoice total (and so an invoice re-save) and the line
+signals once per line. Both conversions here build the lines unsaved and hand
+them to ``GroupedInvoice.save_lines``, which writes them with ``bulk_create``,
+posts inventory once per product and recalculates the total once. That save
+queues the payment link through :mod:`accounts.payment_links`.
+
+Converting many work orders at once goes through an
+:class:`~accounts.models.InvoiceConversionJob`. :func:`enqueue_work_orders`
+records it, and it is processed after commit by a background thread (disable
+with ``INVOICE_CONVERSION_THREAD_DISPATCH = False``) or by ``manage.py
+process_invoice_conversions``. A job whose worker died is left processing;
+once ``INVOICE_CONVERSION_CLAIM_TIMEOUT_SECONDS`` have passed since it was
+started, the next :func:`process_pending` claims it again.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import commit_hooks
+from .models import (
+    GroupedInvoice,
+    IncomeRecord2,
+    InvoiceConversionJob,
+    PendingInvoice,
+    WorkOrder,
+    ensure_decimal,
+)
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CLAIM_TIMEOUT_SECONDS = 600
+
+
+def invoice_from_estimate(estimate) -> GroupedInvoice:
+    """Create an invoice carrying ``estimate``'s header and records."""
+    with transaction.atomic():
+        invoice = GroupedInvoice.objects.create(
+            user=estimate.user,
+            customer=estimate.customer,
+            date=estimate.date,
+            date_from=estimate.date_from,
+            date_to=estimate.date_to,
+            bill_to=estimate.bill_to,
+            bill_to_address=estimate.bill_to_address,
+            bill_to_email=estimate.bill_to_email,
+            vin_no=estimate.vin_no,
+            mileage=estimate.mileage,
+            unit_no=estimate.unit_no,
+            make_model=estimate.make_model,
+        )
+        invoice.save_lines([
+            IncomeRecord2(
+                grouped_invoice=invoice,
+                product_id=record.product_id,
+                job=record.job,
+                qty=ensure_decimal(record.qty),
+                rate=ensure_decimal(record.rate),
+                date=record.date,
+                ticket=record.ticket,
+                jobsite=record.jobsite,
+                truck=record.truck,
+                driver_id=record.driver_id,
+            )
+            for record in estimate.estimate_records.order_by("pk")
+        ])
+        return invoice
+
+
+def invoice_from_work_order(work_order) -> GroupedInvoice:
+    """Create the pending invoice for ``work_order``; the caller links it."""
+    customer = work_order.customer
+    today = timezone.now().date()
+    with transaction.atomic():
+        invoice = GroupedInvoice.objects.create(
+            user=work_order.user,
+            customer=customer,
+            date=today,
+            vin_no=work_order.vehicle_vin,
+            mileage=work_order.mileage,
+            unit_no=work_order.unit_no,
+            make_model=work_order.make_model,
+            bill_to=customer.name if customer else work_order.bill_to or 'N/A',
+            bill_to_address=customer.address if customer else work_order.bill_to_address or '',
+            bill_to_email=customer.email if customer else work_order.bill_to_email or '',
+        )
+        invoice.save_lines([
+            IncomeRecord2(
+                grouped_invoice=invoice,
+                product_id=record.product_id,
+                job=record.job,
+                qty=record.qty,
+                rate=record.rate,
+                date=record.date or today,
+            )
+            for record in work_order.records.order_by("pk")
+        ])
+        PendingInvoice.objects.get_or_create(grouped_invoice=invoice)
+        return invoice
+
+
+# ---------- Bulk work order conversion --------------------------------------
+
+def convertible_work_orders(user):
+    """``user``'s completed work orders that have no invoice yet."""
+    return WorkOrder.objects.filter(user=user, status="completed", invoice__isnull=True)
+
+
+def enqueue_work_orders(user, work_order_ids):
+    """
+    Record a job converting the convertible ones among ``work_order_ids``.
+    Returns the job, or None when none of them can be converted.
+    """
+    ids = sorted(convertible_work_orders(user).filter(pk__in=work_order_ids).values_list("pk", flat=True))
+    if not ids:
+        return None
+    job = InvoiceConversionJob.objects.create(user=user, work_order_ids=ids)
+    if getattr(settings, "INVOICE_CONVERSION_THREAD_DISPATCH", True):
+        job_id = job.pk
+        transaction.on_commit(lambda: _schedule(job_id))
+    return job
+
+
+def _convert(work_order_id, user):
+    with transaction.atomic():
+        work_order = (
+            WorkOrder.objects.select_for_update()
+            .select_related("customer")
+            .filter(pk=work_order_id, user=user)
+            .first()
+        )
+        if work_order is None:
+            raise ValueError("Work order no longer exists.")
+        if work_order.invoice_id:
+            raise ValueError("Work order is already invoiced.")
+        if work_order.status != "completed":
+            raise ValueError("Work order is no longer completed.")
+        invoice = invoice_from_work_order(work_order)
+        WorkOrder.objects.filter(pk=work_order.pk).update(invoice=invoice)
+        return invoice
+
+
+def _claimable(now):
+    stale = now - timedelta(
+        seconds=getattr(settings, "INVOICE_CONVERSION_CLAIM_TIMEOUT_SECONDS", DEFAULT_CLAIM_TIMEOUT_SECONDS)
+    )
+    return Q(status=InvoiceConversionJob.STATUS_PENDING) | Q(
+        status=InvoiceConversionJob.STATUS_PROCESSING, started_at__lt=stale
+    )
+
+
+def process_job(job_id):
+    """Run one pending (or abandoned) job now; returns it, or None if it was not claimable."""
+    now = timezone.now()
+    claimed = InvoiceConversionJob.objects.filter(_claimable(now), pk=job_id).update(
+        status=InvoiceConversionJob.STATUS_PROCESSING, started_at=now
+    )
+    if not claimed:
+        return None
+
+    job = InvoiceConversionJob.objects.select_related("user").get(pk=job_id)
+    invoice_ids, errors = [], {}
+    for work_order_id in job.work_order_ids:
+        # One savepoint per work order, so one failure does not undo the batch.
+        try:
+            invoice_ids.append(_convert(work_order_id, job.user).pk)
+        except ValueError as exc:
+            errors[str(work_order_id)] = str(exc)
+        except Exception as exc:
+            logger.exception("Failed to invoice WorkOrder #%s in conversion job %s", work_order_id, job.pk)
+            errors[str(work_order_id)] = str(exc)
+
+    job.invoice_ids = invoice_ids
+    job.errors = errors
+    job.status = InvoiceConversionJob.STATUS_DONE
+    job.finished_at = timezone.now()
+    job.save(update_fields=["invoice_ids", "errors", "status", "finished_at"])
+    return job
+
+
+def process_pending(*, limit=20) -> int:
+    """Run up to ``limit`` pending or abandoned jobs, oldest first; returns how many ran."""
+    job_ids = list(
+        InvoiceConversionJob.objects.filter(_claimable(timezone.now()))
+        .order_by("created_at", "pk")
+        .values_list("pk", flat=True)[:limit]
+    )
+    return sum(1 for job_id in job_ids if process_job(job_id) is not None)
+
+
+_dispatch_queue = commit_hooks.BackgroundQueue("invoice-conversion", lambda job_id: process_job(job_id))
+
+
+def _schedule(job_id):
+    _dispatch_queue.add(job_id)
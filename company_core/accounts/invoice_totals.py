@@ -0,0 +1,112 @@
+"""Set-based recompute of ``GroupedInvoice.total_amount``.
+
+``GroupedInvoice.recalculate_total_amount`` aggregates one invoice's lines and
+saves it, which runs every ``save`` side effect (payment links, signals). For
+repairs across many invoices, :func:`rebuild` instead sums ``IncomeRecord2``
+lines with one grouped query per chunk and writes the changed totals with
+``bulk_update``. The receivables columns (``amount_due``, ``payment_state``)
+are derived in the same write, and changed invoices are flagged for
+QuickBooks as ``save`` would flag them. The receivables journal, the aging
+snapshots and the cached invoice list counts are then refreshed for the
+changed invoices only.
+
+``manage.py recalculate_totals`` wraps this; ``--dry-run`` reports the drift
+from :func:`iter_drift` without writing.
+"""
+from __future__ import annotations
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from . import aging, pagination, receivables_journal
+from .models import GroupedInvoice, IncomeRecord2, ensure_decimal
+
+
+TOTAL_FIELDS = ("total_amount", "amount_due", "payment_state", "quickbooks_needs_sync", "updated_at")
+_CENT = Decimal("0.01")
+
+
+def compute_totals(invoice_ids) -> dict:
+    """Return ``{invoice_id: total_amount}`` summed from the invoices' lines (0 without lines)."""
+    invoice_ids = list(invoice_ids)
+    totals = {invoice_id: Decimal("0.00") for invoice_id in invoice_ids}
+    rows = (
+        IncomeRecord2.objects.filter(grouped_invoice_id__in=invoice_ids)
+        .order_by()
+        .values("grouped_invoice_id")
+        .annotate(amount=Sum("amount"), tax=Sum("tax_collected"))
+    )
+    for row in rows:
+        # Same rounding as recalculate_total_amount.
+        totals[row["grouped_invoice_id"]] = (
+            ensure_decimal(row["amount"]) + ensure_decimal(row["tax"])
+        ).quantize(_CENT, rounding=ROUND_HALF_UP)
+    return totals
+
+
+def _load(invoice_ids):
+    return list(
+        GroupedInvoice.objects.filter(pk__in=invoice_ids).only(
+            "pk",
+            "user_id",
+            "customer_id",
+            "invoice_number",
+            "total_amount",
+            "amount_paid",
+            "amount_credited",
+            "amount_due",
+            "payment_state",
+        )
+    )
+
+
+def _chunks(queryset, chunk_size):
+    ids = list(queryset.order_by("pk").values_list("pk", flat=True))
+    for start in range(0, len(ids), chunk_size):
+        yield ids[start:start + chunk_size]
+
+
+def iter_drift(queryset=None, *, chunk_size=1000):
+    """Yield ``(invoice, stored_total, expected_total)`` for invoices whose total disagrees with their lines."""
+    queryset = queryset if queryset is not None else GroupedInvoice.objects.all()
+    for chunk in _chunks(queryset, chunk_size):
+        totals = compute_totals(chunk)
+        for invoice in _load(chunk):
+            stored = ensure_decimal(invoice.total_amount)
+            if stored != totals[invoice.pk]:
+                yield invoice, stored, totals[invoice.pk]
+
+
+def rebuild(queryset=None, *, chunk_size=1000) -> int:
+    """
+    Rewrite stale totals for every invoice in ``queryset`` without calling
+    ``save``; returns the number of invoices updated.
+    """
+    queryset = queryset if queryset is not None else GroupedInvoice.objects.all()
+    changed_count = 0
+    for chunk in _chunks(queryset, chunk_size):
+        with transaction.atomic():
+            totals = compute_totals(chunk)
+            now = timezone.now()
+            changed = []
+            for invoice in _load(chunk):
+                if ensure_decimal(invoice.total_amount) == totals[invoice.pk]:
+                    continue
+                invoice.total_amount = totals[invoice.pk]
+                invoice.sync_receivables_fields()
+                invoice.quickbooks_needs_sync = True
+                invoice.updated_at = now
+                changed.append(invoice)
+            if not changed:
+                continue
+            GroupedInvoice.objects.bulk_update(changed, TOTAL_FIELDS)
+            receivables_journal.sync_invoices(invoice.pk for invoice in changed)
+            for user_id, customer_id in {(invoice.user_id, invoice.customer_id) for invoice in changed}:
+                aging.schedule(user_id, customer_id)
+            for user_id in {invoice.user_id for invoice in changed}:
+                pagination.invalidate_counts("groupedinvoice", user_id)
+        changed_count += len(changed)
+    return changed_count
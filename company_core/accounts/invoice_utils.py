@@ -1,4 +1,3 @@
-import tempfile
 import json
 from decimal import Decimal, ROUND_HALF_UP
 from datetime import timedelta
@@ -39,14 +38,18 @@ from .models import (
     ReminderLog,
     CustomerCreditItem,
     CustomerCredit,
+    TERM_CHOICES,
 ) # Make sure Invoice model is imported if used by customer.invoices
 # Assuming your templatetags are in 'accounts' app, and 'custom_filters.py' contains currency
 from accounts.templatetags import custom_filters
+from . import receivables_journal
 from .utils import resolve_company_logo_url, build_cc_list, get_customer_user_ids
-from .pdf_utils import apply_branding_defaults
+from .pdf_utils import apply_branding_defaults, pdf_stylesheet, render_html_to_pdf
 import logging 
 logger = logging.getLogger(__name__)
 
+STATEMENT_PDF_CSS = pdf_stylesheet('@page { size: A4; margin: 1cm; } body { font-family: Arial, sans-serif; }')
+
 
 def _annotate_invoice_credit_totals(queryset):
     amount_field = DecimalField(max_digits=10, decimal_places=2)
@@ -202,6 +205,14 @@ def get_invoice_context(request, customer_id, start_date=None, end_date=None, in
         'statement_label': statement_labels.get(invoice_type, 'Invoice statement'),
         'generated_on': timezone.localdate(),
     }
+    if invoice_type == 'all':
+        # Opening balance, every posting and the running balance for the period.
+        context['account_activity'] = receivables_journal.statement(
+            customer.pk,
+            start_date=start_date,
+            end_date=end_date,
+            user_ids=[request.user.pk],
+        )
     return apply_branding_defaults(context)
 
 
@@ -246,9 +257,12 @@ def get_overdue_invoice_context(request, customer_id, start_date=None, end_date=
     )['total'] or Decimal('0.00')
 
 
-    today = timezone.now().date()
-    # Filter overdue invoices (ensure due_date is present and less than today) from the pending invoices
-    overdue_invoices_list = [invoice for invoice in pending_invoices_for_balance_calc if invoice.due_date and invoice.due_date < today]
+    today = timezone.localdate()
+    # Overdue once date + term has passed (GroupedInvoice.due_date), filtered in SQL.
+    due_cutoff = today - timedelta(days=TERM_CHOICES.get(profile.term, 30))
+    overdue_invoices_list = list(
+        pending_invoices_for_balance_calc.filter(date__lt=due_cutoff).select_related('user__profile')
+    )
     
     if not overdue_invoices_list: # If no invoices are actually overdue
         return None
@@ -465,15 +479,10 @@ def download_invoice_pdf(request, customer_id):
     html_string = render_to_string(template_name, context)
     if not WEASYPRINT_AVAILABLE:
         raise ImportError("WeasyPrint is not available. PDF generation is disabled. Please install GTK+ libraries for Windows.")
-    html = HTML(string=html_string)
-    css = CSS(string='@page { size: A4; margin: 1cm; } body { font-family: Arial, sans-serif; }') if WEASYPRINT_AVAILABLE else None
-
-    with tempfile.NamedTemporaryFile(delete=True, suffix='.pdf') as pdf_file:
-        html.write_pdf(target=pdf_file.name, stylesheets=[css])
-        pdf_file.seek(0)
-        response = HttpResponse(pdf_file.read(), content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="{invoice_type}_invoice_statement_{context["customer"].name}.pdf"'
-        return response
+    pdf_content = render_html_to_pdf(html_string, stylesheets=[STATEMENT_PDF_CSS])
+    response = HttpResponse(pdf_content, content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="{invoice_type}_invoice_statement_{context["customer"].name}.pdf"'
+    return response
 
 
 @login_required
@@ -500,15 +509,10 @@ def print_invoice_pdf(request, customer_id):
     html_string = render_to_string(template_name, context)
     if not WEASYPRINT_AVAILABLE:
         raise ImportError("WeasyPrint is not available. PDF generation is disabled. Please install GTK+ libraries for Windows.")
-    html = HTML(string=html_string)
-    css = CSS(string='@page { size: A4; margin: 1cm; } body { font-family: Arial, sans-serif; }') if WEASYPRINT_AVAILABLE else None
-
-    with tempfile.NamedTemporaryFile(delete=True, suffix='.pdf') as pdf_file:
-        html.write_pdf(target=pdf_file.name, stylesheets=[css])
-        pdf_file.seek(0)
-        response = HttpResponse(pdf_file.read(), content_type='application/pdf')
-        response['Content-Disposition'] = f'inline; filename="{invoice_type}_invoice_statement_{context["customer"].name}.pdf"'
-        return response
+    pdf_content = render_html_to_pdf(html_string, stylesheets=[STATEMENT_PDF_CSS])
+    response = HttpResponse(pdf_content, content_type='application/pdf')
+    response['Content-Disposition'] = f'inline; filename="{invoice_type}_invoice_statement_{context["customer"].name}.pdf"'
+    return response
 
 
 @login_required
@@ -556,43 +560,35 @@ def send_invoice_statement(request, customer_id):
         # For this specific view, we might not have reminder_info unless we explicitly fetch it.
 
         html_string = render_to_string(template_name, context)
-        if not WEASYPRINT_AVAILABLE:
-            raise ImportError("WeasyPrint is not available. PDF generation is disabled. Please install GTK+ libraries for Windows.")
-        html = HTML(string=html_string)
-        css = CSS(string='@page { size: A4; margin: 1cm; } body { font-family: Arial, sans-serif; }') if WEASYPRINT_AVAILABLE else None
-
-        with tempfile.NamedTemporaryFile(delete=True, suffix='.pdf') as pdf_file:
-            html.write_pdf(target=pdf_file.name, stylesheets=[css])
-            pdf_file.seek(0)
-            pdf_content = pdf_file.read()
-            
-            if is_overdue_type:
-                # For a generic overdue statement from this view, we don't have reminder_info
-                # unless we query it here based on the customer.
-                # Let's assume for this specific path, reminder_info is not applicable
-                # or if it is, it needs to be fetched.
-                # The 'trigger_overdue_reminder' view is where 'reminder_info' is constructed.
-                send_overdue_emails(
-                    user_email=request.user.email,
-                    customer_email=context['customer_email'],
-                    pdf_content=pdf_content,
-                    customer=context['customer'],
-                    profile=context['profile'],
-                    total_pending_balance=context['total_pending_balance'],
-                    total_overdue_balance=context['total_overdue_balance'],
-                    reminder_info=None, # Explicitly None, as this isn't the sequenced reminder trigger
-                    start_date=context.get('start_date'),
-                    end_date=context.get('end_date'),
-                )
-            else:
-                send_emails(
-                    user_email=request.user.email,
-                    customer_email=context['customer_email'],
-                    pdf_content=pdf_content,
-                    customer=context['customer'],
-                    profile=context['profile'],
-                    statement_context=context,
-                )
+        pdf_content = render_html_to_pdf(html_string, stylesheets=[STATEMENT_PDF_CSS])
+
+        if is_overdue_type:
+            # For a generic overdue statement from this view, we don't have reminder_info
+            # unless we query it here based on the customer.
+            # Let's assume for this specific path, reminder_info is not applicable
+            # or if it is, it needs to be fetched.
+            # The 'trigger_overdue_reminder' view is where 'reminder_info' is constructed.
+            send_overdue_emails(
+                user_email=request.user.email,
+                customer_email=context['customer_email'],
+                pdf_content=pdf_content,
+                customer=context['customer'],
+                profile=context['profile'],
+                total_pending_balance=context['total_pending_balance'],
+                total_overdue_balance=context['total_overdue_balance'],
+                reminder_info=None, # Explicitly None, as this isn't the sequenced reminder trigger
+                start_date=context.get('start_date'),
+                end_date=context.get('end_date'),
+            )
+        else:
+            send_emails(
+                user_email=request.user.email,
+                customer_email=context['customer_email'],
+                pdf_content=pdf_content,
+                customer=context['customer'],
+                profile=context['profile'],
+                statement_context=context,
+            )
         return JsonResponse({'message': 'Email sent successfully.'})
     else:
         return JsonResponse({'error': 'Invalid request method.'}, status=405)
@@ -672,11 +668,7 @@ def trigger_overdue_reminder(request, customer_id):
             pdf_render_context = apply_branding_defaults(pdf_render_context)
 
             html_string = render_to_string('app/overdue_invoice_statement.html', pdf_render_context)
-            css = CSS(string='@page { size: A4; margin: 1cm; } body { font-family: Arial, sans-serif; }') if WEASYPRINT_AVAILABLE else None
-            with tempfile.NamedTemporaryFile(delete=True, suffix='.pdf') as pdf_file:
-                HTML(string=html_string).write_pdf(target=pdf_file.name, stylesheets=[css])
-                pdf_file.seek(0)
-                pdf_content = pdf_file.read()
+            pdf_content = render_html_to_pdf(html_string, stylesheets=[STATEMENT_PDF_CSS])
 
             send_overdue_emails(
                 user_email=request.user.email,
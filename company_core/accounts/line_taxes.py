@@ -0,0 +1,243 @@
+"""Batch recompute of ``IncomeRecord2.amount`` and ``tax_collected``.
+
+``IncomeRecord2._apply_calculated_fields`` prices one line at a time:
+``qty * rate`` rounded to the cent, then ``calculate_tax_total`` per tax
+component, zero for interest lines, tax-exempt invoices and owners without a
+profile. :func:`backfill` applies the same rules to whole chunks of lines. Each
+chunk is loaded with ``values_list`` into :class:`LineColumns` (no model
+instances), priced in integer cents, and only the lines that changed are
+written back with ``bulk_update``. The linked ``JobHistory`` rows and the invoice
+totals are then updated set-wise.
+
+:func:`preview` runs the same pass against replacement rates (e.g. a provincial
+rate change) and reports the effect without writing anything.
+``manage.py backfill_invoice_taxes`` wraps both and ``manage.py
+benchmark_line_taxes`` times the engine against the per-line path.
+"""
+from __future__ import annotations
+
+from array import array
+from dataclasses import dataclass, field
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import BooleanField, ExpressionWrapper, F, OuterRef, Q, Subquery
+
+from . import invoice_totals
+from .models import (
+    PROVINCE_TAX_COMPONENTS,
+    PROVINCE_TAX_RATES,
+    GroupedInvoice,
+    IncomeRecord2,
+    JobHistory,
+    ensure_decimal,
+    get_tax_components,
+)
+
+
+_HUNDRED = Decimal("100")
+
+
+def _round_half_up(numerator, denominator) -> int:
+    """Integer ``numerator / denominator`` rounded like ``Decimal.quantize(ROUND_HALF_UP)``."""
+    quotient, remainder = divmod(abs(numerator), denominator)
+    if remainder * 2 >= denominator:
+        quotient += 1
+    return quotient if numerator >= 0 else -quotient
+
+
+def _cents(value) -> int:
+    return int((ensure_decimal(value) * _HUNDRED).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def _dollars(cents) -> Decimal:
+    return Decimal(cents).scaleb(-2)
+
+
+def rate_table(overrides=None) -> dict:
+    """
+    Map each province code to ``(scale, numerators)`` so that a component's tax
+    is ``amount_cents * numerator / scale``. ``overrides`` replaces the
+    components of the given provinces, e.g. ``{"ON": (Decimal("0.14"),)}``.
+    """
+    codes = set(PROVINCE_TAX_COMPONENTS) | set(PROVINCE_TAX_RATES) | set(overrides or ())
+    table = {}
+    for code in codes:
+        if overrides and code in overrides:
+            components = tuple(ensure_decimal(rate) for rate in overrides[code] if ensure_decimal(rate))
+        else:
+            # Lines are taxed without a custom rate, so "CU" has no components.
+            components = get_tax_components(code)
+        if not components:
+            continue
+        places = max(max(-rate.as_tuple().exponent, 0) for rate in components)
+        table[code] = (10 ** places, tuple(int(rate.scaleb(places)) for rate in components))
+    return table
+
+
+class LineColumns:
+    """One chunk of lines as parallel columns; money and quantities are held in hundredths."""
+
+    __slots__ = ("ids", "invoice_ids", "qty", "rate", "amount", "tax", "taxable", "province")
+
+    def __init__(self):
+        self.ids = array("q")
+        self.invoice_ids = array("q")
+        self.qty = array("q")
+        self.rate = array("q")
+        self.amount = array("q")
+        self.tax = array("q")
+        self.taxable = array("b")
+        self.province = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def load(cls, line_ids):
+        columns = cls()
+        rows = (
+            IncomeRecord2.objects.filter(pk__in=line_ids)
+            .annotate(
+                is_interest=ExpressionWrapper(Q(job__istartswith="interest"), output_field=BooleanField()),
+            )
+            .order_by("pk")
+            .values_list(
+                "pk",
+                "grouped_invoice_id",
+                "qty",
+                "rate",
+                "amount",
+                "tax_collected",
+                "is_interest",
+                "grouped_invoice__tax_exempt",
+                "grouped_invoice__user__profile__province",
+            )
+        )
+        for pk, invoice_id, qty, rate, amount, tax, is_interest, tax_exempt, province in rows:
+            columns.ids.append(pk)
+            columns.invoice_ids.append(invoice_id or 0)
+            columns.qty.append(_cents(qty))
+            columns.rate.append(_cents(rate))
+            columns.amount.append(_cents(amount))
+            columns.tax.append(_cents(tax))
+            columns.taxable.append(not (is_interest or tax_exempt))
+            columns.province.append(province)
+        return columns
+
+
+def compute(columns, table=None):
+    """Return ``(amounts, taxes)`` in cents for every line in ``columns``."""
+    table = rate_table() if table is None else table
+    amounts = array("q", (_round_half_up(qty * rate, 100) for qty, rate in zip(columns.qty, columns.rate)))
+    taxes = array("q", bytes(8 * len(columns)))
+    for index, (amount, taxable, province) in enumerate(zip(amounts, columns.taxable, columns.province)):
+        rates = table.get(province) if taxable else None
+        if rates is None:
+            continue
+        scale, numerators = rates
+        taxes[index] = sum(_round_half_up(amount * numerator, scale) for numerator in numerators)
+    return amounts, taxes
+
+
+@dataclass
+class TaxSummary:
+    lines: int = 0
+    changed_lines: int = 0
+    # invoice_id -> [lines, changed, old_subtotal, old_tax, new_subtotal, new_tax] in cents
+    invoices: dict = field(default_factory=dict)
+    # province -> [old_tax, new_tax] in cents
+    provinces: dict = field(default_factory=dict)
+
+    def add(self, columns, amounts, taxes):
+        self.lines += len(columns)
+        for index, invoice_id in enumerate(columns.invoice_ids):
+            changed = amounts[index] != columns.amount[index] or taxes[index] != columns.tax[index]
+            self.changed_lines += changed
+            row = self.invoices.setdefault(invoice_id, [0, 0, 0, 0, 0, 0])
+            row[0] += 1
+            row[1] += changed
+            row[2] += columns.amount[index]
+            row[3] += columns.tax[index]
+            row[4] += amounts[index]
+            row[5] += taxes[index]
+            province = self.provinces.setdefault(columns.province[index], [0, 0])
+            province[0] += columns.tax[index]
+            province[1] += taxes[index]
+
+    def invoice_amounts(self, invoice_id):
+        """``(lines, changed, old_subtotal, old_tax, new_subtotal, new_tax)`` with money as Decimal."""
+        lines, changed, *money = self.invoices.get(invoice_id, [0, 0, 0, 0, 0, 0])
+        return (lines, changed, *map(_dollars, money))
+
+    def province_taxes(self):
+        """Yield ``(province, old_tax, new_tax)`` as Decimal, sorted by province."""
+        for province in sorted(self.provinces, key=lambda code: code or ""):
+            old_tax, new_tax = self.provinces[province]
+            yield province, _dollars(old_tax), _dollars(new_tax)
+
+    @property
+    def old_tax(self) -> Decimal:
+        return _dollars(sum(row[3] for row in self.invoices.values()))
+
+    @property
+    def new_tax(self) -> Decimal:
+        return _dollars(sum(row[5] for row in self.invoices.values()))
+
+
+def _line_chunks(queryset, chunk_size):
+    ids = list(queryset.order_by("pk").values_list("pk", flat=True))
+    for start in range(0, len(ids), chunk_size):
+        yield ids[start:start + chunk_size]
+
+
+def _write(columns, amounts, taxes):
+    changed = [
+        IncomeRecord2(pk=columns.ids[index], amount=_dollars(amounts[index]), tax_collected=_dollars(taxes[index]))
+        for index in range(len(columns))
+        if amounts[index] != columns.amount[index] or taxes[index] != columns.tax[index]
+    ]
+    if not changed:
+        return
+    IncomeRecord2.objects.bulk_update(changed, ["amount", "tax_collected"])
+    line = IncomeRecord2.objects.filter(pk=OuterRef("source_income_record_id"))
+    JobHistory.objects.filter(source_income_record_id__in=[line.pk for line in changed]).update(
+        service_cost=Subquery(line.values("amount")[:1]),
+        tax_amount=Subquery(line.values("tax_collected")[:1]),
+        total_job_cost=Subquery(line.annotate(total=F("amount") + F("tax_collected")).values("total")[:1]),
+    )
+
+
+def backfill(lines=None, *, chunk_size=5000, dry_run=False) -> TaxSummary:
+    """
+    Recompute every line in ``lines`` (default: all) with the current rates,
+    write the changed ones and refresh the affected invoice totals.
+    """
+    lines = lines if lines is not None else IncomeRecord2.objects.all()
+    table = rate_table()
+    summary = TaxSummary()
+    for chunk in _line_chunks(lines, chunk_size):
+        with transaction.atomic():
+            columns = LineColumns.load(chunk)
+            amounts, taxes = compute(columns, table)
+            summary.add(columns, amounts, taxes)
+            if not dry_run:
+                _write(columns, amounts, taxes)
+    if not dry_run:
+        # Also repairs totals that were stale even where no line changed.
+        invoice_totals.rebuild(
+            GroupedInvoice.objects.filter(pk__in=lines.values("grouped_invoice_id")),
+            chunk_size=chunk_size,
+        )
+    return summary
+
+
+def preview(rates, lines=None, *, chunk_size=5000) -> TaxSummary:
+    """Report what ``rates`` (province -> components) would do to ``lines`` without writing."""
+    lines = lines if lines is not None else IncomeRecord2.objects.all()
+    table = rate_table(rates)
+    summary = TaxSummary()
+    for chunk in _line_chunks(lines, chunk_size):
+        columns = LineColumns.load(chunk)
+        summary.add(columns, *compute(columns, table))
+    return summary
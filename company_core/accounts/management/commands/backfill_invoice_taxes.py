@@ -1,29 +1,42 @@
-from decimal import Decimal, ROUND_HALF_UP
+from decimal import Decimal, InvalidOperation
 
 from django.core.management.base import BaseCommand, CommandError
-from django.db import transaction
 
-from accounts.models import (
-    GroupedInvoice,
-    IncomeRecord2,
-    JobHistory,
-    calculate_tax_total,
-    ensure_decimal,
-)
+from accounts import line_taxes
+from accounts.models import GroupedInvoice, IncomeRecord2
+
+
+def _parse_rate(value):
+    """``ON=0.14`` or ``QC=0.05+0.1`` -> ``("ON", (Decimal("0.14"),))``."""
+    code, sep, rates = value.partition("=")
+    if not sep or not code.strip():
+        raise CommandError(f"Invalid --rate {value!r}; expected PROVINCE=RATE[+RATE].")
+    try:
+        components = tuple(Decimal(rate.strip()) for rate in rates.split("+") if rate.strip())
+    except InvalidOperation as exc:
+        raise CommandError(f"Invalid --rate {value!r}; rates must be decimals such as 0.13.") from exc
+    return code.strip().upper(), components
 
 
 class Command(BaseCommand):
     help = (
         "Recalculate line-item taxes and invoice totals for specific invoice numbers "
-        "using component-based rounding (QuickBooks-style)."
+        "(or --all) using component-based rounding (QuickBooks-style). Lines are "
+        "priced in batches and written with bulk updates. Pass --rate to preview a "
+        "rate change without writing."
     )
 
     def add_arguments(self, parser):
         parser.add_argument(
             "invoice_numbers",
-            nargs="+",
+            nargs="*",
             help="Invoice number(s) to backfill (space separated).",
         )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Process every invoice line (within --user, if given).",
+        )
         parser.add_argument(
             "--user",
             dest="user",
@@ -34,11 +47,23 @@ class Command(BaseCommand):
             action="store_true",
             help="Show what would change without writing updates.",
         )
+        parser.add_argument(
+            "--rate",
+            dest="rates",
+            action="append",
+            help="Preview a rate change, e.g. ON=0.14 or QC=0.05+0.1; repeat for several provinces. Never writes.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5000,
+            help="Lines processed per batch (default: 5000).",
+        )
 
     def handle(self, *args, **options):
         invoice_numbers = [num.strip() for num in options["invoice_numbers"] if num.strip()]
-        if not invoice_numbers:
-            raise CommandError("Provide at least one invoice number.")
+        if not invoice_numbers and not options["all"]:
+            raise CommandError("Provide at least one invoice number, or --all.")
 
         user_filter = {}
         user_value = options.get("user")
@@ -48,122 +73,65 @@ class Command(BaseCommand):
             else:
                 user_filter["user__username__iexact"] = user_value
 
-        dry_run = options["dry_run"]
-        for invoice_number in invoice_numbers:
-            qs = GroupedInvoice.objects.filter(invoice_number=invoice_number, **user_filter).select_related(
-                "user",
-                "user__profile",
-            )
-            if not qs.exists():
-                self.stdout.write(
-                    self.style.WARNING(f"Invoice {invoice_number}: not found (or filtered out).")
-                )
-                continue
-
-            if qs.count() > 1:
-                self.stdout.write(
-                    self.style.WARNING(
-                        f"Invoice {invoice_number}: multiple matches found; processing all."
-                    )
-                )
-
-            for invoice in qs:
-                line_items = list(
-                    IncomeRecord2.objects.filter(grouped_invoice=invoice).order_by("id")
-                )
-                if not line_items:
+        invoices = GroupedInvoice.objects.filter(**user_filter)
+        if invoice_numbers:
+            invoices = invoices.filter(invoice_number__in=invoice_numbers)
+            found = {}
+            for number in invoices.values_list("invoice_number", flat=True):
+                found[number] = found.get(number, 0) + 1
+            for number in invoice_numbers:
+                if number not in found:
+                    self.stdout.write(self.style.WARNING(f"Invoice {number}: not found (or filtered out)."))
+                elif found[number] > 1:
                     self.stdout.write(
-                        self.style.WARNING(
-                            f"Invoice {invoice.invoice_number} (user {invoice.user_id}): no line items."
-                        )
+                        self.style.WARNING(f"Invoice {number}: multiple matches found; processing all.")
                     )
-                    continue
-
-                old_subtotal = sum(
-                    (ensure_decimal(item.amount) for item in line_items),
-                    Decimal("0.00"),
-                )
-                old_tax = sum(
-                    (ensure_decimal(item.tax_collected) for item in line_items),
-                    Decimal("0.00"),
-                )
-                old_total = (old_subtotal + old_tax).quantize(
-                    Decimal("0.01"), rounding=ROUND_HALF_UP
-                )
-
-                new_subtotal = Decimal("0.00")
-                new_tax = Decimal("0.00")
-                changed_lines = 0
-
-                province = getattr(getattr(invoice.user, "profile", None), "province", None)
-                tax_exempt = bool(getattr(invoice, "tax_exempt", False))
-
-                def update_line(item, amount, tax_amount):
-                    IncomeRecord2.objects.filter(pk=item.pk).update(
-                        amount=amount,
-                        tax_collected=tax_amount,
-                    )
-                    JobHistory.objects.filter(source_income_record=item).update(
-                        service_cost=amount,
-                        tax_amount=tax_amount,
-                        total_job_cost=(amount + tax_amount).quantize(
-                            Decimal("0.01"), rounding=ROUND_HALF_UP
-                        ),
-                    )
-
-                def calculate_line_tax(item, amount):
-                    if tax_exempt:
-                        return Decimal("0.00")
-                    job_value = (item.job or "").strip().lower()
-                    if job_value.startswith("interest"):
-                        return Decimal("0.00")
-                    return calculate_tax_total(amount, province)
-
-                if dry_run:
-                    for item in line_items:
-                        qty = ensure_decimal(item.qty)
-                        rate = ensure_decimal(item.rate)
-                        amount = (qty * rate).quantize(
-                            Decimal("0.01"), rounding=ROUND_HALF_UP
-                        )
-                        tax_amount = calculate_line_tax(item, amount)
-                        if amount != ensure_decimal(item.amount) or tax_amount != ensure_decimal(
-                            item.tax_collected
-                        ):
-                            changed_lines += 1
-                        new_subtotal += amount
-                        new_tax += tax_amount
-                else:
-                    with transaction.atomic():
-                        for item in line_items:
-                            qty = ensure_decimal(item.qty)
-                            rate = ensure_decimal(item.rate)
-                            amount = (qty * rate).quantize(
-                                Decimal("0.01"), rounding=ROUND_HALF_UP
-                            )
-                            tax_amount = calculate_line_tax(item, amount)
-                            if amount != ensure_decimal(item.amount) or tax_amount != ensure_decimal(
-                                item.tax_collected
-                            ):
-                                changed_lines += 1
-                                update_line(item, amount, tax_amount)
-                            new_subtotal += amount
-                            new_tax += tax_amount
-
-                        new_total = (new_subtotal + new_tax).quantize(
-                            Decimal("0.01"), rounding=ROUND_HALF_UP
-                        )
-                        if changed_lines or new_total != ensure_decimal(invoice.total_amount):
-                            invoice.recalculate_total_amount()
+            if not found:
+                return
+
+        lines = IncomeRecord2.objects.filter(grouped_invoice__in=invoices)
+        chunk_size = max(options["chunk_size"], 1)
+        if options["rates"]:
+            summary = line_taxes.preview(dict(map(_parse_rate, options["rates"])), lines, chunk_size=chunk_size)
+            status = "PREVIEW"
+        else:
+            summary = line_taxes.backfill(lines, chunk_size=chunk_size, dry_run=options["dry_run"])
+            status = "DRY RUN" if options["dry_run"] else "UPDATED"
+
+        if invoice_numbers:
+            listed_ids = list(invoices.order_by("invoice_number", "pk").values_list("pk", flat=True))
+        elif options["verbosity"] > 1:
+            # With --all, only invoices with changed lines are listed.
+            listed_ids = sorted(pk for pk, row in summary.invoices.items() if pk and row[1])
+        else:
+            listed_ids = []
+        for start in range(0, len(listed_ids), chunk_size):
+            batch = invoices.only("pk", "invoice_number", "user_id").in_bulk(listed_ids[start:start + chunk_size])
+            for invoice_id in listed_ids[start:start + chunk_size]:
+                self._report_invoice(batch[invoice_id], summary, status)
+
+        if options["rates"]:
+            for province, old_tax, new_tax in summary.province_taxes():
+                if old_tax != new_tax:
+                    self.stdout.write(f"{province or 'No province'}: tax {old_tax:.2f}->{new_tax:.2f}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{status}: {summary.lines} line(s), {summary.changed_lines} changed; "
+                f"tax {summary.old_tax:.2f}->{summary.new_tax:.2f}."
+            )
+        )
 
-                new_total = (new_subtotal + new_tax).quantize(
-                    Decimal("0.01"), rounding=ROUND_HALF_UP
-                )
-                status = "DRY RUN" if dry_run else "UPDATED"
-                self.stdout.write(
-                    f"{status} Invoice {invoice.invoice_number} (user {invoice.user_id}): "
-                    f"lines={len(line_items)}, changed={changed_lines}, "
-                    f"subtotal {old_subtotal:.2f}->{new_subtotal:.2f}, "
-                    f"tax {old_tax:.2f}->{new_tax:.2f}, "
-                    f"total {old_total:.2f}->{new_total:.2f}"
-                )
+    def _report_invoice(self, invoice, summary, status):
+        lines, changed, old_subtotal, old_tax, new_subtotal, new_tax = summary.invoice_amounts(invoice.pk)
+        if not lines:
+            self.stdout.write(
+                self.style.WARNING(f"Invoice {invoice.invoice_number} (user {invoice.user_id}): no line items.")
+            )
+            return
+        self.stdout.write(
+            f"{status} Invoice {invoice.invoice_number} (user {invoice.user_id}): "
+            f"lines={lines}, changed={changed}, "
+            f"subtotal {old_subtotal:.2f}->{new_subtotal:.2f}, "
+            f"tax {old_tax:.2f}->{new_tax:.2f}, "
+            f"total {old_subtotal + old_tax:.2f}->{new_subtotal + new_tax:.2f}"
+        )
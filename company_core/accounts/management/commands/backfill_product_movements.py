@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from accounts import stock_movements
+from accounts.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the per-product daily movement rollup used by inventory analytics "
+        "from the inventory transaction log."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            dest="username",
+            help="Only rebuild products owned by this username.",
+        )
+        parser.add_argument(
+            "--product-id",
+            type=int,
+            action="append",
+            help="Only rebuild this product; repeat for several.",
+        )
+
+    def handle(self, *args, **options):
+        products = Product.objects.all()
+        if options["username"]:
+            products = products.filter(user__username=options["username"])
+        if options["product_id"]:
+            products = products.filter(pk__in=options["product_id"])
+
+        written = stock_movements.backfill(products)
+        self.stdout.write(self.style.SUCCESS(f"Product movement rollup rebuilt; {written} daily row(s) written."))
@@ -0,0 +1,76 @@
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, transaction
+
+from accounts.models import GroupedInvoice
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure invoice number throughput with parallel threads against a throwaway "
+        "business user, and check that no number is handed out twice."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--per-thread", type=int, default=200)
+        parser.add_argument(
+            "--block",
+            type=int,
+            default=1,
+            help="Numbers reserved per call (1 = one generate_invoice_number call per invoice).",
+        )
+
+    def handle(self, *args, **options):
+        thread_count = max(options["threads"], 1)
+        per_thread = max(options["per_thread"], 1)
+        block = max(options["block"], 1)
+
+        UserModel = get_user_model()
+        user = UserModel.objects.create_user(username="__bench_invoice_numbers__", password=None)
+        numbers, retries = [], [0]
+        lock = threading.Lock()
+
+        def worker():
+            local, local_retries = [], 0
+            try:
+                while len(local) < per_thread:
+                    try:
+                        with transaction.atomic():
+                            if block == 1:
+                                local.append(GroupedInvoice.generate_invoice_number(user))
+                            else:
+                                local.extend(GroupedInvoice.reserve_invoice_numbers(user, block))
+                    except OperationalError:
+                        # SQLite reports writer contention instead of queueing.
+                        local_retries += 1
+                        time.sleep(0.001)
+            finally:
+                connection.close()
+            with lock:
+                numbers.extend(local)
+                retries[0] += local_retries
+
+        try:
+            threads = [threading.Thread(target=worker) for _ in range(thread_count)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            user.delete()
+
+        duplicates = len(numbers) - len(set(numbers))
+        self.stdout.write(
+            f"{len(numbers)} numbers from {thread_count} threads in {elapsed:.2f}s "
+            f"({len(numbers) / elapsed:.0f}/s, block={block}, lock retries={retries[0]})"
+        )
+        if duplicates:
+            self.stdout.write(self.style.ERROR(f"{duplicates} duplicate numbers handed out"))
+        else:
+            self.stdout.write(self.style.SUCCESS("No duplicates."))
@@ -0,0 +1,74 @@
+import random
+import time
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import line_taxes
+from accounts.models import PROVINCE_TAX_RATES, calculate_tax_total
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the batch line-tax engine against the per-line calculate_tax_total path "
+        "on synthetic lines (no database access) and check both agree."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lines",
+            type=int,
+            default=1_000_000,
+            help="Number of synthetic lines (default: 1000000).",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=7,
+            help="Random seed for the synthetic lines (default: 7).",
+        )
+
+    def handle(self, *args, **options):
+        count = options["lines"]
+        if count <= 0:
+            raise CommandError("--lines must be positive.")
+
+        rng = random.Random(options["seed"])
+        provinces = sorted(PROVINCE_TAX_RATES) + [None]
+        columns = line_taxes.LineColumns()
+        for index in range(count):
+            columns.ids.append(index + 1)
+            columns.invoice_ids.append(index // 5 + 1)
+            columns.qty.append(rng.randint(1, 2000))
+            columns.rate.append(rng.randint(-5000, 250000))
+            columns.amount.append(0)
+            columns.tax.append(0)
+            columns.taxable.append(rng.random() > 0.05)
+            columns.province.append(rng.choice(provinces))
+
+        started = time.perf_counter()
+        table = line_taxes.rate_table()
+        amounts, taxes = line_taxes.compute(columns, table)
+        batch_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        mismatches = 0
+        cent = Decimal("0.01")
+        for index in range(count):
+            qty = Decimal(columns.qty[index]).scaleb(-2)
+            rate = Decimal(columns.rate[index]).scaleb(-2)
+            amount = (qty * rate).quantize(cent, rounding=ROUND_HALF_UP)
+            tax = calculate_tax_total(amount, columns.province[index]) if columns.taxable[index] else Decimal("0.00")
+            if int(amount * 100) != amounts[index] or int(tax * 100) != taxes[index]:
+                mismatches += 1
+        per_line_seconds = time.perf_counter() - started
+
+        self.stdout.write(f"Batch engine: {count} line(s) in {batch_seconds:.2f}s ({count / batch_seconds:,.0f}/s)")
+        self.stdout.write(
+            f"Per-line path: {count} line(s) in {per_line_seconds:.2f}s ({count / per_line_seconds:,.0f}/s)"
+        )
+        if mismatches:
+            raise CommandError(f"{mismatches} line(s) priced differently by the batch engine.")
+        self.stdout.write(
+            self.style.SUCCESS(f"Results match; batch engine is {per_line_seconds / batch_seconds:.1f}x faster.")
+        )
@@ -0,0 +1,91 @@
+import itertools
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import render_to_string
+
+from accounts import pdf_renderer
+from accounts.models import GroupedInvoice
+from accounts.pdf_utils import WEASYPRINT_AVAILABLE, apply_branding_defaults
+from accounts.utils import resolve_company_logo_url
+from accounts.view_invoices import PDF_STYLESHEET, _build_invoice_context
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-document latency and throughput of invoice PDF rendering: a fresh "
+        "WeasyPrint HTML per document (the old path) against the warm renderers, "
+        "one at a time and batched with render_many. The PDF cache is bypassed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=100, help="Documents per run (default: 100).")
+        parser.add_argument("--user-id", type=int, help="Only use invoices owned by this user.")
+        parser.add_argument(
+            "--invoices",
+            type=int,
+            default=20,
+            help="Distinct invoices to cycle through (default: 20).",
+        )
+
+    def handle(self, *args, **options):
+        if not WEASYPRINT_AVAILABLE:
+            raise CommandError("WeasyPrint is not available.")
+
+        queryset = GroupedInvoice.objects.select_related("user__profile", "customer").prefetch_related(
+            "income_records__product", "payments"
+        )
+        if options["user_id"]:
+            queryset = queryset.filter(user_id=options["user_id"])
+        invoices = list(queryset.order_by("-pk")[: max(options["invoices"], 1)])
+        if not invoices:
+            raise CommandError("No invoices to render.")
+
+        documents = []
+        for invoice in invoices:
+            context = _build_invoice_context(invoice, None)
+            if context.get("profile") is not None:
+                context["company_logo_url"] = resolve_company_logo_url(context["profile"], for_pdf=True)
+            documents.append(render_to_string("invoices/grouped_invoice_pdf.html", apply_branding_defaults(context)))
+        count = max(options["count"], 1)
+        htmls = list(itertools.islice(itertools.cycle(documents), count))
+
+        # Start the pool (and its warm-up render) outside the timed runs.
+        pdf_renderer.render(htmls[0], stylesheets=[PDF_STYLESHEET])
+
+        self.stdout.write(f"{count} invoice PDFs from {len(invoices)} distinct invoices")
+        self.stdout.write(f"{'path':<22} {'mean ms':>9} {'p95 ms':>9} {'docs/s':>9}")
+        self._report("fresh HTML", self._time_each(htmls, self._render_fresh))
+        self._report(
+            "warm renderer",
+            self._time_each(htmls, lambda html: pdf_renderer.render(html, stylesheets=[PDF_STYLESHEET])),
+        )
+
+        started = time.perf_counter()
+        pdf_renderer.render_many([pdf_renderer.RenderJob(html, (PDF_STYLESHEET,)) for html in htmls])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"{'render_many':<22} {'':>9} {'':>9} {count / elapsed:>9.1f}")
+
+    @staticmethod
+    def _render_fresh(html):
+        from weasyprint import CSS, HTML
+
+        return HTML(string=html).write_pdf(stylesheets=[CSS(string=PDF_STYLESHEET.source)])
+
+    @staticmethod
+    def _time_each(htmls, render):
+        timings = []
+        for html in htmls:
+            started = time.perf_counter()
+            render(html)
+            timings.append(time.perf_counter() - started)
+        return timings
+
+    def _report(self, label, timings):
+        ordered = sorted(timings)
+        p95 = ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)]
+        self.stdout.write(
+            f"{label:<22} {statistics.mean(timings) * 1000:>9.1f} {p95 * 1000:>9.1f} "
+            f"{len(timings) / sum(timings):>9.1f}"
+        )
@@ -0,0 +1,61 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.backends.cache import SessionStore
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.http import Http404
+from django.test import RequestFactory
+
+from accounts.middleware import CustomerPortalIsolationMiddleware
+from accounts.models import Customer
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Time CustomerPortalIsolationMiddleware.process_request for a customer "
+        "portal user and a business user. Fixtures are created in a rolled-back transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        iterations = max(options["iterations"], 1)
+        try:
+            with transaction.atomic():
+                self._run(iterations)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, iterations):
+        UserModel = get_user_model()
+        owner = UserModel.objects.create_user(username="__bench_portal_owner__", password=None)
+        portal_user = UserModel.objects.create_user(username="__bench_portal_customer__", password=None)
+        Customer.objects.create(user=owner, name="Benchmark customer", portal_user=portal_user)
+
+        middleware = CustomerPortalIsolationMiddleware(lambda request: None)
+        factory = RequestFactory()
+        paths = ("/store/", "/store/products/123/", "/dashboard/", "/static/css/site.css")
+
+        self.stdout.write(f"{'user':<10} {'path':<24} {'us/request':>11}")
+        for label, user in (("customer", portal_user), ("business", owner)):
+            for path in paths:
+                elapsed = 0.0
+                for _ in range(iterations):
+                    request = factory.get(path)
+                    # Fresh instance per request, as AuthenticationMiddleware provides.
+                    request.user = UserModel.objects.get(pk=user.pk)
+                    request.session = SessionStore()
+                    start = time.perf_counter()
+                    try:
+                        middleware.process_request(request)
+                    except Http404:
+                        pass
+                    elapsed += time.perf_counter() - start
+                self.stdout.write(f"{label:<10} {path:<24} {elapsed / iterations * 1e6:>11.1f}")
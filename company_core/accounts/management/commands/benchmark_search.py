@@ -0,0 +1,121 @@
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from accounts import search_index
+from accounts.models import GroupedInvoice, IncomeRecord2
+
+
+WORDS = (
+    "brake pads rotors caliper oil filter coolant flush alternator starter battery tire rotation "
+    "alignment wiper blades headlight bulb transmission service clutch kit exhaust muffler "
+    "radiator hose belt tensioner air filter cabin fuel injector spark plugs diagnostic scan "
+    "suspension shock strut ball joint tie rod wheel bearing differential dpf regen def sensor"
+).split()
+MAKES = ("freightliner cascadia", "kenworth t680", "peterbilt 579", "volvo vnl", "international lt", "mack anthem")
+CUSTOMERS = ("northline logistics", "prairie haulers", "maple freight", "summit transport", "riverbend carriers")
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a throwaway tenant with --lines invoice lines (default 500k), then compare "
+        "the old icontains invoice search with the full-text index. All data is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lines", type=int, default=500_000, help="Invoice lines to generate (default: 500000).")
+        parser.add_argument("--lines-per-invoice", type=int, default=10, help="Lines per invoice (default: 10).")
+        parser.add_argument("--repeat", type=int, default=5, help="Timed runs per query (default: 5).")
+        parser.add_argument("--seed", type=int, default=1, help="Random seed for the generated data.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        with transaction.atomic():
+            user = User.objects.create(username=f"search-benchmark-{int(time.time())}")
+            started = time.perf_counter()
+            invoices = self._generate(user, rng, options["lines"], max(options["lines_per_invoice"], 1))
+            self.stdout.write(f"Generated {invoices} invoices / {options['lines']} lines in {time.perf_counter() - started:.1f}s")
+
+            started = time.perf_counter()
+            search_index.rebuild([search_index.KIND_INVOICE], user_id=user.pk)
+            self.stdout.write(f"Indexed in {time.perf_counter() - started:.1f}s")
+
+            queries = ["cascadia", "maple freight", "INV-", "dpf regen", "1HGC", "zz-no-match"]
+            self.stdout.write(f"{'query':<16} {'matches':>8} {'icontains ms':>13} {'index ms':>10}")
+            for query in queries:
+                base = GroupedInvoice.objects.filter(user=user)
+
+                def old(query=query, base=base):
+                    return base.filter(
+                        Q(invoice_number__icontains=query) | Q(bill_to__icontains=query) | Q(date__icontains=query)
+                        | Q(total_amount__icontains=query) | Q(vin_no__icontains=query) | Q(unit_no__icontains=query)
+                        | Q(make_model__icontains=query) | Q(income_records__job__icontains=query)
+                    ).distinct().order_by("-date")
+
+                def new(query=query, base=base):
+                    # Building the queryset runs the ranking query, so it is timed too.
+                    return search_index.order_by_rank(
+                        search_index.search(base, search_index.KIND_INVOICE, query, user_id=user.pk)
+                    )
+
+                old_ms = self._time(old, options["repeat"])
+                new_ms = self._time(new, options["repeat"])
+                self.stdout.write(f"{query:<16} {new().count():>8} {old_ms:>13.1f} {new_ms:>10.1f}")
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS("Benchmark data rolled back."))
+
+    @staticmethod
+    def _time(build, repeat):
+        timings = []
+        for _ in range(max(repeat, 1)):
+            started = time.perf_counter()
+            queryset = build()
+            queryset.count()
+            list(queryset[:100])
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+    @staticmethod
+    def _generate(user, rng, total_lines, per_invoice):
+        invoice_count = max(total_lines // per_invoice, 1)
+        today = date.today()
+        created = 0
+        for start in range(0, invoice_count, 1000):
+            batch = [
+                GroupedInvoice(
+                    user=user,
+                    invoice_number=f"INV-{user.pk}-{start + index + 150}",
+                    invoice_sequence=start + index + 150,
+                    bill_to=rng.choice(CUSTOMERS),
+                    date=today - timedelta(days=rng.randrange(730)),
+                    vin_no="".join(rng.choice("0123456789ABCDEFGHJKLMNPRSTUVWXYZ") for _ in range(17)),
+                    unit_no=str(rng.randrange(1, 900)),
+                    make_model=rng.choice(MAKES),
+                    total_amount=Decimal(rng.randrange(5000, 500000)) / 100,
+                )
+                for index in range(min(1000, invoice_count - start))
+            ]
+            batch = GroupedInvoice.objects.bulk_create(batch)
+            IncomeRecord2.objects.bulk_create(
+                [
+                    IncomeRecord2(
+                        grouped_invoice=invoice,
+                        job=" ".join(rng.sample(WORDS, 4)),
+                        qty=Decimal("1.00"),
+                        rate=Decimal("10.00"),
+                        line_order=line,
+                    )
+                    for invoice in batch
+                    for line in range(per_invoice)
+                ],
+                batch_size=5000,
+            )
+            created += len(batch)
+        return created
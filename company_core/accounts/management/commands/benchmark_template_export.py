@@ -0,0 +1,144 @@
+import random
+import time
+import tracemalloc
+from decimal import Decimal
+from io import BytesIO
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import RequestFactory
+from django.urls import reverse
+from openpyxl import Workbook
+
+from accounts.excel_formatting import apply_template_styling
+from accounts.models import Category, Product, ProductAlternateSku, Supplier
+from accounts.product_import import PRODUCT_TEMPLATE_HEADERS
+from accounts.views_inventory import export_products_template
+
+
+WORDS = (
+    "brake pad rotor caliper oil filter coolant alternator starter battery wiper blade headlight "
+    "bulb clutch kit exhaust muffler radiator hose belt tensioner injector sensor shock strut"
+).split()
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a throwaway tenant with --products products (default 100k), then time the "
+        "products template download and report its peak Python memory. All data is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=100_000, help="Products to generate (default: 100000).")
+        parser.add_argument("--seed", type=int, default=1, help="Random seed for the generated data.")
+        parser.add_argument(
+            "--compare",
+            action="store_true",
+            help="Also build the same rows into an in-memory workbook styled with apply_template_styling.",
+        )
+
+    def handle(self, *args, **options):
+        count = options["products"]
+        if count <= 0:
+            raise CommandError("--products must be positive.")
+
+        rng = random.Random(options["seed"])
+        with transaction.atomic():
+            user = User.objects.create(username=f"export-benchmark-{int(time.time())}")
+            started = time.perf_counter()
+            self._generate(user, rng, count)
+            self.stdout.write(f"Generated {count} products in {time.perf_counter() - started:.1f}s")
+
+            request = RequestFactory().get(reverse("accounts:inventory_products_template"))
+            request.user = user
+
+            def streamed():
+                response = export_products_template(request)
+                size = sum(len(chunk) for chunk in response.streaming_content)
+                # response.close() would send request_finished, which closes the
+                # connection inside this transaction; only the temp file needs closing.
+                response.file_to_stream.close()
+                return size
+
+            seconds, peak, size = self._measure(streamed)
+            self.stdout.write(
+                f"Streaming export: {size / 1024 / 1024:.1f} MB in {seconds:.2f}s, peak {peak / 1024 / 1024:.1f} MB"
+            )
+
+            if options["compare"]:
+                products = (
+                    Product.objects.filter(user=user)
+                    .order_by("name")
+                    .values_list(
+                        "sku", "name", "description", "category__name", "supplier__name",
+                        "cost_price", "sale_price", "location",
+                    )
+                )
+                rows = [
+                    [sku, "", "", "", name, description, "", category, supplier, "", "", "", "Inventory",
+                     str(cost), str(sale), "", str(sale - cost), 0, 0, 0, location, "", "", "No", "No"]
+                    for sku, name, description, category, supplier, cost, sale, location in products
+                ]
+
+                def in_memory():
+                    workbook = Workbook()
+                    worksheet = workbook.active
+                    worksheet.append(PRODUCT_TEMPLATE_HEADERS)
+                    for row in rows:
+                        worksheet.append(row)
+                    apply_template_styling(worksheet, headers=PRODUCT_TEMPLATE_HEADERS, header_row_index=1)
+                    output = BytesIO()
+                    workbook.save(output)
+                    return output.tell()
+
+                seconds, peak, size = self._measure(in_memory)
+                self.stdout.write(
+                    f"In-memory workbook: {size / 1024 / 1024:.1f} MB in {seconds:.2f}s, peak {peak / 1024 / 1024:.1f} MB"
+                )
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS("Benchmark data rolled back."))
+
+    @staticmethod
+    def _measure(run):
+        tracemalloc.start()
+        try:
+            started = time.perf_counter()
+            result = run()
+            seconds = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return seconds, peak, result
+
+    @staticmethod
+    def _generate(user, rng, count):
+        categories = Category.objects.bulk_create(
+            [Category(user=user, name=f"Category {index}") for index in range(40)]
+        )
+        suppliers = Supplier.objects.bulk_create(
+            [Supplier(user=user, name=f"Supplier {index}") for index in range(25)]
+        )
+        for start in range(0, count, 5000):
+            batch = Product.objects.bulk_create(
+                [
+                    Product(
+                        user=user,
+                        sku=f"BM-{start + index:07d}",
+                        name=" ".join(rng.sample(WORDS, 3)),
+                        description=" ".join(rng.sample(WORDS, 8)),
+                        category=rng.choice(categories),
+                        supplier=rng.choice(suppliers),
+                        cost_price=Decimal(rng.randrange(100, 50000)) / 100,
+                        sale_price=Decimal(rng.randrange(50000, 90000)) / 100,
+                        location=f"Aisle {rng.randrange(1, 30)}",
+                    )
+                    for index in range(min(5000, count - start))
+                ]
+            )
+            ProductAlternateSku.objects.bulk_create(
+                [
+                    ProductAlternateSku(product=product, sku=f"ALT-{product.sku}")
+                    for product in batch[::10]
+                ]
+            )
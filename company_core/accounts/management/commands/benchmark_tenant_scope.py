@@ -0,0 +1,74 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext,
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+from django.urls import reverse
+
+from accounts import tenant_scope
+
+
+DEFAULT_ROUTES = (
+    "accounts:home",
+    "accounts:inventory_hub",
+    "accounts:store_product_list",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare query counts for key pages with the tenant scope cache disabled, "
+        "cold and warm. Every request runs inside a rolled-back transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("username", help="Username to render the pages as.")
+        parser.add_argument(
+            "--route",
+            dest="routes",
+            action="append",
+            help="URL name to benchmark (repeatable). Defaults to home, inventory hub and store product list.",
+        )
+
+    def handle(self, *args, **options):
+        UserModel = get_user_model()
+        try:
+            user = UserModel.objects.get(username=options["username"])
+        except UserModel.DoesNotExist:
+            raise CommandError(f"User {options['username']!r} not found.")
+
+        routes = options.get("routes") or list(DEFAULT_ROUTES)
+        setup_test_environment()
+        try:
+            client = Client()
+            client.force_login(user)
+
+            self.stdout.write(f"{'route':<34} {'disabled':>9} {'cold':>9} {'warm':>9}")
+            for route in routes:
+                url = reverse(route)
+                with override_settings(TENANT_SCOPE_CACHE_ENABLED=False):
+                    disabled = self._count_queries(client, url)
+                cache.delete(tenant_scope.GENERATION_CACHE_KEY)
+                cold = self._count_queries(client, url)
+                warm = self._count_queries(client, url)
+                self.stdout.write(f"{route:<34} {disabled:>9} {cold:>9} {warm:>9}")
+            client.logout()
+        finally:
+            teardown_test_environment()
+
+    def _count_queries(self, client, url):
+        with CaptureQueriesContext(connection) as captured:
+            with transaction.atomic():
+                response = client.get(url)
+                transaction.set_rollback(True)
+        if response.status_code >= 400:
+            self.stdout.write(
+                self.style.WARNING(f"{url} returned HTTP {response.status_code}")
+            )
+        return len(captured)
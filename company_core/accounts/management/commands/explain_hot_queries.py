@@ -0,0 +1,264 @@
+import random
+import re
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from accounts.models import (
+    Customer,
+    GroupedInvoice,
+    IncomeRecord2,
+    InventoryTransaction,
+    Payment,
+    PendingInvoice,
+    Product,
+    ProductStock,
+    WorkOrder,
+)
+from accounts.pagination import seek_filter
+from accounts.utils import annotate_products_with_stock
+
+
+PICKED = GroupedInvoice.ONLINE_ORDER_STATUS_PICKED
+
+# (area, label, build(ctx) -> queryset). Each mirrors a query issued by the
+# dashboard, the invoice/work order/inventory lists or the storefront.
+HOT_QUERIES = (
+    ("dashboard", "work orders due today", lambda c: WorkOrder.objects.filter(
+        user=c["user"], scheduled_date=c["today"]).exclude(status="completed")),
+    ("dashboard", "open work orders", lambda c: WorkOrder.objects.filter(
+        user=c["user"]).exclude(status="completed").values("pk")),
+    ("dashboard", "recent work orders", lambda c: WorkOrder.objects.filter(
+        user=c["user"]).order_by("-date_created")[:6]),
+    ("dashboard", "30-day work order volume", lambda c: WorkOrder.objects.filter(
+        user=c["user"], scheduled_date__gte=c["today"] - timedelta(days=29), scheduled_date__lte=c["today"],
+    ).values("scheduled_date").annotate(total=Count("id")).order_by("scheduled_date")),
+    ("dashboard", "invoices this week", lambda c: GroupedInvoice.objects.filter(
+        user=c["user"], date__gte=c["today"] - timedelta(days=c["today"].weekday()))),
+    ("dashboard", "unpaid pending invoices", lambda c: PendingInvoice.objects.filter(
+        is_paid=False, grouped_invoice__user=c["user"]).select_related("grouped_invoice")),
+    ("dashboard", "monthly income", lambda c: Payment.objects.filter(invoice__user=c["user"]).annotate(
+        period=TruncMonth("date")).values("period").annotate(total=Sum("amount")).order_by("period")),
+    ("dashboard", "open online orders", lambda c: GroupedInvoice.objects.filter(
+        user=c["user"], is_online_order=True).exclude(online_order_status=PICKED).order_by("-created_at", "-id")[:8]),
+    ("lists", "invoice list page", lambda c: GroupedInvoice.objects.filter(
+        user=c["user"]).order_by("-date", "-id")[:50]),
+    ("lists", "invoice list next page by number", lambda c: GroupedInvoice.objects.filter(
+        seek_filter([("invoice_sequence", True), ("pk", True)], [c["invoice_sequence"], c["invoice_id"]], forward=True),
+        user=c["user"]).order_by("-invoice_sequence", "-id")[:101]),
+    ("lists", "undated invoices page", lambda c: GroupedInvoice.objects.filter(
+        user=c["user"], date__isnull=True).order_by("-id")[:101]),
+    ("lists", "invoices by payment state", lambda c: GroupedInvoice.objects.filter(
+        user=c["user"], payment_state=GroupedInvoice.PAYMENT_STATE_UNPAID).order_by("-date")[:50]),
+    ("lists", "invoices with a balance", lambda c: GroupedInvoice.objects.filter(
+        user=c["user"], amount_due__gt=0)),
+    ("lists", "invoice lines", lambda c: IncomeRecord2.objects.filter(
+        grouped_invoice_id=c["invoice_id"]).order_by("line_order", "id")),
+    ("lists", "invoice payments", lambda c: Payment.objects.filter(
+        invoice_id=c["invoice_id"]).order_by("date")),
+    ("lists", "customer invoices", lambda c: GroupedInvoice.objects.filter(
+        customer_id=c["customer_id"]).order_by("-date")),
+    ("lists", "work order list", lambda c: WorkOrder.objects.filter(
+        user=c["user"], scheduled_date__gte=c["today"] - timedelta(days=90)).order_by("-date_created")[:50]),
+    ("lists", "product stock history", lambda c: InventoryTransaction.objects.filter(
+        product_id=c["product_id"]).order_by("-transaction_date")[:50]),
+    ("lists", "units sold per product", lambda c: InventoryTransaction.objects.filter(
+        product_id__in=c["product_ids"], transaction_type="OUT",
+        transaction_date__gte=c["now"] - timedelta(days=30),
+    ).values("product_id").annotate(sold=Sum("quantity"))),
+    ("storefront", "published products with stock", lambda c: annotate_products_with_stock(
+        Product.objects.filter(user=c["user"], is_published_to_store=True), c["user"]).order_by("name")[:24]),
+    ("storefront", "product stock record", lambda c: ProductStock.objects.filter(
+        product_id=c["product_id"], user=c["user"])),
+    ("storefront", "customer open orders", lambda c: GroupedInvoice.objects.filter(
+        customer_id=c["customer_id"], is_online_order=True,
+    ).exclude(online_order_status=PICKED).order_by("-created_at", "-id")[:25]),
+)
+
+# Tables that only ever hold a handful of rows per tenant; scanning them is fine.
+SMALL_TABLES = {"auth_user", "accounts_profile"}
+
+_SEQ_SCAN_PATTERNS = {
+    "postgresql": re.compile(r"Seq Scan on (\w+)"),
+    # "SCAN t USING [COVERING] INDEX i" walks an index; a bare "SCAN t" reads the table.
+    "sqlite": re.compile(r"\bSCAN (?!CONSTANT ROW|SUBQUERY)(\w+)(?! USING)(?:\s|$)"),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN on the hottest dashboard, list and storefront queries and flag "
+        "sequential scans. By default a throwaway tenant is seeded and rolled back; "
+        "pass --user to explain against an existing account instead. Exits with an "
+        "error when a scan is found so index regressions fail before deploy."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", dest="username", help="Explain against this existing user instead of seeding.")
+        parser.add_argument("--invoices", type=int, default=20_000, help="Invoices to seed (default: 20000).")
+        parser.add_argument("--seed", type=int, default=1, help="Random seed for the generated data.")
+
+    def handle(self, *args, **options):
+        pattern = _SEQ_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f"EXPLAIN parsing is not supported for the {connection.vendor} backend.")
+
+        with transaction.atomic():
+            if options["username"]:
+                try:
+                    user = User.objects.get(username=options["username"])
+                except User.DoesNotExist:
+                    raise CommandError(f"User {options['username']!r} not found.")
+            else:
+                started = time.perf_counter()
+                user = self._generate(random.Random(options["seed"]), max(options["invoices"], 1))
+                self.stdout.write(f"Seeded {options['invoices']} invoices in {time.perf_counter() - started:.1f}s")
+                self._analyze()
+
+            flagged = self._explain_all(self._context(user), pattern, options["verbosity"])
+            transaction.set_rollback(True)
+
+        if flagged:
+            raise CommandError(f"{len(flagged)} hot query(s) use a sequential scan: {', '.join(flagged)}")
+        self.stdout.write(self.style.SUCCESS(f"No sequential scans in {len(HOT_QUERIES)} hot queries."))
+
+    def _explain_all(self, ctx, pattern, verbosity):
+        flagged = []
+        for area, label, build in HOT_QUERIES:
+            plan = build(ctx).explain()
+            scans = sorted({table for table in pattern.findall(plan) if table not in SMALL_TABLES})
+            if scans:
+                flagged.append(label)
+                self.stdout.write(self.style.WARNING(f"SCAN {area:<10} {label:<32} {', '.join(scans)}"))
+            else:
+                self.stdout.write(f"ok   {area:<10} {label}")
+            if verbosity > 1:
+                self.stdout.write("\n".join(f"       {line}" for line in plan.splitlines()))
+        return flagged
+
+    @staticmethod
+    def _context(user):
+        now = timezone.now()
+        product_ids = list(Product.objects.filter(user=user).order_by("pk").values_list("pk", flat=True)[:20])
+        return {
+            "user": user,
+            "now": now,
+            "today": now.date(),
+            "invoice_id": GroupedInvoice.objects.filter(user=user).order_by("-pk").values_list("pk", flat=True).first(),
+            # A position a few rows into the list, as a "next page" cursor would hold.
+            "invoice_sequence": next(iter(
+                GroupedInvoice.objects.filter(user=user).order_by("-invoice_sequence", "-pk")
+                .values_list("invoice_sequence", flat=True)[10:11]
+            ), 0),
+            "customer_id": Customer.objects.filter(user=user).order_by("pk").values_list("pk", flat=True).first(),
+            "product_id": product_ids[0] if product_ids else None,
+            "product_ids": product_ids,
+        }
+
+    @staticmethod
+    def _analyze():
+        """Refresh planner statistics so the seeded volumes are taken into account."""
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                for model in (GroupedInvoice, IncomeRecord2, Payment, PendingInvoice, WorkOrder,
+                              InventoryTransaction, ProductStock, Product, Customer):
+                    cursor.execute(f"ANALYZE {connection.ops.quote_name(model._meta.db_table)}")
+            else:
+                cursor.execute("ANALYZE")
+
+    @staticmethod
+    def _generate(rng, invoice_count):
+        user = User.objects.create(username=f"explain-{int(time.time())}")
+        # Background tenants so per-user filters have something to skip.
+        others = [User.objects.create(username=f"explain-{int(time.time())}-{index}") for index in range(3)]
+        owners = [user] + others
+        today = timezone.now().date()
+        now = timezone.now()
+
+        customers = Customer.objects.bulk_create(
+            [Customer(user=owner, name=f"Customer {owner.pk}-{index}") for owner in owners for index in range(50)]
+        )
+        products = Product.objects.bulk_create(
+            [
+                Product(
+                    user=owner,
+                    sku=f"EXP-{owner.pk}-{index}",
+                    name=f"Part {index}",
+                    cost_price=Decimal("5.00"),
+                    sale_price=Decimal("9.50"),
+                    is_published_to_store=index % 3 == 0,
+                )
+                for owner in owners
+                for index in range(max(invoice_count // 20, 10))
+            ],
+            batch_size=2000,
+        )
+        ProductStock.objects.bulk_create(
+            [ProductStock(product=product, user=product.user, quantity_in_stock=rng.randint(0, 80)) for product in products],
+            batch_size=2000,
+        )
+
+        invoices = GroupedInvoice.objects.bulk_create(
+            [
+                GroupedInvoice(
+                    user=owners[index % len(owners)],
+                    customer=rng.choice(customers),
+                    invoice_number=f"EXP-{index}",
+                    invoice_sequence=index,
+                    date=today - timedelta(days=rng.randint(0, 720)),
+                    total_amount=Decimal("95.00"),
+                    amount_due=Decimal("95.00") if index % 2 else Decimal("0.00"),
+                    amount_paid=Decimal("0.00") if index % 2 else Decimal("95.00"),
+                    payment_state=(
+                        GroupedInvoice.PAYMENT_STATE_UNPAID if index % 2 else GroupedInvoice.PAYMENT_STATE_PAID
+                    ),
+                    is_online_order=index % 7 == 0,
+                    online_order_status=rng.choice(
+                        [c[0] for c in GroupedInvoice.ONLINE_ORDER_STATUS_CHOICES]
+                    ) if index % 7 == 0 else None,
+                )
+                for index in range(invoice_count)
+            ],
+            batch_size=2000,
+        )
+        lines, movements, payments, pending = [], [], [], []
+        for invoice in invoices:
+            for order in range(1, 4):
+                product = rng.choice(products)
+                lines.append(IncomeRecord2(
+                    grouped_invoice=invoice, product=product, job=f"Part {order}", qty=Decimal("1"),
+                    rate=Decimal("9.50"), amount=Decimal("9.50"), line_order=order, date=invoice.date,
+                ))
+                movements.append(InventoryTransaction(
+                    product=product, transaction_type="OUT", quantity=1, user=invoice.user,
+                    transaction_date=now - timedelta(days=rng.randint(0, 720)),
+                ))
+            if invoice.amount_due:
+                pending.append(PendingInvoice(grouped_invoice=invoice))
+            else:
+                payments.append(Payment(invoice=invoice, date=invoice.date, amount=invoice.total_amount, method="Cash"))
+        IncomeRecord2.objects.bulk_create(lines, batch_size=2000)
+        InventoryTransaction.objects.bulk_create(movements, batch_size=2000)
+        Payment.objects.bulk_create(payments, batch_size=2000)
+        PendingInvoice.objects.bulk_create(pending, batch_size=2000)
+
+        WorkOrder.objects.bulk_create(
+            [
+                WorkOrder(
+                    user=owners[index % len(owners)],
+                    customer=rng.choice(customers),
+                    scheduled_date=today - timedelta(days=rng.randint(-14, 365)),
+                    status=rng.choice(["pending", "in_progress", "completed", "completed"]),
+                )
+                for index in range(max(invoice_count // 4, 1))
+            ],
+            batch_size=2000,
+        )
+        return user
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from accounts import invoice_conversion
+
+
+class Command(BaseCommand):
+    help = "Run pending bulk work order invoicing jobs (normally run in a background thread after commit)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=20,
+            help="Maximum number of jobs to run (default: 20).",
+        )
+
+    def handle(self, *args, **options):
+        processed = invoice_conversion.process_pending(limit=options["limit"])
+        self.stdout.write(self.style.SUCCESS(f"Invoice conversion jobs processed: {processed}."))
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts import payment_links
+
+
+class Command(BaseCommand):
+    help = "Build queued invoice payment links, retrying failed requests with backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=100,
+            help="Maximum number of requests to process per pass (default: 100).",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling for due requests instead of exiting after one pass.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5.0,
+            help="Seconds to sleep between passes when --loop is set (default: 5).",
+        )
+        parser.add_argument(
+            "--fake",
+            action="store_true",
+            help="Use the offline fake provider instead of Stripe/Clover.",
+        )
+
+    def handle(self, *args, **options):
+        provider = payment_links.FakePaymentLinkProvider() if options["fake"] else payment_links.get_provider()
+        while True:
+            succeeded, failed = payment_links.process_due(limit=options["limit"], provider=provider)
+            if succeeded or failed or not options["loop"]:
+                message = f"Payment links built: {succeeded}, failed: {failed}."
+                self.stdout.write(self.style.WARNING(message) if failed else self.style.SUCCESS(message))
+            if not options["loop"]:
+                return
+            time.sleep(max(options["interval"], 0.1))
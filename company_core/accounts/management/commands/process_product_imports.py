@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from accounts import product_import
+
+
+class Command(BaseCommand):
+    help = "Run pending product workbook imports (normally run in a background thread after commit)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=20,
+            help="Maximum number of jobs to run (default: 20).",
+        )
+
+    def handle(self, *args, **options):
+        processed = product_import.process_pending(limit=options["limit"])
+        self.stdout.write(self.style.SUCCESS(f"Product import jobs processed: {processed}."))
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import receivables_journal
+from accounts.models import Customer
+
+
+class Command(BaseCommand):
+    help = (
+        "Rewrite the accounts-receivable journal from invoices, payments and customer "
+        "credits, keeping write-offs. Use --check to only report customers whose "
+        "journal balance drifted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Report drifted customers without writing; exits with an error if any are found.",
+        )
+        parser.add_argument(
+            "--user",
+            dest="username",
+            help="Only process customers owned by this username.",
+        )
+        parser.add_argument(
+            "--customer-id",
+            type=int,
+            action="append",
+            help="Only process this customer; repeat for several.",
+        )
+
+    def handle(self, *args, **options):
+        customers = Customer.objects.order_by("pk")
+        if options["username"]:
+            customers = customers.filter(user__username=options["username"])
+        if options["customer_id"]:
+            customers = customers.filter(pk__in=options["customer_id"])
+        customer_ids = list(customers.values_list("pk", flat=True))
+
+        if not options["check"]:
+            written = receivables_journal.rebuild(customer_ids)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Receivables journal rebuilt for {len(customer_ids)} customer(s); {written} entries written."
+                )
+            )
+            return
+
+        drifted = 0
+        for customer_id, journal_balance, source_balance in receivables_journal.iter_drift(customer_ids):
+            drifted += 1
+            self.stdout.write(
+                self.style.WARNING(f"Customer {customer_id}: journal {journal_balance} -> sources {source_balance}")
+            )
+
+        if drifted:
+            raise CommandError(
+                f"{drifted} customer(s) have a stale journal balance. Run rebuild_receivables_journal to fix."
+            )
+        self.stdout.write(self.style.SUCCESS("Receivables journal is consistent."))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from accounts import search_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the invoice, estimate and work order search documents, e.g. after bulk "
+        "updates or imports that bypassed model signals."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--kind",
+            choices=sorted(search_index.BUILDERS),
+            action="append",
+            help="Limit to one document kind; repeat for several (default: all).",
+        )
+        parser.add_argument(
+            "--user-id",
+            type=int,
+            help="Only documents owned by this user.",
+        )
+
+    def handle(self, *args, **options):
+        counts = search_index.rebuild(options["kind"], user_id=options["user_id"])
+        for kind, count in counts.items():
+            self.stdout.write(self.style.SUCCESS(f"{kind}: indexed {count} document(s)."))
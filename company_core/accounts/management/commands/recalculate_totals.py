@@ -1,11 +1,99 @@
-from django.core.management.base import BaseCommand
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from accounts import invoice_totals
 from accounts.models import GroupedInvoice
 
+
+def _init_worker():
+    # Spawned workers start without Django; forked ones reconnect lazily.
+    django.setup()
+
+
+def _rebuild_tenant(user_id, chunk_size, dry_run):
+    queryset = GroupedInvoice.objects.filter(user_id=user_id)
+    if dry_run:
+        drift = [
+            (invoice.pk, invoice.invoice_number, str(stored), str(expected))
+            for invoice, stored, expected in invoice_totals.iter_drift(queryset, chunk_size=chunk_size)
+        ]
+        return user_id, len(drift), drift
+    return user_id, invoice_totals.rebuild(queryset, chunk_size=chunk_size), []
+
+
 class Command(BaseCommand):
-    help = 'Recalculates total amount for all GroupedInvoice instances'
+    help = (
+        "Recalculate invoice totals from their lines with one grouped query and a bulk "
+        "update per chunk. Saves are skipped, so no payment links or save signals "
+        "fire. Use --dry-run to only report invoices whose total is stale."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report stale totals without writing.",
+        )
+        parser.add_argument(
+            "--user",
+            dest="usernames",
+            action="append",
+            help="Only process invoices owned by this username; repeat for several.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Invoices processed per batch (default: 1000).",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Process tenants in this many parallel processes (default: 1).",
+        )
 
-    def handle(self, *args, **kwargs):
+    def handle(self, *args, **options):
         invoices = GroupedInvoice.objects.all()
-        for invoice in invoices:
-            invoice.recalculate_total_amount()
-            self.stdout.write(self.style.SUCCESS(f'Recalculated total for invoice {invoice.id} - ${invoice.total_amount:.2f}'))
\ No newline at end of file
+        if options["usernames"]:
+            invoices = invoices.filter(user__username__in=options["usernames"])
+        user_ids = sorted(invoices.order_by().values_list("user_id", flat=True).distinct())
+        if options["usernames"] and not user_ids:
+            raise CommandError("No invoices found for the given user(s).")
+        chunk_size = max(options["chunk_size"], 1)
+        workers = max(options["workers"], 1)
+        dry_run = options["dry_run"]
+
+        if workers > 1 and connection.vendor == "sqlite" and not dry_run:
+            self.stdout.write(self.style.WARNING("SQLite allows one writer at a time; running in a single process."))
+            workers = 1
+
+        jobs = [(user_id, chunk_size, dry_run) for user_id in user_ids]
+        if workers > 1 and len(jobs) > 1:
+            # Children must not share the parent's database connections.
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                results = pool.map(_rebuild_tenant, *zip(*jobs))
+                total = self._report(results, dry_run)
+        else:
+            total = self._report((_rebuild_tenant(*job) for job in jobs), dry_run)
+
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(f"{total} invoice total(s) would change."))
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f"Recalculated totals for {len(user_ids)} tenant(s); {total} invoice(s) updated.")
+            )
+
+    def _report(self, results, dry_run):
+        total = 0
+        for user_id, count, drift in results:
+            total += count
+            for invoice_id, number, stored, expected in drift:
+                self.stdout.write(self.style.WARNING(f"Invoice {number or invoice_id}: {stored} -> {expected}"))
+            if count and not dry_run:
+                self.stdout.write(f"User {user_id}: {count} invoice(s) updated.")
+        return total
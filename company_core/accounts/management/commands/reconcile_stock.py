@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import stock_ledger
+from accounts.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild ProductStock levels (and mirrored Product quantities) by replaying the "
+        "inventory transaction log. Products without any transactions are left alone. "
+        "Use --check to only report levels that drifted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Report drifted stock levels without writing; exits with an error if any are found.",
+        )
+        parser.add_argument(
+            "--user",
+            dest="username",
+            help="Only process products owned by this username.",
+        )
+        parser.add_argument(
+            "--product-id",
+            type=int,
+            action="append",
+            help="Only process this product; repeat for several.",
+        )
+
+    def handle(self, *args, **options):
+        products = Product.objects.all()
+        if options["username"]:
+            products = products.filter(user__username=options["username"])
+        if options["product_id"]:
+            products = products.filter(pk__in=options["product_id"])
+
+        if not options["check"]:
+            fixed = stock_ledger.rebuild(products)
+            self.stdout.write(self.style.SUCCESS(f"Stock rebuilt from the transaction log; {fixed} level(s) corrected."))
+            return
+
+        drifted = 0
+        for owner_id, product_id, recorded, replayed in stock_ledger.iter_drift(products):
+            drifted += 1
+            self.stdout.write(
+                self.style.WARNING(f"Product {product_id} (stock owner {owner_id}): stock {recorded} -> log {replayed}")
+            )
+
+        if drifted:
+            raise CommandError(f"{drifted} stock level(s) disagree with the transaction log. Run reconcile_stock to fix.")
+        self.stdout.write(self.style.SUCCESS("Stock levels match the transaction log."))
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import receivables
+from accounts.models import GroupedInvoice
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the materialized receivables columns on invoices (amount paid, "
+        "credited, due and payment state) from payments and customer credits. "
+        "Use --check to only report invoices whose stored values drifted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Report drifted invoices without writing; exits with an error if any are found.",
+        )
+        parser.add_argument(
+            "--user",
+            dest="username",
+            help="Only process invoices owned by this username.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Invoices processed per batch (default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        queryset = GroupedInvoice.objects.all()
+        if options["username"]:
+            queryset = queryset.filter(user__username=options["username"])
+        chunk_size = max(options["chunk_size"], 1)
+
+        if not options["check"]:
+            changed = receivables.rebuild(queryset, chunk_size=chunk_size)
+            self.stdout.write(self.style.SUCCESS(f"Receivables rebuilt; {changed} invoice(s) updated."))
+            return
+
+        drifted = 0
+        for invoice_id, stored, expected in receivables.iter_drift(queryset, chunk_size=chunk_size):
+            drifted += 1
+            details = ", ".join(
+                f"{field} {old} -> {new}"
+                for field, old, new in zip(receivables.RECEIVABLE_FIELDS, stored, expected)
+                if old != new
+            )
+            self.stdout.write(self.style.WARNING(f"Invoice {invoice_id}: {details}"))
+
+        if drifted:
+            raise CommandError(f"{drifted} invoice(s) have stale receivables columns. Run repair_receivables to fix.")
+        self.stdout.write(self.style.SUCCESS("Receivables columns are consistent."))
@@ -0,0 +1,33 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import aging
+
+
+class Command(BaseCommand):
+    help = (
+        "Write every business's receivables aging snapshot for a day (default: today) "
+        "and prune snapshots past AGING_SNAPSHOT_RETENTION_DAYS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date",
+            help="Snapshot date as YYYY-MM-DD (default: today).",
+        )
+
+    def handle(self, *args, **options):
+        as_of = None
+        if options["date"]:
+            try:
+                as_of = date.fromisoformat(options["date"])
+            except ValueError as exc:
+                raise CommandError(f"Invalid --date: {options['date']}") from exc
+        result = aging.snapshot_all(as_of)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {result['rows']} aging row(s) for {result['businesses']} business(es); "
+                f"pruned {result['pruned']}."
+            )
+        )
@@ -0,0 +1,41 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import supplier_scorecards
+
+
+class Command(BaseCommand):
+    help = (
+        "Write every business's supplier scorecard snapshot for a day (default: today) "
+        "and prune snapshots past SUPPLIER_SCORECARD_RETENTION_DAYS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date",
+            help="Snapshot date as YYYY-MM-DD (default: today).",
+        )
+        parser.add_argument(
+            "--period-days",
+            type=int,
+            default=supplier_scorecards.DEFAULT_PERIOD_DAYS,
+            help=f"Length of the scoring window in days (default: {supplier_scorecards.DEFAULT_PERIOD_DAYS}).",
+        )
+
+    def handle(self, *args, **options):
+        as_of = None
+        if options["date"]:
+            try:
+                as_of = date.fromisoformat(options["date"])
+            except ValueError as exc:
+                raise CommandError(f"Invalid --date: {options['date']}") from exc
+        if options["period_days"] < 1:
+            raise CommandError("--period-days must be at least 1.")
+        result = supplier_scorecards.snapshot_all(as_of, period_days=options["period_days"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {result['rows']} scorecard row(s) for {result['businesses']} business(es); "
+                f"pruned {result['pruned']}."
+            )
+        )
@@ -0,0 +1,68 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts import pdf_cache, pdf_prerender
+from accounts.models import CustomerCredit, GroupedEstimate, GroupedInvoice, WorkOrder
+
+
+class Command(BaseCommand):
+    help = "Render recent invoice, estimate, work order and credit PDFs into the PDF cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=30,
+            help="Only documents dated within this many days (default: 30).",
+        )
+        parser.add_argument(
+            "--kind",
+            choices=sorted(pdf_prerender.RENDERERS),
+            action="append",
+            help="Limit to one document kind; repeat for several (default: all).",
+        )
+        parser.add_argument(
+            "--user-id",
+            type=int,
+            help="Only documents owned by this user.",
+        )
+        parser.add_argument(
+            "--evict",
+            action="store_true",
+            help="Run LRU eviction on the store before warming.",
+        )
+
+    def handle(self, *args, **options):
+        if not pdf_cache.is_enabled():
+            self.stdout.write(self.style.WARNING("INVOICE_PDF_CACHE_ENABLED is off; nothing to do."))
+            return
+
+        if options["evict"]:
+            store = pdf_cache.get_store()
+            if hasattr(store, "evict"):
+                self.stdout.write(f"Evicted {store.evict()} cached PDF(s).")
+
+        since = timezone.localdate() - timedelta(days=options["days"])
+        querysets = {
+            pdf_prerender.KIND_INVOICE: GroupedInvoice.objects.filter(date__gte=since),
+            pdf_prerender.KIND_ESTIMATE: GroupedEstimate.objects.filter(date__gte=since),
+            pdf_prerender.KIND_WORKORDER: WorkOrder.objects.filter(status="completed", scheduled_date__gte=since),
+            pdf_prerender.KIND_CREDIT: CustomerCredit.objects.filter(date__gte=since),
+        }
+        kinds = options["kind"] or list(querysets)
+
+        for kind in kinds:
+            queryset = querysets[kind]
+            if options["user_id"]:
+                queryset = queryset.filter(user_id=options["user_id"])
+            rendered = failed = 0
+            for object_id in queryset.order_by("pk").values_list("pk", flat=True).iterator():
+                try:
+                    rendered += pdf_prerender.render(kind, object_id)
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f"{kind} {object_id}: {exc}")
+            message = f"{kind}: rendered {rendered} PDF(s), {failed} failed."
+            self.stdout.write(self.style.WARNING(message) if failed else self.style.SUCCESS(message))
@@ -1,12 +1,14 @@
 import os
+import re
 from urllib.parse import quote, unquote
 
 from django.conf import settings
-from django.contrib.auth import logout
+from django.contrib.auth import get_user_model, logout
 from django.http import Http404, HttpResponseRedirect
-from django.urls import NoReverseMatch, reverse
+from django.urls import NoReverseMatch, get_resolver, get_urlconf, reverse
 from django.utils.deprecation import MiddlewareMixin
 
+from . import tenant_scope
 from .activity import set_current_actor, clear_current_actor
 from .utils import get_business_user
 
@@ -76,6 +78,18 @@ class MissingMediaCloudinaryRedirectMiddleware(MiddlewareMixin):
         return HttpResponseRedirect(target_url)
 
 
+class TenantScopeCacheMiddleware(MiddlewareMixin):
+    """Memoize tenant scoping lookups for the lifetime of a single request."""
+
+    def process_request(self, request):
+        tenant_scope.begin_request()
+        return None
+
+    def process_response(self, request, response):
+        tenant_scope.end_request()
+        return response
+
+
 class TrialPeriodMiddleware(MiddlewareMixin):
     """No-op middleware now that subscription requirements have been removed."""
 
@@ -124,6 +138,173 @@ class BusinessImpersonationMiddleware(MiddlewareMixin):
         return response
 
 
+_PORTAL_AUTH_ROUTE_NAMES = (
+    "accounts:password_reset",
+    "accounts:password_reset_done",
+    "accounts:password_reset_complete",
+)
+
+# Public marketing pages stay reachable regardless of the active portal so users
+# can safely browse or land on them after logging out.
+_PORTAL_PUBLIC_ROUTE_NAMES = (
+    "accounts:public_home",
+    "accounts:public_about",
+    "accounts:public_services",
+    "accounts:public_contact",
+    "accounts:public_faq",
+    "accounts:public_booking",
+    "accounts:booking_slots",
+    "accounts:public_emergency",
+    "accounts:public_contact_form",
+    "accounts:service_engine",
+    "accounts:service_transmission",
+    "accounts:service_brakes",
+    "accounts:service_electrical",
+    "accounts:service_maintenance",
+    "accounts:service_dot",
+    "accounts:service_dpf",
+)
+
+_PORTAL_RULES = {
+    "customer": {
+        "prefixes": ("/store/",),
+        "routes": ("accounts:customer_dashboard",),
+    },
+    "mechanic": {
+        "prefixes": ("/mechanic/", "/workorders/fill/"),
+        "routes": ("accounts:mechanic_portal_dashboard",),
+    },
+    "supplier": {
+        "prefixes": ("/supplier/",),
+        "routes": ("accounts:supplier_dashboard",),
+    },
+    "accountant": {
+        "prefixes": ("/accountant-portal/",),
+        "routes": ("accounts:accountant_portal_dashboard",),
+    },
+    # Accountants with "full" or "read_only" access also reach the ledgers.
+    "accountant_ledger": {
+        "prefixes": ("/accountant-portal/", "/grouped-invoices/", "/mech-expenses/"),
+        "routes": (
+            "accounts:accountant_portal_dashboard",
+            "accounts:income_details_by_date",
+            "accounts:expense_details_by_date",
+        ),
+    },
+}
+
+_ACCOUNTANT_LEDGER_ACCESS_LEVELS = ("full", "read_only")
+
+
+class PortalAllowlist:
+    """Allowed exact paths and path prefixes for one portal type."""
+
+    __slots__ = ("exact", "prefix_pattern")
+
+    def __init__(self, exact, prefixes):
+        self.exact = frozenset(exact)
+        prefixes = [prefix for prefix in dict.fromkeys(prefixes) if prefix]
+        self.prefix_pattern = (
+            re.compile("|".join(re.escape(prefix) for prefix in prefixes))
+            if prefixes
+            else None
+        )
+
+    def allows(self, path):
+        if path in self.exact:
+            return True
+        return bool(self.prefix_pattern and self.prefix_pattern.match(path))
+
+
+def _safe_reverse(route_name):
+    try:
+        return reverse(route_name)
+    except NoReverseMatch:
+        # Skip routes that are not configured in this deployment.
+        return None
+
+
+def _build_portal_allowlists():
+    login_url = _safe_reverse("accounts:login") or "/login/"
+    base_exact = {login_url}
+    for route_name in ("accounts:logout",) + _PORTAL_AUTH_ROUTE_NAMES + _PORTAL_PUBLIC_ROUTE_NAMES:
+        url = _safe_reverse(route_name)
+        if url:
+            base_exact.add(url)
+    base_prefixes = (
+        getattr(settings, "STATIC_URL", None) or "/static/",
+        getattr(settings, "MEDIA_URL", None) or "/media/",
+    )
+
+    allowlists = {}
+    for portal, rules in _PORTAL_RULES.items():
+        exact = set(base_exact)
+        for route_name in rules["routes"]:
+            url = _safe_reverse(route_name)
+            if url:
+                exact.add(url)
+        allowlists[portal] = PortalAllowlist(exact, base_prefixes + rules["prefixes"])
+    return login_url, allowlists
+
+
+_compiled_allowlists = None
+
+
+def get_portal_allowlists():
+    """Return ``(login_url, allowlists)`` compiled once per URLconf load.
+
+    The cache is keyed on the active URL resolver (rebuilt by Django whenever
+    the URLconf is reloaded or ``clear_url_caches`` runs) and on the static and
+    media URL settings.
+    """
+    global _compiled_allowlists
+
+    cache_key = (
+        get_resolver(get_urlconf()),
+        getattr(settings, "STATIC_URL", None),
+        getattr(settings, "MEDIA_URL", None),
+    )
+    compiled = _compiled_allowlists
+    if compiled is None or compiled[0] != cache_key:
+        compiled = (cache_key, _build_portal_allowlists())
+        _compiled_allowlists = compiled
+    return compiled[1]
+
+
+def get_portal_type(user):
+    """Return the portal type for a user, or ``None`` for business accounts."""
+
+    def _lookup():
+        row = (
+            get_user_model()
+            .objects.filter(pk=user.pk)
+            .values_list(
+                "customer_portal__id",
+                "mechanic_portal__id",
+                "supplier_portal__id",
+                "accountant_portal__id",
+                "accountant_portal__accountant_access_level",
+            )
+            .first()
+        )
+        if not row:
+            return None
+        customer_id, mechanic_id, supplier_id, accountant_id, access_level = row
+        if customer_id:
+            return "customer"
+        if mechanic_id:
+            return "mechanic"
+        if supplier_id:
+            return "supplier"
+        if accountant_id:
+            if access_level in _ACCOUNTANT_LEDGER_ACCESS_LEVELS:
+                return "accountant_ledger"
+            return "accountant"
+        return None
+
+    return tenant_scope.cached_lookup("portal_type", user.pk, _lookup)
+
+
 class CustomerPortalIsolationMiddleware(MiddlewareMixin):
     """Prevent non-business portals (customer, mechanic, supplier) from hitting business routes."""
 
@@ -132,117 +313,22 @@ class CustomerPortalIsolationMiddleware(MiddlewareMixin):
         if not user or not user.is_authenticated:
             return None
 
-        path = request.path_info or "/"
-
-        portal = None
-        if getattr(user, "customer_portal", None):
-            portal = "customer"
-        elif getattr(user, "mechanic_portal", None):
-            portal = "mechanic"
-        elif getattr(user, "supplier_portal", None):
-            portal = "supplier"
-        elif getattr(user, "accountant_portal", None):
-            portal = "accountant"
+        portal = get_portal_type(user)
 
         # Only enforce for non-business portal users
         if not portal:
             return None
 
-        # Let portal users reach the login page so they can switch accounts cleanly.
-        login_url = None
-        try:
-            login_url = reverse("accounts:login")
-        except NoReverseMatch:
-            login_url = "/login/"
+        path = request.path_info or "/"
+        login_url, allowlists = get_portal_allowlists()
 
-        if login_url and path == login_url:
+        # Let portal users reach the login page so they can switch accounts cleanly.
+        if path == login_url:
             logout(request)
             return None
 
-        allowed_prefixes = [
-            getattr(settings, "STATIC_URL", None) or "/static/",
-            getattr(settings, "MEDIA_URL", None) or "/media/",
-        ]
-        allowed_exact = {reverse("accounts:logout")}
-        if login_url:
-            allowed_exact.add(login_url)
-        for auth_route in (
-            "accounts:password_reset",
-            "accounts:password_reset_done",
-            "accounts:password_reset_complete",
-        ):
-            try:
-                allowed_exact.add(reverse(auth_route))
-            except NoReverseMatch:
-                pass
-
-        # Allow public marketing pages regardless of the active portal so users can
-        # safely browse or land on them after logging out.
-        public_route_names = [
-            "accounts:public_home",
-            "accounts:public_about",
-            "accounts:public_services",
-            "accounts:public_contact",
-            "accounts:public_faq",
-            "accounts:public_booking",
-            "accounts:booking_slots",
-            "accounts:public_emergency",
-            "accounts:public_contact_form",
-            "accounts:service_engine",
-            "accounts:service_transmission",
-            "accounts:service_brakes",
-            "accounts:service_electrical",
-            "accounts:service_maintenance",
-            "accounts:service_dot",
-            "accounts:service_dpf",
-        ]
-
-        for route_name in public_route_names:
-            try:
-                allowed_exact.add(reverse(route_name))
-            except NoReverseMatch:
-                # Skip routes that are not configured in this deployment.
-                pass
-
-        if portal == "customer":
-            allowed_prefixes.append("/store/")
-            allowed_exact.add(reverse("accounts:customer_dashboard"))
-        elif portal == "mechanic":
-            allowed_prefixes.append("/mechanic/")
-            allowed_prefixes.append("/workorders/fill/")
-            allowed_exact.add(reverse("accounts:mechanic_portal_dashboard"))
-        elif portal == "supplier":
-            allowed_prefixes.append("/supplier/")
-            # Supplier portal default dashboard
-            try:
-                allowed_exact.add(reverse("accounts:supplier_dashboard"))
-            except Exception:
-                pass
-        elif portal == "accountant":
-            allowed_prefixes.append("/accountant-portal/")
-            try:
-                allowed_exact.add(reverse("accounts:accountant_portal_dashboard"))
-            except Exception:
-                pass
-            accountant_profile = getattr(user, "accountant_portal", None)
-            if accountant_profile and getattr(accountant_profile, "accountant_access_level", "") in ("full", "read_only"):
-                try:
-                    allowed_exact.add(reverse("accounts:income_details_by_date"))
-                except Exception:
-                    pass
-                try:
-                    allowed_exact.add(reverse("accounts:expense_details_by_date"))
-                except Exception:
-                    pass
-                allowed_prefixes.append("/grouped-invoices/")
-                allowed_prefixes.append("/mech-expenses/")
-
-        if path in allowed_exact:
+        if allowlists[portal].allows(path):
             return None
 
-        for prefix in allowed_prefixes:
-            if prefix and path.startswith(prefix):
-                return None
-
         # Deny everything else to keep business templates inaccessible.
         raise Http404
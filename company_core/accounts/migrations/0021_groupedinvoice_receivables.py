@@ -0,0 +1,98 @@
+# Generated by Django 4.2.2 on 2026-10-16 18:40
+
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+CENT = Decimal('0.01')
+TOLERANCE = Decimal('0.01')
+
+
+def _payment_state(total_amount, amount_paid):
+    # Mirrors GroupedInvoice.calculate_payment_state.
+    if amount_paid <= TOLERANCE:
+        return 'unpaid'
+    if amount_paid + TOLERANCE < total_amount:
+        return 'partial'
+    return 'paid'
+
+
+def backfill_receivables(apps, schema_editor):
+    GroupedInvoice = apps.get_model('accounts', 'GroupedInvoice')
+    Payment = apps.get_model('accounts', 'Payment')
+    CustomerCreditItem = apps.get_model('accounts', 'CustomerCreditItem')
+
+    paid = {
+        row['invoice_id']: row['total'] or Decimal('0.00')
+        for row in Payment.objects.order_by().values('invoice_id').annotate(total=Sum('amount'))
+    }
+    credited = defaultdict(lambda: Decimal('0.00'))
+    credit_rows = CustomerCreditItem.objects.filter(source_invoice__isnull=False).values_list(
+        'source_invoice_id', 'amount', 'tax_paid', 'customer_credit__tax_included'
+    )
+    for invoice_id, amount, tax_paid, tax_included in credit_rows:
+        line_total = (amount or Decimal('0.00')).quantize(CENT, rounding=ROUND_HALF_UP)
+        if not tax_included:
+            line_total += (tax_paid or Decimal('0.00')).quantize(CENT, rounding=ROUND_HALF_UP)
+        credited[invoice_id] += line_total
+
+    batch = []
+    invoices = GroupedInvoice.objects.only('pk', 'total_amount').order_by('pk').iterator(chunk_size=2000)
+    for invoice in invoices:
+        total = Decimal(invoice.total_amount or 0).quantize(CENT, rounding=ROUND_HALF_UP)
+        invoice.amount_paid = Decimal(paid.get(invoice.pk, 0)).quantize(CENT, rounding=ROUND_HALF_UP)
+        invoice.amount_credited = credited[invoice.pk].quantize(CENT, rounding=ROUND_HALF_UP)
+        invoice.amount_due = total - invoice.amount_paid - invoice.amount_credited
+        invoice.payment_state = _payment_state(total, invoice.amount_paid)
+        batch.append(invoice)
+        if len(batch) >= 1000:
+            GroupedInvoice.objects.bulk_update(
+                batch, ['amount_paid', 'amount_credited', 'amount_due', 'payment_state']
+            )
+            batch = []
+    if batch:
+        GroupedInvoice.objects.bulk_update(
+            batch, ['amount_paid', 'amount_credited', 'amount_due', 'payment_state']
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0020_paymentlinkrequest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='groupedinvoice',
+            name='amount_credited',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='groupedinvoice',
+            name='amount_due',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='groupedinvoice',
+            name='amount_paid',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='groupedinvoice',
+            name='payment_state',
+            field=models.CharField(choices=[('unpaid', 'Unpaid'), ('partial', 'Partially Paid'), ('paid', 'Paid')], default='unpaid', editable=False, max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='groupedinvoice',
+            index=models.Index(fields=['user', 'payment_state', 'date'], name='invoice_user_state_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='groupedinvoice',
+            index=models.Index(fields=['user', 'amount_due'], name='invoice_user_amount_due_idx'),
+        ),
+        migrations.RunPython(backfill_receivables, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.2 on 2026-10-16 18:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('accounts', '0021_groupedinvoice_receivables'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceNumberSequence',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='invoice_number_sequence', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('next_value', models.PositiveBigIntegerField(default=150)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
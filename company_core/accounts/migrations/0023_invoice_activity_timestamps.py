@@ -0,0 +1,68 @@
+# Generated by Django 4.2.2 on 2026-10-16 19:09
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+ACTIVITY_FIELDS = {
+    'email_sent': 'last_email_sent_at',
+    'email_opened': 'last_email_opened_at',
+    'viewed': 'last_portal_viewed_at',
+}
+
+
+def backfill_activity_timestamps(apps, schema_editor):
+    GroupedInvoice = apps.get_model('accounts', 'GroupedInvoice')
+    InvoiceActivity = apps.get_model('accounts', 'InvoiceActivity')
+
+    latest = {}
+    rows = (
+        InvoiceActivity.objects.filter(event_type__in=list(ACTIVITY_FIELDS))
+        .order_by()
+        .values('invoice_id', 'event_type')
+        .annotate(latest=Max('created_at'))
+    )
+    for row in rows:
+        latest.setdefault(row['invoice_id'], {})[ACTIVITY_FIELDS[row['event_type']]] = row['latest']
+
+    invoice_ids = sorted(latest)
+    for start in range(0, len(invoice_ids), 1000):
+        batch = list(GroupedInvoice.objects.filter(pk__in=invoice_ids[start:start + 1000]).only('pk'))
+        for invoice in batch:
+            for field, value in latest[invoice.pk].items():
+                setattr(invoice, field, value)
+        GroupedInvoice.objects.bulk_update(batch, list(ACTIVITY_FIELDS.values()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0022_invoicenumbersequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='groupedinvoice',
+            name='last_email_opened_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='groupedinvoice',
+            name='last_email_sent_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='groupedinvoice',
+            name='last_portal_viewed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='groupedinvoice',
+            index=models.Index(fields=['user', 'date', 'id'], name='invoice_user_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='groupedinvoice',
+            index=models.Index(fields=['user', 'total_amount', 'id'], name='invoice_user_total_id_idx'),
+        ),
+        migrations.RunPython(backfill_activity_timestamps, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 4.2.2 on 2026-10-16 19:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "ALTER TABLE accounts_searchdocument ADD COLUMN search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple', content)) STORED",
+    "CREATE INDEX search_document_vector_idx ON accounts_searchdocument USING gin (search_vector)",
+    "CREATE INDEX search_document_trgm_idx ON accounts_searchdocument USING gin (content gin_trgm_ops)",
+]
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS search_document_trgm_idx",
+    "DROP INDEX IF EXISTS search_document_vector_idx",
+    "ALTER TABLE accounts_searchdocument DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE accounts_searchdocument_fts USING fts5("
+    "content, content='accounts_searchdocument', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER accounts_searchdocument_fts_ai AFTER INSERT ON accounts_searchdocument BEGIN "
+    "INSERT INTO accounts_searchdocument_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER accounts_searchdocument_fts_ad AFTER DELETE ON accounts_searchdocument BEGIN "
+    "INSERT INTO accounts_searchdocument_fts(accounts_searchdocument_fts, rowid, content) "
+    "VALUES ('delete', old.id, old.content); END",
+    "CREATE TRIGGER accounts_searchdocument_fts_au AFTER UPDATE OF content ON accounts_searchdocument BEGIN "
+    "INSERT INTO accounts_searchdocument_fts(accounts_searchdocument_fts, rowid, content) "
+    "VALUES ('delete', old.id, old.content); "
+    "INSERT INTO accounts_searchdocument_fts(rowid, content) VALUES (new.id, new.content); END",
+]
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS accounts_searchdocument_fts_au",
+    "DROP TRIGGER IF EXISTS accounts_searchdocument_fts_ad",
+    "DROP TRIGGER IF EXISTS accounts_searchdocument_fts_ai",
+    "DROP TABLE IF EXISTS accounts_searchdocument_fts",
+]
+
+
+def _sqlite_has_trigram_fts(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp.accounts_fts_probe USING fts5(content, tokenize='trigram')")
+        except Exception:
+            return False
+        cursor.execute("DROP TABLE temp.accounts_fts_probe")
+    return True
+
+
+def create_search_structures(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        statements = POSTGRES_FORWARD
+    elif vendor == 'sqlite' and _sqlite_has_trigram_fts(schema_editor):
+        statements = SQLITE_FORWARD
+    else:
+        # Other backends search the plain text with LIKE.
+        return
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_structures(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {'postgresql': POSTGRES_REVERSE, 'sqlite': SQLITE_REVERSE}.get(vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def backfill_search_documents(apps, schema_editor):
+    from accounts import search_index
+
+    search_index.rebuild(get_model=lambda name: apps.get_model('accounts', name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('accounts', '0023_invoice_activity_timestamps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('invoice', 'Invoice'), ('estimate', 'Estimate'), ('workorder', 'Work order')], max_length=16)),
+                ('object_id', models.PositiveIntegerField()),
+                ('content', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_documents', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'kind'], name='search_document_user_kind_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='searchdocument',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='unique_search_document'),
+        ),
+        migrations.RunPython(create_search_structures, drop_search_structures),
+        migrations.RunPython(backfill_search_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.2 on 2026-10-16 19:58
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('accounts', '0024_search_documents'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReceivablesAgingSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateField()),
+                ('current', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('overdue_1_30', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('overdue_31_60', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('overdue_61_90', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('overdue_90_plus', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('total_due', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('overdue_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('invoice_count', models.PositiveIntegerField(default=0)),
+                ('overdue_invoice_count', models.PositiveIntegerField(default=0)),
+                ('oldest_due_invoice_date', models.DateField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('customer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='aging_snapshots', to='accounts.customer')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aging_snapshots', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['as_of'], name='aging_snapshot_as_of_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='receivablesagingsnapshot',
+            constraint=models.UniqueConstraint(condition=models.Q(('customer__isnull', False)), fields=('user', 'as_of', 'customer'), name='unique_aging_snapshot_per_customer'),
+        ),
+        migrations.AddConstraint(
+            model_name='receivablesagingsnapshot',
+            constraint=models.UniqueConstraint(condition=models.Q(('customer__isnull', True)), fields=('user', 'as_of'), name='unique_aging_snapshot_unassigned'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.2 on 2026-10-16 20:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_receivables_journal(apps, schema_editor):
+    from accounts import receivables_journal
+
+    receivables_journal.rebuild(get_model=lambda name: apps.get_model('accounts', name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('accounts', '0025_receivables_aging_snapshots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReceivablesJournalEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_type', models.CharField(choices=[('invoice', 'Invoice'), ('payment', 'Payment'), ('credit', 'Credit'), ('write_off', 'Write-off')], max_length=16)),
+                ('document_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('source_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('reference', models.CharField(blank=True, default='', max_length=100)),
+                ('memo', models.CharField(blank=True, default='', max_length=255)),
+                ('entry_date', models.DateField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='journal_entries', to='accounts.customer')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='receivables_journal_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['customer', 'entry_date', 'id'], name='ar_journal_customer_date_idx'),
+                    models.Index(fields=['customer', '-id'], name='ar_journal_customer_latest_idx'),
+                    models.Index(fields=['entry_type', 'document_id'], name='ar_journal_document_idx'),
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_receivables_journal, migrations.RunPython.noop),
+    ]
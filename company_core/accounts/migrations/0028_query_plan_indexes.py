@@ -0,0 +1,47 @@
+# Generated by Django 4.2.2 on 2026-10-16 20:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0027_invoice_conversion_jobs'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='groupedinvoice',
+            index=models.Index(
+                fields=['user', 'is_online_order', 'online_order_status'],
+                name='invoice_user_online_status_idx',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='incomerecord2',
+            index=models.Index(fields=['grouped_invoice', 'line_order', 'id'], name='income_invoice_line_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorytransaction',
+            index=models.Index(
+                fields=['product', 'transaction_type', 'transaction_date'],
+                name='inv_txn_product_type_date_idx',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['invoice', 'date'], name='payment_invoice_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pendinginvoice',
+            index=models.Index(fields=['is_paid'], name='pending_invoice_is_paid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workorder',
+            index=models.Index(fields=['user', 'scheduled_date', 'status'], name='workorder_user_sched_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workorder',
+            index=models.Index(fields=['user', 'date_created'], name='workorder_user_created_idx'),
+        ),
+    ]
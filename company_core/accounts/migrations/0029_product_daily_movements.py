@@ -0,0 +1,35 @@
+# Generated by Django 4.2.2 on 2026-10-16 20:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('accounts', '0028_query_plan_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductDailyMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('qty_in', models.PositiveIntegerField(default=0)),
+                ('qty_out', models.PositiveIntegerField(default=0)),
+                ('last_out_at', models.DateTimeField(blank=True, null=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_movements', to='accounts.product')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_daily_movements', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'date'], name='product_movement_user_date_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='productdailymovement',
+            constraint=models.UniqueConstraint(fields=('product', 'user', 'date'), name='unique_product_daily_movement'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.2 on 2026-10-16 21:40
+
+from django.db import migrations, models
+
+
+def backfill_invoice_sequence(apps, schema_editor):
+    GroupedInvoice = apps.get_model('accounts', 'GroupedInvoice')
+
+    def sequence_from_number(invoice_number):
+        # Same rule as GroupedInvoice.sequence_from_number.
+        _, dash, tail = (invoice_number or '').rpartition('-')
+        return int(tail) if dash and tail.isascii() and tail.isdigit() else 0
+
+    rows = (
+        GroupedInvoice.objects.exclude(invoice_number__isnull=True)
+        .order_by('pk')
+        .values_list('pk', 'invoice_number')
+    )
+    batch = []
+    for pk, invoice_number in rows.iterator(chunk_size=2000):
+        sequence = sequence_from_number(invoice_number)
+        if sequence:
+            batch.append(GroupedInvoice(pk=pk, invoice_sequence=sequence))
+        if len(batch) >= 1000:
+            GroupedInvoice.objects.bulk_update(batch, ['invoice_sequence'])
+            batch = []
+    if batch:
+        GroupedInvoice.objects.bulk_update(batch, ['invoice_sequence'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0030_product_import_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='groupedinvoice',
+            name='invoice_sequence',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_invoice_sequence, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='groupedinvoice',
+            index=models.Index(fields=['user', 'invoice_sequence', 'id'], name='invoice_user_sequence_id_idx'),
+        ),
+    ]
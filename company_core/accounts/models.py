@@ -21,6 +21,7 @@ from django.urls import reverse
 from datetime import timedelta
 from django.db.models import F, Q, Sum, ExpressionWrapper, DecimalField, Max
 from django.db.models.functions import Lower
+from django.dispatch import Signal
 from cryptography.fernet import Fernet, InvalidToken
 
 
@@ -28,6 +29,11 @@ from cryptography.fernet import Fernet, InvalidToken
 stripe.api_key = settings.STRIPE_SECRET_KEY
 logger = logging.getLogger(__name__)
 
+# Sent by GroupedInvoice.save_lines() once a batch of lines has been written with
+# bulk queries (which skip the per-row post_save receivers).
+# Arguments: ``invoice`` and ``lines`` (the saved IncomeRecord2 instances).
+invoice_lines_saved = Signal()
+
 # Constants
 PROVINCE_CHOICES = [
     ('AB', 'Alberta'),
@@ -1704,6 +1710,14 @@ class GroupedInvoice(models.Model):
         (ONLINE_ORDER_STATUS_READY, "Ready"),
         (ONLINE_ORDER_STATUS_PICKED, "Picked"),
     )
+    PAYMENT_STATE_UNPAID = "unpaid"
+    PAYMENT_STATE_PARTIAL = "partial"
+    PAYMENT_STATE_PAID = "paid"
+    PAYMENT_STATE_CHOICES = (
+        (PAYMENT_STATE_UNPAID, "Unpaid"),
+        (PAYMENT_STATE_PARTIAL, "Partially Paid"),
+        (PAYMENT_STATE_PAID, "Paid"),
+    )
 
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     stripe_invoice_id = models.CharField(
@@ -1727,7 +1741,26 @@ class GroupedInvoice(models.Model):
     # NOTE: invoice numbers must be unique per business (user), not globally.
     # Global uniqueness prevents importing/operating multiple businesses that use the same numbering scheme.
     invoice_number = models.CharField(max_length=20, blank=True, null=True, editable=False)
+    # Numeric tail of invoice_number ("INV-7-0042" -> 42), set by save() so the
+    # invoice list can sort and keyset-paginate on an index.
+    invoice_sequence = models.PositiveBigIntegerField(default=0, editable=False)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, editable=False, default=0)
+    # Receivables snapshot kept in step with Payment and CustomerCreditItem writes
+    # by accounts.receivables; `manage.py repair_receivables` rebuilds it.
+    amount_paid = models.DecimalField(max_digits=10, decimal_places=2, editable=False, default=Decimal('0.00'))
+    amount_credited = models.DecimalField(max_digits=10, decimal_places=2, editable=False, default=Decimal('0.00'))
+    amount_due = models.DecimalField(max_digits=10, decimal_places=2, editable=False, default=Decimal('0.00'))
+    payment_state = models.CharField(
+        max_length=10,
+        choices=PAYMENT_STATE_CHOICES,
+        default=PAYMENT_STATE_UNPAID,
+        editable=False,
+    )
+    # Latest InvoiceActivity timestamps, written by invoice_activity.log_invoice_activity
+    # so the invoice list does not run a subquery per event type.
+    last_email_sent_at = models.DateTimeField(null=True, blank=True, editable=False)
+    last_email_opened_at = models.DateTimeField(null=True, blank=True, editable=False)
+    last_portal_viewed_at = models.DateTimeField(null=True, blank=True, editable=False)
     stripe_payment_link = models.URLField(max_length=500, null=True, blank=True)
     stripe_subscription_link = models.URLField(max_length=500, null=True, blank=True)
     clover_order_id = models.CharField(
@@ -1807,19 +1840,24 @@ class GroupedInvoice(models.Model):
         Guarantee that stock-out transactions exist for every product used on this invoice.
         This backfills any missing inventory postings (e.g., if lines were created in bulk
         without hitting IncomeRecord2.save) while avoiding duplicate deductions.
+
+        Lines, posted totals and products are each read with one query and the
+        missing postings go to the stock ledger as one batch, so an invoice that
+        is already fully posted costs two queries.
         """
         invoice_label = self.invoice_number or f"Invoice {self.pk}"
         expected_by_product = {}
 
-        for item in self.income_records.all():
-            if not item.product_id or item.qty is None or item.qty <= 0:
-                continue
-            if getattr(item.product, 'item_type', 'inventory') != 'inventory':
-                continue
-            qty_int = int(Decimal(str(item.qty)).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+        line_rows = self.income_records.filter(
+            product__isnull=False,
+            product__item_type='inventory',
+            qty__gt=0,
+        ).values_list('product_id', 'qty')
+        for product_id, qty in line_rows:
+            qty_int = int(Decimal(str(qty)).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
             if qty_int <= 0:
                 continue
-            expected_by_product[item.product_id] = expected_by_product.get(item.product_id, 0) + qty_int
+            expected_by_product[product_id] = expected_by_product.get(product_id, 0) + qty_int
 
         if not expected_by_product:
             return
@@ -1839,52 +1877,170 @@ class GroupedInvoice(models.Model):
         )
         posted = {row["product_id"]: int(row.get("total_qty") or 0) for row in existing}
 
-        for product_id, expected_qty in expected_by_product.items():
-            missing_qty = expected_qty - posted.get(product_id, 0)
-            if missing_qty <= 0:
-                continue
+        missing_by_product = {
+            product_id: expected_qty - posted.get(product_id, 0)
+            for product_id, expected_qty in expected_by_product.items()
+            if expected_qty > posted.get(product_id, 0)
+        }
+        if not missing_by_product:
+            return
 
-            owner_user = self.user
-            try:
-                product_obj = Product.objects.select_related("user").get(pk=product_id)
-                if owner_user is None:
-                    owner_user = product_obj.user
-            except Product.DoesNotExist:
-                product_obj = None
-                owner_user = self.user
-
-            # Auto-top-up inventory to avoid insufficient stock errors when posting OUT.
-            if product_obj:
-                stock_owner = _resolve_stock_owner(owner_user, product_obj)
-                stock_record, _ = ProductStock.objects.get_or_create(
-                    product=product_obj,
-                    user=stock_owner,
-                    defaults={
-                        "quantity_in_stock": 0,
-                        "reorder_level": 0,
-                        "max_stock_level": product_obj.max_stock_level or 0,
-                    },
+        from . import stock_ledger
+
+        products = Product.objects.select_related("user").in_bulk(missing_by_product.keys())
+        # The ledger tops up missing stock before each OUT posting.
+        stock_ledger.post(
+            [
+                InventoryTransaction(
+                    product=products[product_id],
+                    transaction_type="OUT",
+                    quantity=missing_qty,
+                    transaction_date=timezone.now(),
+                    remarks=remarks,
+                    user=self.user or products[product_id].user,
                 )
-                current_stock = stock_record.quantity_in_stock or 0
-                if current_stock < missing_qty:
-                    replenish_qty = missing_qty - current_stock
-                    InventoryTransaction.objects.create(
-                        product_id=product_id,
-                        transaction_type="IN",
-                        quantity=replenish_qty,
-                        transaction_date=timezone.now(),
-                        remarks=f"Auto restock for {invoice_label}",
-                        user=owner_user,
-                    )
+                for product_id, missing_qty in missing_by_product.items()
+                if product_id in products
+            ],
+            restock_remarks=f"Auto restock for {invoice_label}",
+        )
 
-            InventoryTransaction.objects.create(
-                product_id=product_id,
-                transaction_type="OUT",
-                quantity=missing_qty,
-                transaction_date=timezone.now(),
-                remarks=remarks,
-                user=owner_user,
-            )
+    def save_lines(self, lines, deleted=()):
+        """
+        Persist a batch of IncomeRecord2 lines for this invoice.
+
+        ``IncomeRecord2.save`` recalculates the invoice total (and payment link),
+        syncs fee lines, posts inventory and schedules job history for every
+        row. This writes the whole batch with bulk queries and runs each of
+        those side effects once. ``deleted`` lines are removed and their stock
+        returned. Returns the saved lines, including any generated fee lines.
+        """
+        lines = [line for line in lines if line is not None]
+        deleted = [line for line in deleted if line is not None and line.pk]
+        if not lines and not deleted:
+            return []
+
+        fee_line_types = [INVOICE_LINE_TYPE_CORE, INVOICE_LINE_TYPE_ENV]
+        update_fields = [
+            field.name for field in IncomeRecord2._meta.concrete_fields if not field.primary_key
+        ]
+
+        with transaction.atomic():
+            product_ids = set()
+            for line in lines:
+                line.grouped_invoice = self
+                product_ids.update(filter(None, (line.product_id, line._original_product_id)))
+            for line in deleted:
+                product_ids.update(filter(None, (line._original_product_id,)))
+            products = Product.objects.select_related("user").in_bulk(product_ids)
+            for line in lines:
+                if line.product_id and not IncomeRecord2.product.is_cached(line):
+                    line.product = products.get(line.product_id)
+
+            new_lines = [line for line in lines if line.pk is None]
+            changed_lines = [line for line in lines if line.pk is not None]
+            for line in lines:
+                line._apply_calculated_fields()
+
+            unordered = [line for line in new_lines if line.line_order is None or line.line_order <= 0]
+            if unordered:
+                next_order = max(
+                    self.income_records.aggregate(max_order=Max('line_order')).get('max_order') or 0,
+                    max((line.line_order or 0 for line in lines), default=0),
+                )
+                for line in unordered:
+                    next_order += 1
+                    line.line_order = next_order
+
+            # Same postings IncomeRecord2.save/delete would make, summed per product.
+            postings = {}
+
+            def _queue(transaction_type, product_id, quantity, remarks_suffix):
+                product = products.get(product_id)
+                if product is None or quantity is None or quantity <= 0:
+                    return
+                if getattr(product, 'item_type', 'inventory') != 'inventory':
+                    return
+                qty_int = int(Decimal(str(quantity)).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+                if qty_int <= 0:
+                    return
+                key = (transaction_type, product_id, remarks_suffix)
+                postings[key] = postings.get(key, 0) + qty_int
+
+            for line in lines:
+                if line.line_type in fee_line_types:
+                    continue
+                original_qty = ensure_decimal(line._original_qty)
+                current_qty = ensure_decimal(line.qty)
+                if line._original_product_id == line.product_id and original_qty == current_qty:
+                    continue
+                if line._original_product_id is not None:
+                    _queue('IN', line._original_product_id, original_qty, "Reversed")
+                if line.product_id is not None:
+                    _queue('OUT', line.product_id, current_qty, "Sold")
+            for line in deleted:
+                if line.line_type not in fee_line_types and line._original_product_id is not None:
+                    _queue('IN', line._original_product_id, ensure_decimal(line._original_qty), "Deletion Reversal")
+
+            if deleted:
+                deleted_ids = [line.pk for line in deleted]
+                IncomeRecord2.objects.filter(
+                    Q(pk__in=deleted_ids) | Q(parent_line_id__in=deleted_ids, line_type__in=fee_line_types)
+                ).delete()
+            if new_lines:
+                IncomeRecord2.objects.bulk_create(new_lines)
+            if changed_lines:
+                IncomeRecord2.objects.bulk_update(changed_lines, update_fields)
+
+            ledger_rows = []
+            for (transaction_type, product_id, remarks_suffix), quantity in postings.items():
+                product = products[product_id]
+                if remarks_suffix == "Sold":
+                    remarks = f"Sold with invoice {self.invoice_number}"
+                else:
+                    remarks = f"Invoice {self.invoice_number} - {remarks_suffix}"
+                ledger_rows.append(InventoryTransaction(
+                    product=product,
+                    transaction_type=transaction_type,
+                    quantity=quantity,
+                    transaction_date=timezone.now(),
+                    remarks=remarks,
+                    user=self.user or product.user,
+                ))
+            if ledger_rows:
+                from . import stock_ledger
+
+                stock_ledger.post(ledger_rows)
+
+            fee_parents = [line for line in lines if line._should_sync_fee_lines()]
+            new_fees, changed_fees, stale_fees = [], [], []
+            if fee_parents:
+                existing_fees = {}
+                for fee in IncomeRecord2.objects.filter(parent_line__in=fee_parents, line_type__in=fee_line_types):
+                    existing_fees.setdefault(fee.parent_line_id, {}).setdefault(fee.line_type, []).append(fee)
+                for line in fee_parents:
+                    created, changed, stale = line._plan_fee_lines(existing_fees.get(line.pk, {}))
+                    new_fees.extend(created)
+                    changed_fees.extend(changed)
+                    stale_fees.extend(stale)
+                for fee in new_fees + changed_fees:
+                    fee.grouped_invoice = self
+                    fee._apply_calculated_fields()
+                if stale_fees:
+                    IncomeRecord2.objects.filter(pk__in=[fee.pk for fee in stale_fees]).delete()
+                if new_fees:
+                    IncomeRecord2.objects.bulk_create(new_fees)
+                if changed_fees:
+                    IncomeRecord2.objects.bulk_update(changed_fees, update_fields)
+
+            saved_lines = lines + new_fees + changed_fees
+            for line in saved_lines:
+                line._original_product_id = line.product_id
+                line._original_qty = ensure_decimal(line.qty)
+
+            self.recalculate_total_amount()
+            invoice_lines_saved.send(sender=GroupedInvoice, invoice=self, lines=saved_lines)
+        return saved_lines
 
 
     def total_paid(self):
@@ -1898,37 +2054,39 @@ class GroupedInvoice(models.Model):
         annotated_total = getattr(self, 'credit_total', None)
         if annotated_total is not None:
             return Decimal(str(annotated_total))
-        total = Decimal('0.00')
-        items = self.customer_credit_items.select_related('customer_credit')
-        for item in items:
-            line_total = ensure_decimal(item.amount)
-            if item.customer_credit and not item.customer_credit.tax_included:
-                line_total += ensure_decimal(item.tax_paid)
-            total += line_total
-        return total
+        return self.amount_credited or Decimal('0.00')
 
     def balance_due(self):
         total_amount = self.total_amount or Decimal('0.00')
-        return total_amount - self.total_paid() - self.total_credit_amount
-
-    @property
-    def payment_status(self):
-        total_paid = self.total_paid()
-        total_amount = self.total_amount or Decimal('0.00')
+        return total_amount - (self.amount_paid or Decimal('0.00')) - self.total_credit_amount
 
-        # Round values to 2 decimal places
-        total_paid = total_paid.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        total_amount = total_amount.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    @staticmethod
+    def calculate_payment_state(total_amount, amount_paid):
+        total_paid = ensure_decimal(amount_paid).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        total_amount = ensure_decimal(total_amount).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
 
         # Define a tolerance
         tolerance = Decimal('0.01')
 
         if total_paid <= Decimal('0.00') + tolerance:
-            return 'Unpaid'
+            return GroupedInvoice.PAYMENT_STATE_UNPAID
         elif total_paid + tolerance < total_amount:
-            return 'Partially Paid'
+            return GroupedInvoice.PAYMENT_STATE_PARTIAL
         else:
-            return 'Paid'
+            return GroupedInvoice.PAYMENT_STATE_PAID
+
+    def sync_receivables_fields(self):
+        """Derive amount_due and payment_state from the stored paid/credited amounts."""
+        self.amount_due = (
+            ensure_decimal(self.total_amount)
+            - ensure_decimal(self.amount_paid)
+            - ensure_decimal(self.amount_credited)
+        ).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        self.payment_state = self.calculate_payment_state(self.total_amount, self.amount_paid)
+
+    @property
+    def payment_status(self):
+        return self.get_payment_state_display()
 
     def get_payment_link_provider(self):
         profile = getattr(self.user, "profile", None)
@@ -1987,43 +2145,29 @@ class GroupedInvoice(models.Model):
         return f'INV-{user.id}-{sequence_number:04d}'
 
     @staticmethod
-    def generate_invoice_number(user, *, commit=True):
-        with transaction.atomic():
-            profile = Profile.objects.select_for_update().filter(user=user).first()
-            sequence_override = None
-            if profile and profile.invoice_sequence_next:
-                sequence_override = int(profile.invoice_sequence_next)
-
-            if sequence_override:
-                new_number = max(sequence_override, 1)
-            else:
-                last_invoice = (
-                    GroupedInvoice.objects
-                    .select_for_update()
-                    .filter(user=user)
-                    .order_by('-id')
-                    .first()
-                )
-                if last_invoice and last_invoice.invoice_number:
-                    try:
-                        last_number = int(last_invoice.invoice_number.split('-')[-1])
-                        new_number = last_number + 1
-                    except ValueError:
-                        new_number = 150  # Start from 0150 if the last number parsing fails
-                else:
-                    new_number = 150  # Start from 0150 if there is no previous invoice
-
-            candidate = new_number
-            invoice_number = GroupedInvoice._format_invoice_number(user, candidate)
-            while GroupedInvoice.objects.filter(user=user, invoice_number=invoice_number).exists():
-                candidate += 1
-                invoice_number = GroupedInvoice._format_invoice_number(user, candidate)
+    def sequence_from_number(invoice_number):
+        """The number after the last dash in ``invoice_number``, or 0 if there is none."""
+        _, dash, tail = (invoice_number or "").rpartition("-")
+        return int(tail) if dash and tail.isascii() and tail.isdigit() else 0
 
-            if commit and profile and sequence_override:
-                profile.invoice_sequence_next = candidate + 1
-                profile.save(update_fields=['invoice_sequence_next'])
+    @staticmethod
+    def generate_invoice_number(user, *, commit=True):
+        """
+        Return the next invoice number for ``user``. With ``commit=False`` the
+        number is only previewed and the sequence is left untouched.
+        """
+        if not commit:
+            return GroupedInvoice._format_invoice_number(user, InvoiceNumberSequence.peek(user))
+        sequence_number = InvoiceNumberSequence.reserve(user)[0]
+        return GroupedInvoice._format_invoice_number(user, sequence_number)
 
-            return invoice_number
+    @staticmethod
+    def reserve_invoice_numbers(user, count):
+        """Reserve ``count`` invoice numbers in one round trip, e.g. for bulk imports."""
+        return [
+            GroupedInvoice._format_invoice_number(user, sequence_number)
+            for sequence_number in InvoiceNumberSequence.reserve(user, count)
+        ]
 
     def save(self, *args, **kwargs):
         # Check if it's a new invoice or an update
@@ -2034,6 +2178,10 @@ class GroupedInvoice(models.Model):
             old_invoice = GroupedInvoice.objects.filter(pk=self.pk).first()
             if old_invoice:
                 old_total_amount = old_invoice.total_amount
+                # Paid/credited amounts are maintained with queryset updates, so
+                # never write back a stale in-memory copy.
+                self.amount_paid = old_invoice.amount_paid
+                self.amount_credited = old_invoice.amount_credited
 
         # Determine whether to flag the invoice for QuickBooks synchronization.
         quickbooks_only_fields = {
@@ -2044,6 +2192,12 @@ class GroupedInvoice(models.Model):
         }
         update_fields = kwargs.get('update_fields')
         update_fields_list = list(update_fields) if update_fields else []
+        self.sync_receivables_fields()
+        if 'total_amount' in update_fields_list:
+            update_fields_list.extend(
+                field for field in ('amount_due', 'payment_state') if field not in update_fields_list
+            )
+            kwargs['update_fields'] = update_fields_list
         skip_quickbooks_flag = getattr(self, '_skip_quickbooks_sync_flag', False)
         mark_for_quickbooks_sync = False
 
@@ -2075,6 +2229,10 @@ class GroupedInvoice(models.Model):
         # First, generate invoice_number if new and missing
         if is_new and not self.invoice_number:
             self.invoice_number = self.generate_invoice_number(self.user)
+        self.invoice_sequence = self.sequence_from_number(self.invoice_number)
+        if 'invoice_number' in update_fields_list and 'invoice_sequence' not in update_fields_list:
+            update_fields_list.append('invoice_sequence')
+            kwargs['update_fields'] = update_fields_list
 
         super().save(*args, **kwargs)
 
@@ -2085,22 +2243,45 @@ class GroupedInvoice(models.Model):
         if not only_updating_link:
             current_link = self.payment_link
             if is_new or (old_total_amount != self.total_amount) or not current_link:
-                if self.is_subscription:
-                    self.create_subscription_link()
-                else:
-                    self.create_online_payment_link()
+                self.request_payment_link()
 
-    def create_online_payment_link(self):
+    def request_payment_link(self):
+        """
+        Queue a payment/subscription link rebuild in the payment link outbox.
+
+        Falls back to calling the provider inline when the outbox is disabled
+        (``PAYMENT_LINK_OUTBOX_ENABLED = False``).
+        """
+        from . import payment_links
+
+        if payment_links.enqueue(self):
+            return
+        if self.is_subscription:
+            self.create_subscription_link()
+        else:
+            self.create_online_payment_link()
+
+    @property
+    def payment_link_pending(self):
+        """True while a queued payment link request has not been processed."""
+        return PaymentLinkRequest.objects.filter(
+            invoice_id=self.pk,
+            status__in=PaymentLinkRequest.OPEN_STATUSES,
+        ).exists()
+
+    def create_online_payment_link(self, raise_errors=False):
         provider = self.get_payment_link_provider()
         if provider == PAYMENT_LINK_PROVIDER_CLOVER:
-            return self.create_clover_payment_link()
+            return self.create_clover_payment_link(raise_errors=raise_errors)
         if provider == PAYMENT_LINK_PROVIDER_NONE:
             return None
-        return self.create_payment_link()
+        return self.create_payment_link(raise_errors=raise_errors)
 
-    def create_clover_payment_link(self):
+    def create_clover_payment_link(self, raise_errors=False):
         """
         Create or update a Clover payment link for this invoice.
+        Provider errors are re-raised after clearing the link when
+        ``raise_errors`` is set, so the outbox worker can retry.
         """
         try:
             from .clover_service import CloverClient
@@ -2157,11 +2338,14 @@ class GroupedInvoice(models.Model):
             )
             self.clover_payment_link = None
             self.save(update_fields=['clover_payment_link'])
+            if raise_errors:
+                raise
 
-    def create_payment_link(self):
+    def create_payment_link(self, raise_errors=False):
         """
         Safely create or recreate a Stripe payment link whenever needed.
-        If total_amount < 0.50, sets link to None.
+        If total_amount < 0.50, sets link to None. Stripe and unexpected
+        errors are re-raised after clearing the link when ``raise_errors`` is set.
         """
         try:
             logger.debug(f"Attempting to create payment link for invoice {self.invoice_number}")
@@ -2225,12 +2409,16 @@ class GroupedInvoice(models.Model):
             logger.error(f"Stripe error: {str(e)}")
             self.stripe_payment_link = None
             self.save(update_fields=['stripe_payment_link'])
+            if raise_errors:
+                raise
         except Exception as e:
             logger.error(f"Unexpected error on invoice {self.invoice_number}: {str(e)}")
             self.stripe_payment_link = None
             self.save(update_fields=['stripe_payment_link'])
+            if raise_errors:
+                raise
 
-    def create_subscription_link(self):
+    def create_subscription_link(self, raise_errors=False):
         """Create a Stripe Checkout session for a recurring subscription."""
         try:
             logger.debug(
@@ -2298,12 +2486,16 @@ class GroupedInvoice(models.Model):
             logger.error(f"Stripe error: {str(e)}")
             self.stripe_subscription_link = None
             self.save(update_fields=['stripe_subscription_link'])
+            if raise_errors:
+                raise
         except Exception as e:
             logger.error(
                 f"Unexpected error on invoice {self.invoice_number}: {str(e)}"
             )
             self.stripe_subscription_link = None
             self.save(update_fields=['stripe_subscription_link'])
+            if raise_errors:
+                raise
 
     def delete(self, *args, **kwargs):
         """Delete invoice and reverse any related inventory transactions."""
@@ -2330,6 +2522,286 @@ class GroupedInvoice(models.Model):
                 condition=~models.Q(quickbooks_invoice_id__isnull=True),
             )
         ]
+        indexes = [
+            models.Index(fields=['user', 'payment_state', 'date'], name='invoice_user_state_date_idx'),
+            models.Index(fields=['user', 'amount_due'], name='invoice_user_amount_due_idx'),
+            # Keyset pagination of the invoice list (see accounts.pagination).
+            models.Index(fields=['user', 'invoice_sequence', 'id'], name='invoice_user_sequence_id_idx'),
+            models.Index(fields=['user', 'date', 'id'], name='invoice_user_date_id_idx'),
+            models.Index(fields=['user', 'total_amount', 'id'], name='invoice_user_total_id_idx'),
+            # Dashboard and storefront "open online orders".
+            models.Index(
+                fields=['user', 'is_online_order', 'online_order_status'],
+                name='invoice_user_online_status_idx',
+            ),
+        ]
+
+
+class PaymentLinkRequest(models.Model):
+    """
+    Outbox entry asking for an invoice's online payment link to be rebuilt.
+
+    ``GroupedInvoice.save()`` records the request instead of calling Stripe or
+    Clover inline; :mod:`accounts.payment_links` processes it after commit.
+    There is one row per invoice, so repeated saves coalesce into one call.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_PROCESSING, 'Processing'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    OPEN_STATUSES = (STATUS_PENDING, STATUS_PROCESSING)
+
+    invoice = models.OneToOneField(GroupedInvoice, on_delete=models.CASCADE, related_name='payment_link_request')
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    # Bumped on every enqueue so a worker never marks a newer request as done.
+    version = models.PositiveIntegerField(default=1)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='paylink_req_status_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"Payment link for invoice {self.invoice_id} ({self.status})"
+
+
+class InvoiceConversionJob(models.Model):
+    """
+    Background request to invoice a batch of completed work orders.
+
+    Created by the work order list's bulk action and processed after commit by
+    :mod:`accounts.invoice_conversion`; ``invoice_ids`` and ``errors`` (keyed by
+    work order id) record the outcome for the list page.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_DONE = 'done'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_PROCESSING, 'Processing'),
+        (STATUS_DONE, 'Done'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='invoice_conversion_jobs')
+    work_order_ids = models.JSONField(default=list)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    invoice_ids = models.JSONField(default=list, blank=True)
+    errors = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='invoice_conv_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Invoice conversion of {len(self.work_order_ids)} work order(s) ({self.status})"
+
+
+class ProductImportJob(models.Model):
+    """
+    Background import of a product workbook.
+
+    Created by the products page upload and processed after commit by
+    :mod:`accounts.product_import`. The row counters advance after every chunk
+    so the page can poll progress; rejected rows end up in ``error_report``.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_PROCESSING, 'Processing'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='product_import_jobs')
+    actor = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        help_text="Staff member who uploaded the file, for the activity log.",
+    )
+    source_file = models.FileField(upload_to='product_imports/')
+    original_filename = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    total_rows = models.PositiveIntegerField(default=0)
+    processed_rows = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    updated_count = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    error_report = models.FileField(upload_to='product_imports/errors/', blank=True, null=True)
+    failure_message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Refreshed with every progress save; a processing job that stops
+    # refreshing it is reclaimed by accounts.product_import.
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='product_import_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Product import {self.original_filename or self.pk} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+    @property
+    def progress_percent(self):
+        if self.is_finished:
+            return 100
+        if not self.total_rows:
+            return 0
+        return min(int(self.processed_rows * 100 / self.total_rows), 99)
+
+
+class InvoiceNumberSequence(models.Model):
+    """
+    Per-business counter for ``INV-<user>-<n>`` invoice numbers.
+
+    ``reserve`` bumps ``next_value`` with a single atomic UPDATE, so concurrent
+    checkouts only contend on this row instead of locking the profile and the
+    latest invoice. ``Profile.invoice_sequence_next`` still acts as an override:
+    when it no longer matches the counter the counter jumps to it, and while it
+    is set it is kept equal to the next number handed out.
+    """
+    DEFAULT_START = 150
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='invoice_number_sequence',
+    )
+    next_value = models.PositiveBigIntegerField(default=DEFAULT_START)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Invoice sequence for {self.user_id}: next {self.next_value}"
+
+    @classmethod
+    def _initial_value(cls, user):
+        last_number = (
+            GroupedInvoice.objects.filter(user=user)
+            .exclude(invoice_number__isnull=True)
+            .order_by('-id')
+            .values_list('invoice_number', flat=True)
+            .first()
+        )
+        if last_number:
+            try:
+                return int(last_number.split('-')[-1]) + 1
+            except ValueError:
+                pass
+        return cls.DEFAULT_START
+
+    @classmethod
+    def _override(cls, user):
+        return (
+            Profile.objects.filter(user=user)
+            .values_list('invoice_sequence_next', flat=True)
+            .first()
+        )
+
+    @classmethod
+    def _free_numbers(cls, user, candidates):
+        """Drop candidates already used by this business (imports, manual numbers)."""
+        taken = set(
+            GroupedInvoice.objects.filter(
+                user=user,
+                invoice_number__in=[GroupedInvoice._format_invoice_number(user, n) for n in candidates],
+            ).values_list('invoice_number', flat=True)
+        )
+        return [n for n in candidates if GroupedInvoice._format_invoice_number(user, n) not in taken]
+
+    @classmethod
+    def _bump(cls, user, count):
+        """Advance the counter by ``count`` and return the first value of the block."""
+        values = {'next_value': F('next_value') + count, 'updated_at': timezone.now()}
+        updated = cls.objects.filter(user=user).update(**values)
+        if not updated:
+            initial = cls._initial_value(user)
+            try:
+                with transaction.atomic():
+                    cls.objects.create(user=user, next_value=initial + count)
+                return initial
+            except IntegrityError:
+                # Another request created the row first; fall through to the update.
+                cls.objects.filter(user=user).update(**values)
+        end = cls.objects.filter(user=user).values_list('next_value', flat=True).get()
+        return end - count
+
+    @classmethod
+    def reserve(cls, user, count=1):
+        """
+        Hand out ``count`` unused sequence numbers for ``user`` in ascending order.
+
+        The counter row stays locked until the caller's transaction ends, so
+        call this inside the transaction that saves the invoices.
+        """
+        if count < 1:
+            return []
+        with transaction.atomic():
+            first = cls._bump(user, count)
+            # Read the override only once the row is locked, so two requests
+            # cannot both apply the same new starting point.
+            override = cls._override(user)
+            if override and override != first:
+                first = max(int(override), 1)
+                cls.objects.filter(user=user).update(next_value=first + count)
+
+            numbers = cls._free_numbers(user, list(range(first, first + count)))
+            while len(numbers) < count:
+                needed = count - len(numbers)
+                first = cls._bump(user, needed)
+                numbers.extend(cls._free_numbers(user, list(range(first, first + needed))))
+
+            if override:
+                next_value = cls.objects.filter(user=user).values_list('next_value', flat=True).get()
+                Profile.objects.filter(user=user).update(invoice_sequence_next=next_value)
+            return numbers
+
+    @classmethod
+    def peek(cls, user):
+        """Return the number the next ``reserve`` call would hand out, without using it."""
+        override = cls._override(user)
+        current = cls.objects.filter(user=user).values_list('next_value', flat=True).first()
+        if override and override != current:
+            candidate = max(int(override), 1)
+        elif current is not None:
+            candidate = current
+        else:
+            candidate = cls._initial_value(user)
+        while not cls._free_numbers(user, [candidate]):
+            candidate += 1
+        return candidate
+
 
 class PendingInvoice(models.Model):
     grouped_invoice = models.OneToOneField(GroupedInvoice, on_delete=models.CASCADE, related_name='pending_invoice')
@@ -2370,6 +2842,9 @@ class PendingInvoice(models.Model):
     class Meta:
         verbose_name = "Pending Invoice"
         verbose_name_plural = "Pending Invoices"
+        indexes = [
+            models.Index(fields=['is_paid'], name='pending_invoice_is_paid_idx'),
+        ]
 
 class PaidInvoice(models.Model):
     grouped_invoice = models.OneToOneField(GroupedInvoice, on_delete=models.CASCADE, related_name='paid_invoice')
@@ -2404,6 +2879,12 @@ class Payment(models.Model):
     def __str__(self):
         return f'Payment of ${self.amount} on {self.date} for Invoice {self.invoice.invoice_number}'
 
+    class Meta:
+        indexes = [
+            # Per-invoice payment history and date_fully_paid lookups.
+            models.Index(fields=['invoice', 'date'], name='payment_invoice_date_idx'),
+        ]
+
 class CategoryGroup(models.Model):
     user = models.ForeignKey(User, related_name='category_groups', on_delete=models.CASCADE)
     name = models.CharField(max_length=120)
@@ -3107,30 +3588,26 @@ class Product(models.Model):
 
     @staticmethod
     def top_sellers(user, days=30, limit=5):
-        start = timezone.now() - timedelta(days=days)
+        from . import stock_movements
+
+        since = stock_movements.window_start(days)
         return (
             Product.objects.filter(user=user)
             .annotate(
-                qty_sold=Sum(
-                    'transactions__quantity',
-                    filter=Q(transactions__transaction_type='OUT',
-                            transactions__transaction_date__gte=start)
-                )
+                qty_sold=Sum('daily_movements__qty_out', filter=Q(daily_movements__date__gte=since))
             )
             .order_by('-qty_sold')[:limit]
         )
 
     @staticmethod
     def slow_movers(user, days=30, limit=5):
-        start = timezone.now() - timedelta(days=days)
+        from . import stock_movements
+
+        since = stock_movements.window_start(days)
         return (
             Product.objects.filter(user=user)
             .annotate(
-                qty_sold=Sum(
-                    'transactions__quantity',
-                    filter=Q(transactions__transaction_type='OUT',
-                            transactions__transaction_date__gte=start)
-                )
+                qty_sold=Sum('daily_movements__qty_out', filter=Q(daily_movements__date__gte=since))
             )
             .order_by('qty_sold')[:limit]
         )
@@ -3140,12 +3617,7 @@ class Product(models.Model):
         cutoff = timezone.now() - timedelta(days=days)
         return (
             Product.objects.filter(user=user)
-            .annotate(
-                last_sale=Max(
-                    'transactions__transaction_date',
-                    filter=Q(transactions__transaction_type='OUT')
-                )
-            )
+            .annotate(last_sale=Max('daily_movements__last_out_at'))
             .filter(Q(last_sale__lt=cutoff) | Q(last_sale__isnull=True))
         )
 
@@ -4490,56 +4962,69 @@ class InventoryTransaction(models.Model):
     def __str__(self):
         return f"{self.product.name} - {self.transaction_type} - {self.quantity}"
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['product', 'transaction_type', 'transaction_date'],
+                name='inv_txn_product_type_date_idx',
+            ),
+        ]
+
+    MOVEMENT_FIELDS = ('product_id', 'user_id', 'transaction_type', 'quantity', 'transaction_date')
+
+    # Set by the post_init receiver in accounts.signals.
+    _original_movement = None
+
+    def _movement_row(self):
+        return tuple(getattr(self, field) for field in self.MOVEMENT_FIELDS)
+
+    def _stored_movement(self):
+        """The movement this row was loaded with, read back when its fields were deferred."""
+        if self._original_movement is None and not self._state.adding:
+            self._original_movement = (
+                InventoryTransaction._base_manager.filter(pk=self.pk).values_list(*self.MOVEMENT_FIELDS).first()
+            )
+        return self._original_movement
+
     def save(self, *args, **kwargs):
-        if not self.product or getattr(self.product, 'item_type', 'inventory') != 'inventory':
-            super(InventoryTransaction, self).save(*args, **kwargs)
-            return
+        # Stock levels are moved under a row lock; see accounts.stock_ledger.
+        from . import stock_ledger, stock_movements
 
-        stock_owner = _resolve_stock_owner(self.user, self.product)
-        if not stock_owner:
+        with transaction.atomic():
+            original = self._stored_movement()
+            restocks = stock_ledger.apply([self])
             super(InventoryTransaction, self).save(*args, **kwargs)
-            return
+            if original:
+                stock_movements.unrecord([original])
+            stock_movements.record([*restocks, self])
+        self._original_movement = self._movement_row()
 
-        if not self.user_id:
-            self.user = stock_owner
 
-        stock_record, _ = ProductStock.objects.get_or_create(
-            product=self.product,
-            user=stock_owner,
-            defaults={
-                "quantity_in_stock": 0,
-                "reorder_level": 0,
-                "max_stock_level": self.product.max_stock_level or 0,
-            },
-        )
-        current_stock = stock_record.quantity_in_stock or 0
-
-        if self.transaction_type == 'IN':
-            stock_record.quantity_in_stock = current_stock + self.quantity
-        elif self.transaction_type == 'OUT':
-            if current_stock < self.quantity:
-                # Auto-top-up missing stock instead of throwing an error
-                missing_qty = self.quantity - current_stock
-                InventoryTransaction.objects.create(
-                    product=self.product,
-                    transaction_type='IN',
-                    quantity=missing_qty,
-                    transaction_date=timezone.now(),
-                    remarks="Auto restock to satisfy invoice",
-                    user=self.user,
-                )
-                current_stock += missing_qty
-            stock_record.quantity_in_stock = current_stock - self.quantity
-        elif self.transaction_type == 'ADJUSTMENT':
-            stock_record.quantity_in_stock = self.quantity
-
-        stock_record.save(update_fields=["quantity_in_stock", "updated_at"])
-        if stock_owner.id == self.product.user_id:
-            Product.objects.filter(pk=self.product_id).update(
-                quantity_in_stock=stock_record.quantity_in_stock,
-            )
-        super(InventoryTransaction, self).save(*args, **kwargs)
 
+class ProductDailyMovement(models.Model):
+    """
+    Units moved in and out per product, store user and day, rolled up from
+    InventoryTransaction so analytics do not scan the full history. ``user`` is
+    the posting user, or the product owner when the posting has none, matching
+    how inventory views scope transactions. Maintained by accounts.stock_movements.
+    """
+    product = models.ForeignKey(Product, related_name='daily_movements', on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='product_daily_movements')
+    date = models.DateField()
+    qty_in = models.PositiveIntegerField(default=0)
+    qty_out = models.PositiveIntegerField(default=0)
+    last_out_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'user', 'date'], name='unique_product_daily_movement'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'date'], name='product_movement_user_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} on {self.date}: +{self.qty_in} / -{self.qty_out}"
 
 
 INVOICE_LINE_TYPE_PRODUCT = "product"
@@ -4653,28 +5138,34 @@ class IncomeRecord2(models.Model):
             return False
         return True
 
-    def _sync_fee_lines(self):
-        if not self._should_sync_fee_lines():
-            return
+    # (line type, product price field, label, line_order offset from the parent)
+    _FEE_LINE_SPECS = (
+        (INVOICE_LINE_TYPE_CORE, "core_price", "Core charge", 1),
+        (INVOICE_LINE_TYPE_ENV, "environmental_fee", "Environmental fee", 2),
+    )
+
+    def _plan_fee_lines(self, existing_by_type):
+        """
+        Work out the core/environmental fee lines this product line needs.
 
+        ``existing_by_type`` maps a fee line type to the fee lines already attached
+        to this line. Returns ``(new_lines, changed_lines, stale_lines)`` without
+        touching the database.
+        """
         qty_dec = ensure_decimal(self.qty)
         if qty_dec <= Decimal("0.00"):
-            IncomeRecord2.objects.filter(
-                parent_line=self,
-                line_type__in=[INVOICE_LINE_TYPE_CORE, INVOICE_LINE_TYPE_ENV],
-            ).delete()
-            return
+            return [], [], [fee for fees in existing_by_type.values() for fee in fees]
 
-        core_fee = ensure_decimal(getattr(self.product, "core_price", None))
-        env_fee = ensure_decimal(getattr(self.product, "environmental_fee", None))
+        new_lines, changed_lines, stale_lines = [], [], []
         base_order = self.line_order or 0
-
-        def _upsert_fee(line_type, unit_fee, label, order_offset):
-            existing = IncomeRecord2.objects.filter(parent_line=self, line_type=line_type).first()
+        for line_type, price_field, label, order_offset in self._FEE_LINE_SPECS:
+            unit_fee = ensure_decimal(getattr(self.product, price_field, None))
+            fees = existing_by_type.get(line_type) or []
+            existing = fees[0] if fees else None
             if unit_fee <= Decimal("0.00"):
                 if existing:
-                    existing.delete()
-                return
+                    stale_lines.append(existing)
+                continue
 
             job_label = f"{label} - {self.product.name}" if self.product else label
             line_order = base_order + order_offset if base_order else 0
@@ -4700,10 +5191,10 @@ class IncomeRecord2(models.Model):
                 if updates:
                     for field, value in updates.items():
                         setattr(existing, field, value)
-                    existing.save()
-                return
+                    changed_lines.append(existing)
+                continue
 
-            IncomeRecord2.objects.create(
+            new_lines.append(IncomeRecord2(
                 grouped_invoice=self.grouped_invoice,
                 pending_invoice=self.pending_invoice,
                 paid_invoice=self.paid_invoice,
@@ -4720,16 +5211,31 @@ class IncomeRecord2(models.Model):
                 jobsite=self.jobsite,
                 truck=self.truck,
                 driver=self.driver,
-            )
+            ))
+        return new_lines, changed_lines, stale_lines
 
-        _upsert_fee(INVOICE_LINE_TYPE_CORE, core_fee, "Core charge", 1)
-        _upsert_fee(INVOICE_LINE_TYPE_ENV, env_fee, "Environmental fee", 2)
+    def _sync_fee_lines(self):
+        if not self._should_sync_fee_lines():
+            return
 
-    def save(self, *args, **kwargs):
+        existing_by_type = {}
+        for fee in IncomeRecord2.objects.filter(
+            parent_line=self,
+            line_type__in=[INVOICE_LINE_TYPE_CORE, INVOICE_LINE_TYPE_ENV],
+        ):
+            existing_by_type.setdefault(fee.line_type, []).append(fee)
+
+        new_lines, changed_lines, stale_lines = self._plan_fee_lines(existing_by_type)
+        if stale_lines:
+            IncomeRecord2.objects.filter(pk__in=[fee.pk for fee in stale_lines]).delete()
+        for fee in changed_lines + new_lines:
+            fee.save()
+
+    def _apply_calculated_fields(self):
+        """Normalize the line type and derive amount/tax from qty, rate and the invoice."""
         if self.product_id and (not self.line_type or self.line_type == INVOICE_LINE_TYPE_CUSTOM):
             self.line_type = INVOICE_LINE_TYPE_PRODUCT
 
-        # --- Calculate amount and tax (your existing logic) ---
         qty_dec = ensure_decimal(self.qty)
         rate_dec = ensure_decimal(self.rate)
         calculated_amount = (qty_dec * rate_dec).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
@@ -4745,7 +5251,9 @@ class IncomeRecord2(models.Model):
                 self.tax_collected = calculate_tax_total(self.amount, user_profile.province)
         else:
             self.tax_collected = Decimal('0.00')
-        # --- End calculation logic ---
+
+    def save(self, *args, **kwargs):
+        self._apply_calculated_fields()
 
 
         # --- Inventory Transaction Logic ---
@@ -4866,6 +5374,9 @@ class IncomeRecord2(models.Model):
         verbose_name = "Invoice Line Item" # Changed for clarity
         verbose_name_plural = "Invoice Line Items"
         ordering = ['line_order', 'id']
+        indexes = [
+            models.Index(fields=['grouped_invoice', 'line_order', 'id'], name='income_invoice_line_order_idx'),
+        ]
 
 
 class DriverSettlementStatement(models.Model):
@@ -4979,41 +5490,9 @@ class GroupedEstimate(models.Model):
         Converts this estimate to a real invoice by creating a GroupedInvoice instance
         and copying over the relevant fields and associated EstimateRecords as IncomeRecord2.
         """
-        from accounts.models import GroupedInvoice, IncomeRecord2  # adjust import as needed
+        from . import invoice_conversion
 
-        with transaction.atomic():
-            invoice = GroupedInvoice.objects.create(
-                user=self.user,
-                customer=self.customer,
-                date=self.date,
-                date_from=self.date_from,
-                date_to=self.date_to,
-                bill_to=self.bill_to,
-                bill_to_address=self.bill_to_address,
-                bill_to_email=self.bill_to_email,
-                vin_no=self.vin_no,
-                mileage=self.mileage,
-                unit_no=self.unit_no,
-                make_model=self.make_model,
-            )
-            # Copy each estimate record to a real invoice record.
-            for record in self.estimate_records.all():
-                IncomeRecord2.objects.create(
-                    grouped_invoice=invoice,
-                    product=record.product,
-                    job=record.job,
-                    qty=ensure_decimal(record.qty),
-                    rate=ensure_decimal(record.rate),
-                    date=record.date,
-                    ticket=record.ticket,
-                    jobsite=record.jobsite,
-                    truck=record.truck,
-                    driver=record.driver,
-                )
-            invoice.ensure_inventory_transactions()
-            invoice.recalculate_total_amount()
-            invoice.create_online_payment_link()  # Create payment link if applicable.
-            return invoice
+        return invoice_conversion.invoice_from_estimate(self)
 
     def __str__(self):
         return f'{self.estimate_number} - {self.date} - {self.bill_to} - ${self.total_amount:.2f}'
@@ -5575,6 +6054,13 @@ class WorkOrder(models.Model):
     # Business completion timestamp (when status becomes completed)
     completed_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Dashboard "today" and 30-day volume, and the work order list.
+            models.Index(fields=['user', 'scheduled_date', 'status'], name='workorder_user_sched_idx'),
+            models.Index(fields=['user', 'date_created'], name='workorder_user_created_idx'),
+        ]
+
     def _invoice_sequence_from_number(self):
         invoice_number = getattr(self.invoice, "invoice_number", None)
         if not invoice_number:
@@ -5613,83 +6099,12 @@ class WorkOrder(models.Model):
             logger.warning(f"Invoice already exists (ID: {self.invoice.id}) for WorkOrder #{self.id}. Aborting.")
             return None # Or raise an error?
 
-        # Use a single transaction for all related creations
-        with transaction.atomic():
-            # 1. Create Invoice Header
-            invoice = GroupedInvoice.objects.create(
-                user=self.user,
-                customer=self.customer,
-                date=timezone.now().date(),
-                vin_no=self.vehicle_vin,
-                mileage=self.mileage,
-                unit_no=self.unit_no,
-                make_model=self.make_model,
-                bill_to=self.customer.name if self.customer else self.bill_to or 'N/A',
-                bill_to_address=self.customer.address if self.customer else self.bill_to_address or '',
-                bill_to_email=self.customer.email if self.customer else self.bill_to_email or '',
-            )
-            logger.info(f"Created GroupedInvoice #{invoice.id} ({invoice.invoice_number}) for WorkOrder #{self.id}")
-
-            # 2. Process Each WorkOrderRecord
-            for record in self.records.all():
-                logger.debug(
-                    "Processing WO Record #%s: Prod=%s, Qty=%s, Job='%s'",
-                    record.id,
-                    record.product_id,
-                    record.qty,
-                    record.job,
-                )
-
-                # 2a. Create Invoice Line Item (IncomeRecord2)
-                # Ensure IncomeRecord2 model fields match (especially Decimal types)
-                try:
-                    IncomeRecord2.objects.create(
-                        grouped_invoice=invoice,
-                        product=record.product,
-                        job=record.job,
-                        qty=record.qty,
-                        rate=record.rate,
-                        date=record.date or timezone.now().date(),
-                        # Copy other relevant fields if applicable...
-                    )
-                except ValidationError as exc:
-                    product_label = None
-                    if record.product_id and record.product:
-                        product_label = record.product.name
-                    elif record.job:
-                        product_label = record.job
-                    else:
-                        product_label = f"Work order line #{record.id}"
-
-                    qty_decimal = ensure_decimal(record.qty or Decimal("0"))
-                    if qty_decimal == qty_decimal.to_integral_value():
-                        qty_text = format(int(qty_decimal), "d")
-                    else:
-                        qty_text = format(qty_decimal.quantize(Decimal("0.01")), "f")
-                    shortage_message = (
-                        "Not enough inventory to deduct "
-                        f"{qty_text} units for '{product_label}'. "
-                        "Update the product's stock level or adjust the work order before completing it."
-                    )
-
-                    raise ValidationError({"inventory": shortage_message}) from exc
-
-                logger.debug(f"Created IncomeRecord2 for WO Record #{record.id}")
+        # Lines are written in one batch; see accounts.invoice_conversion.
+        from . import invoice_conversion
 
-                # 2b. Inventory transactions are handled by IncomeRecord2.save()
-                # Creating them here caused duplicate stock deductions.  The
-                # Invoice line item creation above triggers a single inventory
-                # "OUT" transaction, so we simply skip any direct inventory
-                # updates in this loop.
-
-            # 3. Finalize Invoice (assuming these methods exist)
-            invoice.ensure_inventory_transactions()
-            invoice.recalculate_total_amount()
-            invoice.create_online_payment_link()
-            PendingInvoice.objects.get_or_create(grouped_invoice=invoice)
-
-            logger.info(f"Successfully created Invoice #{invoice.id} and processed inventory for WorkOrder #{self.id}.")
-            return invoice # Return the created invoice
+        invoice = invoice_conversion.invoice_from_work_order(self)
+        logger.info(f"Successfully created Invoice #{invoice.id} and processed inventory for WorkOrder #{self.id}.")
+        return invoice
 
 
     def _complete_linked_maintenance_tasks(self):
@@ -7701,3 +8116,127 @@ class ActivityLog(models.Model):
     def __str__(self) -> str:
         identifier = self.object_id or str(self.pk)
         return f"{self.object_type} {identifier} – {self.action}"
+
+
+class SearchDocument(models.Model):
+    """
+    Searchable text of one invoice, estimate or work order, maintained by
+    :mod:`accounts.search_index`. The migration adds the full-text structures
+    (a ``tsvector`` column and trigram index on PostgreSQL, an FTS5 table on
+    SQLite) that Django does not manage.
+    """
+    KIND_CHOICES = [
+        ('invoice', 'Invoice'),
+        ('estimate', 'Estimate'),
+        ('workorder', 'Work order'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='search_documents')
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    content = models.TextField(blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='unique_search_document'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'kind'], name='search_document_user_kind_idx'),
+        ]
+
+    def __str__(self):
+        return f"Search document for {self.kind} {self.object_id}"
+
+
+class ReceivablesAgingSnapshot(models.Model):
+    """
+    One business's open balance for one customer on one day, split into
+    aging buckets by days past due. Written by :mod:`accounts.aging`; the row
+    with ``customer=None`` covers invoices without a customer and is always
+    present for a computed day.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='aging_snapshots')
+    customer = models.ForeignKey(
+        'Customer',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='aging_snapshots',
+    )
+    as_of = models.DateField()
+    current = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    overdue_1_30 = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    overdue_31_60 = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    overdue_61_90 = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    overdue_90_plus = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    total_due = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    overdue_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    invoice_count = models.PositiveIntegerField(default=0)
+    overdue_invoice_count = models.PositiveIntegerField(default=0)
+    oldest_due_invoice_date = models.DateField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'as_of', 'customer'],
+                name='unique_aging_snapshot_per_customer',
+                condition=models.Q(customer__isnull=False),
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'as_of'],
+                name='unique_aging_snapshot_unassigned',
+                condition=models.Q(customer__isnull=True),
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['as_of'], name='aging_snapshot_as_of_idx'),
+        ]
+
+    def __str__(self):
+        return f"Aging for {self.customer_id or 'unassigned'} on {self.as_of}: {self.overdue_total} overdue"
+
+
+class ReceivablesJournalEntry(models.Model):
+    """
+    One line of a customer's append-only accounts-receivable journal. Rows
+    are never edited: :mod:`accounts.receivables_journal` posts the
+    difference when an invoice, payment or credit changes. ``amount`` is
+    positive when it raises what the customer owes and ``balance`` is the
+    customer's running balance after this entry, in posting order.
+    """
+    ENTRY_INVOICE = 'invoice'
+    ENTRY_PAYMENT = 'payment'
+    ENTRY_CREDIT = 'credit'
+    ENTRY_WRITE_OFF = 'write_off'
+    ENTRY_TYPE_CHOICES = [
+        (ENTRY_INVOICE, 'Invoice'),
+        (ENTRY_PAYMENT, 'Payment'),
+        (ENTRY_CREDIT, 'Credit'),
+        (ENTRY_WRITE_OFF, 'Write-off'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='receivables_journal_entries')
+    customer = models.ForeignKey('Customer', on_delete=models.CASCADE, related_name='journal_entries')
+    entry_type = models.CharField(max_length=16, choices=ENTRY_TYPE_CHOICES)
+    # The invoice (invoice and payment entries) or customer credit the entry belongs to.
+    document_id = models.PositiveIntegerField(null=True, blank=True)
+    # The invoice, payment or credit item that produced the entry.
+    source_id = models.PositiveIntegerField(null=True, blank=True)
+    reference = models.CharField(max_length=100, blank=True, default='')
+    memo = models.CharField(max_length=255, blank=True, default='')
+    entry_date = models.DateField()
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+    balance = models.DecimalField(max_digits=14, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', 'entry_date', 'id'], name='ar_journal_customer_date_idx'),
+            models.Index(fields=['customer', '-id'], name='ar_journal_customer_latest_idx'),
+            models.Index(fields=['entry_type', 'document_id'], name='ar_journal_document_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_entry_type_display()} {self.reference or self.source_id} for {self.customer_id}: {self.amount}"
@@ -0,0 +1,289 @@
+"""Keyset pagination and cached counts for long list views.
+
+OFFSET pagination makes the database produce and throw away every row before
+the requested page, and Django's paginator runs a ``COUNT(*)`` over the full
+filtered query on every request. For lists that are sorted on an indexed,
+non-null key:
+
+* :class:`KeysetPaginator` seeks past the last row of the previous page with
+  a ``(key, pk) < (value, pk)`` filter, so every page costs the same. The
+  position travels in a signed ``after``/``before`` cursor that is tied to the
+  sort, so a cursor from another sort is ignored. A nullable sort column is
+  read as two segments (rows with a value, then rows without, or the reverse)
+  so that neither needs ``COALESCE`` or ``NULLS LAST`` and both stay index
+  seeks.
+* :func:`cached_count` memoizes the count per tenant and query in the default
+  cache. :func:`invalidate_counts` rotates the tenant's namespace when its
+  rows change, and ``LIST_COUNT_CACHE_TIMEOUT`` bounds staleness across
+  workers.
+
+:class:`CachedCountPaginator` keeps OFFSET pages (for sorts without a keyset)
+but takes its count from the same cache.
+"""
+from __future__ import annotations
+
+import datetime
+import hashlib
+import math
+from decimal import Decimal
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from . import tenant_scope
+
+
+CURSOR_SALT = "accounts.pagination.cursor"
+DEFAULT_COUNT_TIMEOUT = 300
+
+
+# ---------- Counts ----------------------------------------------------------
+
+def _count_generation_key(namespace, tenant_id):
+    return f"accounts:list_count:{namespace}:{tenant_id}:generation"
+
+
+def invalidate_counts(namespace, tenant_id) -> None:
+    """Forget cached counts for one tenant's list (e.g. after an invoice changes)."""
+    if tenant_id:
+        tenant_scope.rotate_generation(_count_generation_key(namespace, tenant_id))
+
+
+def cached_count(queryset, *, namespace, tenant_id) -> int:
+    """Return ``queryset.count()``, cached per tenant and SQL."""
+    try:
+        sql = str(queryset.order_by().query)
+    except Exception:
+        return queryset.count()
+    generation = tenant_scope.get_generation(_count_generation_key(namespace, tenant_id))
+    digest = hashlib.sha1(sql.encode("utf-8")).hexdigest()
+    key = f"accounts:list_count:{namespace}:{tenant_id}:{generation}:{digest}"
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, getattr(settings, "LIST_COUNT_CACHE_TIMEOUT", DEFAULT_COUNT_TIMEOUT))
+    return count
+
+
+class CachedCountPaginator(Paginator):
+    """OFFSET paginator whose count comes from :func:`cached_count`."""
+
+    def __init__(self, object_list, per_page, *, namespace, tenant_id, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.namespace = namespace
+        self.tenant_id = tenant_id
+
+    @cached_property
+    def count(self):
+        return cached_count(self.object_list, namespace=self.namespace, tenant_id=self.tenant_id)
+
+
+# ---------- Cursors ---------------------------------------------------------
+
+def _encode_value(value):
+    if isinstance(value, datetime.datetime):
+        return ["dt", value.isoformat()]
+    if isinstance(value, datetime.date):
+        return ["d", value.isoformat()]
+    if isinstance(value, Decimal):
+        return ["n", str(value)]
+    return ["v", value]
+
+
+def _decode_value(pair):
+    kind, value = pair
+    if kind == "dt":
+        return datetime.datetime.fromisoformat(value)
+    if kind == "d":
+        return datetime.date.fromisoformat(value)
+    if kind == "n":
+        return Decimal(value)
+    return value
+
+
+def encode_cursor(signature, values, number) -> str:
+    return signing.dumps(
+        {"s": signature, "v": [_encode_value(value) for value in values], "n": number},
+        salt=CURSOR_SALT,
+        compress=True,
+    )
+
+
+def decode_cursor(token, signature):
+    """Return ``(values, page_number)`` or None if ``token`` is invalid or for another sort."""
+    if not token:
+        return None
+    try:
+        payload = signing.loads(token, salt=CURSOR_SALT)
+        if payload.get("s") != signature:
+            return None
+        return [_decode_value(pair) for pair in payload["v"]], int(payload.get("n") or 1)
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        return None
+
+
+# ---------- Keyset pages ----------------------------------------------------
+
+def seek_filter(keys, values, *, forward):
+    """
+    Rows strictly after ``values`` in ``keys`` order (before, if not ``forward``),
+    as the OR-of-ANDs expansion of a row-value comparison.
+    """
+    condition = None
+    for index, (name, descending) in enumerate(keys):
+        lookup = "lt" if descending == forward else "gt"
+        clause = Q(**{f"{name}__{lookup}": values[index]})
+        for (prior_name, _), prior_value in zip(keys[:index], values[:index]):
+            clause &= Q(**{prior_name: prior_value})
+        condition = clause if condition is None else condition | clause
+    return condition
+
+
+class KeysetPage:
+    """Page object with the parts of ``django.core.paginator.Page`` templates use."""
+
+    def __init__(self, object_list, number, paginator, *, has_next, has_previous):
+        self.object_list = object_list
+        self.number = number
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def start_index(self):
+        if not self.object_list:
+            return 0
+        return (self.number - 1) * self.paginator.per_page + 1
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1 if self.object_list else 0
+
+    def _cursor(self, row):
+        return encode_cursor(self.paginator.signature, self.paginator.values_for(row), self.number)
+
+    @property
+    def next_cursor(self):
+        return self._cursor(self.object_list[-1]) if self._has_next else None
+
+    @property
+    def previous_cursor(self):
+        return self._cursor(self.object_list[0]) if self._has_previous else None
+
+
+class KeysetPaginator:
+    """
+    Seek-based paginator for a queryset ordered by ``keys``.
+
+    ``keys`` is a sequence of ``(field_or_annotation, descending)`` pairs whose
+    last entry must be unique (normally ``("pk", ...)``). Only the first column
+    may be NULL, and only with ``nullable=True``: NULLs then sort as the lowest
+    value, after every other row when descending and before them when
+    ascending, ordered by the remaining keys.
+    """
+
+    def __init__(self, queryset, per_page, keys, *, signature, namespace, tenant_id, nullable=False):
+        self.keys = list(keys)
+        self.queryset = queryset
+        self.per_page = per_page
+        self.signature = signature
+        self.namespace = namespace
+        self.tenant_id = tenant_id
+
+        segments = [(queryset, self.keys)]
+        if nullable:
+            name, descending = self.keys[0]
+            with_values = (queryset.filter(**{f"{name}__isnull": False}), self.keys)
+            without = (queryset.filter(**{f"{name}__isnull": True}), self.keys[1:])
+            segments = [with_values, without] if descending else [without, with_values]
+        # Each segment is ``(ordered queryset, its keys)``.
+        self.segments = [
+            (segment.order_by(*[f"-{name}" if desc else name for name, desc in segment_keys]), segment_keys)
+            for segment, segment_keys in segments
+        ]
+
+    @cached_property
+    def count(self):
+        return cached_count(self.queryset, namespace=self.namespace, tenant_id=self.tenant_id)
+
+    @property
+    def num_pages(self):
+        return max(math.ceil(self.count / self.per_page), 1)
+
+    def values_for(self, row):
+        return [getattr(row, name) for name, _ in self.keys]
+
+    def _segment_of(self, values):
+        width = len(self.keys) - 1 if values[0] is None else len(self.keys)
+        for index, (_, keys) in enumerate(self.segments):
+            if len(keys) == width:
+                return index
+        return 0
+
+    def _read(self, values, limit, *, forward):
+        """
+        Up to ``limit`` rows after (or before) ``values``, nearest first,
+        continuing into the following (or preceding) segments. With ``values``
+        of None, read from the start (or the end).
+        """
+        if values is None:
+            indexes = range(len(self.segments)) if forward else range(len(self.segments) - 1, -1, -1)
+            start = None
+        else:
+            start = self._segment_of(values)
+            indexes = range(start, len(self.segments)) if forward else range(start, -1, -1)
+        rows = []
+        for index in indexes:
+            queryset, keys = self.segments[index]
+            if not forward:
+                queryset = queryset.reverse()
+            if index == start:
+                queryset = queryset.filter(seek_filter(keys, values[len(self.keys) - len(keys):], forward=forward))
+            rows.extend(queryset[: limit - len(rows)])
+            if len(rows) >= limit:
+                break
+        return rows
+
+    def page(self, *, after=None, before=None, last=False) -> KeysetPage:
+        """Return the first page, or the one after/before a cursor, or the last page."""
+        position = decode_cursor(after, self.signature)
+        if position is not None:
+            values, number = position
+            rows = self._read(values, self.per_page + 1, forward=True)
+            has_next = len(rows) > self.per_page
+            return KeysetPage(rows[: self.per_page], number + 1, self, has_next=has_next, has_previous=True)
+
+        position = decode_cursor(before, self.signature)
+        if position is not None:
+            values, number = position
+            rows = self._read(values, self.per_page + 1, forward=False)
+            has_previous = len(rows) > self.per_page
+            rows = rows[: self.per_page][::-1]
+            return KeysetPage(rows, max(number - 1, 1), self, has_next=True, has_previous=has_previous)
+
+        if last and self.count > self.per_page:
+            # Size the last page like OFFSET would so page numbers line up.
+            size = self.count - (self.num_pages - 1) * self.per_page
+            rows = self._read(None, size, forward=False)[::-1]
+            return KeysetPage(rows, self.num_pages, self, has_next=False, has_previous=True)
+
+        rows = self._read(None, self.per_page + 1, forward=True)
+        has_next = len(rows) > self.per_page
+        return KeysetPage(rows[: self.per_page], 1, self, has_next=has_next, has_previous=False)
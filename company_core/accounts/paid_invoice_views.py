@@ -22,10 +22,10 @@ from .ai_service import generate_dynamic_invoice_note
 from .utils import resolve_company_logo_url
 from .view_workorder import generate_pm_inspection_pdf
 from accounts.templatetags import custom_filters
-from .pdf_utils import render_template_to_pdf_cached, apply_branding_defaults
+from .pdf_utils import render_template_to_pdf_cached, apply_branding_defaults, pdf_stylesheet
 from .utils import build_cc_list
 
-PDF_CSS = CSS(string='@page{size:A4;margin:1cm;} body{font-family:Arial,sans-serif;}') if WEASYPRINT_AVAILABLE else None
+PDF_CSS = pdf_stylesheet('@page{size:A4;margin:1cm;} body{font-family:Arial,sans-serif;}')
 
 
 def _invoice_queryset_for_user(user):
@@ -140,10 +140,8 @@ def _invoice_context(
 def _render_paid_invoice_pdf(invoice: GroupedInvoice, *, request=None) -> bytes:
     context = _invoice_context(invoice, request=request)
     return render_template_to_pdf_cached(
-        invoice,
         'invoices/paid_invoice_pdf.html',
         context,
-        cache_prefix='paid_invoice',
         stylesheets=[PDF_CSS],
     )
 
@@ -0,0 +1,194 @@
+"""Apply one customer payment across several invoices in a single transaction.
+
+Saving one ``Payment`` per invoice runs ``update_date_fully_paid``, the
+``PendingInvoice`` -> ``PaidInvoice`` move (which re-saves every line) and each
+payment receiver separately, so a cheque covering a few hundred invoices costs
+thousands of queries. :func:`record_payment` instead splits the amount in
+memory with :func:`allocate`, writes the payments with ``bulk_create`` and then
+settles the affected invoices together: one receivables refresh, one
+``date_fully_paid`` update, one pending -> paid move and one journal sync.
+
+``record_customer_payment`` and ``MarkInvoicePaidView`` both go through here.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import Max, OuterRef, Subquery
+
+from . import aging, pagination, pdf_prerender, receivables, receivables_journal
+from .models import (
+    GroupedInvoice,
+    IncomeRecord2,
+    PaidInvoice,
+    Payment,
+    PendingInvoice,
+    ensure_decimal,
+)
+
+
+STATUS_PAID = "paid"
+STATUS_PARTIAL = "partial"
+
+_CENT = Decimal("0.01")
+_ZERO = Decimal("0.00")
+# Same tolerance as GroupedInvoice.update_date_fully_paid.
+_TOLERANCE = Decimal("0.01")
+
+
+@dataclass
+class Allocation:
+    invoice: GroupedInvoice
+    amount: Decimal
+    status: str = STATUS_PARTIAL
+    balance_remaining: Decimal = _ZERO
+
+
+def open_invoices(queryset):
+    """Invoices in ``queryset`` with a balance left, oldest first."""
+    return queryset.filter(amount_due__gt=_ZERO).order_by("date", "id")
+
+
+def allocate(amount, invoices) -> list:
+    """
+    Split ``amount`` over ``invoices`` in the order given, paying each one's
+    stored ``amount_due`` in full before moving to the next. Nothing is written.
+    """
+    remaining = ensure_decimal(amount).quantize(_CENT, rounding=ROUND_HALF_UP)
+    allocations = []
+    for invoice in invoices:
+        if remaining <= _ZERO:
+            break
+        due = ensure_decimal(invoice.amount_due).quantize(_CENT, rounding=ROUND_HALF_UP)
+        if due <= _ZERO:
+            continue
+        applied = min(due, remaining)
+        allocations.append(Allocation(invoice=invoice, amount=applied))
+        remaining -= applied
+    return allocations
+
+
+def _is_fully_paid(invoice) -> bool:
+    total_amount = ensure_decimal(invoice.total_amount).quantize(_CENT, rounding=ROUND_HALF_UP)
+    return ensure_decimal(invoice.amount_paid) + _TOLERANCE >= total_amount
+
+
+def _update_dates_fully_paid(invoices):
+    """``update_date_fully_paid`` for every invoice, with one grouped query and one bulk update."""
+    need_date = [invoice.pk for invoice in invoices if _is_fully_paid(invoice) and not invoice.date_fully_paid]
+    last_dates = {}
+    if need_date:
+        last_dates = dict(
+            Payment.objects.filter(invoice_id__in=need_date)
+            .order_by()
+            .values("invoice_id")
+            .annotate(last_date=Max("date"))
+            .values_list("invoice_id", "last_date")
+        )
+
+    changed = []
+    for invoice in invoices:
+        if invoice.pk in last_dates:
+            invoice.date_fully_paid = last_dates[invoice.pk]
+        elif not _is_fully_paid(invoice) and invoice.date_fully_paid:
+            invoice.date_fully_paid = None
+        else:
+            continue
+        # GroupedInvoice.save flags any non-QuickBooks field change for sync.
+        invoice.quickbooks_needs_sync = True
+        changed.append(invoice)
+    if changed:
+        GroupedInvoice.objects.bulk_update(changed, ["date_fully_paid", "quickbooks_needs_sync"])
+
+
+def _move_pending_to_paid(invoice_ids):
+    """What ``PendingInvoice.save(is_paid=True)`` does, for several invoices at once."""
+    pending_ids = set(
+        PendingInvoice.objects.filter(grouped_invoice_id__in=invoice_ids).values_list("grouped_invoice_id", flat=True)
+    )
+    if not pending_ids:
+        return
+    # Invoices that already have a PaidInvoice are left alone, as in PendingInvoice.save.
+    pending_ids -= set(
+        PaidInvoice.objects.filter(grouped_invoice_id__in=pending_ids).values_list("grouped_invoice_id", flat=True)
+    )
+    if not pending_ids:
+        return
+    PaidInvoice.objects.bulk_create([PaidInvoice(grouped_invoice_id=invoice_id) for invoice_id in pending_ids])
+    IncomeRecord2.objects.filter(grouped_invoice_id__in=pending_ids).update(
+        pending_invoice=None,
+        paid_invoice_id=Subquery(
+            PaidInvoice.objects.filter(grouped_invoice_id=OuterRef("grouped_invoice_id")).values("pk")[:1]
+        ),
+    )
+    PendingInvoice.objects.filter(grouped_invoice_id__in=pending_ids).delete()
+
+
+def record_payment(invoices, amount, *, method="Manual", notes="", payment_date=None) -> list:
+    """
+    Pay ``amount`` across ``invoices`` (in order) and return the
+    :class:`Allocation` list with each invoice's resulting status and balance.
+
+    The invoices are re-read under a row lock so the split uses current
+    balances. ``Payment.save`` is skipped; its receivers' work (receivables
+    columns, list counts, PDF pre-render, aging, journal) runs once per batch.
+    """
+    invoice_ids = [invoice.pk for invoice in invoices]
+    if not invoice_ids:
+        return []
+    payment_date = payment_date or date.today()
+
+    with transaction.atomic():
+        locked = (
+            GroupedInvoice.objects.select_for_update()
+            .only(
+                "pk",
+                "user_id",
+                "customer_id",
+                "invoice_number",
+                "total_amount",
+                "date_fully_paid",
+                "quickbooks_needs_sync",
+                *receivables.RECEIVABLE_FIELDS,
+            )
+            .in_bulk(invoice_ids)
+        )
+        allocations = allocate(amount, [locked[pk] for pk in invoice_ids if pk in locked])
+        if not allocations:
+            return []
+
+        Payment.objects.bulk_create(
+            [
+                Payment(
+                    invoice_id=allocation.invoice.pk,
+                    amount=allocation.amount,
+                    method=method,
+                    notes=notes,
+                    date=payment_date,
+                )
+                for allocation in allocations
+            ]
+        )
+
+        settled = [allocation.invoice for allocation in allocations]
+        settled_ids = [invoice.pk for invoice in settled]
+        receivables.refresh(settled_ids, instances=settled)
+        _update_dates_fully_paid(settled)
+        _move_pending_to_paid([invoice.pk for invoice in settled if _is_fully_paid(invoice)])
+        receivables_journal.sync_invoices(settled_ids)
+
+        for user_id in {invoice.user_id for invoice in settled}:
+            pagination.invalidate_counts("groupedinvoice", user_id)
+        for user_id, customer_id in {(invoice.user_id, invoice.customer_id) for invoice in settled}:
+            aging.schedule(user_id, customer_id)
+        for invoice_id in settled_ids:
+            pdf_prerender.schedule(pdf_prerender.KIND_INVOICE, invoice_id)
+
+    for allocation in allocations:
+        invoice = allocation.invoice
+        allocation.status = STATUS_PAID if _is_fully_paid(invoice) else STATUS_PARTIAL
+        allocation.balance_remaining = max(ensure_decimal(invoice.amount_due), _ZERO)
+    return allocations
@@ -0,0 +1,253 @@
+"""Outbox for invoice payment links.
+
+Building a Stripe or Clover link is a network round trip, and
+``GroupedInvoice.save()`` used to make it inline every time the invoice total
+changed, which happens on every line save. Instead the invoice now records a
+:class:`~accounts.models.PaymentLinkRequest` (one row per invoice, so repeated
+saves coalesce) and the link is built after commit:
+
+* by a background thread started from ``transaction.on_commit`` (disable with
+  ``PAYMENT_LINK_OUTBOX_THREAD_DISPATCH = False``), and
+* by ``manage.py process_payment_links``, which also retries failed requests
+  with exponential backoff and picks up requests left behind by a crash.
+
+``PAYMENT_LINK_PROVIDER_CLASS`` selects the provider; point it at
+:class:`FakePaymentLinkProvider` to work offline.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import commit_hooks
+from .models import (
+    PAYMENT_LINK_PROVIDER_CLOVER,
+    PAYMENT_LINK_PROVIDER_NONE,
+    GroupedInvoice,
+    PaymentLinkRequest,
+)
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROVIDER_CLASS = "accounts.payment_links.LivePaymentLinkProvider"
+DEFAULT_MAX_ATTEMPTS = 8
+DEFAULT_RETRY_BASE_SECONDS = 30
+DEFAULT_RETRY_MAX_SECONDS = 3600
+DEFAULT_CLAIM_TIMEOUT_SECONDS = 600
+
+LINK_FIELDS = (
+    "stripe_payment_link",
+    "stripe_subscription_link",
+    "clover_payment_link",
+    "clover_order_id",
+)
+
+
+def is_enabled() -> bool:
+    """Return True when payment links go through the outbox."""
+    return bool(getattr(settings, "PAYMENT_LINK_OUTBOX_ENABLED", True))
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class LivePaymentLinkProvider:
+    """Build links with the invoice owner's Stripe or Clover account."""
+
+    def create_link(self, invoice):
+        if invoice.is_subscription:
+            invoice.create_subscription_link(raise_errors=True)
+        else:
+            invoice.create_online_payment_link(raise_errors=True)
+
+
+class FakePaymentLinkProvider:
+    """Offline provider that stores deterministic local URLs."""
+
+    base_url = "http://localhost:8000/fake-pay"
+
+    def create_link(self, invoice):
+        provider = invoice.get_payment_link_provider()
+        if provider == PAYMENT_LINK_PROVIDER_CLOVER:
+            field = "clover_payment_link"
+        elif invoice.is_subscription:
+            field = "stripe_subscription_link"
+        elif provider == PAYMENT_LINK_PROVIDER_NONE:
+            return
+        else:
+            field = "stripe_payment_link"
+
+        amount_cents = int((invoice.total_amount or 0) * 100)
+        setattr(invoice, field, f"{self.base_url}/{provider}/{invoice.pk}/?amount={amount_cents}")
+        invoice.save(update_fields=[field])
+
+
+def get_provider():
+    return import_string(_setting("PAYMENT_LINK_PROVIDER_CLASS", DEFAULT_PROVIDER_CLASS))()
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Exponential backoff after ``attempts`` failed tries, capped at the max delay."""
+    base = _setting("PAYMENT_LINK_RETRY_BASE_SECONDS", DEFAULT_RETRY_BASE_SECONDS)
+    cap = _setting("PAYMENT_LINK_RETRY_MAX_SECONDS", DEFAULT_RETRY_MAX_SECONDS)
+    return timedelta(seconds=min(base * (2 ** max(attempts - 1, 0)), cap))
+
+
+# ---------- Enqueue ---------------------------------------------------------
+
+def enqueue(invoice) -> bool:
+    """
+    Record that ``invoice`` needs its payment link rebuilt.
+
+    Returns False when the outbox is disabled so the caller can build the link
+    inline. The row is written in the caller's transaction and only dispatched
+    once that transaction commits.
+    """
+    if not is_enabled() or not invoice.pk:
+        return False
+    if not invoice.is_subscription and invoice.get_payment_link_provider() == PAYMENT_LINK_PROVIDER_NONE:
+        return True
+
+    values = {
+        "status": PaymentLinkRequest.STATUS_PENDING,
+        "total_amount": invoice.total_amount or 0,
+        "attempts": 0,
+        "next_attempt_at": timezone.now(),
+        "claimed_at": None,
+        "last_error": "",
+    }
+    updated = PaymentLinkRequest.objects.filter(invoice_id=invoice.pk).update(
+        version=F("version") + 1, **values
+    )
+    if not updated:
+        try:
+            with transaction.atomic():
+                PaymentLinkRequest.objects.create(invoice_id=invoice.pk, **values)
+        except IntegrityError:
+            # A concurrent save created the row first; fold into it.
+            PaymentLinkRequest.objects.filter(invoice_id=invoice.pk).update(
+                version=F("version") + 1, **values
+            )
+
+    if _setting("PAYMENT_LINK_OUTBOX_THREAD_DISPATCH", True):
+        invoice_id = invoice.pk
+        transaction.on_commit(lambda: _schedule(invoice_id))
+    return True
+
+
+# ---------- Processing ------------------------------------------------------
+
+def _claimable(now, *, force=False):
+    stale = now - timedelta(seconds=_setting("PAYMENT_LINK_CLAIM_TIMEOUT_SECONDS", DEFAULT_CLAIM_TIMEOUT_SECONDS))
+    pending = Q(status=PaymentLinkRequest.STATUS_PENDING)
+    if not force:
+        pending &= Q(next_attempt_at__lte=now)
+    return pending | Q(status=PaymentLinkRequest.STATUS_PROCESSING, claimed_at__lt=stale)
+
+
+def _claim(request, now, *, force=False) -> bool:
+    """Mark ``request`` as processing unless another worker got there first."""
+    claimed = (
+        PaymentLinkRequest.objects.filter(pk=request.pk, version=request.version)
+        .filter(_claimable(now, force=force))
+        .update(status=PaymentLinkRequest.STATUS_PROCESSING, claimed_at=now)
+    )
+    return bool(claimed)
+
+
+def _run(request, provider) -> bool:
+    invoice = GroupedInvoice.objects.select_related("user__profile").filter(pk=request.invoice_id).first()
+    if invoice is None:
+        return False
+
+    # Only the claimed version may be settled; a save during the provider call
+    # has already put the row back to pending with a higher version.
+    current = PaymentLinkRequest.objects.filter(pk=request.pk, version=request.version)
+    try:
+        provider.create_link(invoice)
+    except Exception as exc:
+        attempts = request.attempts + 1
+        max_attempts = _setting("PAYMENT_LINK_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS)
+        if attempts >= max_attempts:
+            status, next_attempt_at = PaymentLinkRequest.STATUS_FAILED, timezone.now()
+        else:
+            status, next_attempt_at = PaymentLinkRequest.STATUS_PENDING, timezone.now() + retry_delay(attempts)
+        current.update(
+            status=status,
+            attempts=attempts,
+            next_attempt_at=next_attempt_at,
+            claimed_at=None,
+            last_error=str(exc)[:2000],
+        )
+        logger.warning(
+            "Payment link attempt %s for invoice %s failed: %s",
+            attempts,
+            invoice.invoice_number,
+            exc,
+        )
+        return False
+
+    current.update(
+        status=PaymentLinkRequest.STATUS_DONE,
+        attempts=F("attempts") + 1,
+        claimed_at=None,
+        last_error="",
+    )
+    return True
+
+
+def process_invoice(invoice_id, *, provider=None, force=False) -> bool:
+    """
+    Build the queued link for one invoice now. ``force`` ignores retry backoff,
+    for flows that must show or email the link straight away.
+    """
+    request = PaymentLinkRequest.objects.filter(invoice_id=invoice_id).first()
+    if request is None or not _claim(request, timezone.now(), force=force):
+        return False
+    return _run(request, provider or get_provider())
+
+
+def process_due(*, limit=100, provider=None):
+    """Process due requests oldest first. Returns ``(succeeded, failed)``."""
+    now = timezone.now()
+    provider = provider or get_provider()
+    succeeded = failed = 0
+    requests = PaymentLinkRequest.objects.filter(_claimable(now)).order_by("next_attempt_at", "pk")[:limit]
+    for request in list(requests):
+        if not _claim(request, now):
+            continue
+        if _run(request, provider):
+            succeeded += 1
+        else:
+            failed += 1
+    return succeeded, failed
+
+
+def build_now(invoice):
+    """
+    Build ``invoice``'s link synchronously and refresh its link fields.
+
+    Used where the link is shown or emailed as part of the same request.
+    """
+    if not is_enabled():
+        return invoice.create_online_payment_link()
+    process_invoice(invoice.pk, force=True)
+    invoice.refresh_from_db(fields=list(LINK_FIELDS))
+    return invoice.payment_link
+
+
+# ---------- Background dispatch ---------------------------------------------
+
+_dispatch_queue = commit_hooks.BackgroundQueue("payment-link-outbox", lambda invoice_id: process_invoice(invoice_id))
+
+
+def _schedule(invoice_id):
+    _dispatch_queue.add(invoice_id)
@@ -0,0 +1,222 @@
+"""Content-addressed cache for rendered PDFs.
+
+Entries are keyed on a SHA-256 of the rendered HTML, the stylesheets and the
+local files the HTML references (logos are passed to WeasyPrint as
+``file://`` paths), so any change to the document produces a new key and
+nothing has to be invalidated by hand. Entries for stale versions simply age
+out.
+
+The default store keeps files on the local filesystem under
+``PDF_CACHE_DIR`` and evicts least recently used entries once the directory
+grows past ``PDF_CACHE_MAX_BYTES``. ``PDF_CACHE_STORE_CLASS`` swaps in another
+store with the same ``get``/``put``/``clear`` interface.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from pathlib import Path
+from typing import Callable, Iterable
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE_CLASS = "accounts.pdf_cache.FileSystemPdfStore"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Sweep again once this share of the size budget has been written.
+SWEEP_FRACTION = 0.1
+# Evict down to this share of the budget so sweeps do not run back to back.
+LOW_WATER_FRACTION = 0.9
+
+_FILE_URL_RE = re.compile(r"""file://([^"'\s)>]+)""")
+
+
+def is_enabled() -> bool:
+    """Return True when rendered PDFs should be cached."""
+    return bool(getattr(settings, "INVOICE_PDF_CACHE_ENABLED", True))
+
+
+class FileSystemPdfStore:
+    """Sharded directory of ``<key>.pdf`` files with size-bounded LRU eviction."""
+
+    def __init__(self, root=None, max_bytes=None):
+        default_root = os.path.join(tempfile.gettempdir(), "pdf_cache")
+        self.root = Path(root or getattr(settings, "PDF_CACHE_DIR", None) or default_root)
+        self.max_bytes = int(max_bytes or getattr(settings, "PDF_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+        self._lock = threading.Lock()
+        self._written_since_sweep = None
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.pdf"
+
+    def get(self, key: str) -> bytes | None:
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        try:
+            # The mtime doubles as the last-used time for eviction.
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                handle.write(data)
+            os.replace(tmp_name, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_name)
+            except OSError:
+                pass
+            raise
+
+        with self._lock:
+            # The first write in a process sweeps once; after that only every
+            # SWEEP_FRACTION of the budget, so misses do not list the directory.
+            if self._written_since_sweep is not None:
+                self._written_since_sweep += len(data)
+                if self._written_since_sweep < self.max_bytes * SWEEP_FRACTION:
+                    return
+            self._written_since_sweep = 0
+        self.evict()
+
+    def _entries(self):
+        if not self.root.exists():
+            return []
+        entries = []
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if not entry.name.endswith(".pdf"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self) -> int:
+        """Delete least recently used entries until the store fits its budget."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return 0
+        target = self.max_bytes * LOW_WATER_FRACTION
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self) -> None:
+        for _, _, path in self._entries():
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            store_class = getattr(settings, "PDF_CACHE_STORE_CLASS", DEFAULT_STORE_CLASS)
+            _store = import_string(store_class)()
+        return _store
+
+
+def reset_store() -> None:
+    """Forget the configured store (used when settings change, e.g. in tests)."""
+    global _store
+    with _store_lock:
+        _store = None
+
+
+def stylesheet_fingerprint(stylesheet) -> str:
+    """
+    Identify a stylesheet for the cache key. Sheets built with
+    :func:`accounts.pdf_utils.pdf_stylesheet` carry a content hash; anything
+    else falls back to its identity, which is stable for module-level sheets
+    within a process.
+    """
+    fingerprint = getattr(stylesheet, "pdf_cache_fingerprint", None)
+    if fingerprint:
+        return fingerprint
+    return f"{type(stylesheet).__name__}:{id(stylesheet)}"
+
+
+def _asset_fingerprints(html: str):
+    for raw_path in sorted(set(_FILE_URL_RE.findall(html))):
+        path = unquote(raw_path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            yield f"{path}:missing"
+            continue
+        yield f"{path}:{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def cache_key(html: str, stylesheets: Iterable = ()) -> str:
+    digest = hashlib.sha256()
+    digest.update(html.encode("utf-8"))
+    for stylesheet in stylesheets:
+        digest.update(b"\0css:")
+        digest.update(stylesheet_fingerprint(stylesheet).encode("utf-8"))
+    for asset in _asset_fingerprints(html):
+        digest.update(b"\0asset:")
+        digest.update(asset.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def get_or_render(html: str, render: Callable[[], bytes], *, stylesheets: Iterable = ()) -> bytes:
+    """Return the cached PDF for ``html`` or call ``render`` and store the result."""
+    stylesheets = list(stylesheets)
+    if not is_enabled():
+        return render()
+
+    store = get_store()
+    key = cache_key(html, stylesheets)
+    try:
+        cached = store.get(key)
+    except Exception:
+        logger.exception("PDF cache read failed for %s", key)
+        cached = None
+    if cached is not None:
+        return cached
+
+    pdf_bytes = render()
+    try:
+        store.put(key, pdf_bytes)
+    except Exception:
+        logger.exception("PDF cache write failed for %s", key)
+    return pdf_bytes
@@ -0,0 +1,135 @@
+"""Background pre-rendering of document PDFs into :mod:`accounts.pdf_cache`.
+
+When an invoice, estimate, work order or customer credit (or one of their
+lines, payments or credit items) changes, :func:`schedule` queues the document
+once per transaction. After commit a daemon thread renders it through the same
+code path the print/download/email views use, so the first request after an
+edit is served from the cache instead of waiting on WeasyPrint.
+
+Pre-rendering is skipped when it cannot produce the bytes a request would:
+invoices whose note is generated per render (``Profile.use_dynamic_note``) and
+work orders that are not completed yet. Disable it with
+``PDF_PRERENDER_ENABLED = False``; ``manage.py warm_pdf_cache`` fills the cache
+for existing documents.
+"""
+from __future__ import annotations
+
+import logging
+
+from django.conf import settings
+
+from . import commit_hooks, pdf_cache
+from .pdf_utils import WEASYPRINT_AVAILABLE
+
+
+logger = logging.getLogger(__name__)
+
+KIND_INVOICE = "invoice"
+KIND_ESTIMATE = "estimate"
+KIND_WORKORDER = "workorder"
+KIND_CREDIT = "credit"
+
+
+def is_enabled() -> bool:
+    """Return True when saved documents should be rendered in the background."""
+    return (
+        WEASYPRINT_AVAILABLE
+        and pdf_cache.is_enabled()
+        and bool(getattr(settings, "PDF_PRERENDER_ENABLED", True))
+    )
+
+
+# ---------- Renderers -------------------------------------------------------
+# Imports are local: the view modules import models and pull in most of the app.
+
+def render_invoice(invoice_id) -> int:
+    from .models import GroupedInvoice
+    from .paid_invoice_views import _render_paid_invoice_pdf
+    from .view_invoices import _build_invoice_context, _render_pdf
+    from .views import generate_invoice_pdf, get_invoice_context
+
+    invoice = (
+        GroupedInvoice.objects.select_related("user__profile", "customer", "work_order")
+        .prefetch_related("income_records__product", "payments")
+        .filter(pk=invoice_id)
+        .first()
+    )
+    if invoice is None:
+        return 0
+    profile = getattr(invoice.user, "profile", None)
+    if profile is not None and profile.show_note and profile.use_dynamic_note and not (invoice.notes or "").strip():
+        return 0
+
+    _render_pdf("invoices/grouped_invoice_pdf.html", _build_invoice_context(invoice, None, profile=profile))
+    # The download/email attachment uses its own template.
+    generate_invoice_pdf(get_invoice_context(invoice, None))
+    if invoice.payment_status == "Paid":
+        _render_paid_invoice_pdf(invoice)
+        return 3
+    return 2
+
+
+def render_estimate(estimate_id) -> int:
+    from .models import GroupedEstimate
+    from .view_invoices import _build_estimate_context, _render_pdf
+
+    estimate = GroupedEstimate.objects.select_related("user__profile", "customer").filter(pk=estimate_id).first()
+    if estimate is None:
+        return 0
+    _render_pdf("invoices/estimate_pdf.html", _build_estimate_context(estimate, None))
+    return 1
+
+
+def render_workorder(workorder_id) -> int:
+    from .models import WorkOrder
+    from .views import generate_workorder_pdf
+
+    workorder = WorkOrder.objects.select_related("user__profile").filter(pk=workorder_id).first()
+    if workorder is None or workorder.status != "completed":
+        return 0
+    generate_workorder_pdf(workorder)
+    return 1
+
+
+def render_credit(credit_id) -> int:
+    from .models import CustomerCredit
+    from .pdf_utils import render_template_to_pdf_cached
+    from .views import _build_customer_credit_context
+
+    credit = CustomerCredit.objects.select_related("user__profile", "customer").filter(pk=credit_id).first()
+    if credit is None:
+        return 0
+    render_template_to_pdf_cached(
+        "invoices/customer_credit_pdf.html",
+        _build_customer_credit_context(credit),
+    )
+    return 1
+
+
+RENDERERS = {
+    KIND_INVOICE: render_invoice,
+    KIND_ESTIMATE: render_estimate,
+    KIND_WORKORDER: render_workorder,
+    KIND_CREDIT: render_credit,
+}
+
+
+def render(kind, object_id) -> int:
+    """Render and cache the PDFs for one document now; returns the number rendered."""
+    return RENDERERS[kind](object_id)
+
+
+# ---------- Scheduling ------------------------------------------------------
+
+def schedule(kind, object_id) -> None:
+    """Pre-render ``kind``/``object_id`` in the background once the transaction commits."""
+    if not object_id or not is_enabled():
+        return
+    commit_hooks.on_commit_once(("pdf_prerender", kind, object_id), lambda: _schedule(kind, object_id))
+
+
+_dispatch_queue = commit_hooks.BackgroundQueue("pdf-prerender", lambda item: render(*item))
+
+
+def _schedule(kind, object_id):
+    _dispatch_queue.add((kind, object_id))
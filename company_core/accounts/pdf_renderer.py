@@ -0,0 +1,291 @@
+"""Warm, pooled WeasyPrint rendering.
+
+Building a fresh ``HTML(...)`` per request re-parses the stylesheets, rebuilds
+the Fontconfig configuration and re-reads the logo on every render, and the
+gunicorn worker is blocked while that happens. This module keeps *warm*
+renderers instead:
+
+* stylesheets are parsed once per renderer (keyed on their source),
+* one ``FontConfiguration`` is reused for every document, and
+* ``file://`` and ``http(s)`` assets such as logos are cached in memory,
+  keyed on path and mtime for local files and refreshed after
+  ``PDF_RENDER_ASSET_TTL`` seconds for remote ones.
+
+When ``PDF_RENDER_POOL_ENABLED`` is on, documents are rendered by a bounded
+``ProcessPoolExecutor`` of ``PDF_RENDER_POOL_SIZE`` warm worker processes;
+at most twice that many documents are queued at once, so callers block
+instead of piling work up. Otherwise, or if the pool breaks, each thread
+renders with its own warm renderer in-process.
+
+:func:`render` is the synchronous API and :func:`render_many` renders a batch
+in parallel, returning PDFs in input order. Stylesheets must be built with
+:func:`accounts.pdf_utils.pdf_stylesheet` to cross the process boundary; any
+other stylesheet object makes that document render in-process.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Iterable, NamedTuple
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 2
+DEFAULT_START_METHOD = "spawn"
+DEFAULT_TIMEOUT_SECONDS = 120
+DEFAULT_ASSET_TTL_SECONDS = 300
+MAX_CACHED_ASSETS = 64
+MAX_CACHED_ASSET_BYTES = 5 * 1024 * 1024
+
+
+@dataclass(frozen=True)
+class PdfStylesheet:
+    """Picklable stylesheet source; each renderer parses it once."""
+
+    source: str
+    pdf_cache_fingerprint: str = field(init=False, compare=False)
+
+    def __post_init__(self):
+        digest = hashlib.sha256(self.source.encode("utf-8")).hexdigest()
+        object.__setattr__(self, "pdf_cache_fingerprint", f"sha256:{digest}")
+
+
+class RenderJob(NamedTuple):
+    html: str
+    stylesheets: tuple = ()
+    base_url: str | None = None
+
+
+# Sources registered at import time are parsed when a worker starts.
+_preload_sources: dict = {}
+
+
+def register_stylesheet(stylesheet: PdfStylesheet) -> PdfStylesheet:
+    _preload_sources.setdefault(stylesheet.source, None)
+    return stylesheet
+
+
+# ---------- Warm renderer ---------------------------------------------------
+
+class _WarmRenderer:
+    def __init__(self, preload=(), *, asset_ttl=DEFAULT_ASSET_TTL_SECONDS):
+        from weasyprint import CSS, HTML, default_url_fetcher
+        from weasyprint.text.fonts import FontConfiguration
+
+        self._CSS = CSS
+        self._HTML = HTML
+        self._default_url_fetcher = default_url_fetcher
+        self.asset_ttl = asset_ttl
+        self.font_config = FontConfiguration()
+        self._stylesheets = {}
+        self._assets = OrderedDict()
+        for source in preload:
+            self._stylesheet(source)
+
+    def _stylesheet(self, sheet):
+        if isinstance(sheet, PdfStylesheet):
+            sheet = sheet.source
+        if not isinstance(sheet, str):
+            return sheet
+        css = self._stylesheets.get(sheet)
+        if css is None:
+            css = self._stylesheets[sheet] = self._CSS(string=sheet, font_config=self.font_config)
+        return css
+
+    def _asset_version(self, url):
+        if url.startswith("file://"):
+            from urllib.parse import unquote, urlsplit
+
+            try:
+                stat = os.stat(unquote(urlsplit(url).path))
+            except OSError:
+                return None
+            return (stat.st_mtime_ns, stat.st_size)
+        if url.startswith(("http://", "https://")):
+            return int(time.monotonic() // max(self.asset_ttl, 1))
+        return None
+
+    def fetch(self, url, *args, **kwargs):
+        """``url_fetcher`` that keeps small local and remote assets in memory."""
+        version = self._asset_version(url)
+        if version is None:
+            return self._default_url_fetcher(url, *args, **kwargs)
+
+        cached = self._assets.get(url)
+        if cached is not None and cached[0] == version:
+            self._assets.move_to_end(url)
+            return dict(cached[1])
+
+        result = self._default_url_fetcher(url, *args, **kwargs)
+        file_obj = result.pop("file_obj", None)
+        if file_obj is not None:
+            try:
+                result["string"] = file_obj.read()
+            finally:
+                file_obj.close()
+        if len(result.get("string") or b"") <= MAX_CACHED_ASSET_BYTES:
+            self._assets[url] = (version, dict(result))
+            while len(self._assets) > MAX_CACHED_ASSETS:
+                self._assets.popitem(last=False)
+        return result
+
+    def render(self, html, stylesheets=(), base_url=None) -> bytes:
+        document = self._HTML(string=html, base_url=base_url, url_fetcher=self.fetch)
+        return document.write_pdf(
+            stylesheets=[self._stylesheet(sheet) for sheet in stylesheets],
+            font_config=self.font_config,
+        )
+
+
+_local = threading.local()
+
+
+def _local_renderer():
+    renderer = getattr(_local, "renderer", None)
+    if renderer is None:
+        renderer = _local.renderer = _WarmRenderer(
+            list(_preload_sources),
+            asset_ttl=getattr(settings, "PDF_RENDER_ASSET_TTL", DEFAULT_ASSET_TTL_SECONDS),
+        )
+    return renderer
+
+
+# ---------- Worker processes ------------------------------------------------
+# Workers do not configure Django; they only need WeasyPrint.
+
+_worker_renderer = None
+
+
+def _init_worker(preload, asset_ttl):
+    global _worker_renderer
+    _worker_renderer = _WarmRenderer(preload, asset_ttl=asset_ttl)
+    # Lay out one page so fonts and the text shaper are loaded before real work.
+    _worker_renderer.render("<p>warm-up</p>", preload)
+
+
+def _render_in_worker(html, sources, base_url):
+    return _worker_renderer.render(html, sources, base_url)
+
+
+_pool = None
+_pool_slots = None
+_pool_lock = threading.Lock()
+
+
+def _pool_size() -> int:
+    return max(int(getattr(settings, "PDF_RENDER_POOL_SIZE", DEFAULT_POOL_SIZE)), 0)
+
+
+def is_pool_enabled() -> bool:
+    return bool(getattr(settings, "PDF_RENDER_POOL_ENABLED", True)) and _pool_size() > 0
+
+
+def _get_pool():
+    global _pool, _pool_slots
+    with _pool_lock:
+        if _pool is None:
+            size = _pool_size()
+            context = multiprocessing.get_context(
+                getattr(settings, "PDF_RENDER_POOL_START_METHOD", DEFAULT_START_METHOD)
+            )
+            _pool = ProcessPoolExecutor(
+                max_workers=size,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(
+                    tuple(_preload_sources),
+                    getattr(settings, "PDF_RENDER_ASSET_TTL", DEFAULT_ASSET_TTL_SECONDS),
+                ),
+            )
+            _pool_slots = threading.BoundedSemaphore(size * 2)
+        return _pool, _pool_slots
+
+
+def shutdown(wait=True) -> None:
+    """Stop the worker processes; the next render starts a fresh pool."""
+    global _pool, _pool_slots
+    with _pool_lock:
+        pool, _pool, _pool_slots = _pool, None, None
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=True)
+
+
+def _poolable_sources(stylesheets):
+    sources = []
+    for sheet in stylesheets:
+        if isinstance(sheet, PdfStylesheet):
+            sources.append(sheet.source)
+        elif isinstance(sheet, str):
+            sources.append(sheet)
+        else:
+            return None
+    return tuple(sources)
+
+
+def _submit(job: RenderJob):
+    """Queue ``job`` on the pool, or return None when it must render in-process."""
+    if not is_pool_enabled():
+        return None
+    sources = _poolable_sources(job.stylesheets)
+    if sources is None:
+        return None
+    pool, slots = _get_pool()
+    slots.acquire()
+    try:
+        future = pool.submit(_render_in_worker, job.html, sources, job.base_url)
+    except BaseException:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    return future
+
+
+def _result(job: RenderJob, future) -> bytes:
+    if future is not None:
+        try:
+            return future.result(timeout=getattr(settings, "PDF_RENDER_TIMEOUT", DEFAULT_TIMEOUT_SECONDS))
+        except BrokenProcessPool:
+            logger.exception("PDF render pool broke; rendering in-process")
+            shutdown(wait=False)
+    return _local_renderer().render(job.html, job.stylesheets, job.base_url)
+
+
+# ---------- Public API ------------------------------------------------------
+
+def render(html: str, *, stylesheets: Iterable = (), base_url: str | None = None) -> bytes:
+    """Render ``html`` to PDF bytes with a warm renderer."""
+    job = RenderJob(html, tuple(stylesheets), base_url)
+    try:
+        future = _submit(job)
+    except BrokenProcessPool:
+        shutdown(wait=False)
+        future = None
+    return _result(job, future)
+
+
+def render_many(jobs: Iterable) -> list[bytes]:
+    """
+    Render several documents in parallel. ``jobs`` holds :class:`RenderJob`
+    tuples (or ``(html, stylesheets, base_url)`` tuples); PDFs are returned in
+    the same order.
+    """
+    jobs = [RenderJob(*job) if not isinstance(job, RenderJob) else job for job in jobs]
+    futures = []
+    for job in jobs:
+        try:
+            futures.append(_submit(job))
+        except BrokenProcessPool:
+            shutdown(wait=False)
+            futures.append(None)
+    return [_result(job, future) for job, future in zip(jobs, futures)]
@@ -1,16 +1,10 @@
 """Utility helpers for PDF rendering and caching."""
 from __future__ import annotations
 
-from datetime import datetime
-from io import BytesIO
-from pathlib import Path
 from typing import Iterable
 
 from django.conf import settings
-from django.core.files.base import ContentFile
-from django.core.files.storage import default_storage
 from django.template.loader import render_to_string
-from django.utils import timezone
 try:
     from weasyprint import HTML
     WEASYPRINT_AVAILABLE = True
@@ -18,7 +12,7 @@ except (ImportError, OSError):
     WEASYPRINT_AVAILABLE = False
     HTML = None
 
-DEFAULT_CACHE_SUBDIR = "invoices/generated"
+from . import pdf_cache, pdf_renderer
 
 
 def apply_branding_defaults(context: dict) -> dict:
@@ -68,62 +62,20 @@ def apply_branding_defaults(context: dict) -> dict:
     return context
 
 
-def _storage_is_cloudinary() -> bool:
+def pdf_stylesheet(source: str) -> pdf_renderer.PdfStylesheet:
     """
-    True when the default storage backend is Cloudinary.
-
-    We avoid caching PDFs into Cloudinary because it is unnecessary and consumes resources.
-    PDFs should be generated on-demand for email/print/download.
-    """
-    if getattr(settings, "USE_CLOUDINARY_STORAGE", False):
-        return True
-    storage_cls = getattr(default_storage, "__class__", None)
-    storage_mod = (getattr(storage_cls, "__module__", "") or "").lower()
-    storage_name = (getattr(storage_cls, "__name__", "") or "").lower()
-    return ("cloudinary" in storage_mod) or ("cloudinary" in storage_name)
-
-
-def _pdf_cache_enabled() -> bool:
+    Declare a stylesheet for PDF rendering. The renderers in
+    :mod:`accounts.pdf_renderer` parse it once and reuse it; its content hash
+    keys :mod:`accounts.pdf_cache` entries.
     """
-    Allow disabling invoice PDF caching.
-
-    Default: enabled, but automatically disabled when Cloudinary is active.
-    """
-    enabled = getattr(settings, "INVOICE_PDF_CACHE_ENABLED", True)
-    return bool(enabled) and not _storage_is_cloudinary()
-
-
-def _cache_directory() -> str:
-    configured = getattr(settings, "INVOICE_PDF_CACHE_SUBDIR", DEFAULT_CACHE_SUBDIR)
-    # Normalise to a simple forward-slash path for the configured storage backend
-    return str(Path(configured).as_posix())
-
-
-def _object_timestamp(obj) -> datetime:
-    timestamp = getattr(obj, "updated_at", None) or getattr(obj, "created_at", None)
-    if timestamp is None:
-        timestamp = timezone.now()
-    return timestamp
-
-
-def _purge_old_cached_files(directory: str, prefix: str) -> None:
-    try:
-        _, files = default_storage.listdir(directory)
-    except (FileNotFoundError, NotADirectoryError):
-        return
-
-    for name in files:
-        if name.startswith(prefix):
-            default_storage.delete(f"{directory}/{name}")
+    return pdf_renderer.register_stylesheet(pdf_renderer.PdfStylesheet(source))
 
 
 def render_html_to_pdf(html: str, *, stylesheets: Iterable = (), base_url: str | None = None) -> bytes:
-    """Render an HTML string to PDF bytes."""
+    """Render an HTML string to PDF bytes with a warm (optionally pooled) renderer."""
     if not WEASYPRINT_AVAILABLE:
         raise ImportError("WeasyPrint is not available. PDF generation is disabled. Please install GTK+ libraries for Windows or use a different PDF generation method.")
-    buffer = BytesIO()
-    HTML(string=html, base_url=base_url).write_pdf(target=buffer, stylesheets=list(stylesheets))
-    return buffer.getvalue()
+    return pdf_renderer.render(html, stylesheets=stylesheets, base_url=base_url)
 
 
 def render_template_to_pdf(
@@ -138,36 +90,27 @@ def render_template_to_pdf(
     return render_html_to_pdf(html, stylesheets=stylesheets, base_url=base_url)
 
 
-def render_template_to_pdf_cached(
-    obj,
-    template: str,
-    context: dict,
-    *,
-    cache_prefix: str,
-    stylesheets: Iterable = (),
-) -> bytes:
-    """Render a template to PDF bytes with simple storage-backed caching."""
-    context = apply_branding_defaults(context)
-    # Never store invoice PDFs in Cloudinary (resource-heavy and unnecessary).
-    if not _pdf_cache_enabled():
-        return render_template_to_pdf(template, context, stylesheets=stylesheets)
-
-    object_pk = getattr(obj, 'pk', None)
-    if object_pk is None:
-        return render_template_to_pdf(template, context, stylesheets=stylesheets)
-
-    directory = _cache_directory()
-    timestamp = _object_timestamp(obj)
-    filename = f"{cache_prefix}_{object_pk}_{timestamp.strftime('%Y%m%d%H%M%S')}".strip()
-    cache_path = f"{directory}/{filename}.pdf"
+def render_html_to_pdf_cached(html: str, *, stylesheets: Iterable = (), base_url: str | None = None) -> bytes:
+    """
+    Render an HTML string to PDF bytes through :mod:`accounts.pdf_cache`.
 
-    if default_storage.exists(cache_path):
-        with default_storage.open(cache_path, "rb") as cached_file:
-            return cached_file.read()
+    ``base_url`` is not part of the cache key: PDF templates reference their
+    assets by absolute URL or ``file://`` path, so it does not change the output.
+    """
+    stylesheets = [sheet for sheet in stylesheets if sheet is not None]
+    return pdf_cache.get_or_render(
+        html,
+        lambda: render_html_to_pdf(html, stylesheets=stylesheets, base_url=base_url),
+        stylesheets=stylesheets,
+    )
 
-    # Remove older cached variants for the same object to avoid orphaned files
-    _purge_old_cached_files(directory, f"{cache_prefix}_{object_pk}_")
 
-    pdf_bytes = render_template_to_pdf(template, context, stylesheets=stylesheets)
-    default_storage.save(cache_path, ContentFile(pdf_bytes))
-    return pdf_bytes
+def render_template_to_pdf_cached(template: str, context: dict, *, stylesheets: Iterable = ()) -> bytes:
+    """
+    Render a template to PDF bytes, reusing a cached PDF when the rendered HTML
+    is unchanged. The cache is keyed on content, so any view rendering the same
+    document shares the entry.
+    """
+    context = apply_branding_defaults(context)
+    html = render_to_string(template, context)
+    return render_html_to_pdf_cached(html, stylesheets=stylesheets)
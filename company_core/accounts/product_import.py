@@ -0,0 +1,939 @@
+"""Import the product workbook in the background.
+
+The products page used to parse the whole workbook inside the request. Every
+row ran lookup-or-create queries for its category, supplier, brand, model and
+VIN, then ``product.save()`` with its signals, stock row and activity entry,
+so a large supplier catalog timed out. :func:`enqueue` now checks the header
+row, stores the upload as a :class:`~accounts.models.ProductImportJob` and
+processes it after commit on a background thread (disable with
+``PRODUCT_IMPORT_THREAD_DISPATCH = False``), or via ``manage.py
+process_product_imports``.
+
+:func:`process_job` streams the sheet (openpyxl read-only) in chunks of
+:data:`CHUNK_SIZE` rows. Reference tables are loaded into lookup maps once and
+missing names are bulk-created per chunk. Products are matched by SKU, then by
+name, with two queries per chunk and written with ``bulk_create`` /
+``bulk_update``, together with their stock rows, alternate SKUs and activity
+entries. If a chunk hits a constraint, it is retried row by row so only the
+offending rows are rejected. Counters are saved after every chunk for the
+progress endpoint, and rejected rows are written to a CSV error report.
+Each progress save also refreshes the job's ``claimed_at``; a job left
+processing for ``PRODUCT_IMPORT_CLAIM_TIMEOUT_SECONDS`` without one (its
+worker died) is claimed again by the next :func:`process_pending`.
+"""
+from __future__ import annotations
+
+import csv
+import logging
+import re
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from io import StringIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from . import commit_hooks
+from .context_processors import invalidate_storefront_nav_cache
+from .models import (
+    ActivityLog,
+    Category,
+    Product,
+    ProductAlternateSku,
+    ProductBrand,
+    ProductImportJob,
+    ProductModel,
+    ProductStock,
+    ProductVin,
+    Supplier,
+)
+from .utils import get_stock_owner
+
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+DEFAULT_CLAIM_TIMEOUT_SECONDS = 600
+
+PRODUCT_TEMPLATE_HEADERS = [
+    "SKU",
+    "OEM Part Number",
+    "Barcode",
+    "Alternate SKUs",
+    "Name",
+    "Description",
+    "Fitment Notes",
+    "Category",
+    "Supplier",
+    "Brand",
+    "Model",
+    "VIN",
+    "Item Type",
+    "Cost Price",
+    "Sale Price",
+    "Promotion Price",
+    "Margin",
+    "Quantity",
+    "Reorder Level",
+    "Max Stock Level",
+    "Location",
+    "Warranty Expiry Date",
+    "Warranty Length (Days)",
+    "Show on Storefront",
+    "Featured",
+]
+
+OPTIONAL_PRODUCT_TEMPLATE_HEADERS = {
+    "OEM Part Number",
+    "Barcode",
+    "Alternate SKUs",
+    "Fitment Notes",
+    "Max Stock Level",
+}
+
+# Fields the importer writes on existing products.
+PRODUCT_FIELDS = (
+    "user",
+    "sku",
+    "oem_part_number",
+    "barcode_value",
+    "name",
+    "description",
+    "fitment_notes",
+    "category",
+    "supplier",
+    "brand",
+    "vehicle_model",
+    "vin_number",
+    "cost_price",
+    "sale_price",
+    "promotion_price",
+    "margin",
+    "quantity_in_stock",
+    "reorder_level",
+    "max_stock_level",
+    "location",
+    "warranty_expiry_date",
+    "warranty_length",
+    "item_type",
+    "is_published_to_store",
+    "is_featured",
+    "updated_at",
+)
+
+
+# ---------- Cell parsing ----------------------------------------------------
+# Public: the supplier and catalog importers in views_inventory parse with these too.
+
+def normalize_text(value):
+    if value in (None, ""):
+        return ""
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, float):
+        if value.is_integer():
+            return str(int(value))
+        return ("%s" % value).strip()
+    return str(value).strip()
+
+
+def _parse_alternate_sku_input(value):
+    if value in (None, ""):
+        return []
+    if isinstance(value, (list, tuple)):
+        raw_values = value
+    else:
+        raw_values = re.split(r"[\n,;]+", str(value))
+
+    parsed = []
+    seen = set()
+    for raw in raw_values:
+        normalized = (str(raw) if raw is not None else "").strip()
+        if not normalized:
+            continue
+        key = normalized.casefold()
+        if key in seen:
+            continue
+        seen.add(key)
+        parsed.append(normalized)
+    return parsed
+
+
+def parse_decimal(value, field_name, allow_blank=True):
+    if value in (None, ""):
+        if allow_blank:
+            return None
+        return Decimal("0")
+    if isinstance(value, Decimal):
+        return value
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, ValueError) as exc:
+        raise ValueError(f"{field_name} must be a number.") from exc
+
+
+def parse_integer(value, field_name):
+    if value in (None, ""):
+        return 0
+    try:
+        decimal_value = Decimal(str(value))
+        if decimal_value != decimal_value.to_integral_value():
+            raise ValueError
+        return int(decimal_value)
+    except (InvalidOperation, ValueError) as exc:
+        raise ValueError(f"{field_name} must be an integer.") from exc
+
+
+def parse_optional_integer(value, field_name):
+    if value in (None, ""):
+        return None
+    return parse_integer(value, field_name)
+
+
+def parse_date(value, field_name):
+    if value in (None, ""):
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str):
+        cleaned = value.strip()
+        for fmt in ("%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y"):
+            try:
+                return datetime.strptime(cleaned, fmt).date()
+            except ValueError:
+                continue
+        raise ValueError(
+            f"{field_name} must be a valid date in YYYY-MM-DD format."
+        )
+    raise ValueError(f"{field_name} must be a valid date.")
+
+
+def parse_boolean(value, field_name, default=None):
+    if value in (None, ""):
+        return default
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float, Decimal)):
+        if value == 1:
+            return True
+        if value == 0:
+            return False
+    if isinstance(value, str):
+        normalized = value.strip().lower()
+        truthy = {"1", "true", "yes", "y", "active", "enabled", "on"}
+        falsy = {"0", "false", "no", "n", "inactive", "disabled", "off"}
+        if normalized in truthy:
+            return True
+        if normalized in falsy:
+            return False
+    raise ValueError(f"{field_name} must be yes/no or true/false.")
+
+
+def _check_length(value, model, field_name, label):
+    max_length = model._meta.get_field(field_name).max_length
+    if value and len(value) > max_length:
+        raise ValueError(f"{label} must be {max_length} characters or fewer.")
+
+
+def _item_type_map():
+    item_type_map = {}
+    for value, label in Product._meta.get_field("item_type").choices:
+        item_type_map[str(value).strip().lower()] = value
+        item_type_map[str(label).strip().lower()] = value
+        item_type_map[str(label).strip().lower().replace("-", "_")] = value
+    return item_type_map
+
+
+def parse_row(get_value, *, has_alternate_skus, item_type_map):
+    """
+    Validate one sheet row; ``get_value(header)`` returns a cell. Returns the
+    product values with reference names unresolved; raises ValueError.
+    """
+    sku = normalize_text(get_value("SKU"))
+    oem_part_number = normalize_text(get_value("OEM Part Number"))
+    barcode_value = normalize_text(get_value("Barcode"))
+    fitment_notes = normalize_text(get_value("Fitment Notes"))
+    alternate_skus = None
+    if has_alternate_skus:
+        alternate_skus = _parse_alternate_sku_input(get_value("Alternate SKUs"))
+
+    name = normalize_text(get_value("Name"))
+    if not name:
+        raise ValueError("Name is required.")
+
+    description = get_value("Description") or ""
+    if isinstance(description, str):
+        description = description.strip()
+
+    references = {
+        "category": normalize_text(get_value("Category")),
+        "supplier": normalize_text(get_value("Supplier")),
+        "brand": normalize_text(get_value("Brand")),
+        "vehicle_model": normalize_text(get_value("Model")),
+        "vin_number": normalize_text(get_value("VIN")),
+    }
+    _check_length(sku, Product, "sku", "SKU")
+    _check_length(name, Product, "name", "Name")
+    _check_length(references["category"], Category, "name", "Category")
+    _check_length(references["supplier"], Supplier, "name", "Supplier")
+    _check_length(references["brand"], ProductBrand, "name", "Brand")
+    _check_length(references["vehicle_model"], ProductModel, "name", "Model")
+    _check_length(references["vin_number"], ProductVin, "vin", "VIN")
+
+    cost_price = parse_decimal(get_value("Cost Price"), "Cost Price")
+    sale_price = parse_decimal(get_value("Sale Price"), "Sale Price")
+    promotion_price = parse_decimal(get_value("Promotion Price"), "Promotion Price")
+    margin = parse_decimal(get_value("Margin"), "Margin")
+
+    for label, value in (("Cost Price", cost_price), ("Sale Price", sale_price)):
+        if value is not None and value < Decimal("0"):
+            raise ValueError(f"{label} cannot be negative.")
+    if margin is None:
+        if cost_price is None and sale_price is None:
+            raise ValueError(
+                "Provide Cost Price and Sale Price, or include the Margin so missing values can be calculated."
+            )
+        if cost_price is None or sale_price is None:
+            raise ValueError(
+                "Margin is required when only one of Cost Price or Sale Price is supplied."
+            )
+        margin = sale_price - cost_price
+    else:
+        if cost_price is None and sale_price is None:
+            raise ValueError(
+                "Cost Price or Sale Price is required when Margin is provided."
+            )
+        if cost_price is None:
+            cost_price = sale_price - margin
+        if sale_price is None:
+            sale_price = cost_price + margin
+        if cost_price is not None and sale_price is not None:
+            margin = sale_price - cost_price
+
+    if cost_price is None or sale_price is None:
+        raise ValueError("Unable to determine both Cost Price and Sale Price from the provided values.")
+
+    if cost_price < Decimal("0"):
+        raise ValueError("Cost Price cannot be negative.")
+    if sale_price < Decimal("0"):
+        raise ValueError("Sale Price cannot be negative.")
+    if promotion_price is not None and promotion_price < Decimal("0"):
+        raise ValueError("Promotion Price cannot be negative.")
+
+    quantity = parse_integer(get_value("Quantity"), "Quantity")
+    if quantity < 0:
+        raise ValueError("Quantity cannot be negative.")
+
+    reorder_level = parse_integer(get_value("Reorder Level"), "Reorder Level")
+    if reorder_level < 0:
+        raise ValueError("Reorder Level cannot be negative.")
+    max_stock_level = parse_integer(get_value("Max Stock Level"), "Max Stock Level")
+    if max_stock_level < 0:
+        raise ValueError("Max Stock Level cannot be negative.")
+    if max_stock_level and max_stock_level < reorder_level:
+        raise ValueError("Max Stock Level must be greater than or equal to Reorder Level.")
+
+    location = normalize_text(get_value("Location"))
+
+    warranty_expiry = parse_date(get_value("Warranty Expiry Date"), "Warranty Expiry Date")
+    warranty_length = parse_optional_integer(get_value("Warranty Length (Days)"), "Warranty Length (Days)")
+    if warranty_length is not None and warranty_length < 0:
+        raise ValueError("Warranty Length cannot be negative.")
+
+    item_type_raw = normalize_text(get_value("Item Type"))
+    item_type = None
+    if item_type_raw:
+        normalized_item_type = item_type_raw.strip().lower().replace(" ", "_").replace("-", "_")
+        item_type = item_type_map.get(normalized_item_type)
+        if not item_type:
+            raise ValueError("Item Type must be Inventory or Non-inventory.")
+
+    return {
+        "sku": sku,
+        "oem_part_number": oem_part_number,
+        "barcode_value": barcode_value,
+        "alternate_skus": alternate_skus,
+        "name": name,
+        "description": description,
+        "fitment_notes": fitment_notes,
+        "references": references,
+        "cost_price": cost_price,
+        "sale_price": sale_price,
+        "promotion_price": promotion_price,
+        "margin": margin,
+        "quantity": quantity,
+        "reorder_level": reorder_level,
+        "max_stock_level": max_stock_level,
+        "location": location,
+        "warranty_expiry_date": warranty_expiry,
+        "warranty_length": warranty_length,
+        "item_type": item_type,
+        "show_on_storefront": parse_boolean(
+            get_value("Show on Storefront"), "Show on Storefront", default=None
+        ),
+        "featured": parse_boolean(get_value("Featured"), "Featured", default=None),
+    }
+
+
+def read_header(rows):
+    """
+    Consume ``rows`` (``iter_rows(values_only=True)``) up to the header row,
+    skipping blank and ``Instructions:`` rows. Returns ``(row_number,
+    headers)``; raises ValueError when the sheet has no usable header.
+    """
+    for row_number, values in enumerate(rows, start=1):
+        if not values or not any(values):
+            continue
+        first_value = values[0]
+        if isinstance(first_value, str) and first_value.startswith("Instructions:"):
+            continue
+        headers = [(value.strip() if isinstance(value, str) else value) or "" for value in values]
+        missing_headers = [
+            h
+            for h in PRODUCT_TEMPLATE_HEADERS
+            if h not in headers and h not in OPTIONAL_PRODUCT_TEMPLATE_HEADERS
+        ]
+        if missing_headers:
+            raise ValueError(
+                "The uploaded file is missing required columns: " + ", ".join(missing_headers)
+            )
+        return row_number, headers
+    raise ValueError("The uploaded file is empty or missing a header row.")
+
+
+def _open_sheet(file):
+    try:
+        workbook = load_workbook(file, read_only=True, data_only=True)
+    except Exception as exc:
+        raise ValueError("Unable to read the uploaded file. Please upload a valid .xlsx file.") from exc
+    return workbook, workbook.active
+
+
+# ---------- Importer --------------------------------------------------------
+
+def _key(value):
+    return (value or "").lower()
+
+
+class _ProductImporter:
+    """Writes one job's rows; reference maps live for the whole file."""
+
+    def __init__(self, job):
+        self.user = job.user
+        self.owner = get_stock_owner(job.user) or job.user
+        self.actor = job.actor if self._actor_is_audited(job.actor) else None
+        self.item_type_map = _item_type_map()
+        self.categories = self._load(Category.objects.filter(user=self.user), "name")
+        self.suppliers = self._load(Supplier.objects.filter(user=self.user), "name")
+        self.brands = self._load(ProductBrand.objects.filter(user=self.user), "name")
+        self.vins = self._load(ProductVin.objects.filter(user=self.user), "vin")
+        self.models = {}
+        for vehicle_model in ProductModel.objects.filter(user=self.user).order_by("pk"):
+            self.models.setdefault(_key(vehicle_model.name), []).append(vehicle_model)
+
+    @staticmethod
+    def _actor_is_audited(actor):
+        # Same rule as signals._record_activity.
+        profile = getattr(actor, "profile", None) if actor else None
+        return bool(profile and profile.is_business_admin and profile.admin_approved)
+
+    @staticmethod
+    def _load(queryset, field):
+        lookup = {}
+        for obj in queryset.order_by("pk"):
+            lookup.setdefault(_key(getattr(obj, field)), obj)
+        return lookup
+
+    # -- references --
+
+    def _create_missing(self, model, lookup, field, names, **extra):
+        missing = {}
+        for name in names:
+            if name and _key(name) not in lookup:
+                missing.setdefault(_key(name), name)
+        if not missing:
+            return
+        model.objects.bulk_create(
+            [model(user=self.user, **{field: name}, **extra) for name in missing.values()],
+            ignore_conflicts=True,
+        )
+        # Re-read rather than trust returned pks, which not every backend sets.
+        for obj in model.objects.filter(user=self.user, **{f"{field}__in": list(missing.values())}).order_by("pk"):
+            lookup.setdefault(_key(getattr(obj, field)), obj)
+
+    def _model_for(self, name, brand):
+        candidates = self.models.get(_key(name)) or []
+        if brand is not None:
+            for vehicle_model in candidates:
+                if vehicle_model.brand_id == brand.pk:
+                    return vehicle_model
+        return candidates[0] if candidates else None
+
+    def resolve_references(self, parsed_rows):
+        """Create the chunk's missing categories, suppliers, brands, models and VINs."""
+        names = {field: set() for field in ("category", "supplier", "brand", "vehicle_model", "vin_number")}
+        for _, _, parsed in parsed_rows:
+            for field, value in parsed["references"].items():
+                if value:
+                    names[field].add(value)
+        self._create_missing(Category, self.categories, "name", names["category"], description="")
+        self._create_missing(Supplier, self.suppliers, "name", names["supplier"])
+        self._create_missing(ProductBrand, self.brands, "name", names["brand"])
+        self._create_missing(ProductVin, self.vins, "vin", names["vin_number"])
+
+        new_models = {}
+        for _, _, parsed in parsed_rows:
+            references = parsed["references"]
+            name = references["vehicle_model"]
+            if not name:
+                continue
+            brand = self.brands.get(_key(references["brand"])) if references["brand"] else None
+            if self._model_for(name, brand) is None:
+                new_models.setdefault(_key(name), (name, brand))
+        if new_models:
+            ProductModel.objects.bulk_create(
+                [ProductModel(user=self.user, name=name, brand=brand) for name, brand in new_models.values()],
+                ignore_conflicts=True,
+            )
+            created = ProductModel.objects.filter(
+                user=self.user, name__in=[name for name, _ in new_models.values()]
+            ).order_by("pk")
+            for vehicle_model in created:
+                bucket = self.models.setdefault(_key(vehicle_model.name), [])
+                if all(existing.pk != vehicle_model.pk for existing in bucket):
+                    bucket.append(vehicle_model)
+
+    # -- products --
+
+    def _existing_products(self, parsed_rows):
+        skus = {_key(parsed["sku"]) for _, _, parsed in parsed_rows if parsed["sku"]}
+        names = {_key(parsed["name"]) for _, _, parsed in parsed_rows}
+        user_ids = {self.user.pk, self.owner.pk}
+        by_sku, by_name = {}, {}
+        if skus:
+            for product in (
+                Product.objects.filter(user_id__in=user_ids)
+                .annotate(sku_key=Lower("sku"))
+                .filter(sku_key__in=skus)
+                .order_by("pk")
+            ):
+                by_sku.setdefault(product.sku_key, product)
+        for product in (
+            Product.objects.filter(user_id__in=user_ids)
+            .annotate(name_key=Lower("name"))
+            .filter(name_key__in=names)
+            .order_by("pk")
+        ):
+            by_name.setdefault(product.name_key, product)
+        return by_sku, by_name
+
+    def _apply(self, product, parsed, now):
+        references = parsed["references"]
+        brand = self.brands.get(_key(references["brand"])) if references["brand"] else None
+        product.user = self.owner
+        product.sku = parsed["sku"] or None
+        product.oem_part_number = parsed["oem_part_number"] or None
+        product.barcode_value = parsed["barcode_value"] or None
+        product.name = parsed["name"]
+        product.description = parsed["description"] or ""
+        product.fitment_notes = parsed["fitment_notes"] or ""
+        product.category = self.categories.get(_key(references["category"])) if references["category"] else None
+        product.supplier = self.suppliers.get(_key(references["supplier"])) if references["supplier"] else None
+        product.brand = brand
+        product.vehicle_model = (
+            self._model_for(references["vehicle_model"], brand) if references["vehicle_model"] else None
+        )
+        product.vin_number = self.vins.get(_key(references["vin_number"])) if references["vin_number"] else None
+        product.cost_price = parsed["cost_price"]
+        product.sale_price = parsed["sale_price"]
+        product.promotion_price = parsed["promotion_price"]
+        product.margin = parsed["margin"]
+        product.quantity_in_stock = parsed["quantity"]
+        product.reorder_level = parsed["reorder_level"]
+        product.max_stock_level = parsed["max_stock_level"]
+        product.location = parsed["location"] or ""
+        product.warranty_expiry_date = parsed["warranty_expiry_date"]
+        product.warranty_length = parsed["warranty_length"]
+        if parsed["item_type"]:
+            product.item_type = parsed["item_type"]
+        if parsed["show_on_storefront"] is not None:
+            product.is_published_to_store = parsed["show_on_storefront"]
+        if parsed["featured"] is not None:
+            product.is_featured = parsed["featured"]
+        product.updated_at = now
+        product.clean()
+
+    def write(self, parsed_rows):
+        """
+        Upsert ``parsed_rows`` (``(row_number, values, parsed)``) and their
+        stock rows and alternate SKUs. Returns ``(created, updated, errors)``;
+        the caller wraps this in a transaction.
+        """
+        now = timezone.now()
+        by_sku, by_name = self._existing_products(parsed_rows)
+        to_create, to_update, errors = [], {}, []
+        entries = []  # (product, parsed, is_new)
+        for row_number, values, parsed in parsed_rows:
+            product = None
+            if parsed["sku"]:
+                product = by_sku.get(_key(parsed["sku"]))
+            if product is None:
+                product = by_name.get(_key(parsed["name"]))
+            is_new = product is None
+            if is_new:
+                product = Product(user=self.owner)
+            # A product may already be queued by an earlier row of the chunk.
+            previous = {field.attname: getattr(product, field.attname) for field in Product._meta.concrete_fields}
+            try:
+                self._apply(product, parsed, now)
+            except ValidationError as exc:
+                for attname, value in previous.items():
+                    setattr(product, attname, value)
+                errors.append((row_number, "; ".join(exc.messages), values))
+                continue
+            # Later rows for the same SKU or name update this product.
+            if product.sku:
+                by_sku[_key(product.sku)] = product
+            by_name[_key(product.name)] = product
+            if product.pk is None:
+                if is_new:
+                    to_create.append(product)
+            else:
+                to_update[product.pk] = product
+            entries.append((product, parsed, is_new))
+
+        if to_create:
+            if connections[Product.objects.db].features.can_return_rows_from_bulk_insert:
+                Product.objects.bulk_create(to_create, batch_size=CHUNK_SIZE)
+            else:
+                existing = {pk for pk, _, _ in self._rows_named(to_create)}
+                Product.objects.bulk_create(to_create, batch_size=CHUNK_SIZE)
+                self._assign_missing_pks(to_create, existing)
+        if to_update:
+            Product.objects.bulk_update(list(to_update.values()), PRODUCT_FIELDS, batch_size=CHUNK_SIZE)
+
+        products = {product.pk: product for product, _, _ in entries}
+        self._write_stock(products)
+        self._write_alternate_skus(
+            {product.pk: parsed["alternate_skus"] for product, parsed, _ in entries if parsed["alternate_skus"] is not None},
+            products,
+        )
+        self._log_activity(entries)
+        created = sum(1 for _, _, is_new in entries if is_new)
+        return created, len(entries) - created, errors
+
+    def _rows_named(self, products):
+        names = {_key(product.name) for product in products}
+        return (
+            Product.objects.filter(user=self.owner)
+            .annotate(name_key=Lower("name"))
+            .filter(name_key__in=names)
+            .order_by("pk")
+            .values_list("pk", "sku", "name")
+        )
+
+    def _assign_missing_pks(self, products, existing):
+        """
+        Fill in the pks of ``products`` on backends whose ``bulk_create``
+        cannot return them. Runs in the chunk's transaction, so the rows
+        with the created names whose pks weren't in ``existing`` before the
+        insert are the ones it wrote, matched by (sku, name) in insertion
+        order.
+        """
+        inserted = {}
+        for pk, sku, name in self._rows_named(products):
+            if pk not in existing:
+                inserted.setdefault((_key(sku), _key(name)), []).append(pk)
+        for product in products:
+            product.pk = inserted[(_key(product.sku), _key(product.name))].pop(0)
+            product._state.adding = False
+
+    def _write_stock(self, products):
+        if not products:
+            return
+        now = timezone.now()
+        existing = {
+            stock.product_id: stock
+            for stock in ProductStock.objects.filter(product_id__in=list(products), user=self.owner)
+        }
+        to_create, to_update = [], []
+        for product_id, product in products.items():
+            tracked = product.item_type == "inventory"
+            values = {
+                "quantity_in_stock": product.quantity_in_stock if tracked else 0,
+                "reorder_level": product.reorder_level if tracked else 0,
+                "max_stock_level": product.max_stock_level if tracked else 0,
+            }
+            stock = existing.get(product_id)
+            if stock is None:
+                to_create.append(ProductStock(product_id=product_id, user=self.owner, **values))
+                continue
+            for field, value in values.items():
+                setattr(stock, field, value)
+            stock.updated_at = now
+            to_update.append(stock)
+        ProductStock.objects.bulk_create(to_create, batch_size=CHUNK_SIZE)
+        ProductStock.objects.bulk_update(
+            to_update,
+            ["quantity_in_stock", "reorder_level", "max_stock_level", "updated_at"],
+            batch_size=CHUNK_SIZE,
+        )
+
+    def _write_alternate_skus(self, wanted, products):
+        """Bulk form of ``views_inventory._sync_alternate_skus``."""
+        if not wanted:
+            return
+        existing = {}
+        for alternate in ProductAlternateSku.objects.filter(product_id__in=list(wanted)).order_by("pk"):
+            existing.setdefault(alternate.product_id, []).append(alternate)
+
+        to_delete, to_rename, to_create = [], [], []
+        for product_id, sku_list in wanted.items():
+            main_key = (products[product_id].sku or "").strip().casefold()
+            desired = {}
+            for sku in sku_list:
+                if sku and sku.casefold() != main_key:
+                    desired.setdefault(sku.casefold(), sku)
+            current = {alternate.sku.casefold(): alternate for alternate in existing.get(product_id, [])}
+            for key, alternate in current.items():
+                if key not in desired:
+                    to_delete.append(alternate.pk)
+                elif alternate.sku != desired[key]:
+                    alternate.sku = desired[key]
+                    to_rename.append(alternate)
+            to_create.extend(
+                ProductAlternateSku(product_id=product_id, sku=sku)
+                for key, sku in desired.items()
+                if key not in current
+            )
+        if to_delete:
+            ProductAlternateSku.objects.filter(pk__in=to_delete).delete()
+        ProductAlternateSku.objects.bulk_update(to_rename, ["sku"], batch_size=CHUNK_SIZE)
+        ProductAlternateSku.objects.bulk_create(to_create, batch_size=CHUNK_SIZE)
+
+    def _log_activity(self, entries):
+        # The per-product entries signals.log_product_activity would have written.
+        if self.actor is None or not entries:
+            return
+        logs = []
+        for product, _, is_new in entries:
+            action = "created" if is_new else "updated"
+            logs.append(
+                ActivityLog(
+                    business=product.user,
+                    actor=self.actor,
+                    action=f"product_{action}",
+                    object_type="product",
+                    object_id=str(product.sku or product.pk),
+                    description=f"Product {product.name} {action}",
+                    metadata={"sku": product.sku or "", "name": product.name},
+                )
+            )
+        ActivityLog.objects.bulk_create(logs, batch_size=CHUNK_SIZE)
+
+
+# ---------- Jobs ------------------------------------------------------------
+
+def enqueue(user, upload, *, actor=None):
+    """
+    Check ``upload``'s header row and record an import job for ``user``.
+    Raises ValueError with a message for the user when the file is unusable.
+    """
+    workbook, worksheet = _open_sheet(upload)
+    try:
+        read_header(worksheet.iter_rows(values_only=True))
+    finally:
+        workbook.close()
+    upload.seek(0)
+
+    job = ProductImportJob.objects.create(
+        user=user,
+        actor=actor,
+        source_file=upload,
+        original_filename=(getattr(upload, "name", "") or "")[:255],
+    )
+    if getattr(settings, "PRODUCT_IMPORT_THREAD_DISPATCH", True):
+        job_id = job.pk
+        transaction.on_commit(lambda: _schedule(job_id))
+    return job
+
+
+def _save_progress(job, processed, created, updated, errors):
+    job.processed_rows = processed
+    job.created_count = created
+    job.updated_count = updated
+    job.error_count = len(errors)
+    ProductImportJob.objects.filter(pk=job.pk).update(
+        processed_rows=processed,
+        created_count=created,
+        updated_count=updated,
+        error_count=len(errors),
+        claimed_at=timezone.now(),
+    )
+
+
+def _write_error_report(job, headers, errors):
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["Row", "Error", *headers])
+    for row_number, message, values in errors:
+        writer.writerow([row_number, message, *["" if value is None else value for value in values]])
+    job.error_report.save(
+        f"product_import_{job.pk}_errors.csv",
+        ContentFile(buffer.getvalue().encode("utf-8")),
+        save=False,
+    )
+
+
+def _run(job):
+    importer = _ProductImporter(job)
+    created = updated = processed = 0
+    errors = []
+
+    with job.source_file.open("rb") as source:
+        workbook, worksheet = _open_sheet(source)
+        try:
+            rows = worksheet.iter_rows(values_only=True)
+            header_row, headers = read_header(rows)
+            header_indexes = {header: idx for idx, header in enumerate(headers) if header}
+            has_alternate_skus = "Alternate SKUs" in header_indexes
+            if worksheet.max_row:
+                job.total_rows = max(worksheet.max_row - header_row, 0)
+                ProductImportJob.objects.filter(pk=job.pk).update(total_rows=job.total_rows)
+
+            def _chunks():
+                chunk = []
+                for row_number, values in enumerate(rows, start=header_row + 1):
+                    if not values or not any(values):
+                        continue
+                    chunk.append((row_number, values))
+                    if len(chunk) >= CHUNK_SIZE:
+                        yield chunk
+                        chunk = []
+                if chunk:
+                    yield chunk
+
+            for chunk in _chunks():
+                parsed_rows = []
+                for row_number, values in chunk:
+                    def get_value(column_name, values=values):
+                        idx = header_indexes.get(column_name)
+                        if idx is None:
+                            return None
+                        return values[idx] if idx < len(values) else None
+
+                    try:
+                        parsed = parse_row(
+                            get_value,
+                            has_alternate_skus=has_alternate_skus,
+                            item_type_map=importer.item_type_map,
+                        )
+                    except ValueError as exc:
+                        errors.append((row_number, str(exc), values))
+                        continue
+                    parsed_rows.append((row_number, values, parsed))
+
+                importer.resolve_references(parsed_rows)
+                try:
+                    with transaction.atomic():
+                        results = [importer.write(parsed_rows)]
+                except IntegrityError:
+                    # Retry row by row so one conflicting SKU only rejects its row.
+                    results = []
+                    for row in parsed_rows:
+                        try:
+                            with transaction.atomic():
+                                results.append(importer.write([row]))
+                        except IntegrityError:
+                            errors.append((row[0], "SKU is already used by another product.", row[1]))
+                for chunk_created, chunk_updated, chunk_errors in results:
+                    created += chunk_created
+                    updated += chunk_updated
+                    errors.extend(chunk_errors)
+                processed += len(chunk)
+                _save_progress(job, processed, created, updated, errors)
+        finally:
+            workbook.close()
+
+    errors.sort(key=lambda error: error[0])
+    if errors:
+        _write_error_report(job, headers, errors)
+    if created or updated:
+        invalidate_storefront_nav_cache()
+    job.total_rows = processed
+
+
+def _claimable(now):
+    stale = now - timedelta(
+        seconds=getattr(settings, "PRODUCT_IMPORT_CLAIM_TIMEOUT_SECONDS", DEFAULT_CLAIM_TIMEOUT_SECONDS)
+    )
+    return Q(status=ProductImportJob.STATUS_PENDING) | Q(
+        status=ProductImportJob.STATUS_PROCESSING, claimed_at__lt=stale
+    )
+
+
+def process_job(job_id):
+    """Run one pending (or abandoned) job now; returns it, or None if it was not claimable."""
+    now = timezone.now()
+    claimed = ProductImportJob.objects.filter(_claimable(now), pk=job_id).update(
+        status=ProductImportJob.STATUS_PROCESSING,
+        started_at=now,
+        claimed_at=now,
+        processed_rows=0,
+        created_count=0,
+        updated_count=0,
+        error_count=0,
+    )
+    if not claimed:
+        return None
+
+    job = ProductImportJob.objects.select_related("user", "actor").get(pk=job_id)
+    try:
+        _run(job)
+    except ValueError as exc:
+        job.status = ProductImportJob.STATUS_FAILED
+        job.failure_message = str(exc)
+    except Exception as exc:
+        logger.exception("Product import job %s failed", job.pk)
+        job.status = ProductImportJob.STATUS_FAILED
+        job.failure_message = str(exc)
+    else:
+        job.status = ProductImportJob.STATUS_DONE
+    job.finished_at = timezone.now()
+    job.save(update_fields=[
+        "status",
+        "total_rows",
+        "processed_rows",
+        "created_count",
+        "updated_count",
+        "error_count",
+        "error_report",
+        "failure_message",
+        "finished_at",
+    ])
+    return job
+
+
+def process_pending(*, limit=20) -> int:
+    """Run up to ``limit`` pending or abandoned jobs, oldest first; returns how many ran."""
+    job_ids = list(
+        ProductImportJob.objects.filter(_claimable(timezone.now()))
+        .order_by("created_at", "pk")
+        .values_list("pk", flat=True)[:limit]
+    )
+    return sum(1 for job_id in job_ids if process_job(job_id) is not None)
+
+
+_dispatch_queue = commit_hooks.BackgroundQueue("product-import", lambda job_id: process_job(job_id))
+
+
+def _schedule(job_id):
+    _dispatch_queue.add(job_id)
@@ -0,0 +1,144 @@
+"""Materialized receivables columns on :class:`~accounts.models.GroupedInvoice`.
+
+``amount_paid``, ``amount_credited``, ``amount_due`` and ``payment_state`` are
+kept in step with writes by the receivers in :mod:`accounts.signals`
+(``Payment`` and ``CustomerCreditItem`` changes) and by ``GroupedInvoice.save``
+(total changes from ``IncomeRecord2`` writes). List views, the dashboard and
+the customer portal filter and sort on these indexed columns instead of
+re-aggregating payments and credits with correlated subqueries.
+
+``manage.py repair_receivables`` rebuilds the columns and ``--check`` reports
+rows that drifted.
+"""
+from __future__ import annotations
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db.models import F, Sum
+
+from .models import CustomerCreditItem, GroupedInvoice, Payment, ensure_decimal
+
+
+RECEIVABLE_FIELDS = ("amount_paid", "amount_credited", "amount_due", "payment_state")
+_CENT = Decimal("0.01")
+
+
+def compute_amounts(invoice_ids):
+    """Return ``{invoice_id: (amount_paid, amount_credited)}`` from the source rows."""
+    invoice_ids = list(invoice_ids)
+    amounts = {invoice_id: [Decimal("0.00"), Decimal("0.00")] for invoice_id in invoice_ids}
+    if not invoice_ids:
+        return {}
+
+    paid_rows = (
+        Payment.objects.filter(invoice_id__in=invoice_ids)
+        .order_by()
+        .values("invoice_id")
+        .annotate(total=Sum("amount"))
+    )
+    for row in paid_rows:
+        amounts[row["invoice_id"]][0] = ensure_decimal(row["total"])
+
+    # Same rule as the credit annotations: tax is added unless the credit is tax-included.
+    credit_rows = CustomerCreditItem.objects.filter(source_invoice_id__in=invoice_ids).values_list(
+        "source_invoice_id", "amount", "tax_paid", "customer_credit__tax_included"
+    )
+    for invoice_id, amount, tax_paid, tax_included in credit_rows:
+        line_total = ensure_decimal(amount).quantize(_CENT, rounding=ROUND_HALF_UP)
+        if not tax_included:
+            line_total += ensure_decimal(tax_paid).quantize(_CENT, rounding=ROUND_HALF_UP)
+        amounts[invoice_id][1] += line_total
+
+    return {
+        invoice_id: (
+            paid.quantize(_CENT, rounding=ROUND_HALF_UP),
+            credited.quantize(_CENT, rounding=ROUND_HALF_UP),
+        )
+        for invoice_id, (paid, credited) in amounts.items()
+    }
+
+
+def _expected_invoices(invoices):
+    """Yield ``(invoice, changed)`` with receivable fields recomputed in place."""
+    amounts = compute_amounts(invoice.pk for invoice in invoices)
+    for invoice in invoices:
+        before = tuple(getattr(invoice, field) for field in RECEIVABLE_FIELDS)
+        invoice.amount_paid, invoice.amount_credited = amounts[invoice.pk]
+        invoice.sync_receivables_fields()
+        after = tuple(getattr(invoice, field) for field in RECEIVABLE_FIELDS)
+        yield invoice, before != after
+
+
+def _load(invoice_ids):
+    return list(
+        GroupedInvoice.objects.filter(pk__in=invoice_ids).only("pk", "total_amount", *RECEIVABLE_FIELDS)
+    )
+
+
+def refresh(invoice_ids, *, instances=()):
+    """
+    Recompute the receivables columns for ``invoice_ids``.
+
+    Rows are written with ``bulk_update`` so ``GroupedInvoice.save`` side
+    effects (payment links, QuickBooks flags) are not triggered. Any matching
+    objects passed in ``instances`` are updated in memory too. Returns the
+    number of rows that changed.
+    """
+    invoice_ids = {invoice_id for invoice_id in invoice_ids if invoice_id}
+    if not invoice_ids:
+        return 0
+
+    changed = [invoice for invoice, dirty in _expected_invoices(_load(invoice_ids)) if dirty]
+    if changed:
+        GroupedInvoice.objects.bulk_update(changed, RECEIVABLE_FIELDS)
+
+    fresh = {invoice.pk: invoice for invoice in changed}
+    for instance in instances:
+        source = fresh.get(getattr(instance, "pk", None))
+        if source is not None:
+            for field in RECEIVABLE_FIELDS:
+                setattr(instance, field, getattr(source, field))
+    return len(changed)
+
+
+def iter_drift(queryset=None, *, chunk_size=1000):
+    """
+    Yield ``(invoice_id, stored, expected)`` for invoices whose stored columns
+    disagree with payments and credits. ``stored``/``expected`` are tuples in
+    :data:`RECEIVABLE_FIELDS` order.
+    """
+    queryset = queryset if queryset is not None else GroupedInvoice.objects.all()
+    ids = list(queryset.order_by("pk").values_list("pk", flat=True))
+    for start in range(0, len(ids), chunk_size):
+        invoices = _load(ids[start:start + chunk_size])
+        stored = {invoice.pk: tuple(getattr(invoice, field) for field in RECEIVABLE_FIELDS) for invoice in invoices}
+        for invoice, dirty in _expected_invoices(invoices):
+            if dirty:
+                expected = tuple(getattr(invoice, field) for field in RECEIVABLE_FIELDS)
+                yield invoice.pk, stored[invoice.pk], expected
+
+
+def rebuild(queryset=None, *, chunk_size=1000):
+    """Recompute the columns for every invoice in ``queryset``; returns rows changed."""
+    queryset = queryset if queryset is not None else GroupedInvoice.objects.all()
+    ids = list(queryset.order_by("pk").values_list("pk", flat=True))
+    changed = 0
+    for start in range(0, len(ids), chunk_size):
+        changed += refresh(ids[start:start + chunk_size])
+    return changed
+
+
+def annotate_receivables(queryset, *, invoice_path=""):
+    """
+    Expose the stored columns under the annotation names the views and
+    templates already use: ``total_paid``, ``credit_total`` and ``balance_due``.
+
+    ``invoice_path`` is the lookup from the queryset's model to the invoice,
+    e.g. ``"grouped_invoice"`` for ``PendingInvoice`` querysets.
+    """
+    prefix = f"{invoice_path}__" if invoice_path else ""
+    return queryset.annotate(
+        total_paid=F(f"{prefix}amount_paid"),
+        credit_total=F(f"{prefix}amount_credited"),
+        balance_due=F(f"{prefix}amount_due"),
+    )
@@ -0,0 +1,469 @@
+"""Append-only accounts-receivable journal per customer.
+
+Every invoice, payment and customer credit item with a customer is mirrored
+as :class:`~accounts.models.ReceivablesJournalEntry` rows. An invoice posts
+its total, a payment posts minus its amount and a credit item posts minus its
+credited amount (tax added unless the credit is tax-included, the same rule
+as :mod:`accounts.receivables`). Write-offs exist only in the journal and are
+posted with :func:`write_off`.
+
+Rows are never updated. When a source changes, :func:`sync_invoices` and
+:func:`sync_credits` compare what the sources say with what has been posted
+and append the difference: a reversal at the old date or customer, and a new
+posting at the current one. Each entry stores the customer's running
+``balance``, so:
+
+* :func:`balance` is a single-row read of the customer's latest entry.
+* :func:`statement` reads one ``(customer, entry_date)`` index range for any
+  period, with the opening balance summed over the same index.
+
+The receivers in :mod:`accounts.signals` schedule a sync after commit.
+``manage.py rebuild_receivables_journal`` rewrites the journal from the
+source rows (keeping write-offs), and ``--check`` reports customers whose
+balance drifted.
+"""
+from __future__ import annotations
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import Max, Q, Sum
+from django.utils import timezone
+
+from . import commit_hooks
+from .models import ReceivablesJournalEntry, ensure_decimal
+
+ENTRY_INVOICE = ReceivablesJournalEntry.ENTRY_INVOICE
+ENTRY_PAYMENT = ReceivablesJournalEntry.ENTRY_PAYMENT
+ENTRY_CREDIT = ReceivablesJournalEntry.ENTRY_CREDIT
+ENTRY_WRITE_OFF = ReceivablesJournalEntry.ENTRY_WRITE_OFF
+INVOICE_ENTRY_TYPES = (ENTRY_INVOICE, ENTRY_PAYMENT)
+BATCH_SIZE = 500
+_ZERO = Decimal("0.00")
+_CENT = Decimal("0.01")
+
+
+def _money(value):
+    return ensure_decimal(value).quantize(_CENT, rounding=ROUND_HALF_UP)
+
+
+def _default_get_model(name):
+    from django.apps import apps
+
+    return apps.get_model("accounts", name)
+
+
+# ---------- Postings --------------------------------------------------------
+# A posting key is (entry_type, document_id, source_id, customer_id, user_id,
+# entry_date); the values are [reference, amount]. Sources and the journal are
+# both reduced to this shape and diffed. The functions take ``get_model`` so
+# the migration can backfill with historical models.
+
+def _fallback_date(created_at):
+    return timezone.localdate(created_at) if created_at else timezone.localdate()
+
+
+def invoice_postings(invoice_filter, get_model=_default_get_model) -> dict:
+    """What the invoices matching ``invoice_filter`` and their payments should have posted."""
+    postings = {}
+    invoices = {}
+    rows = (
+        get_model("GroupedInvoice").objects.filter(invoice_filter, customer__isnull=False)
+        .values_list("pk", "user_id", "customer_id", "date", "created_at", "invoice_number", "total_amount")
+    )
+    for pk, user_id, customer_id, invoice_date, created_at, number, total in rows:
+        invoices[pk] = (user_id, customer_id)
+        entry_date = invoice_date or _fallback_date(created_at)
+        postings[(ENTRY_INVOICE, pk, pk, customer_id, user_id, entry_date)] = [number or "", _money(total)]
+
+    payments = get_model("Payment").objects.filter(invoice_id__in=list(invoices)).values_list(
+        "pk", "invoice_id", "date", "method", "amount"
+    )
+    for pk, invoice_id, payment_date, method, amount in payments:
+        user_id, customer_id = invoices[invoice_id]
+        entry_date = payment_date or timezone.localdate()
+        postings[(ENTRY_PAYMENT, invoice_id, pk, customer_id, user_id, entry_date)] = [method or "", -_money(amount)]
+    return postings
+
+
+def credit_postings(credit_filter, get_model=_default_get_model) -> dict:
+    """What the customer credits matching ``credit_filter`` should have posted."""
+    postings = {}
+    rows = (
+        get_model("CustomerCreditItem").objects.filter(
+            Q(customer_credit__in=get_model("CustomerCredit").objects.filter(credit_filter)),
+            customer_credit__customer__isnull=False,
+        )
+        .values_list(
+            "pk",
+            "customer_credit_id",
+            "customer_credit__user_id",
+            "customer_credit__customer_id",
+            "customer_credit__date",
+            "customer_credit__created_at",
+            "customer_credit__credit_no",
+            "customer_credit__tax_included",
+            "amount",
+            "tax_paid",
+        )
+    )
+    for pk, credit_id, user_id, customer_id, credit_date, created_at, credit_no, tax_included, amount, tax in rows:
+        credited = _money(amount)
+        if not tax_included:
+            credited += _money(tax)
+        entry_date = credit_date or _fallback_date(created_at)
+        postings[(ENTRY_CREDIT, credit_id, pk, customer_id, user_id, entry_date)] = [credit_no or "", -credited]
+    return postings
+
+
+def _posted(entry_filter, get_model=_default_get_model) -> dict:
+    rows = (
+        get_model("ReceivablesJournalEntry").objects.filter(entry_filter)
+        .order_by()
+        .values("entry_type", "document_id", "source_id", "customer_id", "user_id", "entry_date")
+        .annotate(total=Sum("amount"), last_reference=Max("reference"))
+    )
+    return {
+        (
+            row["entry_type"],
+            row["document_id"],
+            row["source_id"],
+            row["customer_id"],
+            row["user_id"],
+            row["entry_date"],
+        ): [row["last_reference"], row["total"] or _ZERO]
+        for row in rows
+    }
+
+
+def _differences(expected, posted):
+    """Yield a journal line ``(key, reference, memo, amount)`` for every posting that is off."""
+    for key in sorted(set(expected) | set(posted), key=_posting_order):
+        reference, amount = expected.get(key, (None, _ZERO))
+        posted_reference, posted_amount = posted.get(key, (None, _ZERO))
+        delta = amount - posted_amount
+        if delta:
+            yield key, reference or posted_reference or "", "", delta
+
+
+def _posting_order(key):
+    entry_type, document_id, source_id, customer_id, user_id, entry_date = key
+    # Invoices before the payments and credits against them on the same day.
+    return (customer_id, entry_date, entry_type != ENTRY_INVOICE, document_id or 0, source_id or 0)
+
+
+def _lock_customers(customer_ids, get_model) -> set:
+    return set(
+        get_model("Customer").objects.select_for_update()
+        .filter(pk__in=sorted(customer_ids))
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+
+
+def _append(lines, get_model=_default_get_model, *, lock=()) -> list:
+    """
+    Append ``(key, reference, memo, amount)`` lines with running balances and
+    return the new entries. The customers are locked so concurrent postings
+    cannot interleave balances.
+
+    ``lines`` may be a callable; it is called once the customers in ``lock``
+    are held, so a diff it computes cannot race another sync of the same
+    postings.
+    """
+    with transaction.atomic():
+        live = _lock_customers(lock, get_model) if lock else set()
+        lines = list(lines() if callable(lines) else lines)
+        if not lines:
+            return []
+        live |= _lock_customers({line[0][3] for line in lines} - set(lock), get_model)
+        Entry = get_model("ReceivablesJournalEntry")
+        running = balances(live, get_model=get_model)
+        entries = []
+        for (entry_type, document_id, source_id, customer_id, user_id, entry_date), reference, memo, amount in lines:
+            if customer_id not in live:
+                continue
+            running[customer_id] = running.get(customer_id, _ZERO) + amount
+            entries.append(
+                Entry(
+                    user_id=user_id,
+                    customer_id=customer_id,
+                    entry_type=entry_type,
+                    document_id=document_id,
+                    source_id=source_id,
+                    reference=reference[:100],
+                    memo=memo[:255],
+                    entry_date=entry_date,
+                    amount=amount,
+                    balance=running[customer_id],
+                )
+            )
+        return Entry.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+
+
+def _sync(documents, entry_filter, expected, get_model) -> int:
+    """
+    Append the difference between ``expected()`` and what ``entry_filter`` has
+    posted. The ``documents`` rows and every customer they or their postings
+    belong to are locked before the diff is taken; a deleted document has no
+    row left, so its earlier customers carry the lock.
+    """
+    with transaction.atomic():
+        customer_ids = set(
+            documents.select_for_update().order_by("pk").values_list("customer_id", flat=True)
+        )
+        customer_ids.update(
+            get_model("ReceivablesJournalEntry").objects.filter(entry_filter)
+            .order_by()
+            .values_list("customer_id", flat=True)
+            .distinct()
+        )
+        customer_ids.discard(None)
+        entries = _append(
+            lambda: _differences(expected(), _posted(entry_filter, get_model)),
+            get_model,
+            lock=customer_ids,
+        )
+    return len(entries)
+
+
+def sync_invoices(invoice_ids, get_model=_default_get_model) -> int:
+    """Post whatever changed on ``invoice_ids`` and their payments; returns entries appended."""
+    invoice_ids = [pk for pk in set(invoice_ids) if pk]
+    if not invoice_ids:
+        return 0
+    return _sync(
+        get_model("GroupedInvoice").objects.filter(pk__in=invoice_ids),
+        Q(entry_type__in=INVOICE_ENTRY_TYPES, document_id__in=invoice_ids),
+        lambda: invoice_postings(Q(pk__in=invoice_ids), get_model),
+        get_model,
+    )
+
+
+def sync_credits(credit_ids, get_model=_default_get_model) -> int:
+    """Post whatever changed on the customer credits ``credit_ids``; returns entries appended."""
+    credit_ids = [pk for pk in set(credit_ids) if pk]
+    if not credit_ids:
+        return 0
+    return _sync(
+        get_model("CustomerCredit").objects.filter(pk__in=credit_ids),
+        Q(entry_type=ENTRY_CREDIT, document_id__in=credit_ids),
+        lambda: credit_postings(Q(pk__in=credit_ids), get_model),
+        get_model,
+    )
+
+
+def write_off(customer, amount, *, user=None, entry_date=None, reference="", memo="") -> ReceivablesJournalEntry:
+    """Post a write-off of ``amount`` against ``customer``'s balance and return the entry."""
+    amount = _money(amount)
+    if amount <= _ZERO:
+        raise ValueError("A write-off must be a positive amount.")
+    key = (ENTRY_WRITE_OFF, None, None, customer.pk, user.pk if user else customer.user_id, entry_date or timezone.localdate())
+    entries = _append([(key, reference, memo, -amount)])
+    if not entries:
+        raise ValueError("The customer no longer exists.")
+    return entries[0]
+
+
+def schedule_invoices(*invoice_ids) -> None:
+    """Sync ``invoice_ids`` once the current transaction commits."""
+    for invoice_id in invoice_ids:
+        if invoice_id:
+            commit_hooks.on_commit_once(
+                ("receivables_journal", ENTRY_INVOICE, invoice_id),
+                lambda invoice_id=invoice_id: sync_invoices([invoice_id]),
+            )
+
+
+def schedule_credits(*credit_ids) -> None:
+    """Sync the customer credits ``credit_ids`` once the current transaction commits."""
+    for credit_id in credit_ids:
+        if credit_id:
+            commit_hooks.on_commit_once(
+                ("receivables_journal", ENTRY_CREDIT, credit_id),
+                lambda credit_id=credit_id: sync_credits([credit_id]),
+            )
+
+
+# ---------- Rebuild ---------------------------------------------------------
+
+def _customer_postings(customer_ids, get_model=_default_get_model) -> dict:
+    postings = invoice_postings(Q(customer_id__in=customer_ids), get_model)
+    postings.update(credit_postings(Q(customer_id__in=customer_ids), get_model))
+    return postings
+
+
+def _source_balances(postings):
+    by_customer = {}
+    for key, (_, amount) in postings.items():
+        by_customer[key[3]] = by_customer.get(key[3], _ZERO) + amount
+    return by_customer
+
+
+def iter_drift(customer_ids=None, *, get_model=_default_get_model):
+    """
+    Yield ``(customer_id, journal_balance, source_balance)`` for customers whose
+    latest journal balance disagrees with their invoices, payments, credits
+    and write-offs.
+    """
+    for chunk in _customer_chunks(customer_ids, get_model):
+        expected = _source_balances(_customer_postings(chunk, get_model))
+        write_offs = dict(
+            get_model("ReceivablesJournalEntry").objects.filter(customer_id__in=chunk, entry_type=ENTRY_WRITE_OFF)
+            .order_by()
+            .values("customer_id")
+            .annotate(total=Sum("amount"))
+            .values_list("customer_id", "total")
+        )
+        journal = balances(chunk, get_model=get_model)
+        for customer_id in chunk:
+            source = expected.get(customer_id, _ZERO) + (write_offs.get(customer_id) or _ZERO)
+            if journal.get(customer_id, _ZERO) != source:
+                yield customer_id, journal.get(customer_id, _ZERO), source
+
+
+def rebuild(customer_ids=None, *, get_model=_default_get_model) -> int:
+    """
+    Rewrite the journal of ``customer_ids`` (every customer by default) from
+    the source rows, keeping write-offs. Returns the number of entries written.
+    """
+    Entry = get_model("ReceivablesJournalEntry")
+    written = 0
+    for chunk in _customer_chunks(customer_ids, get_model):
+        with transaction.atomic():
+            write_offs = list(
+                Entry.objects.filter(customer_id__in=chunk, entry_type=ENTRY_WRITE_OFF)
+                .order_by("id")
+                .values_list("user_id", "customer_id", "entry_date", "reference", "memo", "amount")
+            )
+            Entry.objects.filter(customer_id__in=chunk).delete()
+            postings = _customer_postings(chunk, get_model)
+            lines = [(key, reference, "", amount) for key, (reference, amount) in postings.items() if amount]
+            for user_id, customer_id, entry_date, reference, memo, amount in write_offs:
+                lines.append(((ENTRY_WRITE_OFF, None, None, customer_id, user_id, entry_date), reference, memo, amount))
+            lines.sort(key=lambda line: _posting_order(line[0]))
+            written += len(_append(lines, get_model))
+    return written
+
+
+def _customer_chunks(customer_ids, get_model):
+    if customer_ids is None:
+        customer_ids = get_model("Customer").objects.order_by("pk").values_list("pk", flat=True)
+    customer_ids = sorted(set(customer_ids))
+    for start in range(0, len(customer_ids), BATCH_SIZE):
+        yield customer_ids[start:start + BATCH_SIZE]
+
+
+# ---------- Reads -----------------------------------------------------------
+
+def balance(customer_id) -> Decimal:
+    """``customer_id``'s current balance: the running balance of its latest entry."""
+    value = (
+        ReceivablesJournalEntry.objects.filter(customer_id=customer_id)
+        .order_by("-id")
+        .values_list("balance", flat=True)
+        .first()
+    )
+    return value if value is not None else _ZERO
+
+
+def balances(customer_ids, *, get_model=_default_get_model) -> dict:
+    """``{customer_id: balance}`` for ``customer_ids`` that have journal entries."""
+    Entry = get_model("ReceivablesJournalEntry")
+    latest_ids = (
+        Entry.objects.filter(customer_id__in=list(customer_ids))
+        .order_by()
+        .values("customer_id")
+        .annotate(latest=Max("id"))
+        .values_list("latest", flat=True)
+    )
+    return dict(Entry.objects.filter(pk__in=list(latest_ids)).values_list("customer_id", "balance"))
+
+
+def _range_filter(customer_id, user_ids=None):
+    entries = ReceivablesJournalEntry.objects.filter(customer_id=customer_id)
+    if user_ids is not None:
+        entries = entries.filter(user_id__in=list(user_ids))
+    return entries
+
+
+def totals(customer_id, *, start_date=None, end_date=None, user_ids=None) -> dict:
+    """Net posted amount per entry type for ``customer_id`` in the period."""
+    entries = _range_filter(customer_id, user_ids)
+    if start_date:
+        entries = entries.filter(entry_date__gte=start_date)
+    if end_date:
+        entries = entries.filter(entry_date__lte=end_date)
+    result = {entry_type: _ZERO for entry_type, _ in ReceivablesJournalEntry.ENTRY_TYPE_CHOICES}
+    rows = entries.order_by().values("entry_type").annotate(total=Sum("amount"))
+    for row in rows:
+        result[row["entry_type"]] = row["total"] or _ZERO
+    return result
+
+
+def account_summary(customer_id, *, user_ids=None) -> dict:
+    """Lifetime invoiced, paid, credited and written-off totals and the outstanding balance."""
+    by_type = totals(customer_id, user_ids=user_ids)
+    return {
+        "total_invoiced": by_type[ENTRY_INVOICE],
+        "total_paid": -by_type[ENTRY_PAYMENT],
+        "total_credit": -by_type[ENTRY_CREDIT],
+        "total_written_off": -by_type[ENTRY_WRITE_OFF],
+        "outstanding_balance": sum(by_type.values(), _ZERO),
+    }
+
+
+def statement(customer_id, *, start_date=None, end_date=None, user_ids=None) -> dict:
+    """
+    ``customer_id``'s account activity for the period: ``opening_balance``,
+    the ``entries`` in date order with their running ``balance`` and the
+    ``closing_balance``. ``user_ids`` limits the activity to some businesses.
+    Corrections posted against the same source and date are folded into one
+    line, and lines that net to zero are dropped.
+    """
+    entries = _range_filter(customer_id, user_ids)
+    opening = _ZERO
+    if start_date:
+        opening = entries.filter(entry_date__lt=start_date).aggregate(total=Sum("amount"))["total"] or _ZERO
+        entries = entries.filter(entry_date__gte=start_date)
+    if end_date:
+        entries = entries.filter(entry_date__lte=end_date)
+
+    labels = dict(ReceivablesJournalEntry.ENTRY_TYPE_CHOICES)
+    lines = {}
+    rows = entries.order_by("entry_date", "id").values_list(
+        "id", "entry_type", "document_id", "source_id", "entry_date", "reference", "memo", "amount"
+    )
+    for pk, entry_type, document_id, source_id, entry_date, reference, memo, amount in rows:
+        key = (entry_type, document_id, source_id, entry_date) if entry_type != ENTRY_WRITE_OFF else pk
+        line = lines.setdefault(key, {
+            "entry_type": entry_type,
+            "entry_type_label": labels.get(entry_type, entry_type),
+            "document_id": document_id,
+            "source_id": source_id,
+            "entry_date": entry_date,
+            "reference": reference,
+            "memo": memo,
+            "amount": _ZERO,
+        })
+        line["reference"] = reference or line["reference"]
+        line["amount"] += amount
+
+    activity = sorted(
+        (line for line in lines.values() if line["amount"]),
+        key=lambda line: (line["entry_date"], line["entry_type"] != ENTRY_INVOICE),
+    )
+    running = opening
+    charges = _ZERO
+    for line in activity:
+        running += line["amount"]
+        line["balance"] = running
+        if line["amount"] > _ZERO:
+            charges += line["amount"]
+    return {
+        "opening_balance": opening,
+        "entries": activity,
+        "charges": charges,
+        "reductions": running - opening - charges,
+        "closing_balance": running,
+    }
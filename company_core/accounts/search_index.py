@@ -0,0 +1,322 @@
+"""Full-text search documents for invoices, estimates and work orders.
+
+The list views used to search with an OR of ``icontains`` lookups across a
+handful of header columns, which scans every row the tenant owns (plus joins)
+on each keystroke. Instead, each invoice, estimate and work order keeps one
+:class:`~accounts.models.SearchDocument` row holding the searchable text of
+its header and line descriptions, refreshed once per transaction when the
+document or one of its lines changes.
+
+The database indexes that document:
+
+* PostgreSQL: a generated ``tsvector`` column with a GIN index for ranking,
+  and a ``pg_trgm`` GIN index on the text so substring (``ILIKE``) matches are
+  indexed too.
+* SQLite: an FTS5 shadow table with the ``trigram`` tokenizer, kept in sync by
+  triggers; terms of three or more characters go through ``MATCH`` and are
+  ranked with ``bm25``.
+
+Other backends (or SQLite builds without FTS5) fall back to ``LIKE`` on the
+document text. Matching is substring-based on every term, like the old
+``icontains`` search. Ranking runs once per search over the index and scores
+the best ``SEARCH_RANKED_HITS`` matches; the rest keep the caller's order. ``manage.py rebuild_search_index`` re-indexes existing
+rows, e.g. after bulk updates that bypass signals.
+"""
+from __future__ import annotations
+
+import re
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.expressions import RawSQL
+
+from . import commit_hooks
+
+
+KIND_INVOICE = "invoice"
+KIND_ESTIMATE = "estimate"
+KIND_WORKORDER = "workorder"
+
+DOCUMENT_TABLE = "accounts_searchdocument"
+FTS_TABLE = "accounts_searchdocument_fts"
+MAX_CONTENT_LENGTH = 20000
+MAX_TERMS = 8
+TRIGRAM_LENGTH = 3
+BATCH_SIZE = 500
+DEFAULT_RANKED_HITS = 200
+
+
+def is_enabled() -> bool:
+    """Return True when list views should search through the index."""
+    return bool(getattr(settings, "SEARCH_INDEX_ENABLED", True))
+
+
+# ---------- Documents -------------------------------------------------------
+# Builders take ``get_model`` so the migration can backfill with historical models.
+
+def _default_get_model(name):
+    from django.apps import apps
+
+    return apps.get_model("accounts", name)
+
+
+def _text(value):
+    if value is None or value == "":
+        return ""
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return str(value)
+
+
+def _content(parts) -> str:
+    text = " ".join(part for part in (_text(value) for value in parts) if part)
+    return " ".join(text.lower().split())[:MAX_CONTENT_LENGTH]
+
+
+def _line_text(model, parent_field, ids):
+    lines = defaultdict(list)
+    rows = model.objects.filter(**{f"{parent_field}__in": ids}).exclude(job="").order_by("pk")
+    for parent_id, job in rows.values_list(parent_field, "job"):
+        lines[parent_id].append(job)
+    return lines
+
+
+INVOICE_FIELDS = (
+    "invoice_number", "bill_to", "po_number", "vin_no", "unit_no", "make_model",
+    "license_plate", "date", "total_amount",
+)
+ESTIMATE_FIELDS = (
+    "estimate_number", "bill_to", "po_number", "vin_no", "unit_no", "make_model",
+    "date", "total_amount",
+)
+WORKORDER_FIELDS = (
+    "customer__name", "customer__email", "bill_to", "bill_to_address", "unit_no",
+    "vehicle__unit_number", "vehicle_vin", "make_model", "license_plate", "status",
+    "description", "cause", "correction", "scheduled_date",
+)
+
+
+def build_invoice_documents(ids, get_model=_default_get_model):
+    lines = _line_text(get_model("IncomeRecord2"), "grouped_invoice_id", ids)
+    rows = get_model("GroupedInvoice").objects.filter(pk__in=ids).values("pk", "user_id", *INVOICE_FIELDS)
+    return {
+        row["pk"]: (row["user_id"], _content([row[name] for name in INVOICE_FIELDS] + lines[row["pk"]]))
+        for row in rows
+    }
+
+
+def build_estimate_documents(ids, get_model=_default_get_model):
+    lines = _line_text(get_model("EstimateRecord"), "grouped_estimate_id", ids)
+    rows = get_model("GroupedEstimate").objects.filter(pk__in=ids).values("pk", "user_id", *ESTIMATE_FIELDS)
+    return {
+        row["pk"]: (row["user_id"], _content([row[name] for name in ESTIMATE_FIELDS] + lines[row["pk"]]))
+        for row in rows
+    }
+
+
+def build_workorder_documents(ids, get_model=_default_get_model):
+    lines = _line_text(get_model("WorkOrderRecord"), "work_order_id", ids)
+    rows = get_model("WorkOrder").objects.filter(pk__in=ids).values("pk", "user_id", *WORKORDER_FIELDS)
+    return {
+        row["pk"]: (row["user_id"], _content([row[name] for name in WORKORDER_FIELDS] + lines[row["pk"]]))
+        for row in rows
+    }
+
+
+BUILDERS = {
+    KIND_INVOICE: build_invoice_documents,
+    KIND_ESTIMATE: build_estimate_documents,
+    KIND_WORKORDER: build_workorder_documents,
+}
+
+SOURCE_MODELS = {
+    KIND_INVOICE: "GroupedInvoice",
+    KIND_ESTIMATE: "GroupedEstimate",
+    KIND_WORKORDER: "WorkOrder",
+}
+
+
+def refresh(kind, object_ids, get_model=_default_get_model) -> int:
+    """Rebuild the documents for ``object_ids`` now; deleted objects lose theirs."""
+    object_ids = sorted({object_id for object_id in object_ids if object_id})
+    if not object_ids:
+        return 0
+    SearchDocument = get_model("SearchDocument")
+    documents = BUILDERS[kind](object_ids, get_model)
+    missing = [object_id for object_id in object_ids if object_id not in documents]
+    if missing:
+        SearchDocument.objects.filter(kind=kind, object_id__in=missing).delete()
+    SearchDocument.objects.bulk_create(
+        [
+            SearchDocument(kind=kind, object_id=object_id, user_id=user_id, content=content)
+            for object_id, (user_id, content) in documents.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["kind", "object_id"],
+        update_fields=["user", "content", "updated_at"],
+    )
+    return len(documents)
+
+
+def rebuild(kinds=None, *, user_id=None, get_model=_default_get_model) -> dict:
+    """Re-index every document of ``kinds`` (all by default); returns counts per kind."""
+    counts = {}
+    for kind in kinds or BUILDERS:
+        queryset = get_model(SOURCE_MODELS[kind]).objects.order_by("pk")
+        if user_id:
+            queryset = queryset.filter(user_id=user_id)
+        ids = list(queryset.values_list("pk", flat=True))
+        counts[kind] = 0
+        for start in range(0, len(ids), BATCH_SIZE):
+            counts[kind] += refresh(kind, ids[start:start + BATCH_SIZE], get_model)
+    return counts
+
+
+def schedule(kind, object_id) -> None:
+    """Refresh ``kind``/``object_id`` once the current transaction commits."""
+    if object_id:
+        commit_hooks.on_commit_once(("search_index", kind, object_id), lambda: refresh(kind, [object_id]))
+
+
+def schedule_many(kind, object_ids, *, key) -> None:
+    """Refresh several documents after commit, coalesced under ``key``."""
+    object_ids = list(object_ids)
+    if object_ids:
+        commit_hooks.on_commit_once(("search_index", kind, key), lambda: refresh(kind, object_ids))
+
+
+# ---------- Queries ---------------------------------------------------------
+
+def _terms(query):
+    terms = []
+    for term in (query or "").replace('"', " ").lower().split():
+        if term not in terms:
+            terms.append(term)
+    return terms[:MAX_TERMS]
+
+
+def _like_pattern(term):
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _has_fts_table(connection) -> bool:
+    cached = getattr(connection, "_accounts_search_fts", None)
+    if cached is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            cached = cursor.fetchone() is not None
+        # Cache positives only; the table appears once migrations have run.
+        if cached:
+            connection._accounts_search_fts = True
+    return cached
+
+
+def _fts_phrase(terms):
+    return " ".join(f'"{term}"' for term in terms)
+
+
+def _split_terms(connection, terms):
+    """``(fts_phrase, like_terms)``: the terms the FTS5 table can match, and the rest."""
+    if connection.vendor == "sqlite" and _has_fts_table(connection):
+        indexed = [term for term in terms if len(term) >= TRIGRAM_LENGTH]
+        return (_fts_phrase(indexed) if indexed else None), [term for term in terms if len(term) < TRIGRAM_LENGTH]
+    return None, terms
+
+
+def _like_clauses(connection, terms):
+    operator = "ILIKE" if connection.vendor == "postgresql" else "LIKE"
+    return [f"d.content {operator} %s ESCAPE '\\'" for _ in terms], [_like_pattern(term) for term in terms]
+
+
+def matching_ids(kind, query, *, user_id=None, using="default"):
+    """Subquery of ``kind`` object ids whose document matches every term of ``query``."""
+    connection = connections[using]
+    phrase, like_terms = _split_terms(connection, _terms(query))
+    clauses, params = ["d.kind = %s"], [kind]
+    if user_id:
+        clauses.append("d.user_id = %s")
+        params.append(user_id)
+    if phrase:
+        clauses.append(f"d.id IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)")
+        params.append(phrase)
+    like_sql, like_params = _like_clauses(connection, like_terms)
+    sql = f"SELECT d.object_id FROM {DOCUMENT_TABLE} d WHERE {' AND '.join(clauses + like_sql)}"
+    return RawSQL(sql, params + like_params)
+
+
+def top_hits(kind, query, *, user_id=None, limit=None, using="default"):
+    """
+    ``[(object_id, score)]`` for the best-ranked matches, best first, from one
+    pass over the index. Backends (or queries) without ranking return ``[]``.
+    """
+    connection = connections[using]
+    terms = _terms(query)
+    limit = limit or getattr(settings, "SEARCH_RANKED_HITS", DEFAULT_RANKED_HITS)
+    phrase, like_terms = _split_terms(connection, terms)
+    like_sql, like_params = _like_clauses(connection, like_terms)
+    filters = [("d.kind = %s", kind)] + ([("d.user_id = %s", user_id)] if user_id else [])
+    where = " AND ".join([clause for clause, _ in filters] + like_sql)
+    params = [value for _, value in filters] + like_params
+
+    if connection.vendor == "postgresql" and terms:
+        words = re.findall(r"\w+", " ".join(terms))
+        score, score_params = "similarity(d.content, %s)", [" ".join(terms)]
+        if words:
+            score = f"ts_rank(d.search_vector, to_tsquery('simple', %s)) + {score}"
+            score_params.insert(0, " & ".join(f"{word}:*" for word in words))
+        sql = (
+            f"SELECT d.object_id, {score} AS score FROM {DOCUMENT_TABLE} d "
+            f"WHERE {where} ORDER BY score DESC LIMIT %s"
+        )
+        params = score_params + params + [limit]
+    elif phrase:
+        # bm25() is only available inside the FTS query, so rank there.
+        sql = (
+            f"SELECT d.object_id, -bm25({FTS_TABLE}) FROM {FTS_TABLE} "
+            f"JOIN {DOCUMENT_TABLE} d ON d.id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH %s AND {where} ORDER BY bm25({FTS_TABLE}) LIMIT %s"
+        )
+        params = [phrase] + params + [limit]
+    else:
+        return []
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [(object_id, float(score or 0)) for object_id, score in cursor.fetchall()]
+
+
+def rank_expression(queryset, kind, query, *, field="pk", user_id=None):
+    """
+    ``search_rank`` expression for ``queryset``: the score of the best
+    ``SEARCH_RANKED_HITS`` matches (looked up now, in one query) and 0 for
+    the rest, so ordering by it lists the best matches first without scoring
+    every row.
+    """
+    hits = top_hits(kind, query, user_id=user_id, using=queryset.db)
+    if not hits:
+        return Value(0.0, output_field=FloatField())
+    return Case(
+        *[When(**{field: object_id}, then=Value(score)) for object_id, score in hits],
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+def search(queryset, kind, query, *, field="pk", user_id=None):
+    """
+    Filter ``queryset`` to rows whose document matches ``query`` and annotate
+    ``search_rank``. Order with :func:`order_by_rank` to list the best first.
+    """
+    queryset = queryset.filter(**{f"{field}__in": matching_ids(kind, query, user_id=user_id, using=queryset.db)})
+    return queryset.annotate(search_rank=rank_expression(queryset, kind, query, field=field, user_id=user_id))
+
+
+def order_by_rank(queryset, *tiebreakers):
+    return queryset.order_by(F("search_rank").desc(nulls_last=True), *(tiebreakers or ("-pk",)))
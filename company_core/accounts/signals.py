@@ -1,20 +1,36 @@
-from django.db.models.signals import post_save, post_delete, pre_save
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete, post_init, m2m_changed
 from django.dispatch import receiver
 from django.contrib.auth.models import User
 import logging
 from .models import (
     Profile,
+    ConnectedBusinessGroup,
     IncomeRecord2,
     JobHistory,
     Vehicle,
     Customer,
+    Supplier,
+    Mechanic,
     GroupedInvoice,
     WorkOrder,
     Product,
+    ProductBrand,
     ProductStock,
+    Category,
+    CategoryGroup,
     InventoryTransaction,
     ActivityLog,
     VehicleMaintenanceTask,
+    Payment,
+    CustomerCredit,
+    CustomerCreditItem,
+    GroupedEstimate,
+    EstimateRecord,
+    WorkOrderRecord,
+    PurchaseOrder,
+    PurchaseOrderItem,
+    ProductRMA,
+    invoice_lines_saved,
 )
 from django.contrib.auth.signals import user_logged_in
 from django.contrib.auth import logout
@@ -22,6 +38,19 @@ from django.shortcuts import redirect
 from decimal import Decimal
 from django.db import transaction
 from django.db import models as django_models
+from . import (
+    aging,
+    commit_hooks,
+    pagination,
+    pdf_prerender,
+    receivables,
+    receivables_journal,
+    search_index,
+    stock_movements,
+    supplier_scorecards,
+    tenant_scope,
+)
+from .context_processors import invalidate_storefront_nav_cache
 from .activity import get_current_actor
 from .utils import get_business_user, get_stock_owner
 
@@ -111,6 +140,467 @@ def check_user_status(sender, user, request, **kwargs):
         request.session['redirect_after_logout'] = True  # Set a session variable to track redirection
 
 
+# ────────────────────────────────────────────────────────────────────────────
+# TENANT SCOPE CACHE INVALIDATION
+# ────────────────────────────────────────────────────────────────────────────
+
+# ``admin_approved`` toggles ``User.is_active`` through a queryset update in
+# ``Profile.save`` which bypasses the User receivers below.
+_TENANT_SCOPE_PROFILE_FIELDS = (
+    "business_owner_id",
+    "occupation",
+    "storefront_is_visible",
+    "is_business_admin",
+    "admin_approved",
+    "accountant_portal_user_id",
+    "accountant_access_level",
+)
+
+
+def _tenant_scope_profile_snapshot(instance):
+    return tuple(getattr(instance, field, None) for field in _TENANT_SCOPE_PROFILE_FIELDS)
+
+
+@receiver(post_init, sender=Profile)
+def _remember_profile_tenant_scope(sender, instance: Profile, **kwargs):
+    instance._tenant_scope_snapshot = _tenant_scope_profile_snapshot(instance)
+
+
+@receiver(post_save, sender=Profile)
+def _invalidate_tenant_scope_on_profile_save(sender, instance: Profile, created, **kwargs):
+    snapshot = _tenant_scope_profile_snapshot(instance)
+    if created or snapshot != getattr(instance, "_tenant_scope_snapshot", None):
+        tenant_scope.invalidate()
+    instance._tenant_scope_snapshot = snapshot
+
+
+@receiver(post_delete, sender=Profile)
+def _invalidate_tenant_scope_on_profile_delete(sender, instance: Profile, **kwargs):
+    tenant_scope.invalidate()
+
+
+@receiver(post_save, sender=User)
+def _invalidate_tenant_scope_on_user_save(sender, instance, created, update_fields=None, **kwargs):
+    # Stock owner resolution filters on ``is_active``; login timestamps are irrelevant.
+    if not created and update_fields and set(update_fields) <= {"last_login"}:
+        return
+    tenant_scope.invalidate()
+
+
+@receiver(post_delete, sender=User)
+def _invalidate_tenant_scope_on_user_delete(sender, instance, **kwargs):
+    tenant_scope.invalidate()
+
+
+@receiver(post_save, sender=ConnectedBusinessGroup)
+@receiver(post_delete, sender=ConnectedBusinessGroup)
+def _invalidate_tenant_scope_on_group_change(sender, instance, **kwargs):
+    tenant_scope.invalidate()
+
+
+@receiver(m2m_changed, sender=ConnectedBusinessGroup.members.through)
+def _invalidate_tenant_scope_on_group_members(sender, action, **kwargs):
+    if action in {"post_add", "post_remove", "post_clear"}:
+        tenant_scope.invalidate()
+
+
+# Portal logins (customer/supplier/mechanic) decide which routes a user may hit.
+@receiver(post_init, sender=Customer)
+@receiver(post_init, sender=Supplier)
+@receiver(post_init, sender=Mechanic)
+def _remember_portal_user(sender, instance, **kwargs):
+    instance._tenant_scope_portal_user_id = instance.portal_user_id
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Supplier)
+@receiver(post_save, sender=Mechanic)
+def _invalidate_tenant_scope_on_portal_user(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_tenant_scope_portal_user_id", None)
+    if instance.portal_user_id != previous or (created and instance.portal_user_id):
+        tenant_scope.invalidate()
+    instance._tenant_scope_portal_user_id = instance.portal_user_id
+
+
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Supplier)
+@receiver(post_delete, sender=Mechanic)
+def _invalidate_tenant_scope_on_portal_delete(sender, instance, **kwargs):
+    if instance.portal_user_id:
+        tenant_scope.invalidate()
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# STOREFRONT NAV CACHE INVALIDATION
+# ────────────────────────────────────────────────────────────────────────────
+
+_STOREFRONT_NAV_PRODUCT_FIELDS = ("user_id", "category_id", "is_published_to_store")
+
+
+def _storefront_nav_product_snapshot(instance):
+    return tuple(getattr(instance, field, None) for field in _STOREFRONT_NAV_PRODUCT_FIELDS)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=CategoryGroup)
+@receiver(post_delete, sender=CategoryGroup)
+@receiver(post_save, sender=ProductBrand)
+@receiver(post_delete, sender=ProductBrand)
+def _invalidate_storefront_nav(sender, instance, **kwargs):
+    invalidate_storefront_nav_cache()
+
+
+@receiver(post_init, sender=Product)
+def _remember_product_storefront_nav(sender, instance: Product, **kwargs):
+    instance._storefront_nav_snapshot = _storefront_nav_product_snapshot(instance)
+
+
+@receiver(post_save, sender=Product)
+def _invalidate_storefront_nav_on_product_save(sender, instance: Product, created, **kwargs):
+    snapshot = _storefront_nav_product_snapshot(instance)
+    if created or snapshot != getattr(instance, "_storefront_nav_snapshot", None):
+        invalidate_storefront_nav_cache()
+    instance._storefront_nav_snapshot = snapshot
+
+
+@receiver(post_delete, sender=Product)
+def _invalidate_storefront_nav_on_product_delete(sender, instance: Product, **kwargs):
+    invalidate_storefront_nav_cache()
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# RECEIVABLES COLUMNS (GroupedInvoice.amount_paid / amount_credited / ...)
+# ────────────────────────────────────────────────────────────────────────────
+
+# Payments and credit items remember the invoice and credit they were loaded
+# with, so the receivables, aging and journal receivers below also refresh the
+# old one when a row is re-pointed. _rearm_*_links resets the snapshot after
+# all of them have run.
+
+@receiver(post_init, sender=Payment)
+def _remember_payment_links(sender, instance: Payment, **kwargs):
+    instance._previous_invoice_id = instance.__dict__.get("invoice_id")
+
+
+@receiver(post_init, sender=CustomerCreditItem)
+def _remember_credit_item_links(sender, instance: CustomerCreditItem, **kwargs):
+    instance._previous_invoice_id = instance.__dict__.get("source_invoice_id")
+    instance._previous_credit_id = instance.__dict__.get("customer_credit_id")
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def _refresh_receivables_for_payment(sender, instance: Payment, **kwargs):
+    if kwargs.get("raw"):
+        return
+    cached = [instance.invoice] if Payment.invoice.is_cached(instance) else []
+    receivables.refresh(
+        {instance.invoice_id, getattr(instance, "_previous_invoice_id", None)},
+        instances=cached,
+    )
+
+
+@receiver(post_save, sender=CustomerCreditItem)
+@receiver(post_delete, sender=CustomerCreditItem)
+def _refresh_receivables_for_credit_item(sender, instance: CustomerCreditItem, **kwargs):
+    if kwargs.get("raw"):
+        return
+    cached = [instance.source_invoice] if CustomerCreditItem.source_invoice.is_cached(instance) else []
+    receivables.refresh(
+        {instance.source_invoice_id, getattr(instance, "_previous_invoice_id", None)},
+        instances=[invoice for invoice in cached if invoice is not None],
+    )
+
+
+@receiver(post_init, sender=CustomerCredit)
+def _remember_credit_tax_included(sender, instance: CustomerCredit, **kwargs):
+    instance._receivables_tax_included = instance.tax_included
+
+
+@receiver(post_save, sender=CustomerCredit)
+def _refresh_receivables_for_credit(sender, instance: CustomerCredit, created, **kwargs):
+    # Whether tax counts towards the credited amount depends on the parent credit.
+    if not created and instance.tax_included != getattr(instance, "_receivables_tax_included", None):
+        receivables.refresh(
+            instance.items.exclude(source_invoice__isnull=True).values_list("source_invoice_id", flat=True)
+        )
+    instance._receivables_tax_included = instance.tax_included
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# INVOICE LIST COUNTS (accounts.pagination)
+# ────────────────────────────────────────────────────────────────────────────
+
+@receiver(post_save, sender=GroupedInvoice)
+@receiver(post_delete, sender=GroupedInvoice)
+def _invalidate_invoice_list_counts(sender, instance: GroupedInvoice, **kwargs):
+    pagination.invalidate_counts("groupedinvoice", instance.user_id)
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+@receiver(post_save, sender=CustomerCreditItem)
+@receiver(post_delete, sender=CustomerCreditItem)
+def _invalidate_invoice_list_counts_for_settlement(sender, instance, **kwargs):
+    # Payments and credits move invoices between the paid/pending/partial filters.
+    invoice_id = instance.invoice_id if sender is Payment else instance.source_invoice_id
+    if not invoice_id:
+        return
+    user_id = GroupedInvoice.objects.filter(pk=invoice_id).values_list("user_id", flat=True).first()
+    pagination.invalidate_counts("groupedinvoice", user_id)
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# PDF PRE-RENDER (accounts.pdf_prerender)
+# ────────────────────────────────────────────────────────────────────────────
+
+@receiver(post_save, sender=GroupedInvoice)
+def _prerender_invoice_pdf(sender, instance: GroupedInvoice, **kwargs):
+    if not kwargs.get("raw"):
+        pdf_prerender.schedule(pdf_prerender.KIND_INVOICE, instance.pk)
+
+
+@receiver(post_save, sender=IncomeRecord2)
+@receiver(post_delete, sender=IncomeRecord2)
+def _prerender_invoice_pdf_for_line(sender, instance: IncomeRecord2, **kwargs):
+    if not kwargs.get("raw"):
+        pdf_prerender.schedule(pdf_prerender.KIND_INVOICE, instance.grouped_invoice_id)
+
+
+@receiver(invoice_lines_saved)
+def _prerender_invoice_pdf_for_lines(sender, invoice: GroupedInvoice, **kwargs):
+    pdf_prerender.schedule(pdf_prerender.KIND_INVOICE, invoice.pk)
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def _prerender_invoice_pdf_for_payment(sender, instance: Payment, **kwargs):
+    if not kwargs.get("raw"):
+        pdf_prerender.schedule(pdf_prerender.KIND_INVOICE, instance.invoice_id)
+
+
+@receiver(post_save, sender=GroupedEstimate)
+def _prerender_estimate_pdf(sender, instance: GroupedEstimate, **kwargs):
+    if not kwargs.get("raw"):
+        pdf_prerender.schedule(pdf_prerender.KIND_ESTIMATE, instance.pk)
+
+
+@receiver(post_save, sender=EstimateRecord)
+@receiver(post_delete, sender=EstimateRecord)
+def _prerender_estimate_pdf_for_line(sender, instance: EstimateRecord, **kwargs):
+    if not kwargs.get("raw"):
+        pdf_prerender.schedule(pdf_prerender.KIND_ESTIMATE, instance.grouped_estimate_id)
+
+
+@receiver(post_save, sender=WorkOrder)
+def _prerender_workorder_pdf(sender, instance: WorkOrder, **kwargs):
+    if not kwargs.get("raw") and instance.status == "completed":
+        pdf_prerender.schedule(pdf_prerender.KIND_WORKORDER, instance.pk)
+
+
+@receiver(post_save, sender=WorkOrderRecord)
+@receiver(post_delete, sender=WorkOrderRecord)
+def _prerender_workorder_pdf_for_line(sender, instance: WorkOrderRecord, **kwargs):
+    if not kwargs.get("raw"):
+        pdf_prerender.schedule(pdf_prerender.KIND_WORKORDER, instance.work_order_id)
+
+
+@receiver(post_save, sender=CustomerCredit)
+def _prerender_credit_pdf(sender, instance: CustomerCredit, **kwargs):
+    if not kwargs.get("raw"):
+        pdf_prerender.schedule(pdf_prerender.KIND_CREDIT, instance.pk)
+
+
+@receiver(post_save, sender=CustomerCreditItem)
+@receiver(post_delete, sender=CustomerCreditItem)
+def _prerender_credit_pdf_for_item(sender, instance: CustomerCreditItem, **kwargs):
+    if not kwargs.get("raw"):
+        pdf_prerender.schedule(pdf_prerender.KIND_CREDIT, instance.customer_credit_id)
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# RECEIVABLES AGING SNAPSHOTS (accounts.aging)
+# ────────────────────────────────────────────────────────────────────────────
+
+@receiver(post_init, sender=GroupedInvoice)
+def _remember_invoice_aging_customer(sender, instance: GroupedInvoice, **kwargs):
+    instance._aging_customer_id = instance.__dict__.get("customer_id")
+
+
+@receiver(post_save, sender=GroupedInvoice)
+@receiver(post_delete, sender=GroupedInvoice)
+def _age_invoice_customer(sender, instance: GroupedInvoice, **kwargs):
+    if kwargs.get("raw"):
+        return
+    aging.schedule(instance.user_id, instance.customer_id)
+    previous = getattr(instance, "_aging_customer_id", instance.customer_id)
+    if previous != instance.customer_id:
+        aging.schedule(instance.user_id, previous)
+    instance._aging_customer_id = instance.customer_id
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def _age_customer_for_payment(sender, instance: Payment, **kwargs):
+    if kwargs.get("raw"):
+        return
+    aging.schedule_for_invoices([instance.invoice_id, getattr(instance, "_previous_invoice_id", None)])
+
+
+@receiver(post_save, sender=CustomerCreditItem)
+@receiver(post_delete, sender=CustomerCreditItem)
+def _age_customer_for_credit_item(sender, instance: CustomerCreditItem, **kwargs):
+    if kwargs.get("raw"):
+        return
+    aging.schedule_for_invoices([instance.source_invoice_id, getattr(instance, "_previous_invoice_id", None)])
+
+
+@receiver(post_save, sender=CustomerCredit)
+def _age_customer_for_credit(sender, instance: CustomerCredit, created, **kwargs):
+    # Changing tax_included changes the credited amount of every source invoice.
+    if not created and not kwargs.get("raw"):
+        aging.schedule(instance.user_id, instance.customer_id)
+
+
+@receiver(post_delete, sender=Customer)
+def _age_business_for_customer_delete(sender, instance: Customer, **kwargs):
+    # The customer's invoices fall back to the customer-less row.
+    aging.schedule_business(instance.user_id)
+
+
+@receiver(post_init, sender=Profile)
+def _remember_profile_term(sender, instance: Profile, **kwargs):
+    instance._aging_term = instance.__dict__.get("term")
+
+
+@receiver(post_save, sender=Profile)
+def _age_business_for_term_change(sender, instance: Profile, created, **kwargs):
+    if not created and instance.__dict__.get("term") != getattr(instance, "_aging_term", None):
+        aging.schedule_business(instance.user_id)
+    instance._aging_term = instance.__dict__.get("term")
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# RECEIVABLES JOURNAL (accounts.receivables_journal)
+# ────────────────────────────────────────────────────────────────────────────
+
+@receiver(post_save, sender=GroupedInvoice)
+@receiver(post_delete, sender=GroupedInvoice)
+def _journal_invoice(sender, instance: GroupedInvoice, **kwargs):
+    if not kwargs.get("raw"):
+        receivables_journal.schedule_invoices(instance.pk)
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def _journal_payment(sender, instance: Payment, **kwargs):
+    if kwargs.get("raw"):
+        return
+    receivables_journal.schedule_invoices(instance.invoice_id, getattr(instance, "_previous_invoice_id", None))
+
+
+@receiver(post_save, sender=CustomerCreditItem)
+@receiver(post_delete, sender=CustomerCreditItem)
+def _journal_credit_item(sender, instance: CustomerCreditItem, **kwargs):
+    if kwargs.get("raw"):
+        return
+    receivables_journal.schedule_credits(
+        instance.customer_credit_id, getattr(instance, "_previous_credit_id", None)
+    )
+
+
+# Registered after every receiver that reads the snapshot.
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def _rearm_payment_links(sender, instance: Payment, **kwargs):
+    instance._previous_invoice_id = instance.invoice_id
+
+
+@receiver(post_save, sender=CustomerCreditItem)
+@receiver(post_delete, sender=CustomerCreditItem)
+def _rearm_credit_item_links(sender, instance: CustomerCreditItem, **kwargs):
+    instance._previous_invoice_id = instance.source_invoice_id
+    instance._previous_credit_id = instance.customer_credit_id
+
+
+@receiver(post_save, sender=CustomerCredit)
+@receiver(post_delete, sender=CustomerCredit)
+def _journal_credit(sender, instance: CustomerCredit, **kwargs):
+    # Customer, date and tax_included all change what the items post.
+    if not kwargs.get("raw"):
+        receivables_journal.schedule_credits(instance.pk)
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# SEARCH INDEX (accounts.search_index)
+# ────────────────────────────────────────────────────────────────────────────
+
+@receiver(post_save, sender=GroupedInvoice)
+@receiver(post_delete, sender=GroupedInvoice)
+def _index_invoice(sender, instance: GroupedInvoice, **kwargs):
+    if not kwargs.get("raw"):
+        search_index.schedule(search_index.KIND_INVOICE, instance.pk)
+
+
+@receiver(post_save, sender=IncomeRecord2)
+@receiver(post_delete, sender=IncomeRecord2)
+def _index_invoice_for_line(sender, instance: IncomeRecord2, **kwargs):
+    if not kwargs.get("raw"):
+        search_index.schedule(search_index.KIND_INVOICE, instance.grouped_invoice_id)
+
+
+@receiver(invoice_lines_saved)
+def _index_invoice_for_lines(sender, invoice: GroupedInvoice, **kwargs):
+    search_index.schedule(search_index.KIND_INVOICE, invoice.pk)
+
+
+@receiver(post_save, sender=GroupedEstimate)
+@receiver(post_delete, sender=GroupedEstimate)
+def _index_estimate(sender, instance: GroupedEstimate, **kwargs):
+    if not kwargs.get("raw"):
+        search_index.schedule(search_index.KIND_ESTIMATE, instance.pk)
+
+
+@receiver(post_save, sender=EstimateRecord)
+@receiver(post_delete, sender=EstimateRecord)
+def _index_estimate_for_line(sender, instance: EstimateRecord, **kwargs):
+    if not kwargs.get("raw"):
+        search_index.schedule(search_index.KIND_ESTIMATE, instance.grouped_estimate_id)
+
+
+@receiver(post_save, sender=WorkOrder)
+@receiver(post_delete, sender=WorkOrder)
+def _index_workorder(sender, instance: WorkOrder, **kwargs):
+    if not kwargs.get("raw"):
+        search_index.schedule(search_index.KIND_WORKORDER, instance.pk)
+
+
+@receiver(post_save, sender=WorkOrderRecord)
+@receiver(post_delete, sender=WorkOrderRecord)
+def _index_workorder_for_line(sender, instance: WorkOrderRecord, **kwargs):
+    if not kwargs.get("raw"):
+        search_index.schedule(search_index.KIND_WORKORDER, instance.work_order_id)
+
+
+# Work order documents include the customer's name and email.
+@receiver(post_init, sender=Customer)
+def _remember_customer_search_fields(sender, instance: Customer, **kwargs):
+    instance._search_index_snapshot = (instance.__dict__.get("name"), instance.__dict__.get("email"))
+
+
+@receiver(post_save, sender=Customer)
+def _index_workorders_for_customer(sender, instance: Customer, created, **kwargs):
+    current = (instance.__dict__.get("name"), instance.__dict__.get("email"))
+    if not created and not kwargs.get("raw") and current != getattr(instance, "_search_index_snapshot", current):
+        search_index.schedule_many(
+            search_index.KIND_WORKORDER,
+            WorkOrder.objects.filter(customer=instance).values_list("pk", flat=True),
+            key=("customer", instance.pk),
+        )
+    instance._search_index_snapshot = current
+
+
 # ---------- Helpers ---------------------------------------------------------
 
 def _normalise_vin(vin: str) -> str:
@@ -183,6 +673,28 @@ def _build_notes(record: IncomeRecord2) -> str:
         qty = f"{record.qty.normalize():g}" if record.qty else "1"
         parts.append(f"Installed {record.product.name} (x{qty})")
 
+
+def _job_history_defaults(record: IncomeRecord2, invoice, vehicle) -> dict | None:
+    job_date = record.date or invoice.date
+    if not job_date:
+        return None
+
+    description = (
+        record.job
+        or (f"Product: {record.product.name}" if record.product else "")
+        or "No description provided"
+    )
+    return {
+        "vehicle": vehicle,
+        "invoice": invoice,
+        "job_date": job_date,
+        "description": description,
+        "service_cost": record.amount or Decimal("0.00"),
+        "tax_amount": record.tax_collected or Decimal("0.00"),
+        "notes": _build_notes(record),
+    }
+
+
 # ---------- post_save -------------------------------------------------------
 
 @receiver(post_save, sender=IncomeRecord2)
@@ -202,28 +714,56 @@ def sync_job_history(sender, instance: IncomeRecord2, **kwargs):
             # No valid vehicle → silently skip.  You can log here if desired.
             return
 
-        job_date = instance.date or invoice.date
-        if not job_date:
+        defaults = _job_history_defaults(instance, invoice, vehicle)
+        if defaults is None:
             return                         # Nothing to file without a date
 
-        description = (
-            instance.job
-            or (f"Product: {instance.product.name}" if instance.product else "")
-            or "No description provided"
-        )
+        JobHistory.objects.update_or_create(source_income_record=instance, defaults=defaults)
+    transaction.on_commit(_sync)
 
-        obj, _ = JobHistory.objects.update_or_create(
-            source_income_record=instance,
-            defaults={
-                "vehicle": vehicle,
-                "invoice": invoice,
-                "job_date": job_date,
-                "description": description,
-                "service_cost": instance.amount or Decimal("0.00"),
-                "tax_amount": instance.tax_collected or Decimal("0.00"),
-                "notes": _build_notes(instance),
-            },
+
+@receiver(invoice_lines_saved)
+def sync_job_history_for_lines(sender, invoice: GroupedInvoice, lines, **kwargs):
+    """
+    Batch counterpart of ``sync_job_history`` for GroupedInvoice.save_lines():
+    one vehicle lookup and one JobHistory read/write round per invoice.
+    """
+    line_ids = [line.pk for line in lines if line.pk]
+    if not line_ids:
+        return
+
+    def _sync():
+        vehicle = _get_or_create_vehicle(invoice)
+        if not vehicle:
+            return
+
+        records = (
+            IncomeRecord2.objects.filter(pk__in=line_ids, grouped_invoice=invoice)
+            .select_related("product")
         )
+        existing = {
+            entry.source_income_record_id: entry
+            for entry in JobHistory.objects.filter(source_income_record_id__in=line_ids)
+        }
+        to_create, to_update = [], []
+        for record in records:
+            defaults = _job_history_defaults(record, invoice, vehicle)
+            if defaults is None:
+                continue
+            entry = existing.get(record.pk) or JobHistory(source_income_record=record)
+            for field, value in defaults.items():
+                setattr(entry, field, value)
+            # bulk writes skip JobHistory.save(), which derives the total.
+            entry.total_job_cost = (entry.service_cost + entry.tax_amount).quantize(Decimal("0.01"))
+            (to_update if entry.pk else to_create).append(entry)
+
+        if to_create:
+            JobHistory.objects.bulk_create(to_create)
+        if to_update:
+            JobHistory.objects.bulk_update(
+                to_update,
+                ["vehicle", "invoice", "job_date", "description", "service_cost", "tax_amount", "total_job_cost", "notes"],
+            )
     transaction.on_commit(_sync)
 
 # ---------- post_delete -----------------------------------------------------
@@ -319,17 +859,26 @@ def _record_activity(instance, *, action, object_type, description, object_id=No
     )
 
 
-@receiver(post_save, sender=GroupedInvoice)
-def log_grouped_invoice_activity(sender, instance: GroupedInvoice, created: bool, **kwargs):
+def _schedule_inventory_reconciliation(invoice):
+    """Reconcile the invoice's stock postings once after the transaction commits."""
+    if not invoice.pk:
+        return
+
     def _sync_inventory():
         try:
-            instance.ensure_inventory_transactions()
+            invoice.ensure_inventory_transactions()
         except Exception:
             logger.exception(
                 "Failed to ensure inventory transactions for invoice %s",
-                getattr(instance, "invoice_number", instance.pk),
+                getattr(invoice, "invoice_number", invoice.pk),
             )
-    transaction.on_commit(_sync_inventory)
+
+    commit_hooks.on_commit_once(("invoice_inventory", invoice.pk), _sync_inventory)
+
+
+@receiver(post_save, sender=GroupedInvoice)
+def log_grouped_invoice_activity(sender, instance: GroupedInvoice, created: bool, **kwargs):
+    _schedule_inventory_reconciliation(instance)
 
     identifier = getattr(instance, "invoice_number", None) or instance.pk
     action = "created" if created else "updated"
@@ -374,16 +923,7 @@ def ensure_inventory_for_line(sender, instance: IncomeRecord2, created: bool, **
     invoice = getattr(instance, "grouped_invoice", None)
     if not invoice:
         return
-    def _sync_inventory():
-        try:
-            invoice.ensure_inventory_transactions()
-        except Exception:
-            logger.exception(
-                "Failed to backfill inventory for IncomeRecord2 #%s on invoice %s",
-                instance.pk,
-                getattr(invoice, "invoice_number", getattr(invoice, "pk", "")),
-            )
-    transaction.on_commit(_sync_inventory)
+    _schedule_inventory_reconciliation(invoice)
 
 
 @receiver(post_save, sender=WorkOrder)
@@ -517,3 +1057,48 @@ def log_inventory_transaction_delete(sender, instance: InventoryTransaction, **k
         object_id=instance.pk,
         metadata=metadata,
     )
+
+
+@receiver(post_init, sender=InventoryTransaction)
+def _remember_movement(sender, instance: InventoryTransaction, **kwargs):
+    # Deferred loads are left alone; save() and the pre_delete receiver load them on demand.
+    if instance.pk and not instance.get_deferred_fields().intersection(InventoryTransaction.MOVEMENT_FIELDS):
+        instance._original_movement = instance._movement_row()
+
+
+@receiver(pre_delete, sender=InventoryTransaction)
+def _load_deleted_movement(sender, instance: InventoryTransaction, **kwargs):
+    # The row is gone by post_delete, so deferred movement fields are loaded now.
+    deferred = instance.get_deferred_fields().intersection(InventoryTransaction.MOVEMENT_FIELDS)
+    if deferred:
+        instance.refresh_from_db(fields=deferred)
+
+
+@receiver(post_delete, sender=InventoryTransaction)
+def _unrecord_deleted_movement(sender, instance: InventoryTransaction, **kwargs):
+    stock_movements.unrecord([instance._original_movement or instance._movement_row()])
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# SUPPLIER SCORECARDS (accounts.supplier_scorecards)
+# ────────────────────────────────────────────────────────────────────────────
+
+@receiver(post_save, sender=PurchaseOrder)
+def _score_supplier_for_received_po(sender, instance: PurchaseOrder, **kwargs):
+    if not kwargs.get("raw") and instance.status in supplier_scorecards.RECEIVED_STATUSES:
+        supplier_scorecards.schedule(instance.user_id, instance.supplier_id)
+
+
+@receiver(post_save, sender=PurchaseOrderItem)
+def _score_supplier_for_received_item(sender, instance: PurchaseOrderItem, **kwargs):
+    update_fields = kwargs.get("update_fields")
+    if kwargs.get("raw") or not instance.quantity_received:
+        return
+    if update_fields is None or "quantity_received" in update_fields:
+        supplier_scorecards.schedule_for_purchase_order(instance.purchase_order_id)
+
+
+@receiver(post_save, sender=ProductRMA)
+def _score_supplier_for_rma(sender, instance: ProductRMA, created, **kwargs):
+    if created and not kwargs.get("raw"):
+        supplier_scorecards.schedule(instance.user_id, instance.supplier_id)
@@ -0,0 +1,332 @@
+"""Apply inventory postings to ``ProductStock``.
+
+``InventoryTransaction`` rows are the audit log; ``ProductStock`` holds the
+running level per product and stock owner (mirrored onto
+``Product.quantity_in_stock`` when the owner is the product's owner). Reading
+the level, adding in Python and saving it back loses updates when two sales of
+the same SKU commit at once, so :func:`apply` locks the affected stock rows
+first (``SELECT ... FOR UPDATE``; on SQLite, which has no row locks, by taking
+the write lock before reading), then writes every level with a single
+``F()``-expression update and refreshes the mirrored product quantities with
+one more. An OUT posting larger than the stock on hand still records an
+"Auto restock" IN row first, as before.
+
+Rows inserted in bulk skip ``post_save``, so :func:`_log_activity` writes the
+staff activity entries ``signals.log_inventory_transaction`` would have.
+
+:func:`post` applies and inserts a whole batch of new transactions;
+``InventoryTransaction.save`` goes through :func:`apply` for single rows.
+:func:`iter_drift` and :func:`rebuild` replay the log to find or repair stock
+levels that no longer match it (``manage.py reconcile_stock``).
+"""
+from __future__ import annotations
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.utils import timezone
+
+from . import stock_movements
+from .activity import get_current_actor
+from .models import ActivityLog, InventoryTransaction, Product, ProductStock, _resolve_stock_owner
+from .utils import get_business_user
+
+
+AUTO_RESTOCK_REMARKS = "Auto restock to satisfy invoice"
+
+
+def _is_inventory(product):
+    return product is not None and getattr(product, "item_type", "inventory") == "inventory"
+
+
+def _load_products(transactions):
+    missing = {txn.product_id for txn in transactions if not InventoryTransaction.product.is_cached(txn)}
+    if missing:
+        products = Product.objects.select_related("user").in_bulk(missing)
+        for txn in transactions:
+            if txn.product_id in products and not InventoryTransaction.product.is_cached(txn):
+                txn.product = products[txn.product_id]
+
+
+def _stock_owners(transactions):
+    """Yield ``(transaction, owner_id)`` for postings that move tracked stock."""
+    owners = {}
+    for txn in transactions:
+        if not _is_inventory(txn.product):
+            continue
+        # The owner depends on the posting user only, or on the product owner when there is none.
+        key = ("user", txn.user_id) if txn.user_id else ("product", txn.product.user_id)
+        if key not in owners:
+            owners[key] = _resolve_stock_owner(txn.user, txn.product)
+        owner = owners[key]
+        if owner is None:
+            continue
+        if not txn.user_id:
+            txn.user = owner
+        yield txn, owner.pk
+
+
+def _stock_filter(keys):
+    by_owner = {}
+    for owner_id, product_id in keys:
+        by_owner.setdefault(owner_id, set()).add(product_id)
+    condition = Q()
+    for owner_id, product_ids in by_owner.items():
+        condition |= Q(user_id=owner_id, product_id__in=product_ids)
+    return condition
+
+
+def _lock_levels(keys, max_levels):
+    """Lock the stock rows for ``keys`` (creating missing ones) and return ``{key: [pk, quantity]}``."""
+
+    def _read():
+        rows = ProductStock.objects.filter(_stock_filter(keys))
+        if connection.features.has_select_for_update:
+            rows = rows.select_for_update().order_by("pk")
+        else:
+            # SQLite: writing first takes the database write lock, so concurrent
+            # postings queue here instead of both reading the same level.
+            rows.update(updated_at=timezone.now())
+        return {
+            (owner_id, product_id): [pk, quantity or 0]
+            for pk, owner_id, product_id, quantity in rows.values_list("pk", "user_id", "product_id", "quantity_in_stock")
+        }
+
+    levels = _read()
+    missing = [key for key in keys if key not in levels]
+    if missing:
+        ProductStock.objects.bulk_create(
+            [
+                ProductStock(
+                    user_id=owner_id,
+                    product_id=product_id,
+                    quantity_in_stock=0,
+                    reorder_level=0,
+                    max_stock_level=max_levels.get(product_id) or 0,
+                )
+                for owner_id, product_id in missing
+            ],
+            ignore_conflicts=True,
+        )
+        levels = _read()
+    return levels
+
+
+def _log_activity(transactions):
+    # The entries signals.log_inventory_transaction writes for rows saved one at a time.
+    actor = get_current_actor()
+    if not transactions or not actor or not actor.is_authenticated:
+        return
+    profile = getattr(actor, "profile", None)
+    if not profile or not profile.is_business_admin or not profile.admin_approved:
+        return
+
+    fallback = []
+    logs = []
+    for txn in transactions:
+        business = txn.user or (txn.product.user if txn.product_id else None)
+        if business is None:
+            if not fallback:
+                fallback.append(get_business_user(actor))
+            business = fallback[0]
+        if business is None:
+            continue
+        product_name = txn.product.name if txn.product_id else ""
+        description = (
+            f"Inventory transaction {txn.get_transaction_type_display()} "
+            f"for {product_name} ({txn.quantity})"
+        )
+        logs.append(
+            ActivityLog(
+                business=business,
+                actor=actor,
+                action="inventory_transaction_created",
+                object_type="inventory_transaction",
+                object_id=str(txn.pk or ""),
+                description=description.strip(),
+                metadata={
+                    "product": product_name,
+                    "quantity": txn.quantity,
+                    "transaction_type": txn.transaction_type,
+                },
+            )
+        )
+    ActivityLog.objects.bulk_create(logs)
+
+
+def _write_levels(levels, before, product_owners):
+    deltas = {key: levels[key][1] - before[key] for key in levels if levels[key][1] != before[key]}
+    if not deltas:
+        return
+    ProductStock.objects.filter(pk__in=[levels[key][0] for key in deltas]).update(
+        quantity_in_stock=F("quantity_in_stock") + Case(
+            *[When(pk=levels[key][0], then=Value(delta)) for key, delta in deltas.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        ),
+        updated_at=timezone.now(),
+    )
+    mirrored = [product_id for owner_id, product_id in deltas if product_owners.get(product_id) == owner_id]
+    if mirrored:
+        Product.objects.filter(pk__in=mirrored).update(
+            quantity_in_stock=Subquery(
+                ProductStock.objects.filter(product_id=OuterRef("pk"), user_id=OuterRef("user_id"))
+                .values("quantity_in_stock")[:1]
+            )
+        )
+
+
+def apply(transactions, *, restock_remarks=AUTO_RESTOCK_REMARKS):
+    """
+    Move stock for ``transactions`` (saved or not) and insert any auto-restock
+    rows they need, all inside the caller's transaction. The transactions
+    themselves are not saved; sets ``user`` to the stock owner where missing.
+    Returns the restock rows.
+    """
+    transactions = [txn for txn in transactions if txn.product_id]
+    if not transactions:
+        return []
+    _load_products(transactions)
+    owned = list(_stock_owners(transactions))
+    if not owned:
+        return []
+
+    products = {txn.product_id: txn.product for txn, _ in owned}
+    keys = list(dict.fromkeys((owner_id, txn.product_id) for txn, owner_id in owned))
+    levels = _lock_levels(keys, {pk: product.max_stock_level for pk, product in products.items()})
+    before = {key: row[1] for key, row in levels.items()}
+
+    restocks = []
+    for txn, owner_id in owned:
+        row = levels[(owner_id, txn.product_id)]
+        if txn.transaction_type == "IN":
+            row[1] += txn.quantity
+        elif txn.transaction_type == "OUT":
+            if row[1] < txn.quantity:
+                # Auto-top-up missing stock instead of throwing an error
+                restocks.append(InventoryTransaction(
+                    product=txn.product,
+                    transaction_type="IN",
+                    quantity=txn.quantity - row[1],
+                    transaction_date=txn.transaction_date,
+                    remarks=restock_remarks,
+                    user=txn.user,
+                ))
+                row[1] = txn.quantity
+            row[1] -= txn.quantity
+        elif txn.transaction_type == "ADJUSTMENT":
+            row[1] = txn.quantity
+
+    _write_levels(levels, before, {pk: product.user_id for pk, product in products.items()})
+    if restocks:
+        InventoryTransaction.objects.bulk_create(restocks)
+        _log_activity(restocks)
+    return restocks
+
+
+def post(transactions, *, restock_remarks=AUTO_RESTOCK_REMARKS):
+    """Apply and insert a batch of new transactions; returns them."""
+    transactions = list(transactions)
+    if not transactions:
+        return []
+    with transaction.atomic():
+        restocks = apply(transactions, restock_remarks=restock_remarks)
+        created = InventoryTransaction.objects.bulk_create(transactions)
+        _log_activity(created)
+        stock_movements.record(restocks + created)
+    return created
+
+
+# ---------- Reconciliation --------------------------------------------------
+
+def replay(products=None, *, chunk_size=5000):
+    """
+    Stock levels implied by the transaction log, as ``{(owner_id, product_id): quantity}``,
+    for inventory ``products`` (default: all).
+    """
+    products = products if products is not None else Product.objects.all()
+    rows = (
+        InventoryTransaction.objects.filter(product__in=products.filter(item_type="inventory"))
+        .order_by("product_id", "transaction_date", "pk")
+        .values_list("product_id", "product__user_id", "user_id", "transaction_type", "quantity")
+    )
+    users = User.objects.select_related("profile").in_bulk(
+        set(rows.exclude(user_id=None).order_by().values_list("user_id", flat=True).distinct())
+    )
+    owners = {}
+    levels = {}
+    for product_id, product_owner_id, user_id, transaction_type, quantity in rows.iterator(chunk_size=chunk_size):
+        if user_id is None:
+            owner_id = product_owner_id
+        else:
+            if user_id not in owners:
+                owner = _resolve_stock_owner(users.get(user_id))
+                owners[user_id] = owner.pk if owner else None
+            owner_id = owners[user_id]
+        if owner_id is None:
+            continue
+        key = (owner_id, product_id)
+        level = levels.get(key, 0)
+        if transaction_type == "IN":
+            level += quantity
+        elif transaction_type == "OUT":
+            level = max(level - quantity, 0)
+        elif transaction_type == "ADJUSTMENT":
+            level = quantity
+        levels[key] = level
+    return levels
+
+
+def iter_drift(products=None):
+    """Yield ``(owner_id, product_id, recorded, replayed)`` where ``ProductStock`` disagrees with the log."""
+    products = products if products is not None else Product.objects.all()
+    levels = replay(products)
+    if not levels:
+        return
+    recorded = {
+        (owner_id, product_id): quantity
+        for owner_id, product_id, quantity in ProductStock.objects.filter(product__in=products).values_list(
+            "user_id", "product_id", "quantity_in_stock"
+        )
+    }
+    for key in sorted(levels):
+        if recorded.get(key) != levels[key]:
+            yield (*key, recorded.get(key), levels[key])
+
+
+def rebuild(products=None):
+    """
+    Reset every stock level that disagrees with the log to the replayed value.
+    Pairs without any transactions are left alone. Returns how many were fixed.
+
+    The levels are locked before the log is replayed, so a posting that commits
+    meanwhile waits instead of being overwritten by a stale replay.
+    """
+    products = products if products is not None else Product.objects.all()
+    with transaction.atomic():
+        keys = list(ProductStock.objects.filter(product__in=products).values_list("user_id", "product_id"))
+        levels = _lock_levels(keys, {}) if keys else {}
+        replayed = replay(products)
+        missing = [key for key in replayed if key not in levels]
+        if missing:
+            product_ids = {product_id for _, product_id in missing}
+            levels.update(
+                _lock_levels(
+                    missing,
+                    dict(Product.objects.filter(pk__in=product_ids).values_list("pk", "max_stock_level")),
+                )
+            )
+            # Postings that created these rows after the first replay are only in a fresh one.
+            replayed.update(replay(products.filter(pk__in=product_ids)))
+        drift = [key for key in sorted(replayed) if levels[key][1] != replayed[key]]
+        if not drift:
+            return 0
+        before = {key: row[1] for key, row in levels.items()}
+        for key in drift:
+            levels[key][1] = replayed[key]
+        _write_levels(
+            levels,
+            before,
+            dict(Product.objects.filter(pk__in={product_id for _, product_id in drift}).values_list("pk", "user_id")),
+        )
+    return len(drift)
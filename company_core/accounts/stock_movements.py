@@ -0,0 +1,190 @@
+"""Maintain and query the ``ProductDailyMovement`` rollup.
+
+Turnover, top and slow movers, last sale and average usage used to sum or max
+``InventoryTransaction`` rows per product over the whole history. The rollup
+keeps one row per product, store user and local day with the units moved in and
+out and the time of the last sale, so the same figures come from one grouped
+query over a compact table.
+
+New postings are added by :func:`record` (``InventoryTransaction.save`` and
+:func:`accounts.stock_ledger.post`); edited and deleted postings are taken back
+out with :func:`unrecord`. ``manage.py backfill_product_movements`` rebuilds
+the rollup from the log with :func:`backfill`. Only IN and OUT postings are
+counted; adjustments set a level rather than move stock.
+"""
+from __future__ import annotations
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest, TruncDate
+from django.utils import timezone
+
+from .models import InventoryTransaction, Product, ProductDailyMovement
+
+
+MOVEMENT_TYPES = ("IN", "OUT")
+
+
+def _local_date(value):
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return timezone.localdate(value)
+
+
+def _rows(transactions):
+    """``(product_id, user_id, transaction_type, quantity, transaction_date)`` for each transaction."""
+    return [
+        (txn.product_id, txn.user_id, txn.transaction_type, txn.quantity, txn.transaction_date)
+        for txn in transactions
+        if txn.product_id and txn.transaction_type in MOVEMENT_TYPES and txn.quantity
+    ]
+
+
+def _apply(rows, sign):
+    rows = [row for row in rows if row[0] and row[2] in MOVEMENT_TYPES and row[3]]
+    if not rows:
+        return
+    owners = dict(
+        Product.objects.filter(pk__in={row[0] for row in rows if not row[1]}).values_list("pk", "user_id")
+    ) if any(not row[1] for row in rows) else {}
+
+    buckets = {}
+    for product_id, user_id, transaction_type, quantity, when in rows:
+        user_id = user_id or owners.get(product_id)
+        if not user_id:
+            continue
+        bucket = buckets.setdefault((product_id, user_id, _local_date(when)), [0, 0, None])
+        if transaction_type == "IN":
+            bucket[0] += quantity
+        else:
+            bucket[1] += quantity
+            if bucket[2] is None or when > bucket[2]:
+                bucket[2] = when
+    if not buckets:
+        return
+
+    if sign > 0:
+        ProductDailyMovement.objects.bulk_create(
+            [ProductDailyMovement(product_id=p, user_id=u, date=d) for p, u, d in buckets],
+            ignore_conflicts=True,
+        )
+
+    def _match(key):
+        product_id, user_id, day = key
+        return Q(product_id=product_id, user_id=user_id, date=day)
+
+    def _delta(index):
+        return Case(
+            *[When(_match(key), then=Value(sign * values[index])) for key, values in buckets.items() if values[index]],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+
+    updates = {
+        "qty_in": Greatest(F("qty_in") + _delta(0), Value(0)),
+        "qty_out": Greatest(F("qty_out") + _delta(1), Value(0)),
+    }
+    latest = {key: values[2] for key, values in buckets.items() if values[2] is not None}
+    if sign > 0 and latest:
+        updates["last_out_at"] = Case(
+            *[
+                When(_match(key), then=Greatest(Coalesce(F("last_out_at"), Value(when)), Value(when)))
+                for key, when in latest.items()
+            ],
+            default=F("last_out_at"),
+        )
+    condition = Q()
+    for key in buckets:
+        condition |= _match(key)
+    ProductDailyMovement.objects.filter(condition).update(**updates)
+    if sign < 0:
+        ProductDailyMovement.objects.filter(condition, qty_in=0, qty_out=0).delete()
+
+
+def record(transactions):
+    """Add new postings to the rollup."""
+    _apply(_rows(transactions), 1)
+
+
+def unrecord(rows):
+    """
+    Take postings back out of the rollup; ``rows`` are ``(product_id, user_id,
+    transaction_type, quantity, transaction_date)`` as they were recorded. The
+    day's ``last_out_at`` is kept; run a backfill to recompute it exactly.
+    """
+    _apply(list(rows), -1)
+
+
+def backfill(products=None):
+    """Rebuild the rollup for ``products`` (default: all) from the transaction log; returns rows written."""
+    products = products if products is not None else Product.objects.all()
+    grouped = (
+        InventoryTransaction.objects.filter(product__in=products, transaction_type__in=MOVEMENT_TYPES)
+        .annotate(day=TruncDate("transaction_date"), owner_id=Coalesce("user_id", "product__user_id"))
+        .exclude(owner_id=None)
+        .values("product_id", "owner_id", "day")
+        .annotate(
+            qty_in=Sum("quantity", filter=Q(transaction_type="IN")),
+            qty_out=Sum("quantity", filter=Q(transaction_type="OUT")),
+            last_out_at=Max("transaction_date", filter=Q(transaction_type="OUT")),
+        )
+        .order_by()
+    )
+    with transaction.atomic():
+        ProductDailyMovement.objects.filter(product__in=products).delete()
+        created = ProductDailyMovement.objects.bulk_create(
+            (
+                ProductDailyMovement(
+                    product_id=row["product_id"],
+                    user_id=row["owner_id"],
+                    date=row["day"],
+                    qty_in=row["qty_in"] or 0,
+                    qty_out=row["qty_out"] or 0,
+                    last_out_at=row["last_out_at"],
+                )
+                for row in grouped.iterator()
+            ),
+            batch_size=2000,
+        )
+    return len(created)
+
+
+# ---------- Queries ---------------------------------------------------------
+
+def window_start(days):
+    """Local day ``days`` ago; windows include that whole day."""
+    return _local_date(timezone.now() - timedelta(days=days))
+
+
+def sold_by_product(user_ids, since, *, product_ids=None):
+    """``{product_id: units sold}`` by ``user_ids`` on or after the local day ``since``."""
+    movements = ProductDailyMovement.objects.filter(user_id__in=user_ids, date__gte=since, qty_out__gt=0)
+    if product_ids is not None:
+        movements = movements.filter(product_id__in=product_ids)
+    return dict(movements.values("product_id").annotate(total=Sum("qty_out")).values_list("product_id", "total"))
+
+
+def sold_since(user_ids, since):
+    """Expression for a Product queryset: units sold by ``user_ids`` on or after ``since`` (None if none)."""
+    return Subquery(
+        ProductDailyMovement.objects.filter(product_id=OuterRef("pk"), user_id__in=user_ids, date__gte=since)
+        .values("product_id")
+        .annotate(total=Sum("qty_out"))
+        .values("total")[:1],
+        output_field=IntegerField(),
+    )
+
+
+def last_sale(user_ids=None):
+    """Expression for a Product queryset: time of the last sale (by ``user_ids``, if given)."""
+    movements = ProductDailyMovement.objects.filter(product_id=OuterRef("pk"), last_out_at__isnull=False)
+    if user_ids is not None:
+        movements = movements.filter(user_id__in=user_ids)
+    return Subquery(movements.order_by("-last_out_at").values("last_out_at")[:1])
+
+
+def average_daily_usage(sold_qty, lookback_days):
+    return Decimal(sold_qty or 0) / Decimal(max(int(lookback_days or 1), 1))
@@ -30,10 +30,8 @@ from django.db.models import (
     ExpressionWrapper,
     F,
     DecimalField,
-    Case,
-    When,
 )
-from django.db.models.functions import Coalesce, TruncMonth, Cast
+from django.db.models.functions import Coalesce, TruncMonth
 from django.forms import modelformset_factory, inlineformset_factory, BaseModelFormSet
 from django.template.loader import render_to_string
 from django.utils import timezone
@@ -85,7 +83,6 @@ from .models import (
         PendingInvoice,
         Payment,
         CustomerCredit,
-        CustomerCreditItem,
         PAYMENT_LINK_PROVIDER_STRIPE,
         PAYMENT_LINK_PROVIDER_CLOVER,
         PAYMENT_LINK_PROVIDER_NONE,
@@ -100,7 +97,7 @@ from .models import (
         InvoiceActivity,
         calculate_tax_total,
     )
-from . import paid_invoice_views
+from . import paid_invoice_views, payment_links, receivables_journal
 from .view_invoices import send_grouped_invoice_email, _build_invoice_context, _render_pdf
 from .invoice_activity import log_invoice_activity
 from .forms import (
@@ -136,11 +133,11 @@ from .utils import (
     resolve_storefront_category_flags,
     resolve_storefront_price_flags,
 )
-from .pdf_utils import apply_branding_defaults, render_template_to_pdf
+from .pdf_utils import apply_branding_defaults, pdf_stylesheet, render_html_to_pdf, render_template_to_pdf
 
 
-STATEMENT_PDF_CSS = CSS(
-    string='''
+STATEMENT_PDF_CSS = pdf_stylesheet(
+    '''
         @page { size: Letter; margin: 1.25cm; }
         body { font-family: "Helvetica", "Arial", sans-serif; font-size: 12px; color: #1f2933; }
         h1, h2, h3 { color: #0f172a; }
@@ -149,7 +146,7 @@ STATEMENT_PDF_CSS = CSS(
         th { background-color: #f1f5f9; font-weight: 600; }
         tfoot td { font-weight: 600; }
     '''
-) if WEASYPRINT_AVAILABLE else None
+)
 
 
 class _UserScopedFormSet(BaseModelFormSet):
@@ -306,57 +303,6 @@ def _customer_portal_layout_context(request, active_slug):
     }
 
 
-def _annotate_invoice_credit_totals(queryset):
-    amount_field = DecimalField(max_digits=10, decimal_places=2)
-    credit_amount_expr = Case(
-        When(customer_credit__tax_included=True, then=Cast('amount', amount_field)),
-        default=ExpressionWrapper(
-            Cast('amount', amount_field) + Cast('tax_paid', amount_field),
-            output_field=amount_field,
-        ),
-        output_field=amount_field,
-    )
-    credit_total = CustomerCreditItem.objects.filter(
-        source_invoice=OuterRef('pk')
-    ).values('source_invoice').annotate(
-        total=Coalesce(
-            Sum(credit_amount_expr),
-            Value(Decimal('0.00')),
-            output_field=amount_field,
-        )
-    ).values('total')
-    return queryset.annotate(
-        credit_total=Coalesce(
-            Subquery(credit_total, output_field=amount_field),
-            Value(Decimal('0.00')),
-            output_field=amount_field,
-        )
-    )
-
-
-def _get_customer_credit_total(customer_account):
-    amount_field = DecimalField(max_digits=10, decimal_places=2)
-    credit_amount_expr = Case(
-        When(customer_credit__tax_included=True, then=Cast('amount', amount_field)),
-        default=ExpressionWrapper(
-            Cast('amount', amount_field) + Cast('tax_paid', amount_field),
-            output_field=amount_field,
-        ),
-        output_field=amount_field,
-    )
-    total = CustomerCreditItem.objects.filter(
-        customer_credit__customer=customer_account,
-        customer_credit__user=customer_account.user,
-    ).aggregate(
-        total=Coalesce(
-            Sum(credit_amount_expr),
-            Value(Decimal('0.00')),
-            output_field=amount_field,
-        )
-    )['total']
-    return total or Decimal('0.00')
-
-
 def _build_customer_credit_rows(customer_account, *, start_date=None, end_date=None, limit=None):
     credits_qs = CustomerCredit.objects.filter(
         user=customer_account.user,
@@ -410,18 +356,7 @@ def _summarize_customer_invoices(customer_account, *, today=None):
     """Build summary stats and recent invoices for customer portal views."""
 
     today = today or timezone.localdate()
-    invoices_qs = customer_account.invoices.all()
-    invoice_totals = invoices_qs.aggregate(
-        total_invoiced=Coalesce(Sum('total_amount'), Decimal('0.00')),
-    )
-    payment_totals = Payment.objects.filter(invoice__customer=customer_account).aggregate(
-        total_paid=Coalesce(Sum('amount'), Decimal('0.00')),
-    )
-
-    total_invoiced = invoice_totals['total_invoiced'] or Decimal('0.00')
-    total_paid = payment_totals['total_paid'] or Decimal('0.00')
-    total_credit = _get_customer_credit_total(customer_account)
-    outstanding_balance = total_invoiced - total_paid - total_credit
+    account = receivables_journal.account_summary(customer_account.pk)
 
     invoices_qs = (
         customer_account.invoices.select_related('user')
@@ -445,10 +380,10 @@ def _summarize_customer_invoices(customer_account, *, today=None):
             overdue_balance += balance_due
 
     invoice_summary = {
-        'total_invoiced': total_invoiced,
-        'total_paid': total_paid,
-        'total_credit': total_credit,
-        'outstanding_balance': outstanding_balance,
+        'total_invoiced': account['total_invoiced'],
+        'total_paid': account['total_paid'],
+        'total_credit': account['total_credit'],
+        'outstanding_balance': account['outstanding_balance'],
         'invoice_count': len(all_invoices),
         'open_count': open_count,
         'overdue_count': overdue_count,
@@ -465,14 +400,9 @@ def _customer_invoice_pdf_response(invoice, request, *, inline=False):
     """Shared helper used for customer-portal invoice downloads/prints."""
 
     if invoice.payment_status == 'Paid':
-        context = paid_invoice_views._invoice_context(invoice, request=request)
-        template = 'invoices/paid_invoice_pdf.html'
         if not WEASYPRINT_AVAILABLE:
             raise ImportError("WeasyPrint is not available. PDF generation is disabled. Please install GTK+ libraries for Windows.")
-        context = apply_branding_defaults(context)
-        pdf_bytes = HTML(string=render_to_string(template, context)).write_pdf(
-            stylesheets=[paid_invoice_views.PDF_CSS]
-        )
+        pdf_bytes = paid_invoice_views._render_paid_invoice_pdf(invoice, request=request)
         filename = f'paid_{invoice.invoice_number}.pdf'
     else:
         context = _build_invoice_context(invoice, request, profile=getattr(invoice.user, 'profile', None))
@@ -509,7 +439,7 @@ def _customer_workorder_pdf_response(workorder, request):
     html_string = render_to_string('workorders/workorder_pdf.html', context)
     if not WEASYPRINT_AVAILABLE:
         raise ImportError("WeasyPrint is not available. PDF generation is disabled. Please install GTK+ libraries for Windows.")
-    pdf_bytes = HTML(string=html_string, base_url=request.build_absolute_uri()).write_pdf()
+    pdf_bytes = render_html_to_pdf(html_string, base_url=request.build_absolute_uri())
 
     response = HttpResponse(pdf_bytes, content_type='application/pdf')
     response['Content-Disposition'] = f'attachment; filename="WorkOrder_{workorder.id}.pdf"'
@@ -613,8 +543,10 @@ def _statement_pdf_response(customer_account, invoices, *, start_date, end_date,
     html = render_to_string('invoices/customer_statement_pdf.html', context)
     if not WEASYPRINT_AVAILABLE:
         raise ImportError("WeasyPrint is not available. PDF generation is disabled. Please install GTK+ libraries for Windows.")
-    pdf_bytes = HTML(string=html, base_url=request.build_absolute_uri('/')).write_pdf(
-        stylesheets=[STATEMENT_PDF_CSS]
+    pdf_bytes = render_html_to_pdf(
+        html,
+        stylesheets=[STATEMENT_PDF_CSS],
+        base_url=request.build_absolute_uri('/'),
     )
     filename = f'statement_paid_invoices_{start_date:%Y%m%d}_{end_date:%Y%m%d}.pdf'
     response = HttpResponse(pdf_bytes, content_type='application/pdf')
@@ -3929,29 +3861,31 @@ def checkout(request):
                 online_order_status=GroupedInvoice.ONLINE_ORDER_STATUS_NEW,
             )
 
-            for item in paid_items:
-                IncomeRecord2.objects.create(
+            lines = [
+                IncomeRecord2(
                     grouped_invoice=invoice,
                     product=item['product'],
                     job=item['product'].name,
                     qty=Decimal(item['quantity']),
                     rate=item['unit_price'],
                 )
+                for item in paid_items
+            ]
             for item in free_items:
                 bonus_label = item['product'].name
                 if item.get('package_title'):
                     bonus_label = f"{bonus_label} (Free with {item['package_title']})"
-                IncomeRecord2.objects.create(
+                lines.append(IncomeRecord2(
                     grouped_invoice=invoice,
                     product=item['product'],
                     job=bonus_label,
                     qty=Decimal(item['quantity']),
                     rate=Decimal('0.00'),
-                )
+                ))
 
-            invoice.ensure_inventory_transactions()
-            invoice.recalculate_total_amount()
-            invoice.create_online_payment_link()
+            invoice.save_lines(lines)
+            # The confirmation email below carries the link, so build it now.
+            payment_links.build_now(invoice)
             PendingInvoice.objects.get_or_create(grouped_invoice=invoice)
 
             original_user = request.user
@@ -4475,23 +4409,22 @@ def customer_invoice_list(request):
         .select_related('user')
         .prefetch_related('payments')
         .annotate(
-            total_paid_amount=Coalesce(
-                Sum('payments__amount'), Value(Decimal('0.00')), output_field=DecimalField(max_digits=12, decimal_places=2)
-            )
-        )
-    )
-    invoices_qs = _annotate_invoice_credit_totals(invoices_qs).annotate(
-        balance_due_amount=ExpressionWrapper(
-            F('total_amount') - F('total_paid_amount') - F('credit_total'),
-            output_field=DecimalField(max_digits=12, decimal_places=2)
+            total_paid_amount=F('amount_paid'),
+            credit_total=F('amount_credited'),
+            balance_due_amount=F('amount_due'),
         )
     )
 
     if search_query:
+        # Customers search by the status label they see, not the stored code.
+        matching_states = [
+            state for state, label in GroupedInvoice.PAYMENT_STATE_CHOICES
+            if search_query.lower() in label.lower()
+        ]
         invoices_qs = invoices_qs.filter(
             Q(invoice_number__icontains=search_query) |
             Q(bill_to__icontains=search_query) |
-            Q(payment_status__icontains=search_query) |
+            Q(payment_state__in=matching_states) |
             Q(total_amount__icontains=search_query)
         )
 
@@ -5326,34 +5259,21 @@ def customer_settlement_summary(request):
     """Provide a snapshot of paid and outstanding balances for the customer."""
 
     customer_account = request.user.customer_portal
-    invoice_totals = customer_account.invoices.aggregate(
-        total_invoiced=Coalesce(Sum('total_amount'), Decimal('0.00')),
-    )
-    payment_totals = Payment.objects.filter(invoice__customer=customer_account).aggregate(
-        total_paid=Coalesce(Sum('amount'), Decimal('0.00')),
-    )
-
-    total_invoiced = invoice_totals['total_invoiced'] or Decimal('0.00')
-    total_paid = payment_totals['total_paid'] or Decimal('0.00')
-    credit_rows, total_credit = _build_customer_credit_rows(customer_account)
-    outstanding_balance = total_invoiced - total_paid - total_credit
+    account = receivables_journal.account_summary(customer_account.pk)
+    credit_rows, _ = _build_customer_credit_rows(customer_account)
 
     outstanding_qs = (
         customer_account.invoices
         .select_related('user__profile')
         .prefetch_related('payments')
+        .filter(amount_due__gt=Decimal('0.00'))
         .annotate(
-            total_paid_amount=Coalesce(
-                Sum('payments__amount'), Value(Decimal('0.00')), output_field=DecimalField(max_digits=12, decimal_places=2)
-            )
+            total_paid_amount=F('amount_paid'),
+            credit_total=F('amount_credited'),
+            balance_due_amount=F('amount_due'),
         )
+        .order_by('-date', '-id')
     )
-    outstanding_qs = _annotate_invoice_credit_totals(outstanding_qs).annotate(
-        balance_due_amount=ExpressionWrapper(
-            F('total_amount') - F('total_paid_amount') - F('credit_total'),
-            output_field=DecimalField(max_digits=12, decimal_places=2)
-        )
-    ).filter(balance_due_amount__gt=Decimal('0.00')).order_by('-date', '-id')
     paginator = Paginator(outstanding_qs, 100)
     page_number = request.GET.get('page')
     outstanding_page = paginator.get_page(page_number)
@@ -5395,10 +5315,10 @@ def customer_settlement_summary(request):
 
     context = {
         'invoice_summary': {
-            'total_invoiced': total_invoiced,
-            'total_paid': total_paid,
-            'total_credit': total_credit,
-            'outstanding_balance': outstanding_balance,
+            'total_invoiced': account['total_invoiced'],
+            'total_paid': account['total_paid'],
+            'total_credit': account['total_credit'],
+            'outstanding_balance': account['outstanding_balance'],
         },
         'contact_email': contact_email,
         'show_action_column': show_action_column,
@@ -0,0 +1,271 @@
+"""Persisted supplier scorecards.
+
+:func:`compute` scores one business's suppliers over a trailing window with
+three grouped queries: purchase orders, their line quantities and RMAs. The
+scores are
+
+* on-time rate: received POs whose last update fell on or before the
+  expected delivery date;
+* fill rate: units received over units ordered;
+* average lead time: days from creation to the last update of received POs;
+* RMA rate: units returned over units ordered;
+
+blended into ``weighted_score`` (40% on-time, 40% fill, 20% RMA). Windows are
+whole local days ending on ``as_of``.
+
+Scores are stored as :class:`~accounts.models.SupplierScorecardSnapshot` rows,
+one per supplier, day and window length.
+
+* ``SupplierScorecardCronJob`` (``manage.py snapshot_supplier_scorecards``)
+  writes every business's snapshot nightly and prunes rows older than
+  ``SUPPLIER_SCORECARD_RETENTION_DAYS``.
+* Receiving a PO and opening an RMA re-score that supplier after commit
+  (:func:`schedule`), for each window already snapshotted today.
+* The operations page reads :func:`current_rows`, which builds today's
+  snapshot on first use, and :func:`with_trends` for the change in score.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import datetime, time, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import commit_hooks
+from .models import ProductRMA, PurchaseOrder, PurchaseOrderItem, SupplierScorecardSnapshot
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PERIOD_DAYS = 90
+DEFAULT_RETENTION_DAYS = 730
+DEFAULT_TREND_DAYS = 30
+RECEIVED_STATUSES = ("partially_received", "received")
+SCORE_FIELDS = ("po_count", "on_time_rate", "fill_rate", "avg_lead_time_days", "rma_rate", "weighted_score")
+
+_HUNDRED = Decimal("100")
+_CENT = Decimal("0.01")
+
+
+def _window(as_of, period_days):
+    start = timezone.make_aware(datetime.combine(as_of - timedelta(days=period_days), time.min))
+    end = timezone.make_aware(datetime.combine(as_of + timedelta(days=1), time.min))
+    return start, end
+
+
+def _percent(part, whole, default="0.00"):
+    if not whole:
+        return Decimal(default)
+    return Decimal(part or 0) / Decimal(whole) * _HUNDRED
+
+
+def _score(row, rma_qty):
+    ordered = row["qty_ordered"] or 0
+    on_time_rate = _percent(row["on_time_hits"], row["on_time_checks"], default="100.00")
+    fill_rate = _percent(row["qty_received"], ordered)
+    rma_rate = _percent(rma_qty, ordered)
+    avg_lead_time = Decimal("0.00")
+    if row["lead_time_count"]:
+        avg_lead_time = Decimal(row["lead_time_total"].days) / Decimal(row["lead_time_count"])
+
+    weighted_score = (
+        (on_time_rate * Decimal("0.40"))
+        + (fill_rate * Decimal("0.40"))
+        + (max(Decimal("0.00"), _HUNDRED - (rma_rate * Decimal("2.00"))) * Decimal("0.20"))
+    )
+    return {
+        "po_count": row["po_count"],
+        "on_time_rate": on_time_rate.quantize(_CENT, rounding=ROUND_HALF_UP),
+        "fill_rate": fill_rate.quantize(_CENT, rounding=ROUND_HALF_UP),
+        "avg_lead_time_days": avg_lead_time.quantize(_CENT, rounding=ROUND_HALF_UP),
+        "rma_rate": rma_rate.quantize(_CENT, rounding=ROUND_HALF_UP),
+        "weighted_score": weighted_score.quantize(_CENT, rounding=ROUND_HALF_UP),
+    }
+
+
+def compute(user_id, as_of=None, *, period_days=DEFAULT_PERIOD_DAYS, supplier_ids=None) -> dict:
+    """
+    Return ``{supplier_id: {field: value}}`` for suppliers with a PO from
+    ``user_id`` in the ``period_days`` before ``as_of`` (today by default).
+    ``supplier_ids`` limits the suppliers.
+    """
+    as_of = as_of or timezone.localdate()
+    start, end = _window(as_of, period_days)
+
+    orders = PurchaseOrder.objects.filter(
+        user_id=user_id,
+        supplier__isnull=False,
+        created_at__gte=start,
+        created_at__lt=end,
+    )
+    rmas = ProductRMA.objects.filter(user_id=user_id, supplier__isnull=False, opened_at__gte=start, opened_at__lt=end)
+    if supplier_ids is not None:
+        orders = orders.filter(supplier_id__in=supplier_ids)
+        rmas = rmas.filter(supplier_id__in=supplier_ids)
+
+    received = Q(status__in=RECEIVED_STATUSES)
+    checked = received & Q(expected_delivery_date__isnull=False)
+    rows = {
+        row.pop("supplier_id"): row
+        for row in orders.order_by()
+        .values("supplier_id")
+        .annotate(
+            po_count=Count("pk"),
+            on_time_checks=Count("pk", filter=checked),
+            on_time_hits=Count("pk", filter=checked & Q(updated_at__date__lte=F("expected_delivery_date"))),
+            lead_time_count=Count("pk", filter=received),
+            lead_time_total=Sum(TruncDate("updated_at") - TruncDate("created_at"), filter=received),
+        )
+    }
+    if not rows:
+        return {}
+
+    quantities = (
+        PurchaseOrderItem.objects.filter(purchase_order__in=orders)
+        .order_by()
+        .values("purchase_order__supplier_id")
+        .annotate(ordered=Sum("quantity_ordered"), received=Sum("quantity_received"))
+    )
+    for row in rows.values():
+        row["qty_ordered"] = row["qty_received"] = 0
+    for entry in quantities:
+        row = rows[entry["purchase_order__supplier_id"]]
+        row["qty_ordered"] = entry["ordered"] or 0
+        row["qty_received"] = entry["received"] or 0
+
+    returned = dict(
+        rmas.order_by().values("supplier_id").annotate(total=Sum("quantity")).values_list("supplier_id", "total")
+    )
+    return {supplier_id: _score(row, returned.get(supplier_id, 0)) for supplier_id, row in rows.items()}
+
+
+def refresh(user_id, as_of=None, *, period_days=DEFAULT_PERIOD_DAYS, supplier_ids=None) -> int:
+    """
+    Write ``user_id``'s snapshot rows for ``as_of`` (today by default), for
+    every supplier or only ``supplier_ids``. Returns the number of rows written.
+    """
+    as_of = as_of or timezone.localdate()
+    results = compute(user_id, as_of, period_days=period_days, supplier_ids=supplier_ids)
+    existing = SupplierScorecardSnapshot.objects.filter(user_id=user_id, snapshot_date=as_of, period_days=period_days)
+    if supplier_ids is not None:
+        existing = existing.filter(supplier_id__in=supplier_ids)
+
+    snapshots = [
+        SupplierScorecardSnapshot(
+            user_id=user_id,
+            supplier_id=supplier_id,
+            snapshot_date=as_of,
+            period_days=period_days,
+            **values,
+        )
+        for supplier_id, values in results.items()
+    ]
+    try:
+        with transaction.atomic():
+            existing.delete()
+            SupplierScorecardSnapshot.objects.bulk_create(snapshots)
+    except IntegrityError:
+        # Another request wrote the same snapshot first; theirs is as fresh.
+        logger.debug("Supplier scorecards for user %s on %s written concurrently", user_id, as_of)
+        return 0
+    return len(snapshots)
+
+
+def current_rows(user_id, *, period_days=DEFAULT_PERIOD_DAYS, as_of=None):
+    """Today's snapshot rows for ``user_id``, best score first, building them first if needed."""
+    as_of = as_of or timezone.localdate()
+    rows = SupplierScorecardSnapshot.objects.filter(user_id=user_id, snapshot_date=as_of, period_days=period_days)
+    if not rows.exists():
+        refresh(user_id, as_of, period_days=period_days)
+    return rows.select_related("supplier").order_by("-weighted_score", "supplier__name")
+
+
+def with_trends(rows, *, days=DEFAULT_TREND_DAYS):
+    """
+    Attach ``previous_score`` (the earliest snapshot of the same window in the
+    ``days`` before each row) and ``score_change`` to ``rows``; both are None
+    without history.
+    """
+    rows = list(rows)
+    if not rows:
+        return rows
+    as_of = max(row.snapshot_date for row in rows)
+    history = (
+        SupplierScorecardSnapshot.objects.filter(
+            user_id__in={row.user_id for row in rows},
+            supplier_id__in={row.supplier_id for row in rows},
+            period_days__in={row.period_days for row in rows},
+            snapshot_date__gte=as_of - timedelta(days=days),
+            snapshot_date__lt=as_of,
+        )
+        .order_by("snapshot_date")
+        .values_list("user_id", "supplier_id", "period_days", "weighted_score")
+    )
+    earliest = {}
+    for user_id, supplier_id, period_days, score in history:
+        earliest.setdefault((user_id, supplier_id, period_days), score)
+    for row in rows:
+        row.previous_score = earliest.get((row.user_id, row.supplier_id, row.period_days))
+        row.score_change = None if row.previous_score is None else row.weighted_score - row.previous_score
+    return rows
+
+
+def snapshot_all(as_of=None, *, period_days=DEFAULT_PERIOD_DAYS) -> dict:
+    """Write every business's scorecards for ``as_of`` and prune expired rows."""
+    as_of = as_of or timezone.localdate()
+    start, end = _window(as_of, period_days)
+    user_ids = set(
+        PurchaseOrder.objects.filter(supplier__isnull=False, created_at__gte=start, created_at__lt=end)
+        .order_by()
+        .values_list("user_id", flat=True)
+        .distinct()
+    )
+    rows = sum(refresh(user_id, as_of, period_days=period_days) for user_id in sorted(user_ids))
+    retention = getattr(settings, "SUPPLIER_SCORECARD_RETENTION_DAYS", DEFAULT_RETENTION_DAYS)
+    pruned, _ = SupplierScorecardSnapshot.objects.filter(
+        snapshot_date__lt=as_of - timedelta(days=retention)
+    ).delete()
+    return {"businesses": len(user_ids), "rows": rows, "pruned": pruned}
+
+
+# ---------- Incremental updates --------------------------------------------
+
+def _refresh_if_current(user_id, supplier_id):
+    today = timezone.localdate()
+    periods = (
+        SupplierScorecardSnapshot.objects.filter(user_id=user_id, snapshot_date=today)
+        .order_by()
+        .values_list("period_days", flat=True)
+        .distinct()
+    )
+    for period_days in list(periods):
+        refresh(user_id, today, period_days=period_days, supplier_ids={supplier_id})
+
+
+def schedule(user_id, supplier_id) -> None:
+    """Re-score one supplier of ``user_id`` after commit, if today's snapshot exists."""
+    if user_id and supplier_id:
+        commit_hooks.on_commit_once(
+            ("supplier_scorecard", user_id, supplier_id),
+            lambda: _refresh_if_current(user_id, supplier_id),
+        )
+
+
+def schedule_for_purchase_order(purchase_order_id) -> None:
+    """Re-score the supplier of ``purchase_order_id`` (e.g. after a receipt) after commit."""
+    if purchase_order_id:
+        commit_hooks.on_commit_once(
+            ("supplier_scorecard_po", purchase_order_id),
+            lambda: _refresh_purchase_order_supplier(purchase_order_id),
+        )
+
+
+def _refresh_purchase_order_supplier(purchase_order_id):
+    row = PurchaseOrder.objects.filter(pk=purchase_order_id).values_list("user_id", "supplier_id").first()
+    if row is not None and row[1]:
+        _refresh_if_current(*row)
@@ -0,0 +1,134 @@
+"""Request-scoped and shared caching for tenant scoping lookups.
+
+The helpers in :mod:`accounts.utils` that resolve the business owner, team
+members, connected business group and stock owner for a user are called many
+times while rendering a single page. Results are memoized in two tiers:
+
+* a thread-local memo that lives for the duration of one request (activated by
+  :class:`accounts.middleware.TenantScopeCacheMiddleware`), and
+* the Django cache, shared between requests and namespaced by a generation
+  token that is rotated whenever tenant membership data changes (see the
+  receivers in :mod:`accounts.signals`).
+
+Only primitive values (user IDs, ID lists) and freshly loaded rows are stored
+so cached entries never carry stale related-object caches.
+"""
+from __future__ import annotations
+
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+CACHE_KEY_PREFIX = "accounts:tenant_scope"
+GENERATION_CACHE_KEY = f"{CACHE_KEY_PREFIX}:generation"
+DEFAULT_CACHE_TIMEOUT = 300
+
+_MISSING = object()
+_request_storage = threading.local()
+
+
+def is_enabled() -> bool:
+    """Return True when tenant scope caching is turned on."""
+    return bool(getattr(settings, "TENANT_SCOPE_CACHE_ENABLED", True))
+
+
+def _cache_timeout():
+    return getattr(settings, "TENANT_SCOPE_CACHE_TIMEOUT", DEFAULT_CACHE_TIMEOUT)
+
+
+def begin_request() -> None:
+    """Start a fresh per-request memo for the current thread."""
+    _request_storage.memo = {}
+
+
+def end_request() -> None:
+    """Drop the per-request memo for the current thread."""
+    if hasattr(_request_storage, "memo"):
+        delattr(_request_storage, "memo")
+
+
+def _get_memo():
+    return getattr(_request_storage, "memo", None)
+
+
+def get_generation(key=GENERATION_CACHE_KEY):
+    """Return the current token for a versioned cache namespace."""
+    memo = _get_memo()
+    memo_key = ("generation", key)
+    if memo is not None and memo_key in memo:
+        return memo[memo_key]
+
+    generation = cache.get(key)
+    if generation is None:
+        generation = uuid.uuid4().hex
+        if not cache.add(key, generation, None):
+            generation = cache.get(key) or generation
+
+    if memo is not None:
+        memo[memo_key] = generation
+    return generation
+
+
+def rotate_generation(key=GENERATION_CACHE_KEY):
+    """Start a new token for a versioned cache namespace."""
+    cache.set(key, uuid.uuid4().hex, None)
+    memo = _get_memo()
+    if memo is not None:
+        memo.clear()
+
+
+def invalidate() -> None:
+    """Discard every cached tenant scope lookup.
+
+    The generation is rotated immediately and again once the surrounding
+    transaction commits so concurrent requests cannot repopulate the cache
+    with rows that were read before the change became visible.
+    """
+    rotate_generation()
+    transaction.on_commit(rotate_generation)
+
+
+def _format_key(key):
+    if isinstance(key, (tuple, list)):
+        return ":".join(str(part) for part in key)
+    return str(key)
+
+
+def cached_lookup(namespace, key, compute):
+    """Return ``compute()`` memoized per request and in the shared cache."""
+    if not is_enabled():
+        return compute()
+
+    memo = _get_memo()
+    memo_key = (namespace, key)
+    if memo is not None and memo_key in memo:
+        return memo[memo_key]
+
+    cache_key = f"{CACHE_KEY_PREFIX}:{get_generation()}:{namespace}:{_format_key(key)}"
+    value = cache.get(cache_key, _MISSING)
+    if value is _MISSING:
+        value = compute()
+        cache.set(cache_key, value, _cache_timeout())
+
+    if memo is not None:
+        memo[memo_key] = value
+    return value
+
+
+def request_memoized(namespace, key, compute):
+    """Return ``compute()`` memoized for the current request only.
+
+    Used for model instances that should not be shared between requests.
+    """
+    memo = _get_memo()
+    if not is_enabled() or memo is None:
+        return compute()
+
+    memo_key = (namespace, key)
+    if memo_key not in memo:
+        memo[memo_key] = compute()
+    return memo[memo_key]
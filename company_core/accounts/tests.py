@@ -1,41 +1,109 @@
-from datetime import timedelta
+import os
+import pickle
+import random
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
 from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 from urllib.parse import urlencode
 
 from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
 from django.core import mail
 from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.management import call_command
-from django.test import TestCase
-from django.test.utils import override_settings
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
 from django.urls import reverse
 from django.utils import timezone
+from openpyxl import Workbook, load_workbook
+from openpyxl.utils import get_column_letter
 
+from .context_processors import get_storefront_nav
 from .forms import CustomerForm, ProductForm, VehicleQuickWorkOrderForm
 from .models import (
+    ActivityLog,
+    Category,
     CycleCountEntry,
     CycleCountSession,
     Customer,
+    CustomerCredit,
+    CustomerCreditItem,
+    EstimateRecord,
+    GroupedEstimate,
     GroupedInvoice,
     IncomeRecord2,
     InventoryRoleAssignment,
+    InvoiceActivity,
+    InvoiceNumberSequence,
     InventoryTransaction,
+    InvoiceConversionJob,
     MarginGuardrailSetting,
+    PaidInvoice,
+    Payment,
+    PaymentLinkRequest,
     Mechanic,
+    PendingInvoice,
     Product,
+    ProductAlternateSku,
+    ProductDailyMovement,
+    ProductImportJob,
+    ProductRMA,
     ProductStock,
     Profile,
     PurchaseOrder,
     PurchaseOrderItem,
+    ReceivablesAgingSnapshot,
+    ReceivablesJournalEntry,
     ReplenishmentRule,
+    SearchDocument,
     Supplier,
+    SupplierScorecardSnapshot,
     Vehicle,
     VehicleMaintenanceTask,
     WorkOrder,
     WorkOrderAssignment,
     WorkOrderRecord,
+    calculate_tax_total,
 )
-from .utils import sync_workorder_assignments
+from . import (
+    aging,
+    commit_hooks,
+    excel_export,
+    invoice_conversion,
+    line_taxes,
+    pagination,
+    payment_allocation,
+    payment_links,
+    pdf_cache,
+    pdf_prerender,
+    pdf_renderer,
+    pdf_utils,
+    product_import,
+    receivables,
+    receivables_journal,
+    replenishment,
+    search_index,
+    stock_ledger,
+    supplier_scorecards,
+    tenant_scope,
+)
+from .activity import clear_current_actor, set_current_actor
+from .invoice_activity import log_invoice_activity
+from .utils import (
+    annotate_products_with_stock,
+    apply_stock_fields,
+    get_business_user,
+    get_business_user_ids,
+    sync_workorder_assignments,
+)
+from .views import GroupedInvoiceListView
 
 
 class WorkOrderInventoryTests(TestCase):
@@ -252,6 +320,1761 @@ class InvoiceInventoryEditTests(TestCase):
         self.assertEqual(p2_trans.count(), 2)
 
 
+class InvoiceBatchLineSaveTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="batchuser", password="p")
+        self.customer = Customer.objects.create(user=self.user, name="Cust")
+        self.product = Product.objects.create(
+            user=self.user,
+            sku="B1",
+            name="Batch1",
+            cost_price=Decimal("5.00"),
+            sale_price=Decimal("10.00"),
+            quantity_in_stock=50,
+        )
+
+    def _lines(self, invoice, count, qty="1"):
+        return [
+            IncomeRecord2(grouped_invoice=invoice, product=self.product, qty=Decimal(qty), rate=Decimal("10.00"))
+            for _ in range(count)
+        ]
+
+    def test_save_lines_posts_inventory_and_total_once(self):
+        invoice = GroupedInvoice.objects.create(user=self.user, customer=self.customer)
+        invoice.save_lines(self._lines(invoice, 3, qty="2"))
+
+        lines = list(invoice.income_records.all())
+        self.assertEqual([line.line_order for line in lines], [1, 2, 3])
+        self.assertTrue(all(line.amount == Decimal("20.00") for line in lines))
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.total_amount, sum(line.amount + line.tax_collected for line in lines))
+
+        trans = InventoryTransaction.objects.filter(product=self.product)
+        self.assertEqual(trans.count(), 1)
+        self.assertEqual(trans.get().quantity, 6)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity_in_stock, 44)
+
+    def test_save_lines_updates_and_deletes_existing_lines(self):
+        invoice = GroupedInvoice.objects.create(user=self.user, customer=self.customer)
+        kept, removed = invoice.save_lines(self._lines(invoice, 2, qty="2"))
+
+        kept.qty = Decimal("5")
+        invoice.save_lines([kept], deleted=[removed])
+
+        self.assertEqual(list(invoice.income_records.values_list("pk", flat=True)), [kept.pk])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity_in_stock, 45)
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.total_amount, kept.amount + kept.tax_collected)
+
+    def test_save_lines_creates_fee_lines_for_parts_store(self):
+        Profile.objects.filter(user=self.user).update(occupation="parts_store")
+        self.product.core_price = Decimal("15.00")
+        self.product.save(update_fields=["core_price"])
+        invoice = GroupedInvoice.objects.create(user=User.objects.get(pk=self.user.pk), customer=self.customer)
+
+        line = invoice.save_lines(self._lines(invoice, 1, qty="2"))[0]
+
+        fee = IncomeRecord2.objects.get(parent_line=line)
+        self.assertEqual(fee.amount, Decimal("30.00"))
+        self.assertEqual(fee.line_order, line.line_order + 1)
+
+    def test_save_lines_query_count_does_not_grow_with_lines(self):
+        def _count(line_count):
+            invoice = GroupedInvoice.objects.create(user=self.user, customer=self.customer)
+            lines = self._lines(invoice, line_count)
+            with CaptureQueriesContext(connection) as captured:
+                invoice.save_lines(lines)
+            return len(captured)
+
+        self.assertEqual(_count(3), _count(30))
+
+
+class InvoiceInventoryReconciliationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="reconuser", password="p")
+        self.customer = Customer.objects.create(user=self.user, name="Cust")
+        self.products = [
+            Product.objects.create(
+                user=self.user,
+                sku=f"R{index}",
+                name=f"Recon{index}",
+                cost_price=Decimal("5.00"),
+                sale_price=Decimal("10.00"),
+                quantity_in_stock=100,
+            )
+            for index in range(50)
+        ]
+
+    @override_settings(PDF_PRERENDER_ENABLED=False)
+    def test_line_saves_reconcile_once_per_transaction(self):
+        with mock.patch.object(GroupedInvoice, "ensure_inventory_transactions", autospec=True) as ensure:
+            with self.captureOnCommitCallbacks(execute=True):
+                invoice = GroupedInvoice.objects.create(user=self.user, customer=self.customer)
+                for product in self.products:
+                    IncomeRecord2.objects.create(
+                        grouped_invoice=invoice, product=product, qty=Decimal("1"), rate=Decimal("10.00")
+                    )
+                inventory_keys = [key for key in commit_hooks.pending_keys() if key[0] == "invoice_inventory"]
+                self.assertEqual(inventory_keys, [("invoice_inventory", invoice.pk)])
+
+        self.assertEqual(ensure.call_count, 1)
+
+    def test_fully_posted_50_line_invoice_costs_two_queries(self):
+        invoice = GroupedInvoice.objects.create(user=self.user, customer=self.customer)
+        invoice.save_lines([
+            IncomeRecord2(grouped_invoice=invoice, product=product, qty=Decimal("2"), rate=Decimal("10.00"))
+            for product in self.products
+        ])
+
+        with self.assertNumQueries(2):
+            invoice.ensure_inventory_transactions()
+
+    def test_backfills_missing_postings_for_every_product(self):
+        invoice = GroupedInvoice.objects.create(user=self.user, customer=self.customer)
+        invoice.save_lines([
+            IncomeRecord2(grouped_invoice=invoice, product=product, qty=Decimal("2"), rate=Decimal("10.00"))
+            for product in self.products
+        ])
+        InventoryTransaction.objects.filter(product__in=self.products[:10]).delete()
+
+        invoice.ensure_inventory_transactions()
+
+        outs = InventoryTransaction.objects.filter(transaction_type="OUT", product__in=self.products)
+        self.assertEqual(outs.count(), 50)
+        self.assertEqual(set(outs.values_list("quantity", flat=True)), {2})
+        with self.assertNumQueries(2):
+            invoice.ensure_inventory_transactions()
+
+
+class InvoiceNumberSequenceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="sequser", password="p")
+        self.customer = Customer.objects.create(user=self.user, name="Cust")
+
+    def _number(self, sequence_number):
+        return GroupedInvoice._format_invoice_number(self.user, sequence_number)
+
+    def test_numbers_increment_from_last_invoice(self):
+        first = GroupedInvoice.objects.create(user=self.user, customer=self.customer)
+        second = GroupedInvoice.objects.create(user=self.user, customer=self.customer)
+        self.assertEqual(first.invoice_number, self._number(150))
+        self.assertEqual(second.invoice_number, self._number(151))
+        self.assertEqual(GroupedInvoice.generate_invoice_number(self.user, commit=False), self._number(152))
+
+    def test_profile_override_moves_the_counter_and_tracks_it(self):
+        GroupedInvoice.objects.create(user=self.user, customer=self.customer)
+        profile = Profile.objects.get(user=self.user)
+        profile.invoice_sequence_next = 500
+        profile.save(update_fields=["invoice_sequence_next"])
+
+        self.assertEqual(GroupedInvoice.generate_invoice_number(self.user, commit=False), self._number(500))
+        invoice = GroupedInvoice.objects.create(user=self.user, customer=self.customer)
+        self.assertEqual(invoice.invoice_number, self._number(500))
+        profile.refresh_from_db()
+        self.assertEqual(profile.invoice_sequence_next, 501)
+
+        again = GroupedInvoice.objects.create(user=self.user, customer=self.customer)
+        self.assertEqual(again.invoice_number, self._number(501))
+
+    def test_reserved_block_skips_numbers_already_in_use(self):
+        GroupedInvoice.objects.create(user=self.user, customer=self.customer)
+        manual = GroupedInvoice(user=self.user, customer=self.customer, invoice_number=self._number(152))
+        manual.save()
+
+        numbers = GroupedInvoice.reserve_invoice_numbers(self.user, 3)
+
+        self.assertEqual(numbers, [self._number(151), self._number(153), self._number(154)])
+        self.assertEqual(InvoiceNumberSequence.objects.get(user=self.user).next_value, 155)
+
+
+class InvoiceNumberConcurrencyTests(TransactionTestCase):
+    def test_parallel_reservations_never_collide(self):
+        user = User.objects.create_user(username="seqthreads", password="p")
+        thread_count, per_thread = 8, 25
+        results, errors = [], []
+        lock = threading.Lock()
+
+        def worker():
+            numbers = []
+            try:
+                for _ in range(per_thread):
+                    for attempt in range(50):
+                        try:
+                            numbers.append(GroupedInvoice.generate_invoice_number(user))
+                            break
+                        except OperationalError:
+                            # SQLite reports lock contention instead of waiting.
+                            time.sleep(0.001 * (attempt + 1))
+                    else:
+                        raise AssertionError("sequence stayed locked")
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+            with lock:
+                results.extend(numbers)
+
+        threads = [threading.Thread(target=worker) for _ in range(thread_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(results), thread_count * per_thread)
+        self.assertEqual(len(set(results)), len(results))
+        self.assertEqual(
+            InvoiceNumberSequence.objects.get(user=user).next_value,
+            InvoiceNumberSequence.DEFAULT_START + thread_count * per_thread,
+        )
+
+
+class PdfCacheTests(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.store = pdf_cache.FileSystemPdfStore(root=self.tmpdir.name, max_bytes=10_000)
+        patcher = mock.patch.object(pdf_cache, "get_store", return_value=self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_same_html_is_rendered_once(self):
+        render = mock.Mock(return_value=b"%PDF-1")
+        first = pdf_cache.get_or_render("<p>Invoice 1</p>", render)
+        second = pdf_cache.get_or_render("<p>Invoice 1</p>", render)
+        self.assertEqual(first, b"%PDF-1")
+        self.assertEqual(second, b"%PDF-1")
+        render.assert_called_once()
+
+    def test_changed_html_or_stylesheet_gets_a_new_key(self):
+        sheet_a = mock.Mock(pdf_cache_fingerprint="sha256:a")
+        sheet_b = mock.Mock(pdf_cache_fingerprint="sha256:b")
+        key = pdf_cache.cache_key("<p>1</p>", [sheet_a])
+        self.assertEqual(key, pdf_cache.cache_key("<p>1</p>", [sheet_a]))
+        self.assertNotEqual(key, pdf_cache.cache_key("<p>2</p>", [sheet_a]))
+        self.assertNotEqual(key, pdf_cache.cache_key("<p>1</p>", [sheet_b]))
+
+    def test_referenced_file_changes_the_key(self):
+        logo = os.path.join(self.tmpdir.name, "logo.png")
+        with open(logo, "wb") as handle:
+            handle.write(b"a")
+        html = f'<img src="file://{logo}">'
+        key = pdf_cache.cache_key(html)
+        with open(logo, "wb") as handle:
+            handle.write(b"bigger")
+        self.assertNotEqual(key, pdf_cache.cache_key(html))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        self.store.max_bytes = 3000
+        now = time.time()
+        for index in range(3):
+            self.store.put(f"{index:02d}" * 32, b"x" * 1000)
+            path = self.store._path(f"{index:02d}" * 32)
+            os.utime(path, (now - 100 + index, now - 100 + index))
+        self.store.get("00" * 32)  # touch the oldest entry
+        self.store.put("03" * 32, b"x" * 1000)
+        self.store.evict()
+
+        self.assertIsNotNone(self.store.get("00" * 32))
+        self.assertIsNone(self.store.get("01" * 32))
+        self.assertIsNotNone(self.store.get("03" * 32))
+        self.assertLessEqual(self.store.size(), 3000)
+
+    @override_settings(INVOICE_PDF_CACHE_ENABLED=False)
+    def test_disabled_cache_always_renders(self):
+        render = mock.Mock(return_value=b"%PDF-1")
+        pdf_cache.get_or_render("<p>x</p>", render)
+        pdf_cache.get_or_render("<p>x</p>", render)
+        self.assertEqual(render.call_count, 2)
+        self.assertEqual(self.store.size(), 0)
+
+    @override_settings(PAYMENT_LINK_OUTBOX_THREAD_DISPATCH=False)
+    def test_saves_schedule_one_prerender_per_document(self):
+        user = User.objects.create_user(username="pdfcache", password="p")
+        customer = Customer.objects.create(user=user, name="PDF Customer")
+        with mock.patch.object(pdf_prerender, "WEASYPRINT_AVAILABLE", True), \
+                mock.patch.object(pdf_prerender, "_schedule") as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                invoice = GroupedInvoice.objects.create(
+                    user=user, customer=customer, date=timezone.localdate()
+                )
+                IncomeRecord2.objects.create(grouped_invoice=invoice, job="Labour", qty=1, rate=10)
+                IncomeRecord2.objects.create(grouped_invoice=invoice, job="Parts", qty=2, rate=5)
+                invoice.save()
+        schedule.assert_called_once_with(pdf_prerender.KIND_INVOICE, invoice.pk)
+
+    def test_prerender_warms_the_download_pdf(self):
+        user = User.objects.create_user(username="pdfwarm", password="p")
+        Profile.objects.update_or_create(user=user, defaults={"activation_link_clicked": True, "show_note": False})
+        invoice = GroupedInvoice.objects.create(user=user, date=timezone.localdate())
+        IncomeRecord2.objects.create(grouped_invoice=invoice, job="Labour", qty=1, rate=10)
+        render = mock.Mock(return_value=b"%PDF-warm")
+        self.client.force_login(user)
+
+        with mock.patch.object(pdf_utils, "render_html_to_pdf", render), \
+                mock.patch("accounts.views.WEASYPRINT_AVAILABLE", True):
+            pdf_prerender.render(pdf_prerender.KIND_INVOICE, invoice.pk)
+            warmed = render.call_count
+            response = self.client.get(reverse("accounts:download_invoice", args=[invoice.pk]))
+
+        self.assertEqual(response.content, b"%PDF-warm")
+        self.assertEqual(render.call_count, warmed)
+
+    @override_settings(PDF_PRERENDER_ENABLED=False)
+    def test_prerender_can_be_disabled(self):
+        user = User.objects.create_user(username="pdfcacheoff", password="p")
+        with mock.patch.object(pdf_prerender, "WEASYPRINT_AVAILABLE", True), \
+                mock.patch.object(pdf_prerender, "_schedule") as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                GroupedInvoice.objects.create(user=user, date=timezone.localdate())
+        schedule.assert_not_called()
+
+
+class PdfRendererTests(TestCase):
+    def test_stylesheets_pickle_with_a_content_fingerprint(self):
+        sheet = pdf_renderer.PdfStylesheet("@page { size: A4; }")
+        clone = pickle.loads(pickle.dumps(sheet))
+        self.assertEqual(clone, sheet)
+        self.assertEqual(clone.pdf_cache_fingerprint, sheet.pdf_cache_fingerprint)
+        self.assertNotEqual(
+            sheet.pdf_cache_fingerprint,
+            pdf_renderer.PdfStylesheet("@page { size: Letter; }").pdf_cache_fingerprint,
+        )
+
+    @override_settings(PDF_RENDER_POOL_ENABLED=True, PDF_RENDER_POOL_SIZE=1)
+    def test_foreign_stylesheets_render_in_process(self):
+        job = pdf_renderer.RenderJob("<p>x</p>", (object(),))
+        with mock.patch.object(pdf_renderer, "_get_pool") as get_pool:
+            self.assertIsNone(pdf_renderer._submit(job))
+        get_pool.assert_not_called()
+
+    @override_settings(PDF_RENDER_POOL_ENABLED=False)
+    def test_render_many_keeps_input_order_without_a_pool(self):
+        renderer = mock.Mock()
+        renderer.render.side_effect = lambda html, stylesheets, base_url: html.encode()
+        with mock.patch.object(pdf_renderer, "_local_renderer", return_value=renderer):
+            pdfs = pdf_renderer.render_many([("<p>1</p>", (), None), ("<p>2</p>", (), None)])
+        self.assertEqual(pdfs, [b"<p>1</p>", b"<p>2</p>"])
+
+
+class GroupedInvoiceListPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="keyset", password="p")
+        Profile.objects.get_or_create(user=self.user)
+        customer = Customer.objects.create(user=self.user, name="Keyset Customer")
+        today = timezone.localdate()
+        self.invoices = [
+            GroupedInvoice.objects.create(user=self.user, customer=customer, date=today - timedelta(days=index // 2))
+            for index in range(7)
+        ]
+        self.client.force_login(self.user)
+        patcher = mock.patch.object(GroupedInvoiceListView, "paginate_by", 3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _get(self, url=None, **params):
+        params.setdefault("date_range", "all")
+        if url:
+            return self.client.get(reverse("accounts:groupedinvoice_list") + url)
+        return self.client.get(reverse("accounts:groupedinvoice_list"), params)
+
+    def test_date_sort_walks_every_row_forwards_and_back(self):
+        expected = [
+            invoice.pk for invoice in sorted(self.invoices, key=lambda inv: (inv.date, inv.pk), reverse=True)
+        ]
+        response = self._get(sort_by="date", order="desc")
+        pages = [[invoice.pk for invoice in response.context["object_list"]]]
+        while response.context["page_obj"].has_next():
+            response = self._get(response.context["page_links"]["next"])
+            pages.append([invoice.pk for invoice in response.context["object_list"]])
+
+        self.assertEqual([pk for page in pages for pk in page], expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(response.context["page_obj"].number, 3)
+        self.assertEqual(response.context["page_obj"].start_index(), 7)
+
+        response = self._get(response.context["page_links"]["previous"])
+        self.assertEqual([invoice.pk for invoice in response.context["object_list"]], pages[1])
+        self.assertEqual(response.context["page_obj"].number, 2)
+
+        response = self._get(response.context["page_links"]["last"])
+        self.assertEqual([invoice.pk for invoice in response.context["object_list"]], pages[2])
+
+    def _walk(self, **params):
+        response = self._get(**params)
+        pages = [[invoice.pk for invoice in response.context["object_list"]]]
+        while response.context["page_obj"].has_next():
+            response = self._get(response.context["page_links"]["next"])
+            pages.append([invoice.pk for invoice in response.context["object_list"]])
+        return response, pages
+
+    def test_undated_invoices_are_a_separate_segment(self):
+        undated = self.invoices[1:4]
+        GroupedInvoice.objects.filter(pk__in=[invoice.pk for invoice in undated]).update(date=None)
+        dated = sorted(
+            (invoice for invoice in self.invoices if invoice not in undated), key=lambda inv: (inv.date, inv.pk)
+        )
+        undated_pks = sorted(invoice.pk for invoice in undated)
+
+        response, pages = self._walk(sort_by="date", order="desc")
+        self.assertEqual(
+            [pk for page in pages for pk in page], [inv.pk for inv in reversed(dated)] + undated_pks[::-1]
+        )
+        response = self._get(response.context["page_links"]["previous"])
+        self.assertEqual([invoice.pk for invoice in response.context["object_list"]], pages[1])
+
+        response, pages = self._walk(sort_by="date", order="asc")
+        self.assertEqual([pk for page in pages for pk in page], undated_pks + [inv.pk for inv in dated])
+        response = self._get(response.context["page_links"]["last"])
+        self.assertEqual([invoice.pk for invoice in response.context["object_list"]], pages[-1])
+        # The OFFSET fallback orders undated invoices the same way.
+        response = self._get(sort_by="date", order="asc", page=2)
+        self.assertEqual([invoice.pk for invoice in response.context["object_list"]], pages[1])
+
+    def test_invoice_number_sort_uses_the_stored_sequence(self):
+        invoice = self.invoices[0]
+        self.assertEqual(invoice.invoice_sequence, GroupedInvoice.sequence_from_number(invoice.invoice_number))
+        self.assertGreater(invoice.invoice_sequence, 0)
+        self.assertEqual(GroupedInvoice.sequence_from_number("LEGACY"), 0)
+        self.assertEqual(GroupedInvoice.sequence_from_number("A-B-0107"), 107)
+
+        _, pages = self._walk()
+        expected = sorted(self.invoices, key=lambda inv: (inv.invoice_sequence, inv.pk), reverse=True)
+        self.assertEqual([pk for page in pages for pk in page], [inv.pk for inv in expected])
+
+    def test_keyset_pages_seek_on_indexes(self):
+        request = RequestFactory().get(reverse("accounts:groupedinvoice_list"), {"date_range": "all"})
+        request.user = self.user
+        view = GroupedInvoiceListView()
+        view.setup(request)
+        queryset = view.get_queryset()
+        if connection.vendor == "postgresql":
+            # A handful of rows is cheaper to scan; ask whether an index can serve the order.
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                cursor.execute("SET LOCAL enable_sort = off")
+        checks = [
+            ([("invoice_sequence", True), ("pk", True)], False, "invoice_user_sequence_id_idx"),
+            ([("date", True), ("pk", True)], True, "invoice_user_date_id_idx"),
+        ]
+        for keys, nullable, index_name in checks:
+            paginator = pagination.KeysetPaginator(
+                queryset, 3, keys, signature="explain", namespace="explain", tenant_id=self.user.pk, nullable=nullable
+            )
+            for segment, _ in paginator.segments:
+                plan = segment[:4].explain()
+                self.assertIn(index_name, plan)
+                self.assertNotRegex(plan, r"TEMP B-TREE FOR ORDER BY|\bSort\b")
+
+    def test_cursor_from_another_sort_is_ignored(self):
+        response = self._get(sort_by="date", order="desc")
+        after = response.context["page_links"]["next"].split("after=")[1]
+        response = self._get(sort_by="total_amount", order="asc", after=after)
+        self.assertEqual(response.context["page_obj"].number, 1)
+
+    def test_count_is_cached_until_invoices_change(self):
+        queryset = GroupedInvoice.objects.filter(user=self.user)
+        self.assertEqual(pagination.cached_count(queryset, namespace="test", tenant_id=self.user.pk), 7)
+        with self.assertNumQueries(0):
+            pagination.cached_count(queryset, namespace="test", tenant_id=self.user.pk)
+        pagination.invalidate_counts("test", self.user.pk)
+        with self.assertNumQueries(1):
+            pagination.cached_count(queryset, namespace="test", tenant_id=self.user.pk)
+
+    def test_activity_timestamps_are_stored_on_the_invoice(self):
+        invoice = self.invoices[0]
+        log_invoice_activity(invoice, event_type=InvoiceActivity.EVENT_EMAIL_SENT)
+        sent_at = InvoiceActivity.objects.get(invoice=invoice).created_at
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.last_email_sent_at, sent_at)
+        self.assertIsNone(invoice.last_email_opened_at)
+
+        response = self._get(sort_by="date", order="desc")
+        listed = next(row for row in response.context["object_list"] if row.pk == invoice.pk)
+        self.assertEqual(listed.email_status_sent_at, sent_at)
+
+
+@override_settings(PAYMENT_LINK_OUTBOX_THREAD_DISPATCH=False)
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="search", password="p")
+        Profile.objects.get_or_create(user=self.user)
+        self.customer = Customer.objects.create(user=self.user, name="Northline Logistics")
+
+    def _invoice(self, jobs=(), **fields):
+        fields.setdefault("date", timezone.localdate())
+        with self.captureOnCommitCallbacks(execute=True):
+            invoice = GroupedInvoice.objects.create(user=self.user, customer=self.customer, **fields)
+            for job in jobs:
+                IncomeRecord2.objects.create(grouped_invoice=invoice, job=job, qty=Decimal("1"), rate=Decimal("5.00"))
+        return invoice
+
+    def _search(self, query, kind=search_index.KIND_INVOICE, model=GroupedInvoice):
+        queryset = search_index.search(model.objects.filter(user=self.user), kind, query, user_id=self.user.pk)
+        return list(search_index.order_by_rank(queryset).values_list("pk", flat=True))
+
+    def test_header_and_lines_are_indexed_after_commit(self):
+        invoice = self._invoice(["Replace brake caliper"], bill_to="Prairie Haulers", make_model="Kenworth T680")
+
+        document = SearchDocument.objects.get(kind=search_index.KIND_INVOICE, object_id=invoice.pk)
+        self.assertEqual(document.user, self.user)
+        self.assertIn("prairie haulers", document.content)
+        self.assertIn("kenworth t680", document.content)
+        self.assertIn("replace brake caliper", document.content)
+        self.assertIn(invoice.invoice_number.lower(), document.content)
+
+    def test_every_term_must_match_as_a_substring(self):
+        brakes = self._invoice(["Brake caliper"], make_model="Cascadia")
+        self._invoice(["Oil change"], make_model="Cascadia")
+        self._invoice(["Brake pads"], make_model="T680")
+
+        self.assertEqual(self._search("cascad BRAKE"), [brakes.pk])
+        # Two-letter terms are too short for the trigram index and use LIKE.
+        self.assertEqual(self._search("caliper ca"), [brakes.pk])
+        self.assertEqual(self._search("nothing-like-this"), [])
+
+    def test_better_matches_rank_first(self):
+        weak = self._invoice(["Wiper blades", "Alternator", "Coolant flush", "Inspect regen"])
+        strong = self._invoice(["DPF regen", "Regen sensor"])
+
+        self.assertEqual(self._search("regen"), [strong.pk, weak.pk])
+
+    def test_line_and_invoice_deletes_update_the_index(self):
+        invoice = self._invoice(["Clutch kit"])
+        with self.captureOnCommitCallbacks(execute=True):
+            invoice.income_records.all().delete()
+        self.assertEqual(self._search("clutch"), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            invoice.delete()
+        self.assertFalse(SearchDocument.objects.filter(object_id=invoice.pk).exists())
+
+    def test_list_view_searches_the_index(self):
+        match = self._invoice(["Turbo actuator"])
+        self._invoice(["Headlight bulb"])
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse("accounts:groupedinvoice_list"), {"search": "actuator", "date_range": "all"})
+
+        self.assertEqual([invoice.pk for invoice in response.context["object_list"]], [match.pk])
+
+    def test_customer_rename_reindexes_work_orders(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            workorder = WorkOrder.objects.create(
+                user=self.user,
+                customer=self.customer,
+                scheduled_date=timezone.localdate(),
+                description="Air leak at trailer glad hands",
+            )
+        self.assertEqual(self._search("glad hands", search_index.KIND_WORKORDER, WorkOrder), [workorder.pk])
+
+        self.customer.name = "Summit Transport"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer.save()
+
+        self.assertEqual(self._search("summit", search_index.KIND_WORKORDER, WorkOrder), [workorder.pk])
+        self.assertEqual(self._search("northline", search_index.KIND_WORKORDER, WorkOrder), [])
+
+
+@override_settings(PAYMENT_LINK_OUTBOX_THREAD_DISPATCH=False)
+class ReceivablesAgingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="aging", password="p")
+        profile, _ = Profile.objects.get_or_create(user=self.user)
+        profile.term = "net_15"
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+        self.customer = Customer.objects.create(user=self.user, name="Ridge Freight")
+        self.other = Customer.objects.create(user=self.user, name="Coastline Carriers")
+        self.today = timezone.localdate()
+
+    def _invoice(self, days_old, amount, customer=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            invoice = GroupedInvoice.objects.create(
+                user=self.user,
+                customer=customer or self.customer,
+                date=self.today - timedelta(days=days_old),
+            )
+            IncomeRecord2.objects.create(grouped_invoice=invoice, job="Labour", qty=Decimal("1"), rate=Decimal(amount))
+        invoice.refresh_from_db()
+        return invoice
+
+    def _snapshot(self, customer):
+        return ReceivablesAgingSnapshot.objects.get(user=self.user, customer=customer, as_of=self.today)
+
+    def test_invoices_are_bucketed_by_days_past_due(self):
+        current = self._invoice(10, "100.00")  # due in 5 days
+        one_to_thirty = self._invoice(20, "200.00")  # 5 days past due
+        ninety_plus = self._invoice(120, "300.00")  # 105 days past due
+        self._invoice(50, "400.00", customer=self.other)  # 35 days past due
+
+        aging.refresh(self.user.pk)
+
+        row = self._snapshot(self.customer)
+        self.assertEqual(row.current, current.amount_due)
+        self.assertEqual(row.overdue_1_30, one_to_thirty.amount_due)
+        self.assertEqual(row.overdue_31_60, Decimal("0.00"))
+        self.assertEqual(row.overdue_90_plus, ninety_plus.amount_due)
+        self.assertEqual(row.overdue_total, one_to_thirty.amount_due + ninety_plus.amount_due)
+        self.assertEqual(row.total_due, row.current + row.overdue_total)
+        self.assertEqual((row.invoice_count, row.overdue_invoice_count), (3, 2))
+        self.assertEqual(row.oldest_due_invoice_date, ninety_plus.date)
+        self.assertGreater(self._snapshot(self.other).overdue_31_60, Decimal("0.00"))
+        # The customer-less row marks the day as computed even when it is empty.
+        self.assertEqual(self._snapshot(None).total_due, Decimal("0.00"))
+
+    def test_payment_reages_the_customer_after_commit(self):
+        invoice = self._invoice(40, "250.00")
+        aging.refresh(self.user.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            payment = Payment.objects.create(invoice=invoice, amount=Decimal("100.00"))
+
+        invoice.refresh_from_db()
+        self.assertEqual(self._snapshot(self.customer).overdue_1_30, invoice.amount_due)
+
+        payment.amount = invoice.total_amount
+        with self.captureOnCommitCallbacks(execute=True):
+            payment.save()
+
+        # Customers without an open balance have no row.
+        self.assertFalse(
+            ReceivablesAgingSnapshot.objects.filter(user=self.user, customer=self.customer, as_of=self.today).exists()
+        )
+
+    def test_readers_build_todays_snapshot_once(self):
+        self._invoice(30, "120.00")
+        self._invoice(5, "80.00", customer=self.other)
+
+        totals = aging.customer_totals([self.user.pk])
+
+        self.assertEqual(set(totals), {self.customer.pk, self.other.pk})
+        self.assertGreater(totals[self.customer.pk]["overdue_1_30"], Decimal("0.00"))
+        self.assertEqual(totals[self.other.pk]["overdue_total"], Decimal("0.00"))
+        with self.assertNumQueries(2):
+            summary = aging.business_summary([self.user.pk])
+        self.assertEqual(summary["overdue_total"], totals[self.customer.pk]["overdue_total"])
+
+    @override_settings(AGING_SNAPSHOT_RETENTION_DAYS=30)
+    def test_snapshot_all_writes_every_business_and_prunes(self):
+        self._invoice(30, "120.00")
+        ReceivablesAgingSnapshot.objects.create(user=self.user, as_of=self.today - timedelta(days=45))
+        out = StringIO()
+
+        call_command("snapshot_receivables_aging", stdout=out)
+
+        self.assertIn("pruned 1", out.getvalue())
+        self.assertEqual(
+            list(ReceivablesAgingSnapshot.objects.filter(user=self.user).values_list("as_of", flat=True).distinct()),
+            [self.today],
+        )
+        self.assertEqual([row["as_of"] for row in aging.trend([self.user.pk])], [self.today])
+
+
+@override_settings(PAYMENT_LINK_OUTBOX_THREAD_DISPATCH=False)
+class ReceivablesJournalTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="journal", password="p")
+        self.customer = Customer.objects.create(user=self.user, name="Maple Haulage")
+        self.other = Customer.objects.create(user=self.user, name="Bayview Cartage")
+        self.today = timezone.localdate()
+
+    def _invoice(self, amount, customer=None, days_ago=0):
+        with self.captureOnCommitCallbacks(execute=True):
+            invoice = GroupedInvoice.objects.create(
+                user=self.user,
+                customer=customer or self.customer,
+                date=self.today - timedelta(days=days_ago),
+            )
+            IncomeRecord2.objects.create(grouped_invoice=invoice, job="Labour", qty=Decimal("1"), rate=Decimal(amount))
+        invoice.refresh_from_db()
+        return invoice
+
+    def _entries(self, customer=None):
+        return list(
+            ReceivablesJournalEntry.objects.filter(customer=customer or self.customer)
+            .order_by("id")
+            .values_list("entry_type", "amount", "balance")
+        )
+
+    def test_postings_keep_a_running_balance(self):
+        invoice = self._invoice("100.00")
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.create(invoice=invoice, amount=Decimal("30.00"))
+        with self.captureOnCommitCallbacks(execute=True):
+            credit = CustomerCredit.objects.create(user=self.user, customer=self.customer, tax_included=True)
+            CustomerCreditItem.objects.create(customer_credit=credit, qty=1, price=20)
+
+        total = invoice.total_amount
+        self.assertEqual(
+            self._entries(),
+            [
+                ("invoice", total, total),
+                ("payment", Decimal("-30.00"), total - Decimal("30.00")),
+                ("credit", Decimal("-20.00"), total - Decimal("50.00")),
+            ],
+        )
+        self.assertEqual(receivables_journal.balance(self.customer.pk), total - Decimal("50.00"))
+        summary = receivables_journal.account_summary(self.customer.pk)
+        self.assertEqual(summary["total_paid"], Decimal("30.00"))
+        self.assertEqual(summary["total_credit"], Decimal("20.00"))
+        self.assertEqual(summary["outstanding_balance"], total - Decimal("50.00"))
+
+    def test_changes_append_corrections_instead_of_editing(self):
+        invoice = self._invoice("100.00")
+        with self.captureOnCommitCallbacks(execute=True):
+            payment = Payment.objects.create(invoice=invoice, amount=Decimal("40.00"))
+        first_ids = list(ReceivablesJournalEntry.objects.values_list("id", "amount"))
+
+        payment.amount = Decimal("55.00")
+        with self.captureOnCommitCallbacks(execute=True):
+            payment.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            invoice.customer = self.other
+            invoice.save()
+
+        self.assertEqual(list(ReceivablesJournalEntry.objects.filter(id__in=[pk for pk, _ in first_ids]).values_list("id", "amount")), first_ids)
+        self.assertEqual(receivables_journal.balance(self.customer.pk), Decimal("0.00"))
+        self.assertEqual(receivables_journal.balance(self.other.pk), invoice.total_amount - Decimal("55.00"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            invoice.delete()
+        self.assertEqual(receivables_journal.balance(self.other.pk), Decimal("0.00"))
+
+    def test_statement_reads_a_date_range(self):
+        old = self._invoice("100.00", days_ago=40)
+        recent = self._invoice("50.00", days_ago=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.create(invoice=old, amount=old.total_amount, date=self.today - timedelta(days=3))
+
+        activity = receivables_journal.statement(self.customer.pk, start_date=self.today - timedelta(days=10))
+
+        self.assertEqual(activity["opening_balance"], old.total_amount)
+        self.assertEqual(
+            [(line["entry_type"], line["amount"], line["balance"]) for line in activity["entries"]],
+            [
+                ("invoice", recent.total_amount, old.total_amount + recent.total_amount),
+                ("payment", -old.total_amount, recent.total_amount),
+            ],
+        )
+        self.assertEqual(activity["closing_balance"], recent.total_amount)
+
+    def test_rebuild_command_repairs_drift_and_keeps_write_offs(self):
+        invoice = self._invoice("100.00")
+        receivables_journal.write_off(self.customer, Decimal("10.00"), memo="Small balance")
+        # A bulk update that bypasses the signals leaves the journal behind.
+        GroupedInvoice.objects.filter(pk=invoice.pk).update(total_amount=Decimal("80.00"))
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_receivables_journal", "--check", stdout=StringIO())
+        call_command("rebuild_receivables_journal", stdout=StringIO())
+
+        self.assertEqual(receivables_journal.balance(self.customer.pk), Decimal("70.00"))
+        write_off = ReceivablesJournalEntry.objects.get(entry_type=ReceivablesJournalEntry.ENTRY_WRITE_OFF)
+        self.assertEqual((write_off.amount, write_off.memo), (Decimal("-10.00"), "Small balance"))
+        call_command("rebuild_receivables_journal", "--check", stdout=StringIO())
+
+
+class ReceivablesJournalConcurrencyTests(TransactionTestCase):
+    def test_parallel_syncs_post_an_invoice_once(self):
+        user = User.objects.create_user(username="journalthreads", password="p")
+        customer = Customer.objects.create(user=user, name="Harbour Freight")
+        invoice = GroupedInvoice.objects.create(user=user, customer=customer, date=timezone.localdate())
+        IncomeRecord2.objects.create(grouped_invoice=invoice, job="Labour", qty=Decimal("1"), rate=Decimal("75.00"))
+        invoice.refresh_from_db()
+        # Start from an invoice the journal has not seen yet.
+        ReceivablesJournalEntry.objects.all().delete()
+        thread_count = 4
+        barrier = threading.Barrier(thread_count)
+        errors = []
+
+        def worker():
+            try:
+                barrier.wait()
+                for attempt in range(200):
+                    try:
+                        receivables_journal.sync_invoices([invoice.pk])
+                        break
+                    except OperationalError:
+                        # SQLite reports lock contention instead of waiting.
+                        time.sleep(0.001 * random.randint(1, attempt + 1))
+                else:
+                    raise AssertionError("journal stayed locked")
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(thread_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(
+            list(ReceivablesJournalEntry.objects.values_list("entry_type", "amount", "balance")),
+            [("invoice", invoice.total_amount, invoice.total_amount)],
+        )
+
+
+class RecalculateTotalsCommandTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="totals", password="p")
+        self.other_user = User.objects.create_user(username="totals-other", password="p")
+        self.customer = Customer.objects.create(user=self.user, name="Cust")
+        self.invoice = self._invoice(self.user, "100.00")
+        self.other_invoice = self._invoice(self.other_user, "40.00")
+        GroupedInvoice.objects.filter(pk__in=[self.invoice.pk, self.other_invoice.pk]).update(
+            total_amount=Decimal("1.00"), amount_due=Decimal("1.00"), quickbooks_needs_sync=False
+        )
+
+    def _invoice(self, user, rate):
+        invoice = GroupedInvoice.objects.create(user=user, customer=self.customer if user == self.user else None)
+        IncomeRecord2.objects.create(grouped_invoice=invoice, job="Labour", qty=Decimal("1"), rate=Decimal(rate))
+        invoice.refresh_from_db()
+        return invoice
+
+    def test_dry_run_reports_without_writing(self):
+        out = StringIO()
+        call_command("recalculate_totals", "--dry-run", stdout=out)
+
+        self.assertIn(f"Invoice {self.invoice.invoice_number}: 1.00 -> {self.invoice.total_amount}", out.getvalue())
+        self.assertIn("2 invoice total(s) would change", out.getvalue())
+        self.assertEqual(GroupedInvoice.objects.get(pk=self.invoice.pk).total_amount, Decimal("1.00"))
+
+    def test_rebuild_updates_in_bulk_without_saving(self):
+        with mock.patch.object(GroupedInvoice, "save") as save, \
+                mock.patch.object(pagination, "invalidate_counts") as invalidate, \
+                CaptureQueriesContext(connection) as queries:
+            call_command("recalculate_totals", "--user", "totals", stdout=StringIO())
+
+        save.assert_not_called()
+        invalidate.assert_called_once_with("groupedinvoice", self.user.pk)
+        self.assertLess(len(queries), 20)
+        fixed = GroupedInvoice.objects.get(pk=self.invoice.pk)
+        self.assertEqual(fixed.total_amount, self.invoice.total_amount)
+        self.assertEqual(fixed.amount_due, self.invoice.total_amount)
+        self.assertTrue(fixed.quickbooks_needs_sync)
+        self.assertEqual(receivables_journal.balance(self.customer.pk), self.invoice.total_amount)
+        # Other tenants are left alone.
+        untouched = GroupedInvoice.objects.get(pk=self.other_invoice.pk)
+        self.assertEqual(untouched.total_amount, Decimal("1.00"))
+        self.assertFalse(untouched.quickbooks_needs_sync)
+
+
+@override_settings(PAYMENT_LINK_OUTBOX_THREAD_DISPATCH=False)
+class PaymentAllocationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="allocator", password="p")
+        self.customer = Customer.objects.create(user=self.user, name="Fleet Co")
+        self.today = timezone.localdate()
+
+    def _invoices(self, count, rate="50.00"):
+        invoices = []
+        with self.captureOnCommitCallbacks(execute=True):
+            for offset in range(count):
+                invoice = GroupedInvoice.objects.create(
+                    user=self.user,
+                    customer=self.customer,
+                    date=self.today - timedelta(days=count - offset),
+                )
+                IncomeRecord2.objects.create(grouped_invoice=invoice, job="Labour", qty=Decimal("1"), rate=Decimal(rate))
+                PendingInvoice.objects.create(grouped_invoice=invoice)
+                invoices.append(invoice)
+        for invoice in invoices:
+            invoice.refresh_from_db()
+        return invoices
+
+    def test_customer_payment_settles_many_invoices_in_one_batch(self):
+        invoices = self._invoices(30)
+        outstanding = sum((invoice.amount_due for invoice in invoices), Decimal("0.00"))
+        self.client.force_login(self.user)
+
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse("accounts:record_customer_payment", args=[self.customer.pk]),
+                {"amount": str(outstanding), "method": "Cheque"},
+                HTTP_X_REQUESTED_WITH="XMLHttpRequest",
+            )
+
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+        self.assertEqual(len(payload["allocations"]), 30)
+        self.assertEqual({row["status"] for row in payload["allocations"]}, {"paid"})
+        self.assertEqual(payload["outstanding_after"], 0.0)
+        # Query count does not grow with the number of invoices paid.
+        self.assertLess(len(queries), 50)
+
+        self.assertEqual(Payment.objects.filter(invoice__customer=self.customer, method="Cheque").count(), 30)
+        self.assertFalse(PendingInvoice.objects.filter(grouped_invoice__in=invoices).exists())
+        self.assertEqual(PaidInvoice.objects.filter(grouped_invoice__in=invoices).count(), 30)
+        self.assertFalse(IncomeRecord2.objects.filter(grouped_invoice__in=invoices, paid_invoice__isnull=True).exists())
+        self.assertFalse(
+            GroupedInvoice.objects.filter(pk__in=[invoice.pk for invoice in invoices], date_fully_paid__isnull=True).exists()
+        )
+        self.assertEqual(receivables_journal.balance(self.customer.pk), Decimal("0.00"))
+
+    def test_partial_payment_leaves_the_newest_invoice_open(self):
+        first, second, third = self._invoices(3, rate="100.00")
+        amount = first.amount_due + Decimal("40.00")
+
+        allocations = payment_allocation.record_payment(
+            payment_allocation.open_invoices(GroupedInvoice.objects.filter(customer=self.customer)),
+            amount,
+            notes="Cheque 1042",
+        )
+
+        self.assertEqual(
+            [(allocation.invoice.pk, allocation.amount, allocation.status) for allocation in allocations],
+            [(first.pk, first.amount_due, "paid"), (second.pk, Decimal("40.00"), "partial")],
+        )
+        self.assertEqual(allocations[1].balance_remaining, second.amount_due - Decimal("40.00"))
+        second.refresh_from_db()
+        self.assertEqual((second.amount_paid, second.payment_state), (Decimal("40.00"), GroupedInvoice.PAYMENT_STATE_PARTIAL))
+        self.assertIsNone(second.date_fully_paid)
+        self.assertTrue(PendingInvoice.objects.filter(grouped_invoice=second).exists())
+        self.assertFalse(Payment.objects.filter(invoice=third).exists())
+        self.assertEqual(Payment.objects.get(invoice=first).date, date.today())
+
+
+    def test_mark_paid_reports_the_amount_actually_applied(self):
+        invoice, = self._invoices(1, rate="100.00")
+        # The stored balance trails the live one, e.g. before a receivables repair.
+        GroupedInvoice.objects.filter(pk=invoice.pk).update(amount_due=Decimal("30.00"))
+        self.client.force_login(self.user)
+        url = reverse("accounts:mark_invoice_paid", args=[invoice.pk])
+
+        response = self.client.post(
+            url, {"grouped_invoice_id": invoice.pk, "amount": "50.00"}, HTTP_X_REQUESTED_WITH="XMLHttpRequest"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["applied"], 30.0)
+        self.assertIn("$30.00", response.json()["message"])
+        self.assertEqual(Payment.objects.get(invoice=invoice).amount, Decimal("30.00"))
+
+        GroupedInvoice.objects.filter(pk=invoice.pk).update(amount_due=Decimal("0.00"))
+        response = self.client.post(
+            url, {"grouped_invoice_id": invoice.pk, "amount": "10.00"}, HTTP_X_REQUESTED_WITH="XMLHttpRequest"
+        )
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["status"], "error")
+        self.assertEqual(Payment.objects.filter(invoice=invoice).count(), 1)
+
+
+class BackfillInvoiceTaxesCommandTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="taxes", password="p")
+        Profile.objects.update_or_create(user=self.user, defaults={"province": "ON"})
+        self.invoice = GroupedInvoice.objects.create(user=self.user, invoice_number="TAX-1")
+        self.labour = IncomeRecord2.objects.create(
+            grouped_invoice=self.invoice, job="Labour", qty=Decimal("3"), rate=Decimal("33.33")
+        )
+        self.interest = IncomeRecord2.objects.create(
+            grouped_invoice=self.invoice, job="Interest charge", qty=Decimal("1"), rate=Decimal("10.00")
+        )
+        IncomeRecord2.objects.filter(pk=self.labour.pk).update(tax_collected=Decimal("1.00"))
+        GroupedInvoice.objects.filter(pk=self.invoice.pk).update(total_amount=Decimal("1.00"))
+
+    def test_matches_the_per_line_calculation(self):
+        columns = line_taxes.LineColumns.load([self.labour.pk, self.interest.pk])
+        amounts, taxes = line_taxes.compute(columns)
+
+        self.assertEqual(list(amounts), [9999, 1000])
+        self.assertEqual(list(taxes), [int(calculate_tax_total(Decimal("99.99"), "ON") * 100), 0])
+
+    def test_backfill_rewrites_stale_lines_and_totals(self):
+        out = StringIO()
+        call_command("backfill_invoice_taxes", "--dry-run", "TAX-1", stdout=out)
+        self.assertIn("DRY RUN Invoice TAX-1", out.getvalue())
+        self.assertEqual(IncomeRecord2.objects.get(pk=self.labour.pk).tax_collected, Decimal("1.00"))
+
+        with mock.patch.object(IncomeRecord2, "save") as save:
+            call_command("backfill_invoice_taxes", "--all", "--user", "taxes", stdout=StringIO())
+
+        save.assert_not_called()
+        expected_tax = calculate_tax_total(Decimal("99.99"), "ON")
+        self.assertEqual(IncomeRecord2.objects.get(pk=self.labour.pk).tax_collected, expected_tax)
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.total_amount, Decimal("109.99") + expected_tax)
+
+    def test_rate_preview_does_not_write(self):
+        out = StringIO()
+        call_command("backfill_invoice_taxes", "TAX-1", "--rate", "ON=0.15", stdout=out)
+
+        self.assertIn("ON: tax 1.00->15.00", out.getvalue())
+        self.assertIn("PREVIEW", out.getvalue())
+        self.assertEqual(IncomeRecord2.objects.get(pk=self.labour.pk).tax_collected, Decimal("1.00"))
+
+
+@override_settings(PAYMENT_LINK_OUTBOX_THREAD_DISPATCH=False, INVOICE_CONVERSION_THREAD_DISPATCH=False)
+class InvoiceConversionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="convert", password="p")
+        self.customer = Customer.objects.create(user=self.user, name="Fleet Co")
+        self.product = Product.objects.create(
+            user=self.user,
+            sku="FLT-1",
+            name="Filter",
+            cost_price=Decimal("5.00"),
+            sale_price=Decimal("10.00"),
+            quantity_in_stock=50,
+        )
+
+    def _completed_work_order(self, lines=2):
+        work_order = WorkOrder.objects.create(
+            user=self.user,
+            customer=self.customer,
+            status="pending",
+            scheduled_date=timezone.now().date(),
+        )
+        for _ in range(lines):
+            WorkOrderRecord.objects.create(
+                work_order=work_order, product=self.product, qty=Decimal("2"), rate=Decimal("10.00")
+            )
+        # Completed without going through save(), which would invoice it right away.
+        WorkOrder.objects.filter(pk=work_order.pk).update(status="completed")
+        return work_order
+
+    def test_estimate_lines_are_written_in_one_batch(self):
+        estimate = GroupedEstimate.objects.create(user=self.user, customer=self.customer, date=timezone.now().date())
+        for job in ("Labour", "Parts"):
+            EstimateRecord.objects.create(grouped_estimate=estimate, product=self.product, job=job, qty=3, rate=10)
+
+        with mock.patch.object(IncomeRecord2, "save") as save:
+            invoice = estimate.convert_to_invoice()
+
+        save.assert_not_called()
+        self.assertEqual(invoice.income_records.count(), 2)
+        self.assertEqual(invoice.total_amount, sum(line.amount + line.tax_collected for line in invoice.income_records.all()))
+        # Both lines use the same product, so stock is posted once.
+        posting = InventoryTransaction.objects.get(product=self.product)
+        self.assertEqual((posting.transaction_type, posting.quantity), ("OUT", 6))
+
+    def test_bulk_action_invoices_work_orders_in_one_job(self):
+        work_orders = [self._completed_work_order() for _ in range(3)]
+        open_order = WorkOrder.objects.create(
+            user=self.user, customer=self.customer, status="pending", scheduled_date=timezone.now().date()
+        )
+        Profile.objects.update_or_create(user=self.user, defaults={"activation_link_clicked": True})
+        self.client.force_login(self.user)
+
+        response = self.client.post(
+            reverse("accounts:workorder_bulk_invoice"),
+            {"workorder_ids": [order.pk for order in work_orders] + [open_order.pk]},
+        )
+
+        self.assertRedirects(response, reverse("accounts:workorder_list"), fetch_redirect_response=False)
+        job = InvoiceConversionJob.objects.get(user=self.user)
+        self.assertEqual(job.work_order_ids, sorted(order.pk for order in work_orders))
+
+        # A work order invoiced in the meantime is reported, not invoiced twice.
+        WorkOrder.objects.filter(pk=work_orders[0].pk).update(invoice=GroupedInvoice.objects.create(user=self.user))
+        job = invoice_conversion.process_job(job.pk)
+
+        self.assertEqual(job.status, InvoiceConversionJob.STATUS_DONE)
+        self.assertEqual(list(job.errors), [str(work_orders[0].pk)])
+        self.assertEqual(len(job.invoice_ids), 2)
+        for order in work_orders[1:]:
+            order.refresh_from_db()
+            self.assertIn(order.invoice_id, job.invoice_ids)
+            self.assertEqual(order.invoice.income_records.count(), 2)
+            self.assertTrue(PendingInvoice.objects.filter(grouped_invoice=order.invoice).exists())
+        self.assertIsNone(invoice_conversion.process_job(job.pk))
+
+
+    def test_abandoned_jobs_are_reclaimed_after_the_timeout(self):
+        work_order = self._completed_work_order(lines=1)
+        job = InvoiceConversionJob.objects.create(
+            user=self.user,
+            work_order_ids=[work_order.pk],
+            status=InvoiceConversionJob.STATUS_PROCESSING,
+            started_at=timezone.now(),
+        )
+        self.assertEqual(invoice_conversion.process_pending(), 0)
+
+        InvoiceConversionJob.objects.filter(pk=job.pk).update(started_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(invoice_conversion.process_pending(), 1)
+
+        job.refresh_from_db()
+        work_order.refresh_from_db()
+        self.assertEqual(job.status, InvoiceConversionJob.STATUS_DONE)
+        self.assertEqual(job.invoice_ids, [work_order.invoice_id])
+
+
+class ExplainHotQueriesCommandTests(TestCase):
+    def test_hot_queries_use_indexes_on_seeded_data(self):
+        out = StringIO()
+        call_command("explain_hot_queries", "--invoices", "200", stdout=out)
+        self.assertIn("No sequential scans", out.getvalue())
+
+    def test_unindexed_query_is_flagged(self):
+        from accounts.management.commands import explain_hot_queries
+
+        unindexed = ("lists", "invoices by notes", lambda c: GroupedInvoice.objects.filter(notes="rush"))
+        with mock.patch.object(explain_hot_queries, "HOT_QUERIES", (unindexed,)):
+            with self.assertRaisesMessage(CommandError, "invoices by notes"):
+                call_command("explain_hot_queries", "--invoices", "20", stdout=StringIO())
+
+
+class StockLedgerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="ledger", password="p")
+        self.products = [
+            Product.objects.create(
+                user=self.user, sku=f"LED-{index}", name=f"Part {index}",
+                cost_price=Decimal("5.00"), sale_price=Decimal("10.00"),
+            )
+            for index in range(20)
+        ]
+        for product in self.products:
+            InventoryTransaction.objects.create(product=product, transaction_type="ADJUSTMENT", quantity=5)
+
+    def _stock(self, product):
+        return ProductStock.objects.get(product=product, user=self.user).quantity_in_stock
+
+    def test_batch_posting_moves_all_products_in_a_few_queries(self):
+        rows = [
+            InventoryTransaction(product=product, transaction_type="OUT", quantity=3 + index % 5, user=self.user)
+            for index, product in enumerate(self.products)
+        ]
+        with CaptureQueriesContext(connection) as captured:
+            stock_ledger.post(rows)
+
+        self.assertLess(len(captured), 15)
+        for index, product in enumerate(self.products):
+            product.refresh_from_db()
+            # Sales beyond the 5 on hand are topped up first, so stock bottoms out at zero.
+            self.assertEqual(self._stock(product), max(5 - (3 + index % 5), 0))
+            self.assertEqual(product.quantity_in_stock, self._stock(product))
+        restocks = InventoryTransaction.objects.filter(remarks=stock_ledger.AUTO_RESTOCK_REMARKS)
+        self.assertEqual(sorted(restocks.values_list("quantity", flat=True)), [1, 1, 1, 1, 2, 2, 2, 2])
+
+    def test_invoice_posting_logs_staff_activity(self):
+        Profile.objects.update_or_create(
+            user=self.user, defaults={"is_business_admin": True, "admin_approved": True}
+        )
+        self.user.refresh_from_db()
+        set_current_actor(self.user)
+        self.addCleanup(clear_current_actor)
+        customer = Customer.objects.create(user=self.user, name="Ledger customer")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            invoice = GroupedInvoice.objects.create(user=self.user, customer=customer)
+            IncomeRecord2.objects.create(
+                grouped_invoice=invoice, product=self.products[0], qty=Decimal("7"), rate=Decimal("10.00"),
+            )
+
+        logged = ActivityLog.objects.filter(
+            business=self.user, actor=self.user, action="inventory_transaction_created"
+        )
+        self.assertEqual(
+            sorted((entry["transaction_type"], entry["quantity"]) for entry in logged.values_list("metadata", flat=True)),
+            [("IN", 2), ("OUT", 7)],
+        )
+        out = InventoryTransaction.objects.get(product=self.products[0], transaction_type="OUT")
+        self.assertTrue(logged.filter(object_id=str(out.pk)).exists())
+
+    def test_reconcile_stock_rebuilds_levels_from_the_log(self):
+        drifted = self.products[0]
+        ProductStock.objects.filter(product=drifted).update(quantity_in_stock=42)
+        Product.objects.filter(pk=drifted.pk).update(quantity_in_stock=42)
+
+        with self.assertRaisesMessage(CommandError, "1 stock level(s)"):
+            call_command("reconcile_stock", "--check", stdout=StringIO())
+        call_command("reconcile_stock", stdout=StringIO())
+
+        drifted.refresh_from_db()
+        self.assertEqual((self._stock(drifted), drifted.quantity_in_stock), (5, 5))
+        call_command("reconcile_stock", "--check", stdout=StringIO())
+
+
+class StockLedgerConcurrencyTests(TransactionTestCase):
+    def test_parallel_sales_never_lose_updates(self):
+        user = User.objects.create_user(username="ledgerthreads", password="p")
+        product = Product.objects.create(
+            user=user, sku="HOT-1", name="Hot seller", cost_price=Decimal("5.00"), sale_price=Decimal("10.00"),
+        )
+        InventoryTransaction.objects.create(product=product, transaction_type="ADJUSTMENT", quantity=1000, user=user)
+        thread_count, per_thread = 4, 15
+        errors = []
+
+        def worker():
+            try:
+                for _ in range(per_thread):
+                    for attempt in range(200):
+                        try:
+                            InventoryTransaction.objects.create(
+                                product_id=product.pk, transaction_type="OUT", quantity=1, user_id=user.pk
+                            )
+                            break
+                        except OperationalError:
+                            # SQLite reports lock contention instead of waiting.
+                            time.sleep(0.001 * random.randint(1, attempt + 1))
+                    else:
+                        raise AssertionError("stock stayed locked")
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(thread_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        product.refresh_from_db()
+        expected = 1000 - thread_count * per_thread
+        self.assertEqual(ProductStock.objects.get(product=product, user=user).quantity_in_stock, expected)
+        self.assertEqual(product.quantity_in_stock, expected)
+        self.assertEqual(
+            InventoryTransaction.objects.filter(product=product, transaction_type="OUT").count(),
+            thread_count * per_thread,
+        )
+
+
+class ProductDailyMovementTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="movements", password="p")
+        self.products = [
+            Product.objects.create(
+                user=self.user, sku=f"MOV-{index}", name=f"Part {index}",
+                cost_price=Decimal("5.00"), sale_price=Decimal("10.00"),
+            )
+            for index in range(3)
+        ]
+
+    def _rollup(self):
+        return sorted(
+            ProductDailyMovement.objects.values_list("product_id", "user_id", "date", "qty_in", "qty_out", "last_out_at")
+        )
+
+    def test_postings_keep_rollup_in_step_with_backfill(self):
+        first, second, _ = self.products
+        InventoryTransaction.objects.create(product=first, transaction_type="IN", quantity=10, user=self.user)
+        sale = InventoryTransaction.objects.create(product=first, transaction_type="OUT", quantity=4, user=self.user)
+        # Sells more than is on hand, so an auto restock is posted as well.
+        InventoryTransaction.objects.create(product=second, transaction_type="OUT", quantity=3, user=self.user)
+        earlier = InventoryTransaction.objects.create(
+            product=second, transaction_type="IN", quantity=7, user=self.user,
+            transaction_date=timezone.now() - timedelta(days=3),
+        )
+        sale.quantity = 6
+        sale.save()
+        earlier.delete()
+
+        self.assertEqual(ProductDailyMovement.objects.get(product=first).qty_out, 6)
+        incremental = self._rollup()
+        call_command("backfill_product_movements", stdout=StringIO())
+        self.assertEqual(self._rollup(), incremental)
+
+    def test_deferred_loads_read_the_stored_movement_back(self):
+        product = self.products[0]
+        InventoryTransaction.objects.create(product=product, transaction_type="IN", quantity=10, user=self.user)
+        sale = InventoryTransaction.objects.create(product=product, transaction_type="OUT", quantity=4, user=self.user)
+
+        with self.assertNumQueries(1):
+            deferred = InventoryTransaction.objects.only("pk").get(pk=sale.pk)
+        self.assertIsNone(deferred._original_movement)
+        deferred.quantity = 5
+        deferred.save()
+        self.assertEqual(ProductDailyMovement.objects.get(product=product).qty_out, 5)
+
+        InventoryTransaction.objects.only("pk").get(pk=sale.pk).delete()
+        self.assertEqual(ProductDailyMovement.objects.get(product=product).qty_out, 0)
+
+    def test_analytics_read_sales_from_the_rollup(self):
+        for index, product in enumerate(self.products):
+            InventoryTransaction.objects.create(product=product, transaction_type="IN", quantity=20, user=self.user)
+            InventoryTransaction.objects.create(product=product, transaction_type="OUT", quantity=index + 1, user=self.user)
+        stale = Product.objects.create(
+            user=self.user, sku="MOV-OLD", name="Old part", cost_price=Decimal("5.00"), sale_price=Decimal("10.00"),
+        )
+        InventoryTransaction.objects.create(
+            product=stale, transaction_type="OUT", quantity=1, user=self.user,
+            transaction_date=timezone.now() - timedelta(days=400),
+        )
+
+        top = list(Product.top_sellers(self.user, days=30, limit=2))
+        self.assertEqual([(p.pk, p.qty_sold) for p in top], [(self.products[2].pk, 3), (self.products[1].pk, 2)])
+        self.assertEqual(list(Product.get_unsold_products(self.user, days=180)), [stale])
+
+        Profile.objects.update_or_create(user=self.user, defaults={"activation_link_clicked": True})
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse("accounts:inventory_analytics"))
+        self.assertEqual(response.status_code, 200)
+        sold = {entry["product"].pk: entry["qty_sold"] for entry in response.context["turnover_data"]}
+        self.assertEqual(sold[self.products[2].pk], 3)
+        self.assertEqual(sold[stale.pk], 0)
+        self.assertFalse(any("accounts_inventorytransaction" in query["sql"] for query in captured.captured_queries))
+
+
+class SupplierScorecardTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="scorecards", password="p")
+        self.supplier = Supplier.objects.create(user=self.user, name="Keystone Parts")
+        self.product = Product.objects.create(
+            user=self.user, sku="SC-1", name="Air filter", cost_price=Decimal("8.00"), sale_price=Decimal("15.00"),
+        )
+        self.today = timezone.localdate()
+        self.po = PurchaseOrder.objects.create(
+            user=self.user,
+            supplier=self.supplier,
+            status="ordered",
+            expected_delivery_date=self.today + timedelta(days=3),
+        )
+        self.item = PurchaseOrderItem.objects.create(purchase_order=self.po, product=self.product, quantity_ordered=20)
+
+    def _snapshot(self):
+        return SupplierScorecardSnapshot.objects.get(user=self.user, supplier=self.supplier, snapshot_date=self.today)
+
+    def test_receipts_and_rmas_rescore_todays_snapshot(self):
+        result = supplier_scorecards.snapshot_all()
+        self.assertEqual((result["businesses"], result["rows"]), (1, 1))
+        self.assertEqual(self._snapshot().fill_rate, Decimal("0.00"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.receive_stock(15, actor=self.user)
+            self.po.status = "partially_received"
+            self.po.save(update_fields=["status", "updated_at"])
+        snapshot = self._snapshot()
+        self.assertEqual(snapshot.fill_rate, Decimal("75.00"))
+        self.assertEqual(snapshot.on_time_rate, Decimal("100.00"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductRMA.objects.create(user=self.user, supplier=self.supplier, product=self.product, quantity=2)
+        snapshot = self._snapshot()
+        self.assertEqual(snapshot.rma_rate, Decimal("10.00"))
+        self.assertEqual(snapshot.weighted_score, Decimal("86.00"))
+
+    def test_operations_page_reads_snapshots_with_trend(self):
+        SupplierScorecardSnapshot.objects.create(
+            user=self.user,
+            supplier=self.supplier,
+            snapshot_date=self.today - timedelta(days=7),
+            weighted_score=Decimal("50.00"),
+        )
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse("accounts:inventory_operations"))
+        self.assertEqual(response.status_code, 200)
+        [row] = response.context["scorecards"]
+        self.assertEqual(row.snapshot_date, self.today)
+        self.assertEqual(row.previous_score, Decimal("50.00"))
+        self.assertEqual(row.score_change, row.weighted_score - Decimal("50.00"))
+
+        with mock.patch.object(supplier_scorecards, "compute", wraps=supplier_scorecards.compute) as compute:
+            self.client.get(reverse("accounts:inventory_operations"))
+        compute.assert_not_called()
+
+
+@override_settings(PRODUCT_IMPORT_THREAD_DISPATCH=False)
+class ProductImportTests(TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        media = override_settings(MEDIA_ROOT=tmpdir.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.user = User.objects.create_user(username="importer", password="p")
+        Profile.objects.update_or_create(user=self.user, defaults={"activation_link_clicked": True})
+        self.client.force_login(self.user)
+        self.category = Category.objects.create(user=self.user, name="Filters")
+        self.existing = Product.objects.create(
+            user=self.user, sku="EX-1", name="Oil filter", cost_price=Decimal("4.00"), sale_price=Decimal("9.00"),
+        )
+
+    def _upload(self, rows, headers=None):
+        workbook = Workbook()
+        worksheet = workbook.active
+        worksheet.append(["Instructions: fill in one product per row."])
+        worksheet.append(headers or product_import.PRODUCT_TEMPLATE_HEADERS)
+        for values in rows:
+            row = dict.fromkeys(product_import.PRODUCT_TEMPLATE_HEADERS, None)
+            row.update(values)
+            worksheet.append([row[header] for header in product_import.PRODUCT_TEMPLATE_HEADERS])
+        output = BytesIO()
+        workbook.save(output)
+        upload = SimpleUploadedFile("catalog.xlsx", output.getvalue())
+        return self.client.post(reverse("accounts:inventory_products_import"), {"file": upload})
+
+    def test_import_job_upserts_products_in_bulk(self):
+        response = self._upload([
+            {"SKU": "ex-1", "Name": "Oil filter", "Category": "filters", "Cost Price": 5, "Sale Price": 11, "Quantity": 7},
+            {
+                "SKU": "NEW-1",
+                "Name": "Brake pad",
+                "Alternate SKUs": "ALT-1, ALT-2",
+                "Supplier": "Keystone",
+                "Brand": "Bendix",
+                "Model": "Cascadia",
+                "VIN": "1FUJGLDR12LM12345",
+                "Cost Price": 20,
+                "Margin": 15,
+                "Quantity": 4,
+                "Reorder Level": 2,
+            },
+            {"SKU": "BAD-1", "Cost Price": 1, "Sale Price": 2},
+            {"SKU": "BAD-2", "Name": "Wiper", "Cost Price": 1, "Sale Price": 2, "Quantity": "lots"},
+        ])
+        self.assertRedirects(response, reverse("accounts:inventory_products"), fetch_redirect_response=False)
+        job = ProductImportJob.objects.get(user=self.user)
+        self.assertEqual(job.status, ProductImportJob.STATUS_PENDING)
+
+        with mock.patch.object(Product, "save") as save:
+            self.assertEqual(product_import.process_pending(), 1)
+        save.assert_not_called()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ProductImportJob.STATUS_DONE)
+        self.assertEqual(
+            (job.processed_rows, job.created_count, job.updated_count, job.error_count), (4, 1, 1, 2)
+        )
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.sku, self.existing.sale_price), ("ex-1", Decimal("11.00")))
+        self.assertEqual(self.existing.category, self.category)
+        self.assertEqual(Category.objects.filter(user=self.user).count(), 1)
+
+        created = Product.objects.get(user=self.user, sku="NEW-1")
+        self.assertEqual(created.sale_price, Decimal("35.00"))
+        self.assertEqual(
+            (created.supplier.name, created.brand.name, created.vehicle_model.name, created.vehicle_model.brand),
+            ("Keystone", "Bendix", "Cascadia", created.brand),
+        )
+        stock = ProductStock.objects.get(product=created, user=self.user)
+        self.assertEqual((stock.quantity_in_stock, stock.reorder_level), (4, 2))
+        self.assertEqual(ProductStock.objects.get(product=self.existing).quantity_in_stock, 7)
+        self.assertEqual(
+            sorted(ProductAlternateSku.objects.filter(product=created).values_list("sku", flat=True)),
+            ["ALT-1", "ALT-2"],
+        )
+
+        with job.error_report.open("rb") as report:
+            lines = report.read().decode("utf-8").splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[1].startswith("5,Name is required."))
+        self.assertTrue(lines[2].startswith("6,Quantity must be an integer."))
+
+    def test_abandoned_jobs_are_reclaimed_after_the_timeout(self):
+        self._upload([{"SKU": "NEW-9", "Name": "Air filter", "Cost Price": 3, "Sale Price": 6}])
+        job = ProductImportJob.objects.get(user=self.user)
+        ProductImportJob.objects.filter(pk=job.pk).update(
+            status=ProductImportJob.STATUS_PROCESSING, claimed_at=timezone.now(), processed_rows=1
+        )
+        self.assertEqual(product_import.process_pending(), 0)
+
+        ProductImportJob.objects.filter(pk=job.pk).update(claimed_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(product_import.process_pending(), 1)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed_rows, job.created_count), (ProductImportJob.STATUS_DONE, 1, 1))
+        self.assertTrue(Product.objects.filter(user=self.user, sku="NEW-9").exists())
+
+    def test_created_pks_are_looked_up_when_the_backend_cannot_return_them(self):
+        self._upload([
+            {"SKU": "NEW-1", "Name": "Brake pad", "Alternate SKUs": "ALT-1", "Cost Price": 2, "Sale Price": 4, "Quantity": 3},
+            {"SKU": "NEW-2", "Name": "Wiper", "Alternate SKUs": "ALT-2", "Cost Price": 1, "Sale Price": 2, "Quantity": 8},
+        ])
+        with mock.patch.object(connection.features, "can_return_rows_from_bulk_insert", False):
+            self.assertEqual(product_import.process_pending(), 1)
+
+        for sku, alternate, quantity in (("NEW-1", "ALT-1", 3), ("NEW-2", "ALT-2", 8)):
+            product = Product.objects.get(user=self.user, sku=sku)
+            self.assertEqual(ProductStock.objects.get(product=product).quantity_in_stock, quantity)
+            self.assertEqual(list(ProductAlternateSku.objects.filter(product=product).values_list("sku", flat=True)), [alternate])
+
+    def test_status_endpoint_and_error_report(self):
+        response = self._upload([], headers=["SKU", "Name"])
+        self.assertFalse(ProductImportJob.objects.exists())
+        self.assertIn(
+            "missing required columns",
+            str(list(get_messages(response.wsgi_request))[0]),
+        )
+
+        self._upload([{"SKU": "ZZ-1", "Cost Price": 1, "Sale Price": 2}])
+        job = ProductImportJob.objects.get(user=self.user)
+        status_url = reverse("accounts:inventory_products_import_status", args=[job.pk])
+        self.assertEqual(self.client.get(status_url).json()["status"], "pending")
+
+        product_import.process_job(job.pk)
+        data = self.client.get(status_url).json()
+        self.assertEqual((data["finished"], data["progress"], data["errors"]), (True, 100, 1))
+        report = self.client.get(data["error_report_url"])
+        self.assertIn(b"Name is required.", b"".join(report.streaming_content))
+        page = self.client.get(reverse("accounts:inventory_products"))
+        self.assertContains(page, "1 row rejected")
+        self.assertContains(page, data["error_report_url"])
+
+        other = User.objects.create_user(username="other-importer", password="p")
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(status_url).status_code, 404)
+
+
+class TemplateExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="exporter", password="p")
+        Profile.objects.update_or_create(user=self.user, defaults={"activation_link_clicked": True})
+        self.client.force_login(self.user)
+        category = Category.objects.create(user=self.user, name="Filters")
+        supplier = Supplier.objects.create(user=self.user, name="Keystone")
+        for index in range(3):
+            product = Product.objects.create(
+                user=self.user,
+                sku=f"EX-{index}",
+                name=f"Filter {index}",
+                description="Spin-on\nHeavy duty" if index == 1 else "",
+                category=category,
+                supplier=supplier,
+                cost_price=Decimal("4.00"),
+                sale_price=Decimal("9.00"),
+                location="Aisle 2",
+            )
+        ProductAlternateSku.objects.create(product=product, sku="ALT-2B", kind="interchange")
+        ProductAlternateSku.objects.create(product=product, sku="ALT-2A", kind="interchange")
+
+    def _download(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("products_template.xlsx", response["Content-Disposition"])
+        return load_workbook(BytesIO(b"".join(response.streaming_content)))
+
+    def test_products_template_streams_rows_and_keeps_dropdowns(self):
+        url = reverse("accounts:inventory_products_template")
+        with CaptureQueriesContext(connection) as queries:
+            workbook = self._download(url)
+        self.assertLess(len(queries), 15)
+
+        worksheet = workbook["Products"]
+        rows = list(worksheet.iter_rows(values_only=True))
+        self.assertTrue(rows[0][0].startswith("Instructions:"))
+        self.assertEqual(list(rows[1]), product_import.PRODUCT_TEMPLATE_HEADERS)
+        self.assertEqual([row[0] for row in rows[2:]], ["EX-0", "EX-1", "EX-2"])
+        headers = product_import.PRODUCT_TEMPLATE_HEADERS
+        last = dict(zip(headers, rows[4]))
+        self.assertEqual(
+            (last["Alternate SKUs"], last["Category"], last["Supplier"], last["Margin"], last["Featured"]),
+            ("ALT-2A, ALT-2B", "Filters", "Keystone", "5.00", "No"),
+        )
+        self.assertEqual(worksheet.freeze_panes, "A3")
+        self.assertEqual(worksheet.row_dimensions[4].height, 44)
+        self.assertEqual(worksheet.column_dimensions["F"].width, 48)
+
+        options = workbook["Options"]
+        self.assertEqual(options.sheet_state, "hidden")
+        self.assertEqual(options["A1"].value, "Categories")
+        self.assertEqual(options["A2"].value, "Filters")
+        validated = {str(validation.sqref) for validation in worksheet.data_validations.dataValidation}
+        for header in ("Category", "Supplier", "Location", "Show on Storefront", "Featured"):
+            letter = get_column_letter(headers.index(header) + 1)
+            self.assertIn(f"{letter}2:{letter}1048576", validated)
+
+    def test_benchmark_command_rolls_back_its_data(self):
+        out = StringIO()
+        call_command("benchmark_template_export", "--products", "30", "--compare", stdout=out)
+        self.assertIn("Streaming export:", out.getvalue())
+        self.assertIn("In-memory workbook:", out.getvalue())
+        self.assertFalse(User.objects.filter(username__startswith="export-benchmark-").exists())
+
+    def test_write_template_consumes_rows_once(self):
+        consumed = []
+
+        def rows():
+            for index in range(5):
+                consumed.append(index)
+                yield [f"Row {index}"]
+
+        output = BytesIO()
+        written = excel_export.write_template(
+            output,
+            title="Locations",
+            headers=["Name"],
+            rows=rows(),
+            dropdowns=[("Names", ["A", "B"], ["Name"])],
+        )
+        self.assertEqual((written, consumed), (5, [0, 1, 2, 3, 4]))
+        worksheet = load_workbook(output)["Locations"]
+        self.assertEqual(worksheet.max_row, 6)
+        self.assertEqual(worksheet["A2"].fill.fgColor.rgb, "00F3F6FC")
+        self.assertIsNone(worksheet["A3"].fill.fill_type)
+        self.assertEqual(worksheet["A1"].font.b, True)
+
+
+class PaymentLinkOutboxTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="payuser", password="p")
+        self.customer = Customer.objects.create(user=self.user, name="Cust")
+
+    def _invoice_with_line(self):
+        invoice = GroupedInvoice.objects.create(user=self.user, customer=self.customer)
+        IncomeRecord2.objects.create(grouped_invoice=invoice, job="Labour", qty=Decimal("2"), rate=Decimal("50.00"))
+        invoice.refresh_from_db()
+        return invoice
+
+    def test_saves_coalesce_into_one_pending_request(self):
+        invoice = self._invoice_with_line()
+        IncomeRecord2.objects.create(grouped_invoice=invoice, job="More", qty=Decimal("1"), rate=Decimal("10.00"))
+        invoice.refresh_from_db()
+
+        request = PaymentLinkRequest.objects.get(invoice=invoice)
+        self.assertEqual(request.status, PaymentLinkRequest.STATUS_PENDING)
+        self.assertEqual(request.total_amount, invoice.total_amount)
+        self.assertGreater(request.version, 1)
+        self.assertTrue(invoice.payment_link_pending)
+        self.assertIsNone(invoice.stripe_payment_link)
+
+    def test_worker_builds_link_with_fake_provider(self):
+        invoice = self._invoice_with_line()
+
+        succeeded, failed = payment_links.process_due(provider=payment_links.FakePaymentLinkProvider())
+
+        self.assertEqual((succeeded, failed), (1, 0))
+        invoice.refresh_from_db()
+        self.assertIn(f"/stripe/{invoice.pk}/", invoice.stripe_payment_link)
+        self.assertFalse(invoice.payment_link_pending)
+        self.assertEqual(PaymentLinkRequest.objects.get(invoice=invoice).status, PaymentLinkRequest.STATUS_DONE)
+
+    @override_settings(PAYMENT_LINK_MAX_ATTEMPTS=2)
+    def test_failures_back_off_then_give_up(self):
+        class BrokenProvider:
+            def create_link(self, invoice):
+                raise RuntimeError("provider down")
+
+        invoice = self._invoice_with_line()
+        self.assertEqual(payment_links.process_due(provider=BrokenProvider()), (0, 1))
+
+        request = PaymentLinkRequest.objects.get(invoice=invoice)
+        self.assertEqual(request.status, PaymentLinkRequest.STATUS_PENDING)
+        self.assertEqual(request.attempts, 1)
+        self.assertGreater(request.next_attempt_at, timezone.now())
+        self.assertEqual(payment_links.process_due(provider=BrokenProvider()), (0, 0))
+
+        PaymentLinkRequest.objects.filter(pk=request.pk).update(next_attempt_at=timezone.now())
+        payment_links.process_due(provider=BrokenProvider())
+        request.refresh_from_db()
+        self.assertEqual(request.status, PaymentLinkRequest.STATUS_FAILED)
+        self.assertEqual(request.last_error, "provider down")
+
+    def test_request_requeued_during_processing_stays_pending(self):
+        class RequeueingProvider(payment_links.FakePaymentLinkProvider):
+            def create_link(self, invoice):
+                super().create_link(invoice)
+                payment_links.enqueue(invoice)
+
+        invoice = self._invoice_with_line()
+        payment_links.process_due(provider=RequeueingProvider())
+
+        self.assertEqual(PaymentLinkRequest.objects.get(invoice=invoice).status, PaymentLinkRequest.STATUS_PENDING)
+
+    @override_settings(PAYMENT_LINK_OUTBOX_ENABLED=False)
+    def test_disabled_outbox_builds_links_inline(self):
+        invoice = self._invoice_with_line()
+
+        self.assertFalse(PaymentLinkRequest.objects.filter(invoice=invoice).exists())
+        self.assertFalse(invoice.payment_link_pending)
+
+
+class BackgroundQueueTests(TestCase):
+    def test_drains_every_item_past_a_failing_handler(self):
+        gate = threading.Event()
+        seen = []
+
+        def handler(item):
+            gate.wait(5)
+            seen.append(item)
+            if item == "bad":
+                raise RuntimeError("boom")
+
+        queue = commit_hooks.BackgroundQueue("test-queue", handler)
+        with self.assertLogs("accounts.commit_hooks", level="ERROR") as logs:
+            queue.add("a")
+            worker = queue._thread
+            queue.add("bad")
+            queue.add("b")
+            gate.set()
+            worker.join(5)
+
+        self.assertEqual(set(seen), {"a", "bad", "b"})
+        self.assertIn("test-queue", logs.output[0])
+        self.assertIsNone(queue._thread)
+
+
+class ReceivablesColumnsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="aruser", password="p")
+        self.customer = Customer.objects.create(user=self.user, name="Cust")
+        self.invoice = GroupedInvoice.objects.create(user=self.user, customer=self.customer)
+        IncomeRecord2.objects.create(grouped_invoice=self.invoice, job="Labour", qty=Decimal("1"), rate=Decimal("100.00"))
+        self.invoice.refresh_from_db()
+
+    def test_line_total_sets_amount_due(self):
+        self.assertEqual(self.invoice.amount_due, self.invoice.total_amount)
+        self.assertEqual(self.invoice.payment_state, GroupedInvoice.PAYMENT_STATE_UNPAID)
+
+    def test_payments_update_columns(self):
+        payment = Payment.objects.create(invoice=self.invoice, amount=Decimal("40.00"))
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.amount_paid, Decimal("40.00"))
+        self.assertEqual(self.invoice.amount_due, self.invoice.total_amount - Decimal("40.00"))
+        self.assertEqual(self.invoice.payment_status, "Partially Paid")
+
+        payment.amount = self.invoice.total_amount
+        payment.save()
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.amount_due, Decimal("0.00"))
+        self.assertEqual(self.invoice.payment_state, GroupedInvoice.PAYMENT_STATE_PAID)
+
+        payment.delete()
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.amount_paid, Decimal("0.00"))
+        self.assertEqual(self.invoice.payment_state, GroupedInvoice.PAYMENT_STATE_UNPAID)
+
+    def test_credit_items_update_amount_credited(self):
+        credit = CustomerCredit.objects.create(user=self.user, customer=self.customer, tax_included=True)
+        CustomerCreditItem.objects.create(customer_credit=credit, source_invoice=self.invoice, qty=1, price=25)
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.amount_credited, Decimal("25.00"))
+        self.assertEqual(self.invoice.amount_due, self.invoice.total_amount - Decimal("25.00"))
+
+    def test_moving_a_payment_refreshes_both_invoices(self):
+        other = GroupedInvoice.objects.create(user=self.user, customer=self.customer)
+        IncomeRecord2.objects.create(grouped_invoice=other, job="Parts", qty=Decimal("1"), rate=Decimal("80.00"))
+        payment = Payment.objects.get(pk=Payment.objects.create(invoice=self.invoice, amount=Decimal("30.00")).pk)
+
+        payment.invoice = other
+        with mock.patch.object(aging, "schedule_for_invoices") as age, \
+                mock.patch.object(receivables_journal, "schedule_invoices") as journal:
+            payment.save()
+
+        self.invoice.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.invoice.amount_paid, Decimal("0.00"))
+        self.assertEqual(other.amount_paid, Decimal("30.00"))
+        age.assert_called_once_with([other.pk, self.invoice.pk])
+        journal.assert_called_once_with(other.pk, self.invoice.pk)
+        self.assertEqual(payment._previous_invoice_id, other.pk)
+
+    def test_repair_command_detects_and_fixes_drift(self):
+        Payment.objects.create(invoice=self.invoice, amount=Decimal("10.00"))
+        GroupedInvoice.objects.filter(pk=self.invoice.pk).update(amount_paid=Decimal("0.00"))
+
+        self.assertEqual([row[0] for row in receivables.iter_drift()], [self.invoice.pk])
+        with self.assertRaises(CommandError):
+            call_command("repair_receivables", "--check", stdout=StringIO())
+
+        call_command("repair_receivables", stdout=StringIO())
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.amount_paid, Decimal("10.00"))
+        self.assertEqual(list(receivables.iter_drift()), [])
+
+
 class WorkOrderAssignmentSyncTests(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(username="assigner", password="p")
@@ -487,6 +2310,25 @@ class PortalDecoratorRedirectTests(TestCase):
         response = self.client.get(reverse("accounts:customer_dashboard"))
         self.assertEqual(response.status_code, 200)
 
+    def test_customer_invoice_search_matches_status_labels(self):
+        invoices = {}
+        for state, paid in (("unpaid", None), ("partial", "40.00"), ("paid", "100.00")):
+            invoice = GroupedInvoice.objects.create(user=self.owner, customer=self.customer)
+            IncomeRecord2.objects.create(grouped_invoice=invoice, job="Labour", qty=Decimal("1"), rate=Decimal("100.00"))
+            if paid:
+                invoice.refresh_from_db()
+                Payment.objects.create(invoice=invoice, amount=invoice.total_amount if state == "paid" else Decimal(paid))
+            invoices[state] = invoice.pk
+        self.client.force_login(self.customer_user)
+
+        def search(text):
+            response = self.client.get(reverse("accounts:customer_invoice_list"), {"search": text})
+            return {invoice.pk for invoice in response.context["invoices"]}
+
+        self.assertEqual(search("Partially"), {invoices["partial"]})
+        self.assertEqual(search("unpaid"), {invoices["unpaid"]})
+        self.assertEqual(search("Paid"), set(invoices.values()))
+
     def test_supplier_portal_redirects_authenticated_non_supplier(self):
         self.client.force_login(self.general_user)
         response = self.client.get(reverse("accounts:supplier_dashboard"))
@@ -504,6 +2346,15 @@ class PortalDecoratorRedirectTests(TestCase):
         response = self.client.get(reverse("accounts:supplier_dashboard"))
         self.assertEqual(response.status_code, 200)
 
+    def test_portal_isolation_blocks_business_routes_until_unlinked(self):
+        self.client.force_login(self.customer_user)
+        self.assertEqual(self.client.get(reverse("accounts:home")).status_code, 404)
+
+        self.customer.portal_user = None
+        self.customer.save()
+
+        self.assertNotEqual(self.client.get(reverse("accounts:home")).status_code, 404)
+
 
 class MaintenanceReminderCommandTests(TestCase):
     def setUp(self):
@@ -673,6 +2524,104 @@ class InventoryOperationsFeatureTests(TestCase):
         item = PurchaseOrderItem.objects.get(purchase_order=po, product=self.product)
         self.assertEqual(item.quantity_ordered, 10)
 
+    def _sell(self, product, quantity, *, days_ago=1):
+        InventoryTransaction.objects.create(
+            product=product,
+            transaction_type="OUT",
+            quantity=quantity,
+            user=self.owner,
+            transaction_date=timezone.now() - timedelta(days=days_ago),
+        )
+
+    def _stock(self, product, quantity, reorder_level, max_stock_level):
+        ProductStock.objects.update_or_create(
+            product=product,
+            user=self.owner,
+            defaults={
+                "quantity_in_stock": quantity,
+                "reorder_level": reorder_level,
+                "max_stock_level": max_stock_level,
+            },
+        )
+
+    def test_replenishment_plan_matches_rule_calculation(self):
+        rule_settings = [
+            {"lead_time_days": 5, "coverage_days": 20, "buffer_percent": Decimal("12.50")},
+            {"lead_time_days": 10, "coverage_days": 30, "min_order_qty": 24, "seasonality_factor": Decimal("1.35")},
+            {"lead_time_days": 3, "coverage_days": 14, "order_multiple": 6, "buffer_percent": Decimal("0.00")},
+            None,
+        ]
+        products = []
+        for index, settings_row in enumerate(rule_settings):
+            product = Product.objects.create(
+                user=self.owner,
+                name=f"Planned part {index}",
+                sku=f"PLN-{index}",
+                supplier=self.supplier,
+                cost_price=Decimal("4.00"),
+                sale_price=Decimal("9.00"),
+            )
+            self._sell(product, 7 * (index + 1), days_ago=index + 2)
+            self._sell(product, 50, days_ago=90)
+            self._stock(product, index, reorder_level=4, max_stock_level=index * 3)
+            if settings_row is not None:
+                ReplenishmentRule.objects.create(user=self.owner, product=product, **settings_row)
+            products.append(product)
+
+        stocked = apply_stock_fields(
+            list(annotate_products_with_stock(Product.objects.filter(pk__in=[p.pk for p in products]), self.owner))
+        )
+        with self.assertNumQueries(2):
+            planned = replenishment.plan(stocked, business_user=self.owner, transaction_user_ids=[self.owner.id])
+
+        rules = {rule.product_id: rule for rule in ReplenishmentRule.objects.filter(user=self.owner)}
+        for product, recommendation in planned:
+            sold = 7 * (products.index(product) + 1)
+            self.assertEqual(recommendation["sold_qty"], sold)
+            rule = rules.get(product.pk)
+            if rule is None:
+                self.assertEqual(recommendation["recommended_qty"], max(product.max_stock_level, 4) - product.quantity_in_stock)
+                continue
+            expected = rule.calculate_recommended_quantity(
+                current_stock=product.quantity_in_stock,
+                avg_daily_usage=Decimal(sold) / Decimal(60),
+                reorder_level=product.reorder_level,
+                max_stock_level=product.max_stock_level,
+            )
+            self.assertEqual(
+                {key: recommendation[key] for key in expected},
+                expected,
+            )
+
+    def test_create_auto_rule_purchase_orders(self):
+        manual = Product.objects.create(
+            user=self.owner,
+            name="Manual part",
+            sku="MAN-1",
+            supplier=self.supplier,
+            cost_price=Decimal("3.00"),
+            sale_price=Decimal("6.00"),
+        )
+        for product in (self.product, manual):
+            self._sell(product, 60)
+            self._stock(product, 40, reorder_level=5, max_stock_level=12)
+        ReplenishmentRule.objects.create(
+            user=self.owner, product=self.product, coverage_days=60, buffer_percent=Decimal("0.00"), auto_generate_po=True,
+        )
+        ReplenishmentRule.objects.create(user=self.owner, product=manual, coverage_days=60)
+
+        response = self.client.post(
+            reverse("accounts:inventory_operations"),
+            {"action": "create_auto_rule_pos"},
+        )
+        self.assertEqual(response.status_code, 302)
+        po = PurchaseOrder.objects.get(user=self.owner)
+        self.assertEqual(po.supplier, self.supplier)
+        item = PurchaseOrderItem.objects.get(purchase_order=po)
+        self.assertEqual(item.product, self.product)
+        # 1 unit/day over 7 lead + 60 coverage days, less 40 on hand.
+        self.assertEqual(item.quantity_ordered, 27)
+
     def test_viewer_role_cannot_create_purchase_order(self):
         member = User.objects.create_user(username="ops-viewer", password="pass1234")
         member_profile = member.profile
@@ -755,3 +2704,50 @@ class InventoryOperationsFeatureTests(TestCase):
         self.assertFalse(form.is_valid())
         self.assertIn("sale_price", form.errors)
         self.assertIn("minimum guardrail", form.errors["sale_price"][0].lower())
+
+
+class TenantScopeCacheTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="scopeowner", password="p")
+        self.staff = User.objects.create_user(username="scopestaff", password="p")
+        self.staff.profile.business_owner = self.owner
+        self.staff.profile.save()
+        tenant_scope.begin_request()
+        self.addCleanup(tenant_scope.end_request)
+
+    def test_repeated_lookups_are_memoized_within_request(self):
+        self.assertEqual(get_business_user(self.staff), self.owner)
+        self.assertCountEqual(get_business_user_ids(self.staff), [self.owner.id, self.staff.id])
+
+        with self.assertNumQueries(0):
+            for _ in range(5):
+                get_business_user(self.staff)
+                get_business_user_ids(self.staff)
+
+    def test_business_owner_change_invalidates_cache(self):
+        self.assertCountEqual(get_business_user_ids(self.owner), [self.owner.id, self.staff.id])
+
+        profile = Profile.objects.get(user=self.staff)
+        profile.business_owner = None
+        profile.save()
+
+        self.assertEqual(get_business_user_ids(self.owner), [self.owner.id])
+        staff = User.objects.get(pk=self.staff.pk)
+        self.assertEqual(get_business_user(staff), staff)
+
+
+class StorefrontNavCacheTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="navowner", password="p")
+        self.brake = Category.objects.create(user=self.owner, name="Brakes")
+
+    def test_nav_is_cached_and_invalidated_on_category_change(self):
+        categories, _ = get_storefront_nav(self.owner)
+        self.assertEqual([category.name for category in categories], ["Brakes"])
+
+        with self.assertNumQueries(0):
+            get_storefront_nav(self.owner)
+
+        Category.objects.create(user=self.owner, name="Axles")
+        categories, _ = get_storefront_nav(self.owner)
+        self.assertEqual([category.name for category in categories], ["Axles", "Brakes"])
@@ -66,6 +66,8 @@ from .views_inventory import (
     export_vins_template,
     export_locations_template,
     import_products_from_excel,
+    product_import_status,
+    product_import_error_report,
     import_suppliers_from_excel,
     import_categories_from_excel,
     import_category_groups_from_excel,
@@ -347,6 +349,7 @@ urlpatterns = [
     path('workorders/<int:pk>/', view_workorder.workorder_detail, name='workorder_detail'),
     path('workorders/<int:pk>/quick-update/', view_workorder.workorder_quick_update, name='workorder_quick_update'),
     path('workorders/<int:pk>/recreate-invoice/', view_workorder.workorder_recreate_invoice, name='workorder_recreate_invoice'),
+    path('workorders/bulk-invoice/', view_workorder.workorder_bulk_invoice, name='workorder_bulk_invoice'),
     path(
         'workorders/<int:pk>/assignments/<int:assignment_id>/reopen/',
         view_workorder.workorder_assignment_request_rework,
@@ -606,6 +609,8 @@ urlpatterns = [
     path('inventory/products/quick-create/', views.quick_create_inventory_product, name='quick_create_inventory_product'),
     path('inventory/products/template/', export_products_template, name='inventory_products_template'),
     path('inventory/products/import/', import_products_from_excel, name='inventory_products_import'),
+    path('inventory/products/import/<int:pk>/status/', product_import_status, name='inventory_products_import_status'),
+    path('inventory/products/import/<int:pk>/errors/', product_import_error_report, name='inventory_products_import_errors'),
     path('inventory/products/bulk-delete/', bulk_delete_products, name='inventory_products_bulk_delete'),
     path('inventory/products/bulk-update/', bulk_update_products, name='inventory_products_bulk_update'),
     path('inventory/products/update-margin/', update_inventory_margin, name='inventory_update_margin'),
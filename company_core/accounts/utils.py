@@ -22,17 +22,12 @@ from decimal import Decimal
 from django.db.models import (
     Sum,
     Value,
-    F,
     Q,
     OuterRef,
     Subquery,
-    Case,
-    When,
-    DecimalField,
-    ExpressionWrapper,
     IntegerField,
 )
-from django.db.models.functions import Coalesce, Cast
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from .models import (
     PendingInvoice,
@@ -41,9 +36,9 @@ from .models import (
     UserStripeAccount,
     Profile,
     ConnectedBusinessGroup,
-    CustomerCreditItem,
 )
-from .pdf_utils import apply_branding_defaults
+from .pdf_utils import apply_branding_defaults, render_html_to_pdf
+from . import tenant_scope
 
 
 def build_cc_list(*emails, exclude=None):
@@ -90,18 +85,30 @@ def get_primary_business_user():
         return None
 
     UserModel = get_user_model()
-    try:
-        return UserModel.objects.get(username__iexact=username)
-    except UserModel.DoesNotExist:
+
+    def _lookup_id():
+        return (
+            UserModel.objects.filter(username__iexact=username)
+            .values_list("id", flat=True)
+            .first()
+        )
+
+    user_id = tenant_scope.cached_lookup("primary_user", username.lower(), _lookup_id)
+    if not user_id:
         return None
+    return _get_user_by_id(user_id)
 
 
-def get_business_user(user):
-    """Return the business owner associated with the provided user."""
+def _get_user_by_id(user_id):
+    UserModel = get_user_model()
+    return tenant_scope.request_memoized(
+        "user",
+        user_id,
+        lambda: UserModel.objects.filter(pk=user_id).first(),
+    )
 
-    if not user:
-        return None
 
+def _resolve_business_user(user):
     profile = getattr(user, "profile", None)
     if profile and hasattr(profile, "get_business_user"):
         business_user = profile.get_business_user()
@@ -111,17 +118,42 @@ def get_business_user(user):
     return get_primary_business_user() or user
 
 
+def get_business_user(user):
+    """Return the business owner associated with the provided user."""
+
+    if not user:
+        return None
+
+    if not getattr(user, "pk", None):
+        return _resolve_business_user(user)
+
+    def _lookup_id():
+        business_user = _resolve_business_user(user)
+        return getattr(business_user, "pk", None)
+
+    business_user_id = tenant_scope.cached_lookup("business_user", user.pk, _lookup_id)
+    if not business_user_id:
+        return None
+    if business_user_id == user.pk:
+        return user
+    return _get_user_by_id(business_user_id) or _resolve_business_user(user)
+
+
 def _get_team_user_ids(business_user):
     if not business_user:
         return []
-    user_ids = list(
-        Profile.objects.filter(
-            Q(user=business_user) | Q(business_owner=business_user)
-        ).values_list("user_id", flat=True)
-    )
-    if business_user.id not in user_ids:
-        user_ids.append(business_user.id)
-    return user_ids
+
+    def _lookup():
+        user_ids = list(
+            Profile.objects.filter(
+                Q(user=business_user) | Q(business_owner=business_user)
+            ).values_list("user_id", flat=True)
+        )
+        if business_user.id not in user_ids:
+            user_ids.append(business_user.id)
+        return user_ids
+
+    return list(tenant_scope.cached_lookup("team_user_ids", business_user.pk, _lookup))
 
 
 def get_business_user_ids(user):
@@ -153,7 +185,21 @@ def get_connected_business_group(user):
     if not business_user:
         return None
 
-    return ConnectedBusinessGroup.objects.filter(members=business_user).first()
+    return tenant_scope.cached_lookup(
+        "connected_group",
+        business_user.pk,
+        lambda: ConnectedBusinessGroup.objects.filter(members=business_user).first(),
+    )
+
+
+def _get_group_member_ids(group):
+    return list(
+        tenant_scope.cached_lookup(
+            "group_member_ids",
+            group.pk,
+            lambda: list(group.members.values_list("id", flat=True)),
+        )
+    )
 
 
 def get_shared_user_ids(user, scope):
@@ -166,30 +212,35 @@ def get_shared_user_ids(user, scope):
     if not business_user:
         return []
 
-    base_ids = set(_get_team_user_ids(business_user))
-    group = get_connected_business_group(business_user)
-    if not group:
-        return list(base_ids)
-
-    if scope == SHARE_SCOPE_CUSTOMERS and not group.share_customers:
-        return list(base_ids)
-    if scope == SHARE_SCOPE_PRODUCTS and not group.share_products:
-        return list(base_ids)
-    if scope == SHARE_SCOPE_PRODUCT_STOCK:
-        if not group.share_products or not group.share_product_stock:
+    def _lookup():
+        base_ids = set(_get_team_user_ids(business_user))
+        group = get_connected_business_group(business_user)
+        if not group:
             return list(base_ids)
 
-    member_ids = list(group.members.values_list("id", flat=True))
-    if not member_ids:
-        return list(base_ids)
+        if scope == SHARE_SCOPE_CUSTOMERS and not group.share_customers:
+            return list(base_ids)
+        if scope == SHARE_SCOPE_PRODUCTS and not group.share_products:
+            return list(base_ids)
+        if scope == SHARE_SCOPE_PRODUCT_STOCK:
+            if not group.share_products or not group.share_product_stock:
+                return list(base_ids)
 
-    shared_profile_ids = Profile.objects.filter(
-        Q(user_id__in=member_ids) | Q(business_owner_id__in=member_ids)
-    ).values_list("user_id", flat=True)
-    shared_ids = set(shared_profile_ids)
-    shared_ids.update(member_ids)
-    shared_ids.update(base_ids)
-    return list(shared_ids)
+        member_ids = _get_group_member_ids(group)
+        if not member_ids:
+            return list(base_ids)
+
+        shared_profile_ids = Profile.objects.filter(
+            Q(user_id__in=member_ids) | Q(business_owner_id__in=member_ids)
+        ).values_list("user_id", flat=True)
+        shared_ids = set(shared_profile_ids)
+        shared_ids.update(member_ids)
+        shared_ids.update(base_ids)
+        return list(shared_ids)
+
+    return list(
+        tenant_scope.cached_lookup("shared_user_ids", (business_user.pk, scope), _lookup)
+    )
 
 
 def get_customer_user_ids(user):
@@ -211,23 +262,31 @@ def get_stock_owner(user):
         return None
 
     business_user = get_business_user(user) or user
-    group = get_connected_business_group(business_user)
 
-    profile_qs = Profile.objects.filter(
-        occupation="parts_store",
-        user__is_active=True,
-        storefront_is_visible=True,
-    )
-    if group:
-        member_ids = list(group.members.values_list("id", flat=True))
-        if member_ids:
-            profile_qs = profile_qs.filter(user_id__in=member_ids)
+    def _lookup_is_store_user():
+        group = get_connected_business_group(business_user)
+
+        profile_qs = Profile.objects.filter(
+            occupation="parts_store",
+            user__is_active=True,
+            storefront_is_visible=True,
+        )
+        if group:
+            member_ids = _get_group_member_ids(group)
+            if member_ids:
+                profile_qs = profile_qs.filter(user_id__in=member_ids)
+            else:
+                profile_qs = Profile.objects.none()
         else:
-            profile_qs = Profile.objects.none()
-    else:
-        profile_qs = profile_qs.filter(Q(user=business_user) | Q(business_owner=business_user))
-    profile_user_ids = set(profile_qs.values_list("user_id", flat=True))
-    if len(profile_user_ids) > 1 and user.id in profile_user_ids:
+            profile_qs = profile_qs.filter(Q(user=business_user) | Q(business_owner=business_user))
+        profile_user_ids = set(profile_qs.values_list("user_id", flat=True))
+        return len(profile_user_ids) > 1 and user.id in profile_user_ids
+
+    if tenant_scope.cached_lookup(
+        "stock_owner_is_user",
+        (user.pk, business_user.pk),
+        _lookup_is_store_user,
+    ):
         return user
 
     return business_user
@@ -456,42 +515,9 @@ def get_overdue_total_balance(user, term_days):
     treating term_days==0 as 'due on receipt' (i.e. <= today).
     """
     # 1) Base queryset: only unpaid invoices
-    amount_field = DecimalField(max_digits=10, decimal_places=2)
-    credit_amount_expr = Case(
-        When(customer_credit__tax_included=True, then=Cast('amount', amount_field)),
-        default=ExpressionWrapper(
-            Cast('amount', amount_field) + Cast('tax_paid', amount_field),
-            output_field=amount_field,
-        ),
-        output_field=amount_field,
-    )
-    credit_total = CustomerCreditItem.objects.filter(
-        source_invoice=OuterRef('grouped_invoice_id')
-    ).values('source_invoice').annotate(
-        total=Coalesce(
-            Sum(credit_amount_expr),
-            Value(Decimal('0.00')),
-            output_field=amount_field,
-        )
-    ).values('total')
-
     qs = PendingInvoice.objects.filter(
         is_paid=False,
         grouped_invoice__user=user
-    ).annotate(
-        total_paid=Coalesce(
-            Sum('grouped_invoice__payments__amount'),
-            Value(Decimal('0.00'))
-        ),
-        credit_total=Coalesce(
-            Subquery(credit_total, output_field=amount_field),
-            Value(Decimal('0.00')),
-            output_field=amount_field,
-        ),
-        balance_due=ExpressionWrapper(
-            F('grouped_invoice__total_amount') - F('total_paid') - F('credit_total'),
-            output_field=amount_field,
-        )
     )
 
     today = timezone.now().date()
@@ -505,15 +531,13 @@ def get_overdue_total_balance(user, term_days):
     overdue_qs = qs.filter(
         **{f'grouped_invoice__date__{lookup}': threshold}
     )
-    return overdue_qs.aggregate(total=Sum('balance_due'))['total'] or Decimal('0.00')
+    return overdue_qs.aggregate(total=Sum('grouped_invoice__amount_due'))['total'] or Decimal('0.00')
 
 def generate_invoice_pdf(context):
     if not WEASYPRINT_AVAILABLE:
         raise ImportError("WeasyPrint is not available. PDF generation is disabled.")
     html_string = render_to_string('invoices/invoice.html', context)
-    html = HTML(string=html_string)
-    pdf = html.write_pdf()
-    return pdf
+    return render_html_to_pdf(html_string)
 
 def send_invoice_email(invoice, pdf_data, context):
     """Send invoice emails to the customer and the seller.
@@ -692,6 +716,16 @@ def get_storefront_owner(request=None, *, fallback_owner=None):
 
     root_user = resolve_storefront_root_user(request, fallback_owner=fallback_owner)
     profiles = list(get_storefront_profiles(root_user)) if root_user else []
+    return select_storefront_owner(
+        request,
+        root_user,
+        profiles,
+        fallback_owner=fallback_owner,
+    )
+
+
+def select_storefront_owner(request, root_user, profiles, *, fallback_owner=None):
+    """Pick the storefront owner from already-resolved location profiles."""
 
     if not profiles:
         return root_user or fallback_owner or get_default_store_owner()
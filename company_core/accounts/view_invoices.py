@@ -27,9 +27,9 @@ from .invoice_activity import (
 from .ai_service import generate_dynamic_invoice_note
 from .utils import resolve_company_logo_url, build_cc_list
 from .view_workorder import generate_pm_inspection_pdf
-from .pdf_utils import render_template_to_pdf_cached, render_template_to_pdf, apply_branding_defaults
+from .pdf_utils import render_template_to_pdf_cached, render_template_to_pdf, apply_branding_defaults, pdf_stylesheet
 
-PDF_STYLESHEET = CSS(string='@page { size: A4; margin: 1cm; }') if WEASYPRINT_AVAILABLE else None
+PDF_STYLESHEET = pdf_stylesheet('@page { size: A4; margin: 1cm; }')
 logger = logging.getLogger(__name__)
 
 
@@ -214,21 +214,16 @@ def _render_pdf(template, context):
             for_pdf=True,
         )
 
-    pdf_object = context.get('invoice') or context.get('estimate')
-    if pdf_object is None:
+    if context.get('invoice') is None and context.get('estimate') is None:
         return render_template_to_pdf(
             template,
             context_for_pdf,
             stylesheets=[PDF_STYLESHEET],
         )
 
-    cache_prefix = 'grouped_invoice' if 'invoice' in context else 'estimate'
-
     return render_template_to_pdf_cached(
-        pdf_object,
         template,
         context_for_pdf,
-        cache_prefix=cache_prefix,
         stylesheets=[PDF_STYLESHEET],
     )
 
@@ -338,7 +333,10 @@ def track_invoice_email_open(request, token):
 
 
 def _build_estimate_context(estimate, request):
-    profile = request.user.profile
+    if request is not None:
+        profile = request.user.profile
+    else:
+        profile = getattr(estimate.user, 'profile', None)
 
     records = list(estimate.estimate_records.all())
     subtotal = sum(
@@ -355,11 +353,13 @@ def _build_estimate_context(estimate, request):
         )
         total_amount = subtotal + tax
 
-    company_logo_url = (
-        request.build_absolute_uri(profile.company_logo.url)
-        if profile.company_logo else
-        None
-    )
+    company_logo_url = None
+    if profile is not None and profile.company_logo:
+        company_logo_url = (
+            request.build_absolute_uri(profile.company_logo.url)
+            if request is not None else
+            profile.company_logo.url
+        )
 
     return {
         'estimate': estimate,
@@ -41,7 +41,8 @@ except (ImportError, OSError):
 from .ai_service import refine_cause_correction, autocorrect_text_block, transcribe_audio_and_rephrase
 
 from .utils import apply_stock_fields, annotate_products_with_stock, resolve_company_logo_url, get_customer_user_ids, get_product_user_ids
-from .pdf_utils import apply_branding_defaults, render_template_to_pdf
+from .pdf_utils import apply_branding_defaults, render_html_to_pdf, render_template_to_pdf
+from . import invoice_conversion, search_index
 
 from .models import (
     Customer,
@@ -49,6 +50,7 @@ from .models import (
     GroupedInvoice,
     IncomeRecord2,
     InventoryTransaction,
+    InvoiceConversionJob,
     Mechanic,
     MechanicSignupCode,
     PayStub,
@@ -952,7 +954,7 @@ def generate_pm_inspection_pdf(inspection, request, *, blank=False, business_inf
     base_url = request.build_absolute_uri('/') if request else None
     if not WEASYPRINT_AVAILABLE:
         raise ImportError("WeasyPrint is not available. PDF generation is disabled. Please install GTK+ libraries for Windows.")
-    return HTML(string=html_string, base_url=base_url).write_pdf()
+    return render_html_to_pdf(html_string, base_url=base_url)
 
 
 def _build_media_entries(media_files):
@@ -2005,7 +2007,21 @@ def workorder_list(request):
     if end_date:
         workorders_qs = workorders_qs.filter(scheduled_date__isnull=False, scheduled_date__lte=end_date)
 
-    if search_query:
+    if search_query and search_index.is_enabled():
+        filters = Q(pk__in=search_index.matching_ids(
+            search_index.KIND_WORKORDER, search_query, user_id=request.user.pk,
+        ))
+        try:
+            filters |= Q(id=int(search_query))
+        except (TypeError, ValueError):
+            pass
+        workorders_qs = workorders_qs.filter(filters).annotate(
+            search_rank=search_index.rank_expression(
+                workorders_qs, search_index.KIND_WORKORDER, search_query, user_id=request.user.pk,
+            ),
+        )
+        workorders_qs = search_index.order_by_rank(workorders_qs, '-date_created')
+    elif search_query:
         filters = (
             Q(customer__name__icontains=search_query)
             | Q(customer__email__icontains=search_query)
@@ -2045,6 +2061,7 @@ def workorder_list(request):
         'selected_start_date': start_date,
         'selected_end_date': end_date,
         'query_string': query_string,
+        'latest_conversion_job': InvoiceConversionJob.objects.filter(user=request.user).first(),
     }
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
         rows_html = render_to_string('workorders/workorder_rows.html', context, request=request)
@@ -2301,6 +2318,32 @@ def workorder_quick_update(request, pk):
     return JsonResponse(payload)
 
 
+@login_required
+@activation_required
+@subscription_required
+@require_POST
+def workorder_bulk_invoice(request):
+    """Invoice the selected completed work orders in one background job."""
+    selected_ids = []
+    for value in request.POST.getlist('workorder_ids'):
+        try:
+            selected_ids.append(int(value))
+        except (TypeError, ValueError):
+            continue
+
+    job = invoice_conversion.enqueue_work_orders(request.user, selected_ids)
+    if job is None:
+        messages.error(request, "Select completed work orders that do not have an invoice yet.")
+    else:
+        count = len(job.work_order_ids)
+        messages.success(
+            request,
+            f"Creating invoices for {count} work order{'s' if count != 1 else ''} in the background. "
+            "Refresh this page to see the result.",
+        )
+    return redirect('accounts:workorder_list')
+
+
 @login_required
 @activation_required
 @subscription_required
@@ -3461,20 +3504,9 @@ def download_workorder_pdf(request, pk):
     if workorder.status != 'completed':
         return HttpResponseForbidden("Work order not completed.")
 
-    profile = request.user.profile
-    subtotal = workorder.records.aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-    company_logo_url = resolve_company_logo_url(profile, request=request, for_pdf=True)
-    context = {
-        'workorder': workorder,
-        'profile': profile,
-        'subtotal': subtotal,
-        'company_logo_url': company_logo_url,
-    }
-    context = apply_branding_defaults(context)
-    html_string = render_to_string('workorders/workorder_pdf.html', context)
-    if not WEASYPRINT_AVAILABLE:
-        raise ImportError("WeasyPrint is not available. PDF generation is disabled. Please install GTK+ libraries for Windows.")
-    pdf = HTML(string=html_string, base_url=request.build_absolute_uri()).write_pdf()
+    # Shares the cached (and pre-rendered) PDF with the email attachment path.
+    from .views import generate_workorder_pdf
+    pdf = generate_workorder_pdf(workorder, request)
 
     response = HttpResponse(pdf, content_type='application/pdf')
     response['Content-Disposition'] = f'attachment; filename="WorkOrder_{workorder.id}.pdf"'
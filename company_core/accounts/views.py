@@ -39,12 +39,18 @@ from .view_workorder import (
 from .view_invoices import send_grouped_invoice_email
 from .paid_invoice_views import send_paid_invoice_email
 from .invoice_activity import log_invoice_activity, build_email_open_tracking_url
-from .pdf_utils import apply_branding_defaults, render_template_to_pdf
+from .pdf_utils import (
+    apply_branding_defaults,
+    render_html_to_pdf_cached,
+    render_template_to_pdf,
+    render_template_to_pdf_cached,
+)
 from django.http import FileResponse
 from openpyxl import Workbook, load_workbook
 from openpyxl.utils.exceptions import InvalidFileException
 from openpyxl.worksheet.datavalidation import DataValidation
 from .excel_formatting import apply_template_styling
+from .excel_export import ITERATOR_CHUNK_SIZE, template_response
 import shutil
 import pytz
 import os
@@ -98,6 +104,8 @@ from django.contrib.auth.tokens import default_token_generator
 from django.core.mail import EmailMessage
 from django.core.validators import validate_email
 from .utils import build_cc_list
+from . import aging, payment_allocation, payment_links, receivables, receivables_journal, search_index
+from .pagination import CachedCountPaginator, KeysetPaginator
 from django.contrib.auth.forms import SetPasswordForm
 from django.template.loader import render_to_string
 from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
@@ -387,12 +395,13 @@ def get_invoice_context(invoice, request):
         ),
     }
 
-def generate_invoice_pdf(context, request):
+def generate_invoice_pdf(context, request=None):
     """
     Generates a PDF for the given invoice context using WeasyPrint.
 
     :param context: Dictionary containing context data for the invoice.
-    :param request: The HTTP request object.
+    :param request: The HTTP request object; optional so the PDF can be
+        pre-rendered in the background.
     :return: Bytes of the generated PDF.
     """
     # Render the HTML template with context
@@ -409,16 +418,15 @@ def generate_invoice_pdf(context, request):
     if not WEASYPRINT_AVAILABLE:
         raise ImportError("WeasyPrint is not available. PDF generation is disabled. Please install GTK+ libraries for Windows.")
 
-    # Create a WeasyPrint HTML object
-    html = HTML(string=html_string, base_url=request.build_absolute_uri())
-
-    # Generate PDF
-    pdf = html.write_pdf()
+    # Repeat downloads and emails of an unchanged invoice reuse the cached PDF.
+    base_url = request.build_absolute_uri() if request is not None else None
+    return render_html_to_pdf_cached(html_string, base_url=base_url)
 
-    return pdf
+def generate_workorder_pdf(workorder, request=None):
+    """Generate PDF bytes for a completed work order.
 
-def generate_workorder_pdf(workorder, request):
-    """Generate PDF bytes for a completed work order."""
+    ``request`` is optional so the PDF can be pre-rendered in the background.
+    """
     profile = workorder.user.profile
     subtotal = workorder.records.aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
     if not isinstance(subtotal, Decimal):
@@ -457,8 +465,8 @@ def generate_workorder_pdf(workorder, request):
     html_string = render_to_string('workorders/workorder_pdf.html', context)
     if not WEASYPRINT_AVAILABLE:
         raise ImportError("WeasyPrint is not available. PDF generation is disabled. Please install GTK+ libraries for Windows.")
-    pdf = HTML(string=html_string, base_url=request.build_absolute_uri()).write_pdf()
-    return pdf
+    base_url = request.build_absolute_uri() if request is not None else None
+    return render_html_to_pdf_cached(html_string, base_url=base_url)
 
 @login_required
 def print_invoice(request, pk):
@@ -1702,10 +1710,10 @@ class GroupedInvoiceCreateView(LoginRequiredMixin, CreateView):
         if form.is_valid() and incomerecord2_formset.is_valid():
             self.object = form.save()
             incomerecord2_formset.instance = self.object
-            incomerecord2_formset.save()
-
-            # Ensure inventory transactions exist for each sold product
-            self.object.ensure_inventory_transactions()
+            self.object.save_lines(
+                incomerecord2_formset.save(commit=False),
+                deleted=incomerecord2_formset.deleted_objects,
+            )
 
             first_record = self.object.income_records.order_by('line_order', 'id').first()
             if first_record and self.object.customer and first_record.rate is not None:
@@ -1743,19 +1751,14 @@ class GroupedInvoiceUpdateView(LoginRequiredMixin, UpdateView):
         if form.is_valid() and formset.is_valid():
             self.object = form.save()
             formset.instance = self.object
-            formset.save()
-
-            # Ensure inventory transactions exist for each sold product
-            self.object.ensure_inventory_transactions()
+            # Writes the lines, recalculates the total and refreshes the payment link.
+            self.object.save_lines(formset.save(commit=False), deleted=formset.deleted_objects)
 
             first_record = self.object.income_records.order_by('line_order', 'id').first()
             if first_record and self.object.customer and first_record.rate is not None:
                 if self.object.customer.charge_rate != first_record.rate:
                     self.object.customer.charge_rate = first_record.rate
                     self.object.customer.save(update_fields=['charge_rate'])
-            # Recalculate the total and update payment link after changes
-            self.object.recalculate_total_amount()
-            self.object.save()  # This will trigger create_payment_link() if needed
             return redirect(self.success_url)
         else:
             return self.render_to_response(self.get_context_data(form=form))
@@ -1876,6 +1879,7 @@ def quick_invoice_create(request):
         if line_count <= 0:
             line_count = 1
 
+        lines = []
         for idx in range(line_count):
             job = (_at(jobs, idx, '') or '').strip()
             line_source = (_at(line_sources, idx, '') or '').strip().lower()
@@ -1925,7 +1929,7 @@ def quick_invoice_create(request):
                 if rate is None and resolved_service.fixed_rate is not None:
                     rate = Decimal(str(resolved_service.fixed_rate))
 
-            IncomeRecord2.objects.create(
+            lines.append(IncomeRecord2(
                 grouped_invoice=invoice,
                 pending_invoice=pending_invoice,
                 product=resolved_product,
@@ -1933,10 +1937,13 @@ def quick_invoice_create(request):
                 qty=qty if qty is not None else Decimal('1'),
                 rate=rate if rate is not None else Decimal('0'),
                 date=invoice_date,
-            )
+            ))
 
         # Keep totals/payment links consistent with the rest of the app.
-        invoice.recalculate_total_amount()
+        if lines:
+            invoice.save_lines(lines)
+        else:
+            invoice.recalculate_total_amount()
 
     redirect_url = reverse('accounts:groupedinvoice_detail', args=[invoice.pk])
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
@@ -3494,7 +3501,7 @@ def _build_customer_credit_context(credit, *, request=None):
 def customer_credit_pdf(request, pk):
     credit = get_object_or_404(CustomerCredit, pk=pk, user=request.user)
     context = _build_customer_credit_context(credit, request=request)
-    pdf_bytes = render_template_to_pdf('invoices/customer_credit_pdf.html', context)
+    pdf_bytes = render_template_to_pdf_cached('invoices/customer_credit_pdf.html', context)
     filename = f"Customer_Credit_{credit.credit_no or credit.pk}.pdf"
     response = HttpResponse(pdf_bytes, content_type='application/pdf')
     response['Content-Disposition'] = f'attachment; filename="{filename}"'
@@ -3505,7 +3512,7 @@ def customer_credit_pdf(request, pk):
 def customer_credit_print(request, pk):
     credit = get_object_or_404(CustomerCredit, pk=pk, user=request.user)
     context = _build_customer_credit_context(credit, request=request)
-    pdf_bytes = render_template_to_pdf('invoices/customer_credit_pdf.html', context)
+    pdf_bytes = render_template_to_pdf_cached('invoices/customer_credit_pdf.html', context)
     filename = f"Customer_Credit_{credit.credit_no or credit.pk}.pdf"
     response = HttpResponse(pdf_bytes, content_type='application/pdf')
     response['Content-Disposition'] = f'inline; filename="{filename}"'
@@ -3523,7 +3530,7 @@ def customer_credit_email(request, pk):
         return redirect('accounts:customer_credit_detail', pk=credit.pk)
 
     context = _build_customer_credit_context(credit, request=request)
-    pdf_bytes = render_template_to_pdf('invoices/customer_credit_pdf.html', context)
+    pdf_bytes = render_template_to_pdf_cached('invoices/customer_credit_pdf.html', context)
     email_html = render_to_string('emails/customer_credit_email.html', context)
 
     profile = getattr(credit.user, 'profile', None)
@@ -6094,24 +6101,12 @@ def home(request):
     # --- Financial Calculations (Invoices, Overdue) ---
     term_days = TERM_CHOICES.get(profile.term, 30)
 
-    pending_invoices_qs = PendingInvoice.objects.filter(
-        is_paid=False,
-        grouped_invoice__user=request.user
-    ).select_related('grouped_invoice').prefetch_related('grouped_invoice__payments').annotate(
-        total_paid=Coalesce(
-            Sum('grouped_invoice__payments__amount'),
-            Value(Decimal('0.00')),
-            output_field=DecimalField(max_digits=10, decimal_places=2)
-        )
-    )
-    pending_invoices_qs = _annotate_invoice_credit_totals(
-        pending_invoices_qs,
-        invoice_field='grouped_invoice_id',
-    ).annotate(
-        balance_due=ExpressionWrapper(
-            F('grouped_invoice__total_amount') - F('total_paid') - F('credit_total'),
-            output_field=DecimalField(max_digits=10, decimal_places=2)
-        )
+    pending_invoices_qs = receivables.annotate_receivables(
+        PendingInvoice.objects.filter(
+            is_paid=False,
+            grouped_invoice__user=request.user
+        ).select_related('grouped_invoice'),
+        invoice_path='grouped_invoice',
     )
 
     if term_days > 0:
@@ -6128,85 +6123,34 @@ def home(request):
         total_overdue=Sum('balance_due')
     )['total_overdue'] or Decimal('0.00')
 
-    grouped_payments_sum = Coalesce(
-        Sum('payments__amount'),
-        Value(Decimal('0.00')),
-        output_field=DecimalField(max_digits=10, decimal_places=2)
-    )
-
     # --- Overdue customers summary for dashboard ---
     # Aggregate overdue balance per customer, sorted by highest first.
     # Also include "reminder sent today" flag.
     overdue_customer_rows = []
+    outstanding_by_customer = {}
     try:
-        # Use a subquery for invoice total_paid so we can safely Sum(balance_due)
-        # in the customer aggregation (Django disallows summing an aggregate annotation).
-        invoice_paid_subquery = (
-            Payment.objects.filter(invoice=OuterRef('pk'))
-            .values('invoice')
-            .annotate(
-                total=Coalesce(
-                    Sum('amount'),
-                    Value(Decimal('0.00')),
-                    output_field=DecimalField(max_digits=10, decimal_places=2),
-                )
-            )
-            .values('total')[:1]
-        )
-        outstanding_customer_rows = list(
-            _annotate_invoice_credit_totals(
-                GroupedInvoice.objects.filter(
-                    user=request.user,
-                    customer__isnull=False,
-                ).annotate(
-                    total_paid=Coalesce(
-                        Subquery(invoice_paid_subquery),
-                        Value(Decimal('0.00')),
-                        output_field=DecimalField(max_digits=10, decimal_places=2),
-                    )
-                )
-            )
-            .annotate(
-                balance_due=ExpressionWrapper(
-                    F('total_amount') - F('total_paid') - F('credit_total'),
-                    output_field=DecimalField(max_digits=10, decimal_places=2),
-                ),
-            )
-            .filter(balance_due__gt=Decimal('0.00'))
-            .values('customer_id')
-            .annotate(total_outstanding=Coalesce(Sum('balance_due'), Value(Decimal('0.00')), output_field=DecimalField()))
-        )
+        # Per-customer balances come from today's aging snapshot (accounts.aging).
+        customer_aging = aging.customer_totals([request.user.pk])
         outstanding_by_customer = {
-            row.get('customer_id'): (row.get('total_outstanding') or Decimal('0.00'))
-            for row in outstanding_customer_rows
+            customer_id: row['total_due'] for customer_id, row in customer_aging.items()
         }
-        overdue_customer_rows = list(
-            _annotate_invoice_credit_totals(
-                GroupedInvoice.objects.filter(
-                    user=request.user,
-                    customer__isnull=False,
-                ).annotate(
-                    total_paid=Coalesce(
-                        Subquery(invoice_paid_subquery),
-                        Value(Decimal('0.00')),
-                        output_field=DecimalField(max_digits=10, decimal_places=2),
-                    )
-                )
-            )
-            .annotate(
-                balance_due=ExpressionWrapper(
-                    F('total_amount') - F('total_paid') - F('credit_total'),
-                    output_field=DecimalField(max_digits=10, decimal_places=2),
-                ),
-            )
-            .filter(
-                balance_due__gt=Decimal('0.00'),
-                date__isnull=False,
-                **({'date__lt': overdue_threshold_date} if term_days > 0 else {'date__lte': overdue_threshold_date}),
-            )
-            .values('customer_id', 'customer__name')
-            .annotate(total_overdue=Coalesce(Sum('balance_due'), Value(Decimal('0.00')), output_field=DecimalField()))
-            .order_by('-total_overdue', 'customer__name')
+        overdue_aging = {
+            customer_id: row for customer_id, row in customer_aging.items() if row['overdue_total'] > 0
+        }
+        customer_names = dict(
+            Customer.objects.filter(pk__in=list(overdue_aging)).values_list('id', 'name')
+        )
+        overdue_customer_rows = sorted(
+            (
+                {
+                    'customer_id': customer_id,
+                    'customer__name': customer_names.get(customer_id, ''),
+                    'total_overdue': row['overdue_total'],
+                    'aging': row,
+                }
+                for customer_id, row in overdue_aging.items()
+            ),
+            key=lambda row: (-row['total_overdue'], row['customer__name']),
         )
     except DbOperationalError:
         overdue_customer_rows = []
@@ -6265,21 +6209,17 @@ def home(request):
                 'customer_phone': customer_meta.get('phone_number') or '',
                 'next_followup': next_followup.isoformat() if next_followup else '',
                 'collection_notes': customer_meta.get('collection_notes') or '',
+                'aging': {
+                    field: float(row['aging'][field])
+                    for field in aging.OVERDUE_FIELDS
+                },
             }
         )
 
     overdue_customers_count = len(overdue_customers_payload)
-    grouped_pending_invoices_qs = GroupedInvoice.objects.filter(user=request.user).annotate(
-        total_paid=grouped_payments_sum,
+    grouped_pending_invoices_qs = receivables.annotate_receivables(
+        GroupedInvoice.objects.filter(user=request.user, amount_due__gt=Decimal('0.00'))
     )
-    grouped_pending_invoices_qs = _annotate_invoice_credit_totals(
-        grouped_pending_invoices_qs
-    ).annotate(
-        balance_due=ExpressionWrapper(
-            F('total_amount') - F('total_paid') - F('credit_total'),
-            output_field=DecimalField(max_digits=10, decimal_places=2)
-        )
-    ).filter(balance_due__gt=Decimal('0.00'))
     pending_invoices_count = grouped_pending_invoices_qs.count()
     pending_invoices_total = grouped_pending_invoices_qs.aggregate(
         total=Sum('balance_due')
@@ -9284,13 +9224,14 @@ def add_dailylog(request):
                         )
 
                     formset.instance = gi  # Associate formset with the saved instance
-                    formset.save()  # Save the related income/estimate records
+                    if isinstance(gi, GroupedInvoice):
+                        # One total/fee/inventory/job-history pass for all lines.
+                        gi.save_lines(formset.save(commit=False), deleted=formset.deleted_objects)
+                    else:
+                        formset.save()  # Save the related estimate records
 
-                    # If it's an invoice, update the customer rate, create a pending invoice,
-                    # and ensure inventory transactions exist for each product sold.
+                    # If it's an invoice, update the customer rate and create a pending invoice.
                     if documentType == 'invoice' and isinstance(gi, GroupedInvoice):
-                        gi.ensure_inventory_transactions()
-
                         first_record = gi.income_records.order_by('line_order', 'id').first()
                         if first_record and gi.customer and first_record.rate is not None:
                             if gi.customer.charge_rate != first_record.rate:
@@ -9981,20 +9922,10 @@ class PendingInvoiceListView(LoginRequiredMixin, ListView):
         )
         user = self.request.user
 
-        invoices = GroupedInvoice.objects.filter(user=user).select_related('customer').annotate(
-            total_paid=Coalesce(
-                Sum('payments__amount'), Value(Decimal('0.00')), output_field=DecimalField(max_digits=10, decimal_places=2)
-            )
-        )
-        invoices = _annotate_invoice_credit_totals(invoices).annotate(
-            balance_due=ExpressionWrapper(
-                F('total_amount') - F('total_paid') - F('credit_total'),
-                output_field=DecimalField(max_digits=10, decimal_places=2)
-            )
-        )
-
         # Only include invoices with a balance due greater than zero
-        invoices = invoices.filter(balance_due__gt=Decimal('0.00'))
+        invoices = receivables.annotate_receivables(
+            GroupedInvoice.objects.filter(user=user, amount_due__gt=Decimal('0.00')).select_related('customer')
+        )
 
         if start_date:
             invoices = invoices.filter(date__isnull=False, date__gte=start_date)
@@ -10053,36 +9984,11 @@ class PendingInvoiceListView(LoginRequiredMixin, ListView):
         )
         user = self.request.user
 
-        invoice_paid_subquery = (
-            Payment.objects.filter(invoice=OuterRef('pk'))
-            .values('invoice')
-            .annotate(
-                total=Coalesce(
-                    Sum('amount'),
-                    Value(Decimal('0.00')),
-                    output_field=DecimalField(max_digits=10, decimal_places=2),
-                )
-            )
-            .values('total')[:1]
+        invoices = GroupedInvoice.objects.filter(
+            user=user,
+            customer__isnull=False,
+            amount_due__gt=Decimal('0.00'),
         )
-        invoices = _annotate_invoice_credit_totals(
-            GroupedInvoice.objects.filter(
-                user=user,
-                customer__isnull=False,
-            ).annotate(
-                total_paid=Coalesce(
-                    Subquery(invoice_paid_subquery),
-                    Value(Decimal('0.00')),
-                    output_field=DecimalField(max_digits=10, decimal_places=2),
-                ),
-            )
-        ).annotate(
-            balance_due=ExpressionWrapper(
-                F('total_amount') - F('total_paid') - F('credit_total'),
-                output_field=DecimalField(max_digits=10, decimal_places=2),
-            ),
-        ).filter(balance_due__gt=Decimal('0.00'))
-
         if start_date:
             invoices = invoices.filter(date__isnull=False, date__gte=start_date)
         if end_date:
@@ -10096,8 +10002,8 @@ class PendingInvoiceListView(LoginRequiredMixin, ListView):
 
         rows = invoices.values('customer_id', 'customer__name').annotate(
             total_amount=Coalesce(Sum('total_amount'), Value(Decimal('0.00')), output_field=DecimalField(max_digits=10, decimal_places=2)),
-            total_paid=Coalesce(Sum('total_paid'), Value(Decimal('0.00')), output_field=DecimalField(max_digits=10, decimal_places=2)),
-            balance_due=Coalesce(Sum('balance_due'), Value(Decimal('0.00')), output_field=DecimalField(max_digits=10, decimal_places=2)),
+            total_paid=Coalesce(Sum('amount_paid'), Value(Decimal('0.00')), output_field=DecimalField(max_digits=10, decimal_places=2)),
+            balance_due=Coalesce(Sum('amount_due'), Value(Decimal('0.00')), output_field=DecimalField(max_digits=10, decimal_places=2)),
             last_statement=Max('date'),
         )
 
@@ -10119,7 +10025,7 @@ class PendingInvoiceListView(LoginRequiredMixin, ListView):
             rows = rows.order_by('-balance_due', 'customer__name')
 
         total_pending = invoices.aggregate(
-            total=Coalesce(Sum('balance_due'), Value(Decimal('0.00')), output_field=DecimalField(max_digits=10, decimal_places=2))
+            total=Coalesce(Sum('amount_due'), Value(Decimal('0.00')), output_field=DecimalField(max_digits=10, decimal_places=2))
         )['total'] or Decimal('0.00')
         self._pending_customer_summary = {
             'total_pending': total_pending,
@@ -10364,31 +10270,36 @@ class MarkInvoicePaidView(LoginRequiredMixin, View):
                     "Please provide a valid payment date (YYYY-MM-DD).",
                 )
 
-        Payment.objects.create(
-            invoice=grouped_invoice,
-            amount=payment_amount,
+        # Moves the PendingInvoice to paid once payments cover the invoice.
+        applied = payment_allocation.record_payment(
+            [grouped_invoice],
+            payment_amount,
             method=method,
             notes=notes,
-            date=payment_date,
+            payment_date=payment_date,
         )
+        applied_total = sum((allocation.amount for allocation in applied), Decimal('0.00'))
+        grouped_invoice.refresh_from_db(fields=receivables.RECEIVABLE_FIELDS)
 
-        # Update PendingInvoice state only when payments cover the invoice.
-        total_amount = grouped_invoice.total_amount or Decimal('0.00')
-        total_paid = grouped_invoice.total_paid()
-        if total_paid + Decimal('0.01') >= total_amount and pending_invoice:
-            pending_invoice.is_paid = True
-            pending_invoice.save()
+        # The allocation is capped by the stored amount_due, which can trail the live balance.
+        if applied_total <= Decimal('0.00'):
+            return respond_with_message(
+                'error',
+                f"No payment was recorded: Invoice {grouped_invoice.invoice_number} has no balance left to pay.",
+                status=409,
+            )
 
-        messages.success(
-            request,
-            f"Recorded payment of ${payment_amount:,.2f} for Invoice {grouped_invoice.invoice_number}.",
-        )
+        message = f"Recorded payment of ${applied_total:,.2f} for Invoice {grouped_invoice.invoice_number}."
+        if applied_total < payment_amount:
+            message += f" Only ${applied_total:,.2f} of the ${payment_amount:,.2f} entered was still owing."
+        messages.success(request, message)
 
         if request.headers.get('x-requested-with') == 'XMLHttpRequest':
             return JsonResponse(
                 {
                     'status': 'success',
-                    'message': 'Payment recorded successfully.',
+                    'message': message,
+                    'applied': float(applied_total),
                     'balance_due': f"${grouped_invoice.balance_due():,.2f}",
                 }
             )
@@ -10424,46 +10335,12 @@ def record_customer_payment(request, customer_id: int):
         except ValueError:
             return json_error("Please provide a valid payment date (YYYY-MM-DD).")
 
-    # Use subquery/annotations to avoid N+1 when determining balances.
-    invoice_paid_subquery = (
-        Payment.objects.filter(invoice=OuterRef('pk'))
-        .values('invoice')
-        .annotate(
-            total=Coalesce(
-                Sum('amount'),
-                Value(Decimal('0.00')),
-                output_field=DecimalField(max_digits=10, decimal_places=2),
-            )
-        )
-        .values('total')[:1]
-    )
-    unpaid_qs = (
-        _annotate_invoice_credit_totals(
-            GroupedInvoice.objects.filter(
-                user=request.user,
-                customer=customer,
-            ).annotate(
-                total_paid_calc=Coalesce(
-                    Subquery(invoice_paid_subquery),
-                    Value(Decimal('0.00')),
-                    output_field=DecimalField(max_digits=10, decimal_places=2),
-                ),
-            )
-        )
-        .annotate(
-            balance_due_calc=ExpressionWrapper(
-                F('total_amount') - F('total_paid_calc') - F('credit_total'),
-                output_field=DecimalField(max_digits=10, decimal_places=2),
-            ),
-        )
-        .filter(balance_due_calc__gt=Decimal('0.00'))
-        .order_by('date', 'id')
-    )
-    unpaid_invoices = list(unpaid_qs)
+    customer_invoices = GroupedInvoice.objects.filter(user=request.user, customer=customer)
+    unpaid_invoices = list(payment_allocation.open_invoices(customer_invoices))
     if not unpaid_invoices:
         return json_error(f"{customer.name} has no outstanding balance to pay.")
 
-    outstanding_before = sum((inv.balance_due_calc for inv in unpaid_invoices), Decimal('0.00'))
+    outstanding_before = sum((inv.amount_due for inv in unpaid_invoices), Decimal('0.00'))
 
     try:
         payment_amount = Decimal(amount_raw) if amount_raw else outstanding_before
@@ -10493,84 +10370,34 @@ def record_customer_payment(request, customer_id: int):
     )
 
     def customer_overdue_total() -> Decimal:
-        rows = list(
-            _annotate_invoice_credit_totals(
-                GroupedInvoice.objects.filter(
-                    user=request.user,
-                    customer=customer,
-                    date__isnull=False,
-                    **overdue_filter,
-                ).annotate(
-                    total_paid_calc=Coalesce(
-                        Subquery(invoice_paid_subquery),
-                        Value(Decimal('0.00')),
-                        output_field=DecimalField(max_digits=10, decimal_places=2),
-                    ),
-                )
-            )
-            .annotate(
-                balance_due_calc=ExpressionWrapper(
-                    F('total_amount') - F('total_paid_calc') - F('credit_total'),
-                    output_field=DecimalField(max_digits=10, decimal_places=2),
-                ),
-            )
-            .filter(balance_due_calc__gt=Decimal('0.00'))
-            .values('id')
-            .annotate(total=Coalesce(Sum('balance_due_calc'), Value(Decimal('0.00')), output_field=DecimalField()))
-        )
-        return (rows[0]['total'] if rows else Decimal('0.00')) or Decimal('0.00')
+        return customer_invoices.filter(
+            date__isnull=False,
+            amount_due__gt=Decimal('0.00'),
+            **overdue_filter,
+        ).aggregate(
+            total=Coalesce(Sum('amount_due'), Value(Decimal('0.00')), output_field=DecimalField())
+        )['total']
 
     overdue_before = customer_overdue_total()
 
-    allocations = []
-    remaining = payment_amount
-    applied_total = Decimal('0.00')
-
-    with transaction.atomic():
-        for inv in unpaid_invoices:
-            if remaining <= Decimal('0.00'):
-                break
-
-            inv_balance = (inv.balance_due_calc or Decimal('0.00')).quantize(Decimal('0.01'))
-            if inv_balance <= Decimal('0.00'):
-                continue
-
-            apply_amount = min(inv_balance, remaining).quantize(Decimal('0.01'))
-            if apply_amount <= Decimal('0.00'):
-                continue
-
-            Payment.objects.create(
-                invoice_id=inv.pk,
-                amount=apply_amount,
-                method=method,
-                notes=notes,
-                date=payment_date,
-            )
-            remaining -= apply_amount
-            applied_total += apply_amount
-
-            # Refresh invoice payment state for accurate status.
-            fresh_invoice = GroupedInvoice.objects.get(pk=inv.pk, user=request.user)
-            balance_after = fresh_invoice.balance_due()
-            total_amount = fresh_invoice.total_amount or Decimal('0.00')
-            total_paid = fresh_invoice.total_paid()
-            status = 'paid' if total_paid + Decimal('0.01') >= total_amount else 'partial'
-
-            if status == 'paid':
-                pending = PendingInvoice.objects.filter(grouped_invoice_id=inv.pk).first()
-                if pending:
-                    pending.is_paid = True
-                    pending.save()
-
-            allocations.append(
-                {
-                    'invoice_id': inv.pk,
-                    'invoice_number': inv.invoice_number,
-                    'applied': float(apply_amount),
-                    'status': status,
-                    'balance_remaining': float(max(balance_after, Decimal('0.00'))),
-                }
-            )
+    applied = payment_allocation.record_payment(
+        unpaid_invoices,
+        payment_amount,
+        method=method,
+        notes=notes,
+        payment_date=payment_date,
+    )
+    applied_total = sum((allocation.amount for allocation in applied), Decimal('0.00'))
+    allocations = [
+        {
+            'invoice_id': allocation.invoice.pk,
+            'invoice_number': allocation.invoice.invoice_number,
+            'applied': float(allocation.amount),
+            'status': allocation.status,
+            'balance_remaining': float(allocation.balance_remaining),
+        }
+        for allocation in applied
+    ]
 
     outstanding_after = max(outstanding_before - applied_total, Decimal('0.00'))
     overdue_after = customer_overdue_total()
@@ -10615,6 +10442,7 @@ def record_customer_payment(request, customer_id: int):
                 'amount_received': float(applied_total),
                 'outstanding_before': float(outstanding_before),
                 'outstanding_after': float(outstanding_after),
+                'account_balance': float(receivables_journal.balance(customer.pk)),
                 'overdue_before': float(overdue_before),
                 'overdue_after': float(overdue_after),
                 'allocations': allocations,
@@ -12292,29 +12120,30 @@ def export_vehicles_template(request):
 
     business_user_ids = get_customer_user_ids(request.user)
     customer = get_object_or_404(Customer, id=customer_id, user__in=business_user_ids)
-    workbook = Workbook()
-    worksheet = workbook.active
-    worksheet.title = "Vehicles"
-    worksheet.append(VEHICLE_TEMPLATE_HEADERS)
-    worksheet.freeze_panes = "A2"
-
-    vehicles = Vehicle.objects.filter(customer=customer).order_by("vin_number")
-    for vehicle in vehicles:
-        worksheet.append(
-            [
-                vehicle.vin_number or "",
-                vehicle.unit_number or "",
-                vehicle.license_plate or "",
-                vehicle.make_model or "",
-                vehicle.current_mileage if vehicle.current_mileage is not None else "",
-            ]
+    vehicles = (
+        Vehicle.objects.filter(customer=customer)
+        .order_by("vin_number")
+        .values_list("vin_number", "unit_number", "license_plate", "make_model", "current_mileage")
+    )
+    rows = (
+        [
+            vin_number or "",
+            unit_number or "",
+            license_plate or "",
+            make_model or "",
+            current_mileage if current_mileage is not None else "",
+        ]
+        for vin_number, unit_number, license_plate, make_model, current_mileage in vehicles.iterator(
+            chunk_size=ITERATOR_CHUNK_SIZE
         )
+    )
 
-    apply_template_styling(
-        worksheet,
+    return template_response(
+        f"vehicles_{_sanitize_filename_segment(customer.name)}.xlsx",
+        title="Vehicles",
         headers=VEHICLE_TEMPLATE_HEADERS,
-        header_row_index=1,
-        column_width_overrides={
+        rows=rows,
+        column_widths={
             "VIN Number": 26,
             "Unit Number": 18,
             "License Plate": 18,
@@ -12323,18 +12152,6 @@ def export_vehicles_template(request):
         },
     )
 
-    output = BytesIO()
-    workbook.save(output)
-    output.seek(0)
-
-    filename = f"vehicles_{_sanitize_filename_segment(customer.name)}.xlsx"
-    response = HttpResponse(
-        output.getvalue(),
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    )
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
-    return response
-
 
 @login_required
 @require_POST
@@ -12707,43 +12524,32 @@ def customer_overdue_list(request):
     if search_query:
         customers_query = customers_query.filter(name__icontains=search_query)
 
-    current_date = timezone.now().date()
+    current_date = timezone.localdate()
     overdue_customers_data = []
 
-    for customer in customers_query:
-        # Calculate balance_due for each invoice of the customer
-        invoices_with_balance = customer.invoices.filter(
-            user__in=store_user_ids,
-        ).annotate(
-            total_paid=Coalesce(
-                Sum('payments__amount', distinct=True), # Ensure payments aren't double-counted if joins occur
-                Value(Decimal('0.00')),
-                output_field=DecimalField()
-            )
-        )
-        invoices_with_balance = _annotate_invoice_credit_totals(invoices_with_balance).annotate(
-            balance_due=F('total_amount') - F('total_paid') - F('credit_total')
-        )
-
-        # Calculate total overdue amount for this specific customer
-        overdue_total_for_customer = Decimal('0.00')
-        for invoice in invoices_with_balance:
-            if invoice.due_date and invoice.due_date < current_date and invoice.balance_due > 0:
-                overdue_total_for_customer += invoice.balance_due
-
-        if overdue_total_for_customer > 0:
-            # Fetch reminder info for this customer using the ReminderLog model
-            customer_reminders = customer.reminder_logs.all()  # .all() respects Meta ordering
-            reminder_count = customer_reminders.count()
-            last_reminder = customer_reminders.first() # Gets the most recent
-            last_reminder_sent_on = last_reminder.sent_at if last_reminder else None
+    # Per-customer balances come from today's aging snapshot (accounts.aging).
+    customer_aging = aging.customer_totals(store_user_ids, current_date)
+    overdue_customer_ids = [
+        customer_id for customer_id, row in customer_aging.items() if row['overdue_total'] > 0
+    ]
+    overdue_customers = list(customers_query.filter(pk__in=overdue_customer_ids))
+    reminder_by_customer = {
+        row['customer_id']: row
+        for row in ReminderLog.objects.filter(customer__in=overdue_customers)
+        .values('customer_id')
+        .annotate(reminder_count=Count('id'), last_sent=Max('sent_at'))
+    }
 
-            overdue_customers_data.append({
-                'customer': customer,
-                'overdue_total': overdue_total_for_customer,
-                'reminder_count': reminder_count,
-                'last_reminder_sent_on': last_reminder_sent_on,
-            })
+    for customer in overdue_customers:
+        customer_row = customer_aging[customer.pk]
+        reminder_info = reminder_by_customer.get(customer.pk) or {}
+        overdue_customers_data.append({
+            'customer': customer,
+            'overdue_total': customer_row['overdue_total'],
+            'aging': customer_row,
+            'reminder_count': reminder_info.get('reminder_count') or 0,
+            'last_reminder_sent_on': reminder_info.get('last_sent'),
+        })
 
     # Calculate the sum of overdue amounts for the customers being displayed
     total_overdue_for_displayed_customers = sum(d['overdue_total'] for d in overdue_customers_data)
@@ -12775,24 +12581,23 @@ def customer_detail(request, customer_id, invoice_type):
     business_user_ids = get_customer_user_ids(request.user)
     store_user_ids = get_business_user_ids(request.user)
     customer = get_object_or_404(Customer, id=customer_id, user__in=business_user_ids)
-    invoices_qs = customer.invoices.filter(user__in=store_user_ids).annotate(
-        total_paid=Coalesce(
-            Sum('payments__amount'),
-            Value(Decimal('0.00')),
-            output_field=DecimalField()
-        )
-    )
-    invoices_qs = _annotate_invoice_credit_totals(invoices_qs).annotate(
-        balance_due=F('total_amount') - F('total_paid') - F('credit_total')
+    invoices_qs = receivables.annotate_receivables(
+        customer.invoices.filter(user__in=store_user_ids).select_related('user__profile')
     )
     if invoice_type == 'paid':
-        invoices = invoices_qs.filter(balance_due__lte=Decimal('0.00'))
+        invoices = invoices_qs.filter(amount_due__lte=Decimal('0.00'))
     elif invoice_type == 'pending':
-        invoices = invoices_qs.filter(balance_due__gt=Decimal('0.00'))
+        invoices = invoices_qs.filter(amount_due__gt=Decimal('0.00'))
     elif invoice_type == 'overdue':
-        pending_invoices = invoices_qs.filter(balance_due__gt=Decimal('0.00'))
-        today = timezone.now().date()
-        invoices = [inv for inv in pending_invoices if inv.due_date and inv.due_date < today]
+        # Overdue once date + term has passed (GroupedInvoice.due_date); each invoice uses its owner's term.
+        today = timezone.localdate()
+        overdue = Q()
+        terms = Profile.objects.filter(user_id__in=store_user_ids).values_list('user_id', 'term')
+        term_by_user = {user_id: TERM_CHOICES.get(term, 30) for user_id, term in terms}
+        for user_id in store_user_ids:
+            due_cutoff = today - timedelta(days=term_by_user.get(user_id, 30))
+            overdue |= Q(user_id=user_id, date__lt=due_cutoff)
+        invoices = list(invoices_qs.filter(overdue, amount_due__gt=Decimal('0.00')))
     else:  # 'all'
         invoices = invoices_qs
 
@@ -12832,6 +12637,7 @@ def customer_detail(request, customer_id, invoice_type):
         'total_invoice_amount': total_invoice_amount,
         'invoice_type': invoice_type,
         'credit_entries': credit_entries,
+        'account_summary': receivables_journal.account_summary(customer.pk, user_ids=store_user_ids),
     }
     return render(request, 'app/customer_jobs.html', context)
 
@@ -14049,35 +13855,46 @@ def bulk_delete_services(request):
 def export_services_template(request):
     """Export the user's services to an Excel template."""
 
-    workbook = Workbook()
-    worksheet = workbook.active
-    worksheet.title = "Services"
-    worksheet.append(SERVICE_TEMPLATE_HEADERS)
-    worksheet.freeze_panes = "A2"
-
     services = (
         Service.objects.filter(user=request.user)
-        .select_related('job_name')
         .order_by(Lower('job_name__name'), Lower('name'))
-    )
-    for service in services:
-        worksheet.append(
-            [
-                service.job_name.name if service.job_name_id else "",
-                service.name or "",
-                service.description or "",
-                float(service.fixed_hours) if service.fixed_hours is not None else "",
-                float(service.fixed_rate) if service.fixed_rate is not None else "",
-                service.due_after_kilometers or "",
-                service.due_after_months or "",
-            ]
+        .values_list(
+            'job_name__name',
+            'name',
+            'description',
+            'fixed_hours',
+            'fixed_rate',
+            'due_after_kilometers',
+            'due_after_months',
         )
+    )
+    rows = (
+        [
+            job_name or "",
+            name or "",
+            description or "",
+            float(fixed_hours) if fixed_hours is not None else "",
+            float(fixed_rate) if fixed_rate is not None else "",
+            due_after_kilometers or "",
+            due_after_months or "",
+        ]
+        for (
+            job_name,
+            name,
+            description,
+            fixed_hours,
+            fixed_rate,
+            due_after_kilometers,
+            due_after_months,
+        ) in services.iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+    )
 
-        apply_template_styling(
-            worksheet,
-            headers=SERVICE_TEMPLATE_HEADERS,
-            header_row_index=1,
-            column_width_overrides={
+    return template_response(
+        "services_template.xlsx",
+        title="Services",
+        headers=SERVICE_TEMPLATE_HEADERS,
+        rows=rows,
+        column_widths={
             "Job name": 32,
             "Job description": 48,
             "More about this job": 60,
@@ -14092,17 +13909,6 @@ def export_services_template(request):
         },
     )
 
-    output = BytesIO()
-    workbook.save(output)
-    output.seek(0)
-
-    response = HttpResponse(
-        output.getvalue(),
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    )
-    response["Content-Disposition"] = 'attachment; filename="services_template.xlsx"'
-    return response
-
 
 @login_required
 @require_POST
@@ -14368,6 +14174,15 @@ class GroupedInvoiceListView(LoginRequiredMixin, ListView):
     template_name = 'app/groupedinvoice_list.html'
     context_object_name = 'object_list'
     paginate_by = 100
+    count_namespace = 'groupedinvoice'
+    # Sorts served with keyset pagination: sort_by -> indexed sort column.
+    keyset_sort_keys = {
+        'invoice_number': 'invoice_sequence',
+        'date': 'date',
+        'total_amount': 'total_amount',
+    }
+    # Keyset columns that may be NULL; NULLs sort as the lowest value.
+    keyset_nullable_keys = {'date'}
 
     def _get_sorting(self):
         return _resolve_sorting(
@@ -14396,32 +14211,8 @@ class GroupedInvoiceListView(LoginRequiredMixin, ListView):
         if end_date:
             queryset = queryset.filter(date__isnull=False, date__lte=end_date)
 
-        # Annotate total_paid + balance_due for filtering/status without N+1.
-        invoice_paid_subquery = (
-            Payment.objects.filter(invoice=OuterRef('pk'))
-            .values('invoice')
-            .annotate(
-                total=Coalesce(
-                    Sum('amount'),
-                    Value(Decimal('0.00')),
-                    output_field=DecimalField(max_digits=10, decimal_places=2),
-                )
-            )
-            .values('total')[:1]
-        )
-        queryset = _annotate_invoice_credit_totals(
-            queryset.annotate(
-                total_paid=Coalesce(
-                    Subquery(invoice_paid_subquery),
-                    Value(Decimal('0.00')),
-                    output_field=DecimalField(max_digits=10, decimal_places=2),
-                ),
-            )
-        ).annotate(
-            balance_due=ExpressionWrapper(
-                F('total_amount') - F('total_paid') - F('credit_total'),
-                output_field=DecimalField(max_digits=10, decimal_places=2),
-            ),
+        # Stored receivables columns give total_paid + balance_due without subqueries.
+        queryset = receivables.annotate_receivables(queryset).annotate(
             total_settled=ExpressionWrapper(
                 F('total_paid'),
                 output_field=DecimalField(max_digits=10, decimal_places=2),
@@ -14447,44 +14238,11 @@ class GroupedInvoiceListView(LoginRequiredMixin, ListView):
             )
         )
 
-        activity_sent_subquery = (
-            InvoiceActivity.objects.filter(
-                invoice=OuterRef('pk'),
-                event_type=InvoiceActivity.EVENT_EMAIL_SENT,
-            )
-            .order_by('-created_at')
-            .values('created_at')[:1]
-        )
-        activity_opened_subquery = (
-            InvoiceActivity.objects.filter(
-                invoice=OuterRef('pk'),
-                event_type=InvoiceActivity.EVENT_EMAIL_OPENED,
-            )
-            .order_by('-created_at')
-            .values('created_at')[:1]
-        )
-        activity_viewed_subquery = (
-            InvoiceActivity.objects.filter(
-                invoice=OuterRef('pk'),
-                event_type=InvoiceActivity.EVENT_VIEWED,
-            )
-            .order_by('-created_at')
-            .values('created_at')[:1]
-        )
-
+        # Activity timestamps are stored on the invoice by log_invoice_activity.
         queryset = queryset.annotate(
-            latest_email_sent_at=Subquery(
-                activity_sent_subquery,
-                output_field=DateTimeField(),
-            ),
-            latest_email_opened_at=Subquery(
-                activity_opened_subquery,
-                output_field=DateTimeField(),
-            ),
-            latest_portal_viewed_at=Subquery(
-                activity_viewed_subquery,
-                output_field=DateTimeField(),
-            ),
+            latest_email_sent_at=F('last_email_sent_at'),
+            latest_email_opened_at=F('last_email_opened_at'),
+            latest_portal_viewed_at=F('last_portal_viewed_at'),
         )
 
         # Apply status filter
@@ -14505,7 +14263,12 @@ class GroupedInvoiceListView(LoginRequiredMixin, ListView):
         elif order_source_filter == 'offline':
             queryset = queryset.filter(is_online_order=False)
 
-        if query:
+        self._search_ranked = False
+        if query and search_index.is_enabled():
+            queryset = search_index.search(queryset, search_index.KIND_INVOICE, query, user_id=user.pk)
+            # Without an explicit sort, list the best matches first.
+            self._search_ranked = not self.request.GET.get('sort_by')
+        elif query:
             filters = (
                 Q(invoice_number__icontains=query) |
                 Q(bill_to__icontains=query) |
@@ -14515,6 +14278,10 @@ class GroupedInvoiceListView(LoginRequiredMixin, ListView):
             )
             queryset = queryset.filter(filters)
 
+        if self._search_ranked:
+            self._groupedinvoice_queryset = search_index.order_by_rank(queryset)
+            return self._groupedinvoice_queryset
+
         sort_map = {
             'invoice_number': 'invoice_number',
             'date': 'date',
@@ -14525,12 +14292,15 @@ class GroupedInvoiceListView(LoginRequiredMixin, ListView):
             'total_amount': 'total_amount',
             'balance_due': 'balance_due',
         }
-        if sort_by == 'invoice_number':
-            queryset = _annotate_invoice_number_sort(queryset, 'invoice_number')
-            if order == 'desc':
-                queryset = queryset.order_by('-invoice_number_sort', '-invoice_number')
-            else:
-                queryset = queryset.order_by('invoice_number_sort', 'invoice_number')
+        keyset_field = self.keyset_sort_keys.get(sort_by)
+        if keyset_field:
+            prefix = '-' if order == 'desc' else ''
+            ordering = f'{prefix}{keyset_field}'
+            if keyset_field in self.keyset_nullable_keys:
+                # Undated invoices sort as the oldest, as on the keyset pages.
+                column = F(keyset_field)
+                ordering = column.desc(nulls_last=True) if order == 'desc' else column.asc(nulls_first=True)
+            queryset = queryset.order_by(ordering, f'{prefix}pk')
         else:
             sort_field = sort_map.get(sort_by)
             if sort_field:
@@ -14544,6 +14314,67 @@ class GroupedInvoiceListView(LoginRequiredMixin, ListView):
         self._groupedinvoice_queryset = queryset
         return self._groupedinvoice_queryset
 
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        return CachedCountPaginator(
+            queryset,
+            per_page,
+            orphans=orphans,
+            allow_empty_first_page=allow_empty_first_page,
+            namespace=self.count_namespace,
+            tenant_id=self.request.user.pk,
+            **kwargs,
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        """
+        Keyset-paginate the indexed sorts; numbered ``?page=N`` links and the
+        other sorts fall back to OFFSET pages with a cached count.
+        """
+        sort_by, order = self._get_sorting()
+        keyset_field = self.keyset_sort_keys.get(sort_by)
+        if getattr(self, '_search_ranked', False):
+            keyset_field = None
+        page_param = self.request.GET.get(self.page_kwarg)
+        if not keyset_field or page_param not in (None, '', '1', 'last'):
+            self._keyset_pagination = False
+            return super().paginate_queryset(queryset, page_size)
+
+        descending = order == 'desc'
+        paginator = KeysetPaginator(
+            queryset,
+            page_size,
+            [(keyset_field, descending), ('pk', descending)],
+            signature=f'{self.count_namespace}:{sort_by}:{order}',
+            namespace=self.count_namespace,
+            tenant_id=self.request.user.pk,
+            nullable=keyset_field in self.keyset_nullable_keys,
+        )
+        page = paginator.page(
+            after=self.request.GET.get('after'),
+            before=self.request.GET.get('before'),
+            last=page_param == 'last',
+        )
+        self._keyset_pagination = True
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def _page_links(self, page_obj, query_string):
+        base = f'?{query_string}&' if query_string else '?'
+        if page_obj is None:
+            return {}
+        if getattr(self, '_keyset_pagination', False):
+            return {
+                'first': base + 'page=1',
+                'previous': base + f'before={page_obj.previous_cursor}' if page_obj.has_previous() else None,
+                'next': base + f'after={page_obj.next_cursor}' if page_obj.has_next() else None,
+                'last': base + 'page=last',
+            }
+        return {
+            'first': base + 'page=1',
+            'previous': base + f'page={page_obj.previous_page_number()}' if page_obj.has_previous() else None,
+            'next': base + f'page={page_obj.next_page_number()}' if page_obj.has_next() else None,
+            'last': base + f'page={page_obj.paginator.num_pages}',
+        }
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         # IMPORTANT: The summary bars should always reflect the whole business snapshot,
@@ -14560,32 +14391,8 @@ class GroupedInvoiceListView(LoginRequiredMixin, ListView):
         if end_date:
             base_qs = base_qs.filter(date__isnull=False, date__lte=end_date)
 
-        invoice_paid_subquery = (
-            Payment.objects.filter(invoice=OuterRef('pk'))
-            .values('invoice')
-            .annotate(
-                total=Coalesce(
-                    Sum('amount'),
-                    Value(Decimal('0.00')),
-                    output_field=DecimalField(max_digits=10, decimal_places=2),
-                )
-            )
-            .values('total')[:1]
-        )
         def annotate_with_payments(qs):
-            return _annotate_invoice_credit_totals(
-                qs.annotate(
-                    total_paid=Coalesce(
-                        Subquery(invoice_paid_subquery),
-                        Value(Decimal('0.00')),
-                        output_field=DecimalField(max_digits=10, decimal_places=2),
-                    ),
-                )
-            ).annotate(
-                balance_due=ExpressionWrapper(
-                    F('total_amount') - F('total_paid') - F('credit_total'),
-                    output_field=DecimalField(max_digits=10, decimal_places=2),
-                ),
+            return receivables.annotate_receivables(qs).annotate(
                 total_settled=ExpressionWrapper(
                     F('total_paid'),
                     output_field=DecimalField(max_digits=10, decimal_places=2),
@@ -14690,11 +14497,14 @@ class GroupedInvoiceListView(LoginRequiredMixin, ListView):
         context['selected_end_date'] = end_date
         params = self.request.GET.copy()
         params.pop('page', None)
+        params.pop('after', None)
+        params.pop('before', None)
         sort_params = params.copy()
         sort_params.pop('sort_by', None)
         sort_params.pop('order', None)
         context['query_string'] = params.urlencode()
         context['sort_query_string'] = sort_params.urlencode()
+        context['page_links'] = self._page_links(context.get('page_obj'), context['query_string'])
         context['payment_methods'] = PAYMENT_METHOD_OPTIONS
 
         def format_dt(value):
@@ -14782,9 +14592,14 @@ class GroupedEstimateListView(LoginRequiredMixin, ListView):
         sort_by = self.request.GET.get('sort_by')
         order = self.request.GET.get('order', 'asc')
         user = self.request.user
+        allowed_sort_fields = ['estimate_number', 'date', 'bill_to', 'vin_no', 'unit_no', 'total_amount']
 
         queryset = GroupedEstimate.objects.filter(user=user)
-        if query:
+        if query and search_index.is_enabled():
+            queryset = search_index.search(queryset, search_index.KIND_ESTIMATE, query, user_id=user.pk)
+            if sort_by not in allowed_sort_fields:
+                return search_index.order_by_rank(queryset)
+        elif query:
             filters = (
                 Q(estimate_number__icontains=query) |
                 Q(bill_to__icontains=query) |
@@ -14796,7 +14611,6 @@ class GroupedEstimateListView(LoginRequiredMixin, ListView):
             )
             queryset = queryset.filter(filters)
 
-        allowed_sort_fields = ['estimate_number', 'date', 'bill_to', 'vin_no', 'unit_no', 'total_amount']
         if sort_by in allowed_sort_fields:
             if order == 'desc':
                 queryset = queryset.order_by('-' + sort_by)
@@ -15038,9 +14852,10 @@ def generate_payment_link_view(request, invoice_id):
                 {'message': 'No valid Clover connection found.'},
             )
 
-    # Recalculate total amount and trigger payment link update.
+    # Recalculate total amount and build the link now; the user is waiting for it.
     invoice.recalculate_total_amount()
-    invoice.save()  # Model's save() will trigger create_online_payment_link if needed.
+    invoice.save()  # Model's save() queues the payment link if needed.
+    payment_links.build_now(invoice)
 
     checkout_link = invoice.payment_link
     if checkout_link:
@@ -15155,23 +14970,10 @@ class OverdueInvoiceListView(LoginRequiredMixin, ListView):
         qs = PendingInvoice.objects.select_related('grouped_invoice', 'grouped_invoice__customer').filter(
             is_paid=False,
             grouped_invoice__user=user,
-            grouped_invoice__date__lt=(today - timedelta(days=term_days))
-        ).annotate(
-            total_paid=Coalesce(
-                Sum('grouped_invoice__payments__amount'),
-                Value(Decimal('0.00')),
-                output_field=DecimalField(max_digits=10, decimal_places=2)
-            )
+            grouped_invoice__date__lt=(today - timedelta(days=term_days)),
+            grouped_invoice__amount_due__gt=0,
         )
-        qs = _annotate_invoice_credit_totals(
-            qs,
-            invoice_field='grouped_invoice_id',
-        ).annotate(
-            balance_due=ExpressionWrapper(
-                F('grouped_invoice__total_amount') - F('total_paid') - F('credit_total'),
-                output_field=DecimalField(max_digits=10, decimal_places=2)
-            )
-        ).filter(balance_due__gt=0)
+        qs = receivables.annotate_receivables(qs, invoice_path='grouped_invoice')
 
         if start_date:
             qs = qs.filter(grouped_invoice__date__isnull=False, grouped_invoice__date__gte=start_date)
@@ -15236,37 +15038,13 @@ class OverdueInvoiceListView(LoginRequiredMixin, ListView):
 
         overdue_filter = {'date__lt': today - timedelta(days=term_days)}
 
-        invoice_paid_subquery = (
-            Payment.objects.filter(invoice=OuterRef('pk'))
-            .values('invoice')
-            .annotate(
-                total=Coalesce(
-                    Sum('amount'),
-                    Value(Decimal('0.00')),
-                    output_field=DecimalField(max_digits=10, decimal_places=2),
-                )
-            )
-            .values('total')[:1]
+        invoices = GroupedInvoice.objects.filter(
+            user=user,
+            customer__isnull=False,
+            date__isnull=False,
+            amount_due__gt=Decimal('0.00'),
+            **overdue_filter,
         )
-        invoices = _annotate_invoice_credit_totals(
-            GroupedInvoice.objects.filter(
-                user=user,
-                customer__isnull=False,
-                date__isnull=False,
-                **overdue_filter,
-            ).annotate(
-                total_paid=Coalesce(
-                    Subquery(invoice_paid_subquery),
-                    Value(Decimal('0.00')),
-                    output_field=DecimalField(max_digits=10, decimal_places=2),
-                ),
-            )
-        ).annotate(
-            balance_due=ExpressionWrapper(
-                F('total_amount') - F('total_paid') - F('credit_total'),
-                output_field=DecimalField(max_digits=10, decimal_places=2),
-            ),
-        ).filter(balance_due__gt=Decimal('0.00'))
 
         if start_date:
             invoices = invoices.filter(date__gte=start_date)
@@ -15288,8 +15066,8 @@ class OverdueInvoiceListView(LoginRequiredMixin, ListView):
 
         rows = invoices.values('customer_id', 'customer__name').annotate(
             total_amount=Coalesce(Sum('total_amount'), Value(Decimal('0.00')), output_field=DecimalField(max_digits=10, decimal_places=2)),
-            total_paid=Coalesce(Sum('total_paid'), Value(Decimal('0.00')), output_field=DecimalField(max_digits=10, decimal_places=2)),
-            balance_due=Coalesce(Sum('balance_due'), Value(Decimal('0.00')), output_field=DecimalField(max_digits=10, decimal_places=2)),
+            total_paid=Coalesce(Sum('amount_paid'), Value(Decimal('0.00')), output_field=DecimalField(max_digits=10, decimal_places=2)),
+            balance_due=Coalesce(Sum('amount_due'), Value(Decimal('0.00')), output_field=DecimalField(max_digits=10, decimal_places=2)),
             last_statement=Subquery(reminder_last_sent, output_field=DateTimeField()),
             reminder_count=Coalesce(Subquery(reminder_count, output_field=IntegerField()), Value(0)),
         )
@@ -15312,7 +15090,7 @@ class OverdueInvoiceListView(LoginRequiredMixin, ListView):
             rows = rows.order_by('-balance_due', 'customer__name')
 
         total_overdue = invoices.aggregate(
-            total=Coalesce(Sum('balance_due'), Value(Decimal('0.00')), output_field=DecimalField(max_digits=10, decimal_places=2))
+            total=Coalesce(Sum('amount_due'), Value(Decimal('0.00')), output_field=DecimalField(max_digits=10, decimal_places=2))
         )['total'] or Decimal('0.00')
         self._overdue_customer_summary = {
             'total_overdue': total_overdue,
@@ -15455,11 +15233,7 @@ def edit_dailylog(request, pk):
                         grouped_invoice.bill_to_address = grouped_form.cleaned_data.get('bill_to_address', None)
 
                     grouped_invoice.save()
-                    formset.save()
-
-                    # Ensure inventory transactions are present for all items
-                    if documentType == 'invoice':
-                        grouped_invoice.ensure_inventory_transactions()
+                    grouped_invoice.save_lines(formset.save(commit=False), deleted=formset.deleted_objects)
 
                     # Update customer rate if needed and handle pending invoice logic
                     first_record = grouped_invoice.income_records.order_by('line_order', 'id').first()
@@ -16522,7 +16296,23 @@ def accountant_portal_dashboard(request):
     accountant_payroll_access = business_profile.accountant_access_level in ("full", "read_only")
     accountant_can_edit_payroll = business_profile.accountant_access_level == "full"
 
+    customer_aging = aging.customer_totals([business_user.pk])
+    aging_customer_names = dict(
+        Customer.objects.filter(pk__in=list(customer_aging)).values_list('id', 'name')
+    )
+    aging_customers = sorted(
+        (
+            dict(row, customer_name=aging_customer_names.get(customer_id, ''))
+            for customer_id, row in customer_aging.items()
+            if row['overdue_total'] > 0
+        ),
+        key=lambda row: (-row['overdue_total'], row['customer_name']),
+    )
+
     context.update({
+        'receivables_aging': aging.business_summary([business_user.pk]),
+        'receivables_aging_customers': aging_customers[:10],
+        'receivables_aging_trend': aging.trend([business_user.pk], days=90),
         'business_profile': business_profile,
         'business_user': business_user,
         'accountant_user': request.user,
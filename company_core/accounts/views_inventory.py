@@ -2,11 +2,11 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponseBadRequest, HttpResponse
+from django.http import FileResponse, Http404, JsonResponse, HttpResponseBadRequest, HttpResponse
 from django.template.loader import render_to_string
 from django.db import transaction
-from django.db.models import Q, F, Sum, ExpressionWrapper, DecimalField, Max
-from django.db.models.functions import Coalesce, TruncDate
+from django.db.models import Q, F, Sum, ExpressionWrapper, DecimalField
+from django.db.models.functions import Coalesce
 from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator
 from django.urls import reverse  # for building URL for redirect
@@ -14,17 +14,16 @@ from django.utils import timezone
 from django.views.decorators.http import require_POST
 from django.conf import settings
 from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
-from datetime import timedelta, datetime, date
+from datetime import timedelta, datetime
+from collections import defaultdict
 import json
 import qrcode
 import os
 import textwrap
 import re
-from io import BytesIO
+from functools import lru_cache
 from PIL import Image, ImageDraw, ImageFont
-from openpyxl import Workbook, load_workbook
-from openpyxl.utils import get_column_letter
-from openpyxl.worksheet.datavalidation import DataValidation
+from openpyxl import load_workbook
 
 from .models import (
     ActivityLog,
@@ -37,6 +36,8 @@ from .models import (
     Product,
     ProductAlternateSku,
     ProductAttributeValue,
+    ProductDailyMovement,
+    ProductImportJob,
     ProductStock,
     InventoryTransaction,
     InventoryLocation,
@@ -82,44 +83,10 @@ from .forms import (
     InventoryTransactionForm,
     InventoryLocationForm,
 )
-from .excel_formatting import apply_template_styling
-
-
-PRODUCT_TEMPLATE_HEADERS = [
-    "SKU",
-    "OEM Part Number",
-    "Barcode",
-    "Alternate SKUs",
-    "Name",
-    "Description",
-    "Fitment Notes",
-    "Category",
-    "Supplier",
-    "Brand",
-    "Model",
-    "VIN",
-    "Item Type",
-    "Cost Price",
-    "Sale Price",
-    "Promotion Price",
-    "Margin",
-    "Quantity",
-    "Reorder Level",
-    "Max Stock Level",
-    "Location",
-    "Warranty Expiry Date",
-    "Warranty Length (Days)",
-    "Show on Storefront",
-    "Featured",
-]
-
-OPTIONAL_PRODUCT_TEMPLATE_HEADERS = {
-    "OEM Part Number",
-    "Barcode",
-    "Alternate SKUs",
-    "Fitment Notes",
-    "Max Stock Level",
-}
+from .activity import get_current_actor
+from .excel_export import ITERATOR_CHUNK_SIZE, batched, template_response, unique_names
+from . import product_import, replenishment, stock_movements, supplier_scorecards
+from .product_import import PRODUCT_TEMPLATE_HEADERS
 
 
 SUPPLIER_TEMPLATE_HEADERS = [
@@ -181,6 +148,9 @@ LOCATION_TEMPLATE_HEADERS = [
 ]
 
 
+ACTIVE_STATES = ["Active", "Inactive"]
+
+
 def _is_ajax(request):
     return request.headers.get("x-requested-with") == "XMLHttpRequest"
 
@@ -218,15 +188,15 @@ def _get_inventory_transaction_user_ids(request):
     return request._inventory_transaction_user_ids
 
 
-def _transaction_scope_filter(user_ids):
-    return Q(user__in=user_ids) | Q(user__isnull=True, product__user__in=user_ids)
+def _sorted_lookup_rows(queryset):
+    """Template rows for ``(name, description, sort_order, is_active)`` projections."""
 
+    for name, description, sort_order, is_active in queryset.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+        yield [name or "", description or "", sort_order, "Active" if is_active else "Inactive"]
 
-def _product_transaction_scope_filter(user_ids):
-    return Q(transactions__user__in=user_ids) | Q(
-        transactions__user__isnull=True,
-        transactions__product__user__in=user_ids,
-    )
+
+def _transaction_scope_filter(user_ids):
+    return Q(user__in=user_ids) | Q(user__isnull=True, product__user__in=user_ids)
 
 
 def _safe_int(value, default=0, *, minimum=None):
@@ -290,147 +260,6 @@ def _calculate_margin_percent(cost_price, sale_price):
     return ((sale - cost) / cost * Decimal("100")).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
 
 
-def _average_daily_usage(product, transaction_scope, *, lookback_days=60):
-    lookback_days = max(int(lookback_days or 60), 1)
-    start_date = timezone.now() - timedelta(days=lookback_days)
-    sold_qty = (
-        product.transactions.filter(
-            transaction_scope,
-            transaction_type="OUT",
-            transaction_date__gte=start_date,
-        ).aggregate(total=Sum("quantity")).get("total")
-        or 0
-    )
-    avg_usage = Decimal(sold_qty) / Decimal(lookback_days)
-    return sold_qty, avg_usage
-
-
-def _recommended_reorder_for_product(product, *, transaction_scope, rule=None, lookback_days=60):
-    stock_qty = int(getattr(product, "quantity_in_stock", 0) or 0)
-    reorder_level = int(getattr(product, "reorder_level", 0) or 0)
-    max_stock_level = int(getattr(product, "max_stock_level", 0) or 0)
-    sold_qty, avg_usage = _average_daily_usage(product, transaction_scope, lookback_days=lookback_days)
-
-    if rule:
-        recommendation = rule.calculate_recommended_quantity(
-            current_stock=stock_qty,
-            avg_daily_usage=avg_usage,
-            reorder_level=reorder_level,
-            max_stock_level=max_stock_level,
-        )
-    else:
-        target_stock = max(max_stock_level, reorder_level)
-        recommendation = {
-            "recommended_qty": max(target_stock - stock_qty, 0),
-            "target_stock": target_stock,
-            "projected_demand": Decimal("0.00"),
-            "days_covered": 0,
-        }
-
-    recommendation["sold_qty"] = sold_qty
-    recommendation["avg_daily_usage"] = avg_usage.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-    recommendation["rule_applied"] = bool(rule)
-    return recommendation
-
-
-def _build_supplier_scorecards(*, business_user, since_date=None, period_days=90):
-    if since_date is None:
-        since_date = timezone.now() - timedelta(days=period_days)
-
-    purchase_orders = (
-        PurchaseOrder.objects.filter(user=business_user, created_at__gte=since_date, supplier__isnull=False)
-        .select_related("supplier")
-        .prefetch_related("items")
-    )
-
-    supplier_rows = {}
-    for po in purchase_orders:
-        supplier_id = po.supplier_id
-        if supplier_id not in supplier_rows:
-            supplier_rows[supplier_id] = {
-                "supplier": po.supplier,
-                "po_count": 0,
-                "on_time_hits": 0,
-                "on_time_checks": 0,
-                "qty_ordered": 0,
-                "qty_received": 0,
-                "lead_time_total": Decimal("0.00"),
-                "lead_time_count": 0,
-            }
-        row = supplier_rows[supplier_id]
-        row["po_count"] += 1
-
-        qty_ordered = sum((item.quantity_ordered or 0) for item in po.items.all())
-        qty_received = sum((item.quantity_received or 0) for item in po.items.all())
-        row["qty_ordered"] += qty_ordered
-        row["qty_received"] += qty_received
-
-        if po.expected_delivery_date and po.status in {"partially_received", "received"}:
-            row["on_time_checks"] += 1
-            received_date = po.updated_at.date()
-            if received_date <= po.expected_delivery_date:
-                row["on_time_hits"] += 1
-
-        if po.status in {"partially_received", "received"}:
-            lead_days = max((po.updated_at.date() - po.created_at.date()).days, 0)
-            row["lead_time_total"] += Decimal(lead_days)
-            row["lead_time_count"] += 1
-
-    rma_counts = (
-        ProductRMA.objects.filter(
-            user=business_user,
-            supplier__isnull=False,
-            opened_at__gte=since_date,
-        )
-        .values("supplier_id")
-        .annotate(total=Sum("quantity"))
-    )
-    rma_map = {row["supplier_id"]: row["total"] or 0 for row in rma_counts}
-
-    scorecards = []
-    for supplier_id, row in supplier_rows.items():
-        qty_ordered = row["qty_ordered"] or 0
-        qty_received = row["qty_received"] or 0
-
-        on_time_rate = Decimal("100.00")
-        if row["on_time_checks"]:
-            on_time_rate = (Decimal(row["on_time_hits"]) / Decimal(row["on_time_checks"])) * Decimal("100")
-
-        fill_rate = Decimal("0.00")
-        if qty_ordered:
-            fill_rate = (Decimal(qty_received) / Decimal(qty_ordered)) * Decimal("100")
-
-        avg_lead_time = Decimal("0.00")
-        if row["lead_time_count"]:
-            avg_lead_time = row["lead_time_total"] / Decimal(row["lead_time_count"])
-
-        rma_rate = Decimal("0.00")
-        supplier_rma_qty = Decimal(rma_map.get(supplier_id, 0))
-        if qty_ordered:
-            rma_rate = (supplier_rma_qty / Decimal(qty_ordered)) * Decimal("100")
-
-        weighted_score = (
-            (on_time_rate * Decimal("0.40"))
-            + (fill_rate * Decimal("0.40"))
-            + (max(Decimal("0.00"), Decimal("100.00") - (rma_rate * Decimal("2.00"))) * Decimal("0.20"))
-        )
-
-        scorecards.append(
-            {
-                "supplier": row["supplier"],
-                "po_count": row["po_count"],
-                "on_time_rate": on_time_rate.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP),
-                "fill_rate": fill_rate.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP),
-                "avg_lead_time_days": avg_lead_time.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP),
-                "rma_rate": rma_rate.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP),
-                "weighted_score": weighted_score.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP),
-            }
-        )
-
-    scorecards.sort(key=lambda entry: (-entry["weighted_score"], entry["supplier"].name if entry["supplier"] else ""))
-    return scorecards
-
-
 def _sync_alternate_skus(product, sku_list):
     if product is None or sku_list is None:
         return
@@ -472,28 +301,6 @@ def _sync_alternate_skus(product, sku_list):
         )
 
 
-def _parse_alternate_sku_input(value):
-    if value in (None, ""):
-        return []
-    if isinstance(value, (list, tuple)):
-        raw_values = value
-    else:
-        raw_values = re.split(r"[\n,;]+", str(value))
-
-    parsed = []
-    seen = set()
-    for raw in raw_values:
-        normalized = (str(raw) if raw is not None else "").strip()
-        if not normalized:
-            continue
-        key = normalized.casefold()
-        if key in seen:
-            continue
-        seen.add(key)
-        parsed.append(normalized)
-    return parsed
-
-
 def _sync_product_attributes_from_payload(product, user, payload):
     if not product or not product.pk or not payload:
         return
@@ -662,7 +469,6 @@ def inventory_hub(request):
     now = timezone.now()
     window_days = 30
     window_start_date = now.date() - timedelta(days=window_days - 1)
-    recent_period_start = now - timedelta(days=window_days)
 
     products = (
         Product.objects.filter(user__in=product_user_ids)
@@ -693,16 +499,7 @@ def inventory_hub(request):
 
     top_selling = (
         products.annotate(
-            qty_sold=Sum(
-                "transactions__quantity",
-                filter=(
-                    Q(
-                        transactions__transaction_type="OUT",
-                        transactions__transaction_date__gte=recent_period_start,
-                    )
-                    & _product_transaction_scope_filter(transaction_user_ids)
-                ),
-            )
+            qty_sold=stock_movements.sold_since(transaction_user_ids, stock_movements.window_start(window_days))
         )
         .filter(qty_sold__gt=0)
         .order_by("-qty_sold", "name")
@@ -730,16 +527,13 @@ def inventory_hub(request):
         )
 
     movement_rows = (
-        transactions.filter(transaction_date__date__gte=window_start_date)
-        .annotate(day=TruncDate("transaction_date"))
-        .values("day")
-        .annotate(
-            stock_in=Sum("quantity", filter=Q(transaction_type="IN")),
-            stock_out=Sum("quantity", filter=Q(transaction_type="OUT")),
-        )
+        ProductDailyMovement.objects.filter(user_id__in=transaction_user_ids, date__gte=window_start_date)
+        .values("date")
+        .annotate(stock_in=Sum("qty_in"), stock_out=Sum("qty_out"))
+        .order_by()
     )
     movement_lookup = {
-        row["day"]: {
+        row["date"]: {
             "stock_in": row["stock_in"] or 0,
             "stock_out": row["stock_out"] or 0,
         }
@@ -980,6 +774,7 @@ def inventory_products_view(request):
             "total_stock_value": stock_totals.get("total_stock_value") or Decimal("0.00"),
             "stock_user_ids": stock_user_ids,
             "querystring": querystring,
+            "latest_import_job": ProductImportJob.objects.filter(user=request.user).first(),
         },
     )
 
@@ -2738,178 +2533,151 @@ def export_products_template(request):
     """Download an Excel template populated with the user's current products."""
 
     product_user_ids = _get_inventory_user_ids(request)
-    workbook = Workbook()
-    worksheet = workbook.active
-    worksheet.title = "Products"
-
-    instruction_text = (
-        "Instructions: Enter warranty expiry dates using the YYYY-MM-DD format. "
-        "Leave 'Warranty Length (Days)' blank so the system calculates remaining "
-        "warranty days automatically. Provide both cost and sale prices or include "
-        "the margin with one of the prices so missing values can be derived. Use "
-        "Item Type values of Inventory or Non-inventory. Use Yes/No for Show on "
-        "Storefront and Featured. Use commas to separate Alternate SKUs."
-    )
-    instruction_row = [instruction_text] + [""] * (len(PRODUCT_TEMPLATE_HEADERS) - 1)
-    worksheet.append(instruction_row)
-    worksheet.merge_cells(
-        start_row=1,
-        start_column=1,
-        end_row=1,
-        end_column=len(PRODUCT_TEMPLATE_HEADERS),
-    )
-    worksheet.append(PRODUCT_TEMPLATE_HEADERS)
-    worksheet.freeze_panes = "A3"
-
     item_type_labels = dict(Product._meta.get_field("item_type").choices)
-    products = (
-        annotate_products_with_stock(
-            Product.objects.filter(user__in=product_user_ids).order_by("name"),
-            request.user,
-        )
-        .prefetch_related("alternate_skus")
+    products = annotate_products_with_stock(
+        Product.objects.filter(user__in=product_user_ids).order_by("name"),
+        request.user,
+    ).values_list(
+        "id",
+        "sku",
+        "oem_part_number",
+        "barcode_value",
+        "name",
+        "description",
+        "fitment_notes",
+        "category__name",
+        "supplier__name",
+        "brand__name",
+        "vehicle_model__name",
+        "vin_number__vin",
+        "item_type",
+        "cost_price",
+        "sale_price",
+        "promotion_price",
+        "margin",
+        "stock_quantity",
+        "stock_reorder",
+        "stock_max",
+        "location",
+        "warranty_expiry_date",
+        "warranty_length",
+        "is_published_to_store",
+        "is_featured",
     )
-    for product in products:
-        quantity_value = product.stock_quantity
-        reorder_value = product.stock_reorder
-        max_value = product.stock_max
-        if product.margin is not None:
-            margin_value = str(product.margin)
-        elif product.cost_price is not None and product.sale_price is not None:
-            margin_value = str(product.sale_price - product.cost_price)
-        else:
-            margin_value = ""
-        alternate_skus_value = ", ".join(
-            product.alternate_skus.order_by("kind", "sku").values_list("sku", flat=True)
-        )
-        item_type_label = item_type_labels.get(product.item_type, product.item_type)
-        worksheet.append(
-            [
-                product.sku or "",
-                product.oem_part_number or "",
-                product.barcode_value or "",
-                alternate_skus_value,
-                product.name or "",
-                product.description or "",
-                product.fitment_notes or "",
-                product.category.name if product.category else "",
-                product.supplier.name if product.supplier else "",
-                product.brand.name if product.brand else "",
-                product.vehicle_model.name if product.vehicle_model else "",
-                product.vin_number.vin if product.vin_number else "",
-                item_type_label or "",
-                str(product.cost_price) if product.cost_price is not None else "",
-                str(product.sale_price) if product.sale_price is not None else "",
-                str(product.promotion_price) if product.promotion_price is not None else "",
-                margin_value,
-                quantity_value,
-                reorder_value,
-                max_value,
-                product.location or "",
-                product.warranty_expiry_date.isoformat()
-                if product.warranty_expiry_date
-                else "",
-                product.warranty_length or "",
-                "Yes" if product.is_published_to_store else "No",
-                "Yes" if product.is_featured else "No",
-            ]
-        )
 
-    categories = list(
-        dict.fromkeys(
-            Category.objects.filter(user__in=product_user_ids)
-            .order_by("name")
-            .values_list("name", flat=True)
-        )
+    def _rows():
+        for batch in batched(products):
+            alternate_skus = defaultdict(list)
+            for product_id, sku in (
+                ProductAlternateSku.objects.filter(product_id__in=[row[0] for row in batch])
+                .order_by("kind", "sku")
+                .values_list("product_id", "sku")
+            ):
+                alternate_skus[product_id].append(sku)
+
+            for (
+                product_id, sku, oem_part_number, barcode_value, name, description, fitment_notes,
+                category, supplier, brand, vehicle_model, vin, item_type,
+                cost_price, sale_price, promotion_price, margin,
+                quantity, reorder_level, max_stock_level, location,
+                warranty_expiry_date, warranty_length, is_published_to_store, is_featured,
+            ) in batch:
+                if margin is not None:
+                    margin_value = str(margin)
+                elif cost_price is not None and sale_price is not None:
+                    margin_value = str(sale_price - cost_price)
+                else:
+                    margin_value = ""
+                yield [
+                    sku or "",
+                    oem_part_number or "",
+                    barcode_value or "",
+                    ", ".join(alternate_skus.get(product_id, ())),
+                    name or "",
+                    description or "",
+                    fitment_notes or "",
+                    category or "",
+                    supplier or "",
+                    brand or "",
+                    vehicle_model or "",
+                    vin or "",
+                    item_type_labels.get(item_type, item_type) or "",
+                    str(cost_price) if cost_price is not None else "",
+                    str(sale_price) if sale_price is not None else "",
+                    str(promotion_price) if promotion_price is not None else "",
+                    margin_value,
+                    quantity,
+                    reorder_level,
+                    max_stock_level,
+                    location or "",
+                    warranty_expiry_date.isoformat() if warranty_expiry_date else "",
+                    warranty_length or "",
+                    "Yes" if is_published_to_store else "No",
+                    "Yes" if is_featured else "No",
+                ]
+
+    categories = unique_names(
+        Category.objects.filter(user__in=product_user_ids).order_by("name").values_list("name", flat=True)
     )
-    suppliers = list(
-        dict.fromkeys(
-            Supplier.objects.filter(user__in=product_user_ids)
-            .order_by("name")
-            .values_list("name", flat=True)
-        )
+    suppliers = unique_names(
+        Supplier.objects.filter(user__in=product_user_ids).order_by("name").values_list("name", flat=True)
     )
-    brands = list(
-        dict.fromkeys(
-            ProductBrand.objects.filter(user__in=product_user_ids)
-            .order_by("sort_order", "name")
-            .values_list("name", flat=True)
-        )
+    brands = unique_names(
+        ProductBrand.objects.filter(user__in=product_user_ids)
+        .order_by("sort_order", "name")
+        .values_list("name", flat=True)
     )
-    models = list(
-        dict.fromkeys(
-            ProductModel.objects.filter(user__in=product_user_ids)
-            .order_by("sort_order", "name")
-            .values_list("name", flat=True)
-        )
+    models = unique_names(
+        ProductModel.objects.filter(user__in=product_user_ids)
+        .order_by("sort_order", "name")
+        .values_list("name", flat=True)
     )
-    vins = list(
-        dict.fromkeys(
-            ProductVin.objects.filter(user__in=product_user_ids)
-            .order_by("sort_order", "vin")
-            .values_list("vin", flat=True)
-        )
+    vins = unique_names(
+        ProductVin.objects.filter(user__in=product_user_ids)
+        .order_by("sort_order", "vin")
+        .values_list("vin", flat=True)
+    )
+    location_sources = list(
+        InventoryLocation.objects.filter(user__in=product_user_ids)
+        .order_by("name")
+        .values_list("name", flat=True)
     )
-
     product_locations = (
         Product.objects.filter(user__in=product_user_ids)
         .exclude(location__isnull=True)
         .exclude(location__exact="")
+        .order_by("location")
         .values_list("location", flat=True)
+        .distinct()
     )
-    location_sources = list(
-        InventoryLocation.objects.filter(user__in=product_user_ids)
-        .order_by("name")
-        .values_list("name", flat=True)
-    )
-    cleaned_product_locations = [loc.strip() for loc in product_locations if loc and loc.strip()]
-    locations = list(dict.fromkeys(location_sources + cleaned_product_locations))
+    locations = unique_names(location_sources + list(product_locations))
     item_types = [label for _value, label in Product._meta.get_field("item_type").choices]
     yes_no = ["Yes", "No"]
 
-    options_sheet = workbook.create_sheet(title="Options")
-    options_sheet.sheet_state = "hidden"
-
-    def _write_option_column(column_index, header, values):
-        options_sheet.cell(row=1, column=column_index, value=header)
-        for row_index, value in enumerate(values, start=2):
-            options_sheet.cell(row=row_index, column=column_index, value=value)
-        last_row = max(2, len(values) + 1)
-        column_letter = get_column_letter(column_index)
-        return f"=Options!${column_letter}$2:${column_letter}${last_row}"
-
-    category_formula = _write_option_column(1, "Categories", categories)
-    supplier_formula = _write_option_column(2, "Suppliers", suppliers)
-    location_formula = _write_option_column(3, "Locations", locations)
-    brand_formula = _write_option_column(4, "Brands", brands)
-    model_formula = _write_option_column(5, "Models", models)
-    vin_formula = _write_option_column(6, "VINs", vins)
-    item_type_formula = _write_option_column(7, "Item Types", item_types)
-    yes_no_formula = _write_option_column(8, "Yes/No", yes_no)
-
-    def _apply_validation(target_header, formula):
-        target_column_index = PRODUCT_TEMPLATE_HEADERS.index(target_header) + 1
-        target_column_letter = get_column_letter(target_column_index)
-        validation = DataValidation(type="list", formula1=formula, allow_blank=True)
-        worksheet.add_data_validation(validation)
-        validation.add(f"{target_column_letter}2:{target_column_letter}1048576")
-
-    _apply_validation("Category", category_formula)
-    _apply_validation("Supplier", supplier_formula)
-    _apply_validation("Location", location_formula)
-    _apply_validation("Brand", brand_formula)
-    _apply_validation("Model", model_formula)
-    _apply_validation("VIN", vin_formula)
-    _apply_validation("Item Type", item_type_formula)
-    _apply_validation("Show on Storefront", yes_no_formula)
-    _apply_validation("Featured", yes_no_formula)
-
-    apply_template_styling(
-        worksheet,
+    return template_response(
+        "products_template.xlsx",
+        title="Products",
         headers=PRODUCT_TEMPLATE_HEADERS,
-        header_row_index=2,
-        instruction_row_index=1,
-        column_width_overrides={
+        instruction=(
+            "Instructions: Enter warranty expiry dates using the YYYY-MM-DD format. "
+            "Leave 'Warranty Length (Days)' blank so the system calculates remaining "
+            "warranty days automatically. Provide both cost and sale prices or include "
+            "the margin with one of the prices so missing values can be derived. Use "
+            "Item Type values of Inventory or Non-inventory. Use Yes/No for Show on "
+            "Storefront and Featured. Use commas to separate Alternate SKUs."
+        ),
+        rows=_rows(),
+        dropdowns=[
+            ("Categories", categories, ["Category"]),
+            ("Suppliers", suppliers, ["Supplier"]),
+            ("Locations", locations, ["Location"]),
+            ("Brands", brands, ["Brand"]),
+            ("Models", models, ["Model"]),
+            ("VINs", vins, ["VIN"]),
+            ("Item Types", item_types, ["Item Type"]),
+            ("Yes/No", yes_no, ["Show on Storefront", "Featured"]),
+        ],
+        column_widths={
             "SKU": 18,
             "OEM Part Number": 20,
             "Barcode": 22,
@@ -2938,46 +2706,26 @@ def export_products_template(request):
         },
     )
 
-    output = BytesIO()
-    workbook.save(output)
-    output.seek(0)
-
-    response = HttpResponse(
-        output.getvalue(),
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    )
-    response["Content-Disposition"] = 'attachment; filename="products_template.xlsx"'
-    return response
-
 
 @login_required
 def export_suppliers_template(request):
     """Download an Excel template populated with the user's current suppliers."""
 
     product_user_ids = _get_inventory_user_ids(request)
-    workbook = Workbook()
-    worksheet = workbook.active
-    worksheet.title = "Suppliers"
-    worksheet.append(SUPPLIER_TEMPLATE_HEADERS)
-    worksheet.freeze_panes = "A2"
-
-    suppliers = Supplier.objects.filter(user__in=product_user_ids).order_by("name")
-    for supplier in suppliers:
-        worksheet.append(
-            [
-                supplier.name or "",
-                supplier.contact_person or "",
-                supplier.email or "",
-                supplier.phone_number or "",
-                supplier.address or "",
-            ]
-        )
-
-    apply_template_styling(
-        worksheet,
+    suppliers = (
+        Supplier.objects.filter(user__in=product_user_ids)
+        .order_by("name")
+        .values_list("name", "contact_person", "email", "phone_number", "address")
+    )
+    return template_response(
+        "suppliers_template.xlsx",
+        title="Suppliers",
         headers=SUPPLIER_TEMPLATE_HEADERS,
-        header_row_index=1,
-        column_width_overrides={
+        rows=(
+            [value or "" for value in supplier]
+            for supplier in suppliers.iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+        ),
+        column_widths={
             "Name": 32,
             "Contact Person": 28,
             "Email": 36,
@@ -2986,85 +2734,45 @@ def export_suppliers_template(request):
         },
     )
 
-    output = BytesIO()
-    workbook.save(output)
-    output.seek(0)
-
-    response = HttpResponse(
-        output.getvalue(),
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    )
-    response["Content-Disposition"] = 'attachment; filename="suppliers_template.xlsx"'
-    return response
-
 
 @login_required
 def export_categories_template(request):
     """Download an Excel template populated with the user's current categories."""
 
     product_user_ids = _get_inventory_user_ids(request)
-    workbook = Workbook()
-    worksheet = workbook.active
-    worksheet.title = "Categories"
-    worksheet.append(CATEGORY_TEMPLATE_HEADERS)
-    worksheet.freeze_panes = "A2"
-
     categories = Category.objects.filter(user__in=product_user_ids).order_by("sort_order", "name")
-    for category in categories:
-        worksheet.append([
-            category.name or "",
-            category.description or "",
-            category.group.name if category.group else "",
-            category.parent.name if category.parent else "",
-            category.sort_order,
-            "Active" if category.is_active else "Inactive",
-        ])
-
-    groups = list(
-        dict.fromkeys(
-            CategoryGroup.objects.filter(user__in=product_user_ids)
-            .order_by("sort_order", "name")
-            .values_list("name", flat=True)
-        )
+    rows = (
+        [
+            name or "",
+            description or "",
+            group or "",
+            parent or "",
+            sort_order,
+            "Active" if is_active else "Inactive",
+        ]
+        for name, description, group, parent, sort_order, is_active in categories.values_list(
+            "name", "description", "group__name", "parent__name", "sort_order", "is_active"
+        ).iterator(chunk_size=ITERATOR_CHUNK_SIZE)
     )
-    parent_categories = list(
-        dict.fromkeys(
-            categories.values_list("name", flat=True)
-        )
+
+    groups = unique_names(
+        CategoryGroup.objects.filter(user__in=product_user_ids)
+        .order_by("sort_order", "name")
+        .values_list("name", flat=True)
     )
-    active_states = ["Active", "Inactive"]
-
-    options_sheet = workbook.create_sheet(title="Options")
-    options_sheet.sheet_state = "hidden"
-
-    def _write_option_column(column_index, header, values):
-        options_sheet.cell(row=1, column=column_index, value=header)
-        for row_index, value in enumerate(values, start=2):
-            options_sheet.cell(row=row_index, column=column_index, value=value)
-        last_row = max(2, len(values) + 1)
-        column_letter = get_column_letter(column_index)
-        return f"=Options!${column_letter}$2:${column_letter}${last_row}"
-
-    group_formula = _write_option_column(1, "Groups", groups)
-    parent_formula = _write_option_column(2, "Parent Categories", parent_categories)
-    active_formula = _write_option_column(3, "Active", active_states)
-
-    def _apply_validation(target_header, formula):
-        target_column_index = CATEGORY_TEMPLATE_HEADERS.index(target_header) + 1
-        target_column_letter = get_column_letter(target_column_index)
-        validation = DataValidation(type="list", formula1=formula, allow_blank=True)
-        worksheet.add_data_validation(validation)
-        validation.add(f"{target_column_letter}2:{target_column_letter}1048576")
-
-    _apply_validation("Group", group_formula)
-    _apply_validation("Parent Category", parent_formula)
-    _apply_validation("Active", active_formula)
-
-    apply_template_styling(
-        worksheet,
+    parent_categories = unique_names(categories.values_list("name", flat=True))
+
+    return template_response(
+        "categories_template.xlsx",
+        title="Categories",
         headers=CATEGORY_TEMPLATE_HEADERS,
-        header_row_index=1,
-        column_width_overrides={
+        rows=rows,
+        dropdowns=[
+            ("Groups", groups, ["Group"]),
+            ("Parent Categories", parent_categories, ["Parent Category"]),
+            ("Active", ACTIVE_STATES, ["Active"]),
+        ],
+        column_widths={
             "Name": 32,
             "Description": 48,
             "Group": 24,
@@ -3074,66 +2782,24 @@ def export_categories_template(request):
         },
     )
 
-    output = BytesIO()
-    workbook.save(output)
-    output.seek(0)
-
-    response = HttpResponse(
-        output.getvalue(),
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    )
-    response["Content-Disposition"] = 'attachment; filename="categories_template.xlsx"'
-    return response
-
 
 @login_required
 def export_category_groups_template(request):
     """Download an Excel template populated with the user's current category groups."""
 
     product_user_ids = _get_inventory_user_ids(request)
-    workbook = Workbook()
-    worksheet = workbook.active
-    worksheet.title = "Category Groups"
-    worksheet.append(CATEGORY_GROUP_TEMPLATE_HEADERS)
-    worksheet.freeze_panes = "A2"
-
-    groups = CategoryGroup.objects.filter(user__in=product_user_ids).order_by("sort_order", "name")
-    for group in groups:
-        worksheet.append([
-            group.name or "",
-            group.description or "",
-            group.sort_order,
-            "Active" if group.is_active else "Inactive",
-        ])
-
-    active_states = ["Active", "Inactive"]
-    options_sheet = workbook.create_sheet(title="Options")
-    options_sheet.sheet_state = "hidden"
-
-    def _write_option_column(column_index, header, values):
-        options_sheet.cell(row=1, column=column_index, value=header)
-        for row_index, value in enumerate(values, start=2):
-            options_sheet.cell(row=row_index, column=column_index, value=value)
-        last_row = max(2, len(values) + 1)
-        column_letter = get_column_letter(column_index)
-        return f"=Options!${column_letter}$2:${column_letter}${last_row}"
-
-    active_formula = _write_option_column(1, "Active", active_states)
-
-    def _apply_validation(target_header, formula):
-        target_column_index = CATEGORY_GROUP_TEMPLATE_HEADERS.index(target_header) + 1
-        target_column_letter = get_column_letter(target_column_index)
-        validation = DataValidation(type="list", formula1=formula, allow_blank=True)
-        worksheet.add_data_validation(validation)
-        validation.add(f"{target_column_letter}2:{target_column_letter}1048576")
-
-    _apply_validation("Active", active_formula)
-
-    apply_template_styling(
-        worksheet,
+    groups = (
+        CategoryGroup.objects.filter(user__in=product_user_ids)
+        .order_by("sort_order", "name")
+        .values_list("name", "description", "sort_order", "is_active")
+    )
+    return template_response(
+        "category_groups_template.xlsx",
+        title="Category Groups",
         headers=CATEGORY_GROUP_TEMPLATE_HEADERS,
-        header_row_index=1,
-        column_width_overrides={
+        rows=_sorted_lookup_rows(groups),
+        dropdowns=[("Active", ACTIVE_STATES, ["Active"])],
+        column_widths={
             "Name": 32,
             "Description": 48,
             "Sort Order": 14,
@@ -3145,7 +2811,7 @@ def export_category_groups_template(request):
 @login_required
 def inventory_stock_orders_view(request):
     product_user_ids = _get_inventory_user_ids(request)
-    transaction_scope = _transaction_scope_filter(_get_inventory_transaction_user_ids(request))
+    transaction_user_ids = _get_inventory_transaction_user_ids(request)
     business_user = _get_inventory_business_user(request)
     products = (
         Product.objects.filter(user__in=product_user_ids, item_type="inventory")
@@ -3155,13 +2821,11 @@ def inventory_stock_orders_view(request):
     products = annotate_products_with_stock(products, request.user)
     low_stock_products = products.filter(stock_quantity__lt=F("stock_reorder"))
     low_stock_products = apply_stock_fields(list(low_stock_products))
-    rule_map = {
-        rule.product_id: rule
-        for rule in ReplenishmentRule.objects.filter(
-            user=business_user,
-            product_id__in=[product.id for product in low_stock_products],
-        )
-    }
+    planned = replenishment.plan(
+        low_stock_products,
+        business_user=business_user,
+        transaction_user_ids=transaction_user_ids,
+    )
 
     business_name = getattr(getattr(request.user, "profile", None), "company_name", None)
     if not business_name:
@@ -3193,7 +2857,7 @@ def inventory_stock_orders_view(request):
 
     supplier_groups = []
     supplier_lookup = {}
-    for product in low_stock_products:
+    for product, recommendation in planned:
         supplier = product.supplier
         supplier_key = supplier.id if supplier else "unassigned"
         group = supplier_lookup.get(supplier_key)
@@ -3216,12 +2880,6 @@ def inventory_stock_orders_view(request):
 
         reorder_level = product.reorder_level or 0
         max_stock_level = product.max_stock_level or 0
-        rule = rule_map.get(product.id)
-        recommendation = _recommended_reorder_for_product(
-            product,
-            transaction_scope=transaction_scope,
-            rule=rule,
-        )
         target_stock = recommendation["target_stock"]
         order_qty = recommendation["recommended_qty"]
         group["products"].append(
@@ -3257,66 +2915,24 @@ def inventory_stock_orders_view(request):
     }
     return render(request, "inventory/stock_orders.html", context)
 
-    output = BytesIO()
-    workbook.save(output)
-    output.seek(0)
-
-    response = HttpResponse(
-        output.getvalue(),
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    )
-    response["Content-Disposition"] = 'attachment; filename="category_groups_template.xlsx"'
-    return response
-
 
 @login_required
 def export_brands_template(request):
     """Download an Excel template populated with the user's current brands."""
 
     product_user_ids = _get_inventory_user_ids(request)
-    workbook = Workbook()
-    worksheet = workbook.active
-    worksheet.title = "Brands"
-    worksheet.append(BRAND_TEMPLATE_HEADERS)
-    worksheet.freeze_panes = "A2"
-
-    brands = ProductBrand.objects.filter(user__in=product_user_ids).order_by("sort_order", "name")
-    for brand in brands:
-        worksheet.append([
-            brand.name or "",
-            brand.description or "",
-            brand.sort_order,
-            "Active" if brand.is_active else "Inactive",
-        ])
-
-    active_states = ["Active", "Inactive"]
-    options_sheet = workbook.create_sheet(title="Options")
-    options_sheet.sheet_state = "hidden"
-
-    def _write_option_column(column_index, header, values):
-        options_sheet.cell(row=1, column=column_index, value=header)
-        for row_index, value in enumerate(values, start=2):
-            options_sheet.cell(row=row_index, column=column_index, value=value)
-        last_row = max(2, len(values) + 1)
-        column_letter = get_column_letter(column_index)
-        return f"=Options!${column_letter}$2:${column_letter}${last_row}"
-
-    active_formula = _write_option_column(1, "Active", active_states)
-
-    def _apply_validation(target_header, formula):
-        target_column_index = BRAND_TEMPLATE_HEADERS.index(target_header) + 1
-        target_column_letter = get_column_letter(target_column_index)
-        validation = DataValidation(type="list", formula1=formula, allow_blank=True)
-        worksheet.add_data_validation(validation)
-        validation.add(f"{target_column_letter}2:{target_column_letter}1048576")
-
-    _apply_validation("Active", active_formula)
-
-    apply_template_styling(
-        worksheet,
+    brands = (
+        ProductBrand.objects.filter(user__in=product_user_ids)
+        .order_by("sort_order", "name")
+        .values_list("name", "description", "sort_order", "is_active")
+    )
+    return template_response(
+        "brands_template.xlsx",
+        title="Brands",
         headers=BRAND_TEMPLATE_HEADERS,
-        header_row_index=1,
-        column_width_overrides={
+        rows=_sorted_lookup_rows(brands),
+        dropdowns=[("Active", ACTIVE_STATES, ["Active"])],
+        column_widths={
             "Name": 32,
             "Description": 48,
             "Sort Order": 14,
@@ -3324,82 +2940,49 @@ def export_brands_template(request):
         },
     )
 
-    output = BytesIO()
-    workbook.save(output)
-    output.seek(0)
-
-    response = HttpResponse(
-        output.getvalue(),
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    )
-    response["Content-Disposition"] = 'attachment; filename="brands_template.xlsx"'
-    return response
-
 
 @login_required
 def export_models_template(request):
     """Download an Excel template populated with the user's current models."""
 
     product_user_ids = _get_inventory_user_ids(request)
-    workbook = Workbook()
-    worksheet = workbook.active
-    worksheet.title = "Models"
-    worksheet.append(MODEL_TEMPLATE_HEADERS)
-    worksheet.freeze_panes = "A2"
-
     models = (
         ProductModel.objects.filter(user__in=product_user_ids)
-        .select_related("brand")
         .order_by("sort_order", "name")
+        .values_list(
+            "name", "brand__name", "description", "year_start", "year_end", "sort_order", "is_active"
+        )
     )
-    for model in models:
-        worksheet.append([
-            model.name or "",
-            model.brand.name if model.brand else "",
-            model.description or "",
-            model.year_start or "",
-            model.year_end or "",
-            model.sort_order,
-            "Active" if model.is_active else "Inactive",
-        ])
-
-    brand_names = list(
-        dict.fromkeys(
-            ProductBrand.objects.filter(user__in=product_user_ids)
-            .order_by("sort_order", "name")
-            .values_list("name", flat=True)
+    rows = (
+        [
+            name or "",
+            brand or "",
+            description or "",
+            year_start or "",
+            year_end or "",
+            sort_order,
+            "Active" if is_active else "Inactive",
+        ]
+        for name, brand, description, year_start, year_end, sort_order, is_active in models.iterator(
+            chunk_size=ITERATOR_CHUNK_SIZE
         )
     )
-    active_states = ["Active", "Inactive"]
-    options_sheet = workbook.create_sheet(title="Options")
-    options_sheet.sheet_state = "hidden"
-
-    def _write_option_column(column_index, header, values):
-        options_sheet.cell(row=1, column=column_index, value=header)
-        for row_index, value in enumerate(values, start=2):
-            options_sheet.cell(row=row_index, column=column_index, value=value)
-        last_row = max(2, len(values) + 1)
-        column_letter = get_column_letter(column_index)
-        return f"=Options!${column_letter}$2:${column_letter}${last_row}"
-
-    brand_formula = _write_option_column(1, "Brands", brand_names)
-    active_formula = _write_option_column(2, "Active", active_states)
-
-    def _apply_validation(target_header, formula):
-        target_column_index = MODEL_TEMPLATE_HEADERS.index(target_header) + 1
-        target_column_letter = get_column_letter(target_column_index)
-        validation = DataValidation(type="list", formula1=formula, allow_blank=True)
-        worksheet.add_data_validation(validation)
-        validation.add(f"{target_column_letter}2:{target_column_letter}1048576")
-
-    _apply_validation("Brand", brand_formula)
-    _apply_validation("Active", active_formula)
-
-    apply_template_styling(
-        worksheet,
+    brand_names = unique_names(
+        ProductBrand.objects.filter(user__in=product_user_ids)
+        .order_by("sort_order", "name")
+        .values_list("name", flat=True)
+    )
+
+    return template_response(
+        "models_template.xlsx",
+        title="Models",
         headers=MODEL_TEMPLATE_HEADERS,
-        header_row_index=1,
-        column_width_overrides={
+        rows=rows,
+        dropdowns=[
+            ("Brands", brand_names, ["Brand"]),
+            ("Active", ACTIVE_STATES, ["Active"]),
+        ],
+        column_widths={
             "Name": 28,
             "Brand": 24,
             "Description": 48,
@@ -3410,66 +2993,24 @@ def export_models_template(request):
         },
     )
 
-    output = BytesIO()
-    workbook.save(output)
-    output.seek(0)
-
-    response = HttpResponse(
-        output.getvalue(),
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    )
-    response["Content-Disposition"] = 'attachment; filename="models_template.xlsx"'
-    return response
-
 
 @login_required
 def export_vins_template(request):
     """Download an Excel template populated with the user's current VINs."""
 
     product_user_ids = _get_inventory_user_ids(request)
-    workbook = Workbook()
-    worksheet = workbook.active
-    worksheet.title = "VINs"
-    worksheet.append(VIN_TEMPLATE_HEADERS)
-    worksheet.freeze_panes = "A2"
-
-    vins = ProductVin.objects.filter(user__in=product_user_ids).order_by("sort_order", "vin")
-    for vin in vins:
-        worksheet.append([
-            vin.vin or "",
-            vin.description or "",
-            vin.sort_order,
-            "Active" if vin.is_active else "Inactive",
-        ])
-
-    active_states = ["Active", "Inactive"]
-    options_sheet = workbook.create_sheet(title="Options")
-    options_sheet.sheet_state = "hidden"
-
-    def _write_option_column(column_index, header, values):
-        options_sheet.cell(row=1, column=column_index, value=header)
-        for row_index, value in enumerate(values, start=2):
-            options_sheet.cell(row=row_index, column=column_index, value=value)
-        last_row = max(2, len(values) + 1)
-        column_letter = get_column_letter(column_index)
-        return f"=Options!${column_letter}$2:${column_letter}${last_row}"
-
-    active_formula = _write_option_column(1, "Active", active_states)
-
-    def _apply_validation(target_header, formula):
-        target_column_index = VIN_TEMPLATE_HEADERS.index(target_header) + 1
-        target_column_letter = get_column_letter(target_column_index)
-        validation = DataValidation(type="list", formula1=formula, allow_blank=True)
-        worksheet.add_data_validation(validation)
-        validation.add(f"{target_column_letter}2:{target_column_letter}1048576")
-
-    _apply_validation("Active", active_formula)
-
-    apply_template_styling(
-        worksheet,
+    vins = (
+        ProductVin.objects.filter(user__in=product_user_ids)
+        .order_by("sort_order", "vin")
+        .values_list("vin", "description", "sort_order", "is_active")
+    )
+    return template_response(
+        "vins_template.xlsx",
+        title="VINs",
         headers=VIN_TEMPLATE_HEADERS,
-        header_row_index=1,
-        column_width_overrides={
+        rows=_sorted_lookup_rows(vins),
+        dropdowns=[("Active", ACTIVE_STATES, ["Active"])],
+        column_widths={
             "VIN": 24,
             "Description": 48,
             "Sort Order": 14,
@@ -3477,122 +3018,24 @@ def export_vins_template(request):
         },
     )
 
-    output = BytesIO()
-    workbook.save(output)
-    output.seek(0)
-
-    response = HttpResponse(
-        output.getvalue(),
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    )
-    response["Content-Disposition"] = 'attachment; filename="vins_template.xlsx"'
-    return response
-
 
 @login_required
 def export_locations_template(request):
     """Download an Excel template populated with the user's current inventory locations."""
 
     product_user_ids = _get_inventory_user_ids(request)
-    workbook = Workbook()
-    worksheet = workbook.active
-    worksheet.title = "Locations"
-    worksheet.append(LOCATION_TEMPLATE_HEADERS)
-    worksheet.freeze_panes = "A2"
-
-    locations = InventoryLocation.objects.filter(user__in=product_user_ids).order_by("name")
-    for location in locations:
-        worksheet.append([location.name or ""])
-
-    apply_template_styling(
-        worksheet,
-        headers=LOCATION_TEMPLATE_HEADERS,
-        header_row_index=1,
-        column_width_overrides={"Name": 34},
+    locations = (
+        InventoryLocation.objects.filter(user__in=product_user_ids)
+        .order_by("name")
+        .values_list("name", flat=True)
     )
-
-    output = BytesIO()
-    workbook.save(output)
-    output.seek(0)
-
-    response = HttpResponse(
-        output.getvalue(),
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    return template_response(
+        "locations_template.xlsx",
+        title="Locations",
+        headers=LOCATION_TEMPLATE_HEADERS,
+        rows=([name or ""] for name in locations.iterator(chunk_size=ITERATOR_CHUNK_SIZE)),
+        column_widths={"Name": 34},
     )
-    response["Content-Disposition"] = 'attachment; filename="locations_template.xlsx"'
-    return response
-
-
-def _parse_decimal(value, field_name, allow_blank=True):
-    if value in (None, ""):
-        if allow_blank:
-            return None
-        return Decimal("0")
-    if isinstance(value, Decimal):
-        return value
-    try:
-        return Decimal(str(value))
-    except (InvalidOperation, ValueError) as exc:
-        raise ValueError(f"{field_name} must be a number.") from exc
-
-
-def _parse_integer(value, field_name):
-    if value in (None, ""):
-        return 0
-    try:
-        decimal_value = Decimal(str(value))
-        if decimal_value != decimal_value.to_integral_value():
-            raise ValueError
-        return int(decimal_value)
-    except (InvalidOperation, ValueError) as exc:
-        raise ValueError(f"{field_name} must be an integer.") from exc
-
-
-def _parse_optional_integer(value, field_name):
-    if value in (None, ""):
-        return None
-    return _parse_integer(value, field_name)
-
-
-def _parse_date(value, field_name):
-    if value in (None, ""):
-        return None
-    if isinstance(value, datetime):
-        return value.date()
-    if isinstance(value, date):
-        return value
-    if isinstance(value, str):
-        cleaned = value.strip()
-        for fmt in ("%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y"):
-            try:
-                return datetime.strptime(cleaned, fmt).date()
-            except ValueError:
-                continue
-        raise ValueError(
-            f"{field_name} must be a valid date in YYYY-MM-DD format."
-        )
-    raise ValueError(f"{field_name} must be a valid date.")
-
-
-def _parse_boolean(value, field_name, default=None):
-    if value in (None, ""):
-        return default
-    if isinstance(value, bool):
-        return value
-    if isinstance(value, (int, float, Decimal)):
-        if value == 1:
-            return True
-        if value == 0:
-            return False
-    if isinstance(value, str):
-        normalized = value.strip().lower()
-        truthy = {"1", "true", "yes", "y", "active", "enabled", "on"}
-        falsy = {"0", "false", "no", "n", "inactive", "disabled", "off"}
-        if normalized in truthy:
-            return True
-        if normalized in falsy:
-            return False
-    raise ValueError(f"{field_name} must be yes/no or true/false.")
 
 
 @login_required
@@ -3605,340 +3048,53 @@ def import_products_from_excel(request):
         return redirect(next_url)
 
     try:
-        workbook = load_workbook(upload, data_only=True)
-    except Exception:
-        messages.error(request, "Unable to read the uploaded file. Please upload a valid .xlsx file.")
+        product_import.enqueue(request.user, upload, actor=get_current_actor())
+    except ValueError as exc:
+        messages.error(request, str(exc))
         return redirect(next_url)
 
-    worksheet = workbook.active
-
-    header_cells = None
-    header_row_index = None
-    for row in worksheet.iter_rows(min_row=1):
-        row_values = [cell.value for cell in row]
-        if not any(row_values):
-            continue
-        first_value = row_values[0]
-        if isinstance(first_value, str) and first_value.startswith("Instructions:"):
-            continue
-        header_cells = row
-        header_row_index = row[0].row
-        break
-
-    if header_cells is None:
-        messages.error(request, "The uploaded file is empty or missing a header row.")
-        return redirect(next_url)
-
-    headers = []
-    for cell in header_cells:
-        value = cell.value
-        if isinstance(value, str):
-            value = value.strip()
-        headers.append(value or "")
-
-    missing_headers = [
-        h
-        for h in PRODUCT_TEMPLATE_HEADERS
-        if h not in headers and h not in OPTIONAL_PRODUCT_TEMPLATE_HEADERS
-    ]
-    if missing_headers:
-        messages.error(
-            request,
-            "The uploaded file is missing required columns: "
-            + ", ".join(missing_headers),
-        )
-        return redirect(next_url)
-
-    header_indexes = {header: idx for idx, header in enumerate(headers)}
-
-    item_type_choices = Product._meta.get_field("item_type").choices
-    item_type_map = {}
-    for value, label in item_type_choices:
-        item_type_map[str(value).strip().lower()] = value
-        item_type_map[str(label).strip().lower()] = value
-        item_type_map[str(label).strip().lower().replace("-", "_")] = value
-
-    created_count = 0
-    updated_count = 0
-    errors = []
-
-    data_start_row = header_row_index + 1
-    for row_index, row in enumerate(
-        worksheet.iter_rows(min_row=data_start_row, values_only=True), start=data_start_row
-    ):
-        if not row or not any(row):
-            continue
-
-        def get_value(column_name):
-            idx = header_indexes[column_name]
-            return row[idx] if idx < len(row) else None
-
-        try:
-            sku = _normalize_text(get_value("SKU"))
-            oem_part_number = _normalize_text(get_value("OEM Part Number"))
-            barcode_value = _normalize_text(get_value("Barcode"))
-            fitment_notes = _normalize_text(get_value("Fitment Notes"))
-            alternate_skus = None
-            if "Alternate SKUs" in header_indexes:
-                alternate_skus = _parse_alternate_sku_input(get_value("Alternate SKUs"))
-
-            raw_name = get_value("Name")
-            name = _normalize_text(raw_name)
-            if not name:
-                raise ValueError("Name is required.")
-
-            description = get_value("Description") or ""
-            if isinstance(description, str):
-                description = description.strip()
-
-            category_name = _normalize_text(get_value("Category"))
-            category = None
-            if category_name:
-                category = Category.objects.filter(
-                    user=request.user, name__iexact=category_name
-                ).first()
-                if not category:
-                    category = Category.objects.create(
-                        user=request.user,
-                        name=category_name,
-                        description="",
-                    )
-
-            supplier_name = _normalize_text(get_value("Supplier"))
-            supplier = None
-            if supplier_name:
-                supplier = Supplier.objects.filter(
-                    user=request.user, name__iexact=supplier_name
-                ).first()
-                if not supplier:
-                    supplier = Supplier.objects.create(
-                        user=request.user,
-                        name=supplier_name,
-                    )
-
-            brand_name = _normalize_text(get_value("Brand"))
-            brand = None
-            if brand_name:
-                brand = ProductBrand.objects.filter(
-                    user=request.user, name__iexact=brand_name
-                ).first()
-                if not brand:
-                    brand = ProductBrand.objects.create(
-                        user=request.user,
-                        name=brand_name,
-                    )
-
-            model_name = _normalize_text(get_value("Model"))
-            vehicle_model = None
-            if model_name:
-                model_qs = ProductModel.objects.filter(
-                    user=request.user, name__iexact=model_name
-                )
-                if brand:
-                    model_qs = model_qs.filter(brand=brand)
-                vehicle_model = model_qs.first()
-                if not vehicle_model:
-                    vehicle_model = ProductModel.objects.create(
-                        user=request.user,
-                        name=model_name,
-                        brand=brand,
-                    )
-
-            vin_value = _normalize_text(get_value("VIN"))
-            vin_number = None
-            if vin_value:
-                vin_number = ProductVin.objects.filter(
-                    user=request.user, vin__iexact=vin_value
-                ).first()
-                if not vin_number:
-                    vin_number = ProductVin.objects.create(
-                        user=request.user,
-                        vin=vin_value,
-                    )
-
-            cost_price = _parse_decimal(get_value("Cost Price"), "Cost Price")
-            sale_price = _parse_decimal(get_value("Sale Price"), "Sale Price")
-            promotion_price = _parse_decimal(get_value("Promotion Price"), "Promotion Price")
-            margin = _parse_decimal(get_value("Margin"), "Margin")
-
-            for label, value in (("Cost Price", cost_price), ("Sale Price", sale_price)):
-                if value is not None and value < Decimal("0"):
-                    raise ValueError(f"{label} cannot be negative.")
-            if margin is None:
-                if cost_price is None and sale_price is None:
-                    raise ValueError(
-                        "Provide Cost Price and Sale Price, or include the Margin so missing values can be calculated."
-                    )
-                if cost_price is None or sale_price is None:
-                    raise ValueError(
-                        "Margin is required when only one of Cost Price or Sale Price is supplied."
-                    )
-                margin = sale_price - cost_price
-            else:
-                if cost_price is None and sale_price is None:
-                    raise ValueError(
-                        "Cost Price or Sale Price is required when Margin is provided."
-                    )
-                if cost_price is None:
-                    cost_price = sale_price - margin
-                if sale_price is None:
-                    sale_price = cost_price + margin
-                if cost_price is not None and sale_price is not None:
-                    margin = sale_price - cost_price
-
-            if cost_price is None or sale_price is None:
-                raise ValueError("Unable to determine both Cost Price and Sale Price from the provided values.")
-
-            if cost_price < Decimal("0"):
-                raise ValueError("Cost Price cannot be negative.")
-            if sale_price < Decimal("0"):
-                raise ValueError("Sale Price cannot be negative.")
-            if promotion_price is not None and promotion_price < Decimal("0"):
-                raise ValueError("Promotion Price cannot be negative.")
-
-            quantity = _parse_integer(get_value("Quantity"), "Quantity")
-            if quantity < 0:
-                raise ValueError("Quantity cannot be negative.")
-
-            reorder_level = _parse_integer(
-                get_value("Reorder Level"), "Reorder Level"
-            )
-            if reorder_level < 0:
-                raise ValueError("Reorder Level cannot be negative.")
-            max_stock_level = _parse_integer(
-                get_value("Max Stock Level"), "Max Stock Level"
-            )
-            if max_stock_level < 0:
-                raise ValueError("Max Stock Level cannot be negative.")
-            if max_stock_level and max_stock_level < reorder_level:
-                raise ValueError("Max Stock Level must be greater than or equal to Reorder Level.")
-
-            location = _normalize_text(get_value("Location"))
-
-            warranty_expiry = _parse_date(
-                get_value("Warranty Expiry Date"), "Warranty Expiry Date"
-            )
-            warranty_length = get_value("Warranty Length (Days)")
-            if warranty_length in (None, ""):
-                warranty_length_value = None
-            else:
-                warranty_length_value = _parse_integer(
-                    warranty_length, "Warranty Length (Days)"
-                )
-                if warranty_length_value < 0:
-                    raise ValueError("Warranty Length cannot be negative.")
-
-            item_type_raw = _normalize_text(get_value("Item Type"))
-            item_type = None
-            if item_type_raw:
-                normalized_item_type = item_type_raw.strip().lower().replace(" ", "_").replace("-", "_")
-                item_type = item_type_map.get(normalized_item_type)
-                if not item_type:
-                    raise ValueError("Item Type must be Inventory or Non-inventory.")
-
-            show_on_storefront = _parse_boolean(
-                get_value("Show on Storefront"), "Show on Storefront", default=None
-            )
-            featured = _parse_boolean(get_value("Featured"), "Featured", default=None)
-
-            product = None
-            if sku:
-                product = Product.objects.filter(
-                    user=request.user, sku__iexact=sku
-                ).first()
-            if not product:
-                product = Product.objects.filter(
-                    user=request.user, name__iexact=name
-                ).first()
-
-            if product:
-                is_new = False
-            else:
-                product = Product(user=request.user)
-                is_new = True
-
-            stock_owner = get_stock_owner(request.user)
-            product.user = stock_owner or request.user
-            product.sku = sku or None
-            product.oem_part_number = oem_part_number or None
-            product.barcode_value = barcode_value or None
-            product.name = name
-            product.description = description or ""
-            product.fitment_notes = fitment_notes or ""
-            product.category = category
-            product.supplier = supplier
-            product.brand = brand
-            product.vehicle_model = vehicle_model
-            product.vin_number = vin_number
-            product.cost_price = cost_price
-            product.sale_price = sale_price
-            product.promotion_price = promotion_price
-            product.margin = margin
-            product.quantity_in_stock = quantity
-            product.reorder_level = reorder_level
-            product.max_stock_level = max_stock_level
-            product.location = location or ""
-            product.warranty_expiry_date = warranty_expiry
-            product.warranty_length = warranty_length_value
-            if item_type:
-                product.item_type = item_type
-            if show_on_storefront is not None:
-                product.is_published_to_store = show_on_storefront
-            if featured is not None:
-                product.is_featured = featured
-
-            product.clean()
-            product.save()
-            _sync_alternate_skus(product, alternate_skus)
-            stock_quantity = quantity if product.item_type == "inventory" else 0
-            stock_reorder = reorder_level if product.item_type == "inventory" else 0
-            stock_max = max_stock_level if product.item_type == "inventory" else 0
-            upsert_product_stock(
-                product,
-                request.user,
-                quantity_in_stock=stock_quantity,
-                reorder_level=stock_reorder,
-                max_stock_level=stock_max,
-            )
-
-            if is_new:
-                created_count += 1
-            else:
-                updated_count += 1
-
-        except ValidationError as exc:
-            errors.append(f"Row {row_index}: {exc.message}")
-        except ValueError as exc:
-            errors.append(f"Row {row_index}: {exc}")
+    messages.info(
+        request,
+        f"Importing {upload.name} in the background. Progress is shown on the products page.",
+    )
+    return redirect(reverse("accounts:inventory_products"))
 
-    if created_count or updated_count:
-        messages.success(
-            request,
-            f"Imported {created_count} new product(s) and updated {updated_count} product(s).",
-        )
 
-    if errors:
-        error_preview = "; ".join(errors[:10])
-        if len(errors) > 10:
-            error_preview += f"; and {len(errors) - 10} more issue(s)."
-        messages.warning(
-            request,
-            f"Some rows could not be imported: {error_preview}",
-        )
-
-    return redirect(reverse("accounts:inventory_products"))
+@login_required
+def product_import_status(request, pk):
+    """JSON progress of one of the user's product imports, polled by the products page."""
+    job = get_object_or_404(ProductImportJob, pk=pk, user=request.user)
+    return JsonResponse(
+        {
+            "id": job.pk,
+            "status": job.status,
+            "finished": job.is_finished,
+            "progress": job.progress_percent,
+            "total_rows": job.total_rows,
+            "processed_rows": job.processed_rows,
+            "created": job.created_count,
+            "updated": job.updated_count,
+            "errors": job.error_count,
+            "failure_message": job.failure_message,
+            "error_report_url": (
+                reverse("accounts:inventory_products_import_errors", args=[job.pk]) if job.error_report else ""
+            ),
+        }
+    )
 
 
-def _normalize_text(value):
-    if value in (None, ""):
-        return ""
-    if isinstance(value, str):
-        return value.strip()
-    if isinstance(value, float):
-        if value.is_integer():
-            return str(int(value))
-        return ("%s" % value).strip()
-    return str(value).strip()
+@login_required
+def product_import_error_report(request, pk):
+    """Download the CSV of rows a product import rejected."""
+    job = get_object_or_404(ProductImportJob, pk=pk, user=request.user)
+    if not job.error_report:
+        raise Http404("This import has no error report.")
+    return FileResponse(
+        job.error_report.open("rb"),
+        as_attachment=True,
+        filename=f"product_import_{job.pk}_errors.csv",
+        content_type="text/csv",
+    )
 
 
 def _extract_ids(raw_ids):
@@ -4018,14 +3174,14 @@ def import_suppliers_from_excel(request):
 
         try:
             raw_name = get_value("Name")
-            name = _normalize_text(raw_name)
+            name = product_import.normalize_text(raw_name)
             if not name:
                 raise ValueError("Name is required.")
 
-            contact_person = _normalize_text(get_value("Contact Person"))
-            email_value = _normalize_text(get_value("Email"))
-            phone_number = _normalize_text(get_value("Phone Number"))
-            address = _normalize_text(get_value("Address"))
+            contact_person = product_import.normalize_text(get_value("Contact Person"))
+            email_value = product_import.normalize_text(get_value("Email"))
+            phone_number = product_import.normalize_text(get_value("Phone Number"))
+            address = product_import.normalize_text(get_value("Address"))
 
             supplier = Supplier.objects.filter(user=request.user, name__iexact=name).first()
             if supplier:
@@ -4138,15 +3294,15 @@ def import_categories_from_excel(request):
             return row[idx] if idx < len(row) else None
 
         try:
-            name = _normalize_text(get_value("Name"))
+            name = product_import.normalize_text(get_value("Name"))
             if not name:
                 raise ValueError("Name is required.")
 
-            description = _normalize_text(get_value("Description"))
-            group_name = _normalize_text(get_value("Group"))
-            parent_name = _normalize_text(get_value("Parent Category"))
-            sort_order = _parse_integer(get_value("Sort Order"), "Sort Order")
-            is_active = _parse_boolean(get_value("Active"), "Active", default=None)
+            description = product_import.normalize_text(get_value("Description"))
+            group_name = product_import.normalize_text(get_value("Group"))
+            parent_name = product_import.normalize_text(get_value("Parent Category"))
+            sort_order = product_import.parse_integer(get_value("Sort Order"), "Sort Order")
+            is_active = product_import.parse_boolean(get_value("Active"), "Active", default=None)
 
             group = None
             if group_name:
@@ -4289,13 +3445,13 @@ def import_category_groups_from_excel(request):
             return row[idx] if idx < len(row) else None
 
         try:
-            name = _normalize_text(get_value("Name"))
+            name = product_import.normalize_text(get_value("Name"))
             if not name:
                 raise ValueError("Name is required.")
 
-            description = _normalize_text(get_value("Description"))
-            sort_order = _parse_integer(get_value("Sort Order"), "Sort Order")
-            is_active = _parse_boolean(get_value("Active"), "Active", default=None)
+            description = product_import.normalize_text(get_value("Description"))
+            sort_order = product_import.parse_integer(get_value("Sort Order"), "Sort Order")
+            is_active = product_import.parse_boolean(get_value("Active"), "Active", default=None)
 
             group = CategoryGroup.objects.filter(
                 user=request.user, name__iexact=name
@@ -4410,13 +3566,13 @@ def import_brands_from_excel(request):
             return row[idx] if idx < len(row) else None
 
         try:
-            name = _normalize_text(get_value("Name"))
+            name = product_import.normalize_text(get_value("Name"))
             if not name:
                 raise ValueError("Name is required.")
 
-            description = _normalize_text(get_value("Description"))
-            sort_order = _parse_integer(get_value("Sort Order"), "Sort Order")
-            is_active = _parse_boolean(get_value("Active"), "Active", default=None)
+            description = product_import.normalize_text(get_value("Description"))
+            sort_order = product_import.parse_integer(get_value("Sort Order"), "Sort Order")
+            is_active = product_import.parse_boolean(get_value("Active"), "Active", default=None)
 
             brand = ProductBrand.objects.filter(
                 user=request.user, name__iexact=name
@@ -4531,16 +3687,16 @@ def import_models_from_excel(request):
             return row[idx] if idx < len(row) else None
 
         try:
-            name = _normalize_text(get_value("Name"))
+            name = product_import.normalize_text(get_value("Name"))
             if not name:
                 raise ValueError("Name is required.")
 
-            brand_name = _normalize_text(get_value("Brand"))
-            description = _normalize_text(get_value("Description"))
-            year_start = _parse_optional_integer(get_value("Year Start"), "Year Start")
-            year_end = _parse_optional_integer(get_value("Year End"), "Year End")
-            sort_order = _parse_integer(get_value("Sort Order"), "Sort Order")
-            is_active = _parse_boolean(get_value("Active"), "Active", default=None)
+            brand_name = product_import.normalize_text(get_value("Brand"))
+            description = product_import.normalize_text(get_value("Description"))
+            year_start = product_import.parse_optional_integer(get_value("Year Start"), "Year Start")
+            year_end = product_import.parse_optional_integer(get_value("Year End"), "Year End")
+            sort_order = product_import.parse_integer(get_value("Sort Order"), "Sort Order")
+            is_active = product_import.parse_boolean(get_value("Active"), "Active", default=None)
 
             brand = None
             if brand_name:
@@ -4669,14 +3825,14 @@ def import_vins_from_excel(request):
             return row[idx] if idx < len(row) else None
 
         try:
-            vin_value = _normalize_text(get_value("VIN"))
+            vin_value = product_import.normalize_text(get_value("VIN"))
             if not vin_value:
                 raise ValueError("VIN is required.")
             vin_value = vin_value.upper()
 
-            description = _normalize_text(get_value("Description"))
-            sort_order = _parse_integer(get_value("Sort Order"), "Sort Order")
-            is_active = _parse_boolean(get_value("Active"), "Active", default=None)
+            description = product_import.normalize_text(get_value("Description"))
+            sort_order = product_import.parse_integer(get_value("Sort Order"), "Sort Order")
+            is_active = product_import.parse_boolean(get_value("Active"), "Active", default=None)
 
             vin = ProductVin.objects.filter(
                 user=request.user, vin__iexact=vin_value
@@ -4778,7 +3934,7 @@ def import_locations_from_excel(request):
             return row[idx] if idx < len(row) else None
 
         try:
-            name = _normalize_text(get_value("Name"))
+            name = product_import.normalize_text(get_value("Name"))
             if not name:
                 raise ValueError("Name is required.")
 
@@ -5007,6 +4163,26 @@ def bulk_delete_locations(request):
 ##############################
 
 
+_QR_BOLD_FONT_PATHS = (
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf",
+)
+_QR_REGULAR_FONT_PATHS = (
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
+)
+
+
+@lru_cache(maxsize=64)
+def _qr_label_font(size, bold=False):
+    """Load a label font once per size; parsing the TTF dominated label renders."""
+    paths = _QR_BOLD_FONT_PATHS if bold else _QR_REGULAR_FONT_PATHS
+    for path in paths:
+        if os.path.exists(path):
+            return ImageFont.truetype(path, size=size)
+    return ImageFont.load_default()
+
+
 @login_required
 def product_qr_pdf(request, product_id):
     product = get_object_or_404(
@@ -5071,21 +4247,7 @@ def product_qr_pdf(request, product_id):
     text_bottom_limit = label_height_px - bottom_padding
     text_color = (26, 26, 26)
 
-    bold_font_paths = [
-        "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
-        "/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf",
-    ]
-    regular_font_paths = [
-        "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
-        "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
-    ]
-
-    def load_font(size, bold=False):
-        paths = bold_font_paths if bold else regular_font_paths
-        for path in paths:
-            if os.path.exists(path):
-                return ImageFont.truetype(path, size=size)
-        return ImageFont.load_default()
+    load_font = _qr_label_font
 
     def line_height(font):
         ascent, descent = font.getmetrics()
@@ -5296,23 +4458,14 @@ def inventory_analytics(request):
     stock_user_ids = _get_inventory_stock_user_ids(request)
     transaction_user_ids = _get_inventory_transaction_user_ids(request)
     period_days = int(request.GET.get('days', 30))
-    start_date = timezone.now() - timedelta(days=period_days)
 
     products = Product.objects.filter(user__in=stock_user_ids)
     products = annotate_products_with_stock(products, request.user)
-    transaction_scope = _transaction_scope_filter(transaction_user_ids)
+    sold_by_product = stock_movements.sold_by_product(transaction_user_ids, stock_movements.window_start(period_days))
 
     turnover_data = []
     for p in products:
-        sold = (
-            p.transactions.filter(
-                transaction_scope,
-                transaction_type='OUT',
-                transaction_date__gte=start_date,
-            )
-            .aggregate(total=Sum('quantity'))['total']
-            or 0
-        )
+        sold = sold_by_product.get(p.pk, 0)
         avg_stock = (p.stock_quantity + sold) / 2 if sold else p.stock_quantity
         turnover = sold / avg_stock if avg_stock else 0
         turnover_data.append({'product': p, 'qty_sold': sold, 'turnover': round(turnover, 2)})
@@ -5337,12 +4490,7 @@ def inventory_analytics(request):
     unsold_days = period_days * 6
     cutoff = timezone.now() - timedelta(days=unsold_days)
     unsold = (
-        products.annotate(
-            last_sale=Max(
-                'transactions__transaction_date',
-                filter=Q(transactions__transaction_type='OUT') & _product_transaction_scope_filter(transaction_user_ids)
-            )
-        )
+        products.annotate(last_sale=stock_movements.last_sale(transaction_user_ids))
         .filter(Q(last_sale__lt=cutoff) | Q(last_sale__isnull=True))
     )
 
@@ -5383,6 +4531,7 @@ def _parse_datetime_input(raw_value):
 
 OPERATIONS_ACTION_CAPABILITY = {
     "create_low_stock_pos": InventoryRoleAssignment.CAP_PURCHASE_ORDERS,
+    "create_auto_rule_pos": InventoryRoleAssignment.CAP_PURCHASE_ORDERS,
     "update_po_status": InventoryRoleAssignment.CAP_PURCHASE_ORDERS,
     "receive_po_item": InventoryRoleAssignment.CAP_PURCHASE_ORDERS,
     "start_cycle_count": InventoryRoleAssignment.CAP_CYCLE_COUNTS,
@@ -5405,7 +4554,7 @@ OPERATIONS_ACTION_CAPABILITY = {
 def inventory_operations_view(request):
     business_user = _get_inventory_business_user(request)
     product_user_ids = _get_inventory_user_ids(request)
-    transaction_scope = _transaction_scope_filter(_get_inventory_transaction_user_ids(request))
+    transaction_user_ids = _get_inventory_transaction_user_ids(request)
 
     if request.method == "POST":
         action = (request.POST.get("action") or "").strip()
@@ -5454,67 +4603,16 @@ def inventory_operations_view(request):
                 request.user,
             )
             low_stock_products = apply_stock_fields(list(products.filter(stock_quantity__lt=F("stock_reorder"))))
-            rule_map = {
-                rule.product_id: rule
-                for rule in ReplenishmentRule.objects.filter(
-                    user=business_user,
-                    product_id__in=[product.id for product in low_stock_products],
-                )
-            }
-
-            grouped = {}
-            for product in low_stock_products:
-                recommendation = _recommended_reorder_for_product(
-                    product,
-                    transaction_scope=transaction_scope,
-                    rule=rule_map.get(product.id),
-                )
-                order_qty = recommendation["recommended_qty"]
-                if order_qty <= 0:
-                    continue
-
-                supplier_key = product.supplier_id or 0
-                if supplier_key not in grouped:
-                    grouped[supplier_key] = {
-                        "supplier": product.supplier,
-                        "items": [],
-                        "lead_days": [],
-                    }
-                grouped[supplier_key]["items"].append((product, recommendation))
-                if rule_map.get(product.id):
-                    grouped[supplier_key]["lead_days"].append(rule_map[product.id].lead_time_days or 0)
-
-            po_created = 0
-            item_created = 0
-            with transaction.atomic():
-                for _, payload in grouped.items():
-                    lead_days = max(payload["lead_days"]) if payload["lead_days"] else 7
-                    po = PurchaseOrder.objects.create(
-                        user=business_user,
-                        supplier=payload["supplier"],
-                        status="draft",
-                        expected_delivery_date=timezone.localdate() + timedelta(days=max(lead_days, 1)),
-                        created_by=request.user,
-                    )
-                    created_any_item = False
-                    for product, recommendation in payload["items"]:
-                        qty = recommendation["recommended_qty"]
-                        if qty <= 0:
-                            continue
-                        PurchaseOrderItem.objects.create(
-                            purchase_order=po,
-                            product=product,
-                            quantity_ordered=qty,
-                            recommended_quantity=qty,
-                            unit_cost=product.cost_price or Decimal("0.00"),
-                            notes=f"Target stock: {recommendation['target_stock']}",
-                        )
-                        created_any_item = True
-                        item_created += 1
-                    if created_any_item:
-                        po_created += 1
-                    else:
-                        po.delete()
+            planned = replenishment.plan(
+                low_stock_products,
+                business_user=business_user,
+                transaction_user_ids=transaction_user_ids,
+            )
+            po_created, item_created = replenishment.create_draft_purchase_orders(
+                replenishment.group_by_supplier(planned),
+                business_user=business_user,
+                created_by=request.user,
+            )
 
             if po_created:
                 messages.success(request, f"Created {po_created} draft purchase order(s) with {item_created} line item(s).")
@@ -5529,6 +4627,46 @@ def inventory_operations_view(request):
                 messages.info(request, "No purchase orders were created. Review stock levels and replenishment rules.")
             return redirect("accounts:inventory_operations")
 
+        if action == "create_auto_rule_pos":
+            auto_product_ids = ReplenishmentRule.objects.filter(
+                user=business_user,
+                auto_generate_po=True,
+            ).values("product_id")
+            products = annotate_products_with_stock(
+                Product.objects.filter(
+                    user__in=product_user_ids,
+                    item_type="inventory",
+                    pk__in=auto_product_ids,
+                ).select_related("supplier"),
+                request.user,
+            )
+            planned = replenishment.plan(
+                apply_stock_fields(list(products)),
+                business_user=business_user,
+                transaction_user_ids=transaction_user_ids,
+            )
+            po_created, item_created = replenishment.create_draft_purchase_orders(
+                replenishment.group_by_supplier(planned),
+                business_user=business_user,
+                created_by=request.user,
+            )
+
+            if po_created:
+                messages.success(
+                    request,
+                    f"Created {po_created} draft purchase order(s) with {item_created} line item(s) from auto-PO rules.",
+                )
+                _log_inventory_activity(
+                    request,
+                    action="inventory_purchase_orders_generated",
+                    object_type="inventory_purchase_order",
+                    description=f"Generated {po_created} draft purchase orders from auto-PO rules",
+                    metadata={"po_count": po_created, "item_count": item_created, "source": "auto_generate_po"},
+                )
+            else:
+                messages.info(request, "No auto-PO rule currently needs a reorder.")
+            return redirect("accounts:inventory_operations")
+
         if action == "update_po_status":
             po_id = _safe_int(request.POST.get("po_id"), minimum=1)
             status_value = (request.POST.get("status") or "").strip()
@@ -5951,29 +5089,7 @@ def inventory_operations_view(request):
 
         if action == "refresh_supplier_scorecards":
             period_days = _safe_int(request.POST.get("period_days"), default=90, minimum=30)
-            scorecards = _build_supplier_scorecards(
-                business_user=business_user,
-                since_date=timezone.now() - timedelta(days=period_days),
-                period_days=period_days,
-            )
-            snapshot_date = timezone.localdate()
-            saved_count = 0
-            for entry in scorecards:
-                SupplierScorecardSnapshot.objects.update_or_create(
-                    user=business_user,
-                    supplier=entry["supplier"],
-                    snapshot_date=snapshot_date,
-                    period_days=period_days,
-                    defaults={
-                        "po_count": entry["po_count"],
-                        "on_time_rate": entry["on_time_rate"],
-                        "fill_rate": entry["fill_rate"],
-                        "avg_lead_time_days": entry["avg_lead_time_days"],
-                        "rma_rate": entry["rma_rate"],
-                        "weighted_score": entry["weighted_score"],
-                    },
-                )
-                saved_count += 1
+            saved_count = supplier_scorecards.refresh(business_user.id, period_days=period_days)
             messages.success(request, f"Refreshed supplier scorecards for {saved_count} supplier(s).")
             _log_inventory_activity(
                 request,
@@ -5997,29 +5113,19 @@ def inventory_operations_view(request):
 
     guardrail, _ = MarginGuardrailSetting.objects.get_or_create(user=business_user)
 
-    rule_map = {
-        rule.product_id: rule
-        for rule in ReplenishmentRule.objects.filter(
-            user=business_user,
-            product_id__in=[product.id for product in products],
-        )
-    }
-
     low_stock_products = [product for product in products if product.quantity_in_stock < product.reorder_level]
-    replenishment_rows = []
-    for product in low_stock_products[:30]:
-        recommendation = _recommended_reorder_for_product(
-            product,
-            transaction_scope=transaction_scope,
-            rule=rule_map.get(product.id),
-        )
-        replenishment_rows.append(
-            {
-                "product": product,
-                "rule": rule_map.get(product.id),
-                "recommendation": recommendation,
-            }
+    replenishment_rows = [
+        {
+            "product": product,
+            "rule": recommendation["rule"],
+            "recommendation": recommendation,
+        }
+        for product, recommendation in replenishment.plan(
+            low_stock_products[:30],
+            business_user=business_user,
+            transaction_user_ids=transaction_user_ids,
         )
+    ]
 
     purchase_orders = (
         PurchaseOrder.objects.filter(user=business_user)
@@ -6055,11 +5161,7 @@ def inventory_operations_view(request):
         .order_by("-created_at")[:20]
     )
 
-    scorecards = _build_supplier_scorecards(
-        business_user=business_user,
-        since_date=timezone.now() - timedelta(days=90),
-        period_days=90,
-    )
+    scorecards = supplier_scorecards.with_trends(supplier_scorecards.current_rows(business_user.id))
     latest_snapshots = (
         SupplierScorecardSnapshot.objects.filter(user=business_user)
         .select_related("supplier")
@@ -6109,10 +5211,7 @@ def inventory_operations_view(request):
         "bucket_180_plus": 0,
     }
     dead_stock_qs = Product.objects.filter(user__in=product_user_ids, item_type="inventory").annotate(
-        last_sale=Max(
-            "transactions__transaction_date",
-            filter=Q(transactions__transaction_type="OUT") & _product_transaction_scope_filter(_get_inventory_transaction_user_ids(request)),
-        )
+        last_sale=stock_movements.last_sale(transaction_user_ids)
     )
     for product in dead_stock_qs:
         if product.last_sale:
@@ -28,6 +28,7 @@ from accounts.models import (
     WorkOrder, WorkOrderAssignment, Mechanic, Product, WorkOrderRecord, Vehicle, VehicleMaintenanceTask,
     InventoryTransaction, JobHistory, PMInspection
 )
+from accounts import search_index
 from accounts.utils import notify_mechanic_assignment, sync_workorder_assignments
 from .serializers import CustomerSerializer, GroupedInvoiceSerializer, PaymentSerializer, NoteSerializer
 
@@ -265,7 +266,12 @@ def mobile_jobs(request):
             .prefetch_related("workorder__assignments__mechanic")
             .order_by("-date_assigned")
         )
-        if search:
+        if search and search_index.is_enabled():
+            qs = search_index.order_by_rank(
+                search_index.search(qs, search_index.KIND_WORKORDER, search, field="workorder"),
+                "-date_assigned",
+            )
+        elif search:
             qs = qs.filter(
                 Q(workorder__description__icontains=search) |
                 Q(workorder__customer__name__icontains=search) |